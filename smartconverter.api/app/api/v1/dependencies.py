@@ -1,7 +1,11 @@
 from fastapi import Depends, HTTPException, status, Request
+from fastapi.routing import APIRoute
 from fastapi.security import OAuth2PasswordBearer
+from starlette.requests import HTTPConnection
 from sqlalchemy.orm import Session
 from typing import Optional
+import ipaddress
+from app.core.config import settings
 from app.core.database import get_db
 from app.models.user_list import UserList
 from app.services.auth_service import verify_token, get_user_by_email
@@ -103,4 +107,80 @@ async def get_user_id(request: Request, db: Session) -> Optional[int]:
             print(f"DEBUG: Error in get_user_by_device_id service: {e}")
             
     print("DEBUG: No user_id could be identified for this request")
-    return None
\ No newline at end of file
+    return None
+
+def _trusted_proxy(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    for network in settings.trusted_proxy_ips.split(","):
+        try:
+            if network.strip() and address in ipaddress.ip_network(network.strip(), strict=False):
+                return True
+        except ValueError:
+            continue
+    return False
+
+
+def client_address(request: HTTPConnection) -> str:
+    """The client's IP address, read from the proxy headers when the request came through a trusted proxy."""
+    peer = request.client.host if request.client else ""
+    if _trusted_proxy(peer):
+        # X-Real-IP is set by the proxy; in X-Forwarded-For only the last entry was added by it
+        forwarded = request.headers.get("x-real-ip") or request.headers.get("x-forwarded-for", "").split(",")[-1]
+        if forwarded.strip():
+            return forwarded.strip()
+    return peer
+
+
+def get_caller_identity(request: HTTPConnection) -> str:
+    """
+    Who is making the request, for keeping per-caller state apart: the
+    signed-in user, else the app's device id, else the client address.
+    Works for WebSocket connections too.
+    """
+    auth_header = request.headers.get("authorization")
+    if auth_header and auth_header.lower().startswith("bearer "):
+        try:
+            token_data = verify_token(auth_header.split(" ", 1)[1], ValueError("Invalid token"))
+            return f"user:{token_data.email}"
+        except ValueError:
+            pass
+    device_id = request.headers.get("x-device-id") or request.headers.get("device-id")
+    if device_id:
+        return f"device:{device_id}"
+    return f"ip:{client_address(request)}"
+
+
+class UploadRequest(Request):
+    """Request whose form data resolves resumable upload ids into uploaded files."""
+
+    async def form(self, *args, **kwargs):
+        from app.core.exceptions import FileProcessingError, create_error_response
+        from app.services.upload_service import UploadService
+
+        form = await super().form(*args, **kwargs)
+        try:
+            return UploadService.resolve_form(form)
+        except FileProcessingError as e:
+            raise create_error_response(
+                error_type="UploadNotFound",
+                message=str(e),
+                status_code=400
+            )
+
+
+class UploadRoute(APIRoute):
+    """
+    Route class for conversion endpoints: a finalized resumable upload can be
+    sent as ``upload_id`` (or ``<field>_upload_id``) instead of the file itself.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def upload_route_handler(request: Request):
+            return await handler(UploadRequest(request.scope, request.receive))
+
+        return upload_route_handler
@@ -5,7 +5,7 @@ from fastapi import APIRouter, File, UploadFile, HTTPException, Form, Depends, R
 from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from app.core.database import get_db
-from app.api.v1.dependencies import get_user_id
+from app.api.v1.dependencies import get_user_id, UploadRoute
 from app.services.conversion_log_service import ConversionLogService
 
 from app.core.config import settings
@@ -15,11 +15,13 @@ from app.core.exceptions import (
     FileProcessingError,
     UnsupportedFileTypeError,
     FileSizeExceededError,
+    JobCancelledError,
     create_error_response
 )
 from app.services.file_service import FileService
+from app.services.job_service import JobService
 
-router = APIRouter()
+router = APIRouter(route_class=UploadRoute)
 
 def _determine_output_filename(original_filename: str, provided_filename: Optional[str], target_extension: str) -> str:
     """
@@ -81,7 +83,7 @@ async def convert_mp4_to_mp3(
         input_path = FileService.save_uploaded_file(file)
         
         output_filename = _determine_output_filename(file.filename, filename, "mp3")
-        temp_output_path = AudioConversionService.mp4_to_mp3(input_path, bitrate, quality)
+        temp_output_path = await JobService.run(request, "audio", AudioConversionService.mp4_to_mp3, input_path, bitrate, quality)
         
         # Update log on success
         ConversionLogService.update_log_status(
@@ -109,6 +111,9 @@ async def convert_mp4_to_mp3(
             download_url=f"/api/v1/audioconversiontools/download/{output_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except (FileProcessingError, UnsupportedFileTypeError, FileSizeExceededError) as e:
         raise create_error_response(
             error_type=type(e).__name__,
@@ -165,7 +170,7 @@ async def convert_wav_to_mp3(
         input_path = FileService.save_uploaded_file(file)
         
         output_filename = _determine_output_filename(file.filename, filename, "mp3")
-        temp_output_path = AudioConversionService.wav_to_mp3(input_path, bitrate, quality)
+        temp_output_path = await JobService.run(request, "audio", AudioConversionService.wav_to_mp3, input_path, bitrate, quality)
         
         final_output_path = os.path.join(settings.output_dir, output_filename)
         if os.path.abspath(temp_output_path) != os.path.abspath(final_output_path):
@@ -189,6 +194,9 @@ async def convert_wav_to_mp3(
             download_url=f"/api/v1/audioconversiontools/download/{output_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except Exception as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response("ProcessingError", str(e), 500)
@@ -235,7 +243,7 @@ async def convert_flac_to_mp3(
         input_path = FileService.save_uploaded_file(file)
         
         output_filename = _determine_output_filename(file.filename, filename, "mp3")
-        temp_output_path = AudioConversionService.flac_to_mp3(input_path, bitrate, quality)
+        temp_output_path = await JobService.run(request, "audio", AudioConversionService.flac_to_mp3, input_path, bitrate, quality)
         
         final_output_path = os.path.join(settings.output_dir, output_filename)
         if os.path.abspath(temp_output_path) != os.path.abspath(final_output_path):
@@ -259,6 +267,9 @@ async def convert_flac_to_mp3(
             download_url=f"/api/v1/audioconversiontools/download/{output_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except Exception as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response("ProcessingError", str(e), 500)
@@ -305,7 +316,7 @@ async def convert_mp3_to_wav(
         input_path = FileService.save_uploaded_file(file)
         
         output_filename = _determine_output_filename(file.filename, filename, "wav")
-        temp_output_path = AudioConversionService.mp3_to_wav(input_path, sample_rate, channels)
+        temp_output_path = await JobService.run(request, "audio", AudioConversionService.mp3_to_wav, input_path, sample_rate, channels)
         
         final_output_path = os.path.join(settings.output_dir, output_filename)
         if os.path.abspath(temp_output_path) != os.path.abspath(final_output_path):
@@ -329,6 +340,9 @@ async def convert_mp3_to_wav(
             download_url=f"/api/v1/audioconversiontools/download/{output_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except Exception as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response("ProcessingError", str(e), 500)
@@ -375,7 +389,7 @@ async def convert_flac_to_wav(
         input_path = FileService.save_uploaded_file(file)
         
         output_filename = _determine_output_filename(file.filename, filename, "wav")
-        temp_output_path = AudioConversionService.flac_to_wav(input_path, sample_rate, channels)
+        temp_output_path = await JobService.run(request, "audio", AudioConversionService.flac_to_wav, input_path, sample_rate, channels)
         
         final_output_path = os.path.join(settings.output_dir, output_filename)
         if os.path.abspath(temp_output_path) != os.path.abspath(final_output_path):
@@ -399,6 +413,9 @@ async def convert_flac_to_wav(
             download_url=f"/api/v1/audioconversiontools/download/{output_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except Exception as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response("ProcessingError", str(e), 500)
@@ -444,7 +461,7 @@ async def convert_wav_to_flac(
         input_path = FileService.save_uploaded_file(file)
         
         output_filename = _determine_output_filename(file.filename, filename, "flac")
-        temp_output_path = AudioConversionService.wav_to_flac(input_path, compression_level)
+        temp_output_path = await JobService.run(request, "audio", AudioConversionService.wav_to_flac, input_path, compression_level)
         
         final_output_path = os.path.join(settings.output_dir, output_filename)
         if os.path.abspath(temp_output_path) != os.path.abspath(final_output_path):
@@ -468,6 +485,9 @@ async def convert_wav_to_flac(
             download_url=f"/api/v1/audioconversiontools/download/{output_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except Exception as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response("ProcessingError", str(e), 500)
@@ -515,7 +535,7 @@ async def convert_audio_format(
         input_path = FileService.save_uploaded_file(file)
         
         output_filename = _determine_output_filename(file.filename, filename, output_format)
-        temp_output_path = AudioConversionService.convert_audio_format(input_path, output_format, bitrate, quality)
+        temp_output_path = await JobService.run(request, "audio", AudioConversionService.convert_audio_format, input_path, output_format, bitrate, quality)
         
         final_output_path = os.path.join(settings.output_dir, output_filename)
         if os.path.abspath(temp_output_path) != os.path.abspath(final_output_path):
@@ -539,6 +559,9 @@ async def convert_audio_format(
             download_url=f"/api/v1/audioconversiontools/download/{output_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except Exception as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response("ProcessingError", str(e), 500)
@@ -585,7 +608,7 @@ async def normalize_audio(
         
         # Output format is WAV for normalize
         output_filename = _determine_output_filename(file.filename, filename, "wav")
-        temp_output_path = AudioConversionService.normalize_audio(input_path, target_dBFS)
+        temp_output_path = await JobService.run(request, "audio", AudioConversionService.normalize_audio, input_path, target_dBFS)
         
         final_output_path = os.path.join(settings.output_dir, output_filename)
         if os.path.abspath(temp_output_path) != os.path.abspath(final_output_path):
@@ -609,6 +632,9 @@ async def normalize_audio(
             download_url=f"/api/v1/audioconversiontools/download/{output_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except Exception as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response("ProcessingError", str(e), 500)
@@ -656,7 +682,7 @@ async def trim_audio(
         
         # Output format is WAV for trim
         output_filename = _determine_output_filename(file.filename, filename, "wav")
-        temp_output_path = AudioConversionService.trim_audio(input_path, start_time, end_time)
+        temp_output_path = await JobService.run(request, "audio", AudioConversionService.trim_audio, input_path, start_time, end_time)
         
         final_output_path = os.path.join(settings.output_dir, output_filename)
         if os.path.abspath(temp_output_path) != os.path.abspath(final_output_path):
@@ -680,6 +706,9 @@ async def trim_audio(
             download_url=f"/api/v1/audioconversiontools/download/{output_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except Exception as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response("ProcessingError", str(e), 500)
@@ -17,18 +17,20 @@ from sqlalchemy.orm import Session
 from app.services.csv_conversion_service import CSVConversionService
 from app.services.conversion_log_service import ConversionLogService
 from app.core.database import get_db
-from app.api.v1.dependencies import get_user_id
+from app.api.v1.dependencies import get_user_id, UploadRoute
 from app.services.file_service import FileService
+from app.services.job_service import JobService
 from app.core.config import settings
 from app.core.exceptions import (
     create_error_response,
     FileProcessingError,
+    JobCancelledError,
 )
 from app.models.schemas import ConversionResponse
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+router = APIRouter(route_class=UploadRoute)
 
 # ---------------------------------------------------------------------------
 # Helper utilities
@@ -187,7 +189,7 @@ async def convert_excel_to_csv(
         # Read file content
         file_content = await file.read()
         
-        result = CSVConversionService.excel_to_csv(file_content)
+        result = await JobService.run(request, "csv", CSVConversionService.excel_to_csv, file_content)
         
         # Determine filename
         output_filename = _determine_output_filename(filename, file, "excel_to_csv", ".csv")
@@ -213,6 +215,9 @@ async def convert_excel_to_csv(
             converted_data=result
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except Exception as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -258,7 +263,7 @@ async def convert_ods_to_csv(
         # Read file content
         file_content = await file.read()
         
-        result = CSVConversionService.ods_to_csv(file_content)
+        result = await JobService.run(request, "csv", CSVConversionService.ods_to_csv, file_content)
         
         # Determine filename
         output_filename = _determine_output_filename(filename, file, "ods_to_csv", ".csv")
@@ -284,6 +289,9 @@ async def convert_ods_to_csv(
             converted_data=result
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except Exception as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -329,7 +337,7 @@ async def convert_csv_to_excel(
         content = await _read_file_content(file)
         
         # Service method saves file directly and returns path
-        service_output_path = CSVConversionService.csv_to_excel(content)
+        service_output_path = await JobService.run(request, "csv", CSVConversionService.csv_to_excel, content)
         
         # Determine filename
         output_filename = _determine_output_filename(filename, file, "csv_to_excel", ".xlsx")
@@ -355,6 +363,9 @@ async def convert_csv_to_excel(
             download_url=_build_download_url(output_filename)
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except Exception as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -400,7 +411,7 @@ async def convert_csv_to_xml(
     try:
         content = await _read_file_content(file)
         
-        result = CSVConversionService.csv_to_xml(content, root_name)
+        result = await JobService.run(request, "csv", CSVConversionService.csv_to_xml, content, root_name)
         
         # Determine filename
         output_filename = _determine_output_filename(filename, file, "csv_to_xml", ".xml")
@@ -426,6 +437,9 @@ async def convert_csv_to_xml(
             converted_data=result
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except Exception as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -541,7 +555,7 @@ async def convert_pdf_to_csv(
         # Read file content
         file_content = await file.read()
         
-        result = CSVConversionService.pdf_to_csv(file_content)
+        result = await JobService.run(request, "csv", CSVConversionService.pdf_to_csv, file_content)
         
         # Determine filename
         output_filename = _determine_output_filename(filename, file, "pdf_to_csv", ".csv")
@@ -567,6 +581,9 @@ async def convert_pdf_to_csv(
             converted_data=result
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except Exception as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -905,7 +922,7 @@ async def convert_srt_to_csv(
     try:
         content = await _read_file_content(file)
         
-        result = CSVConversionService.srt_to_csv(content)
+        result = await JobService.run(request, "csv", CSVConversionService.srt_to_csv, content)
         
         # Determine filename
         output_filename = _determine_output_filename(filename, file, "srt_to_csv", ".csv")
@@ -931,6 +948,9 @@ async def convert_srt_to_csv(
             converted_data=result
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except Exception as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -975,7 +995,7 @@ async def convert_csv_to_srt(
     try:
         content = await _read_file_content(file)
         
-        result = CSVConversionService.csv_to_srt(content)
+        result = await JobService.run(request, "csv", CSVConversionService.csv_to_srt, content)
         
         # Determine filename
         output_filename = _determine_output_filename(filename, file, "csv_to_srt", ".srt")
@@ -1001,6 +1021,9 @@ async def convert_csv_to_srt(
             converted_data=result
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except Exception as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -8,7 +8,7 @@ from app.models.schemas import ConversionResponse
 from app.services.ebook_conversion_service import EBookConversionService
 from app.services.conversion_log_service import ConversionLogService
 from app.core.database import get_db
-from app.api.v1.dependencies import get_user_id
+from app.api.v1.dependencies import get_user_id, UploadRoute
 from app.core.config import settings
 from app.core.exceptions import (
     FileProcessingError, 
@@ -18,7 +18,7 @@ from app.core.exceptions import (
 )
 from app.services.file_service import FileService
 
-router = APIRouter()
+router = APIRouter(route_class=UploadRoute)
 
 def _determine_output_filename(original_filename: str, provided_filename: Optional[str], target_extension: str) -> str:
     """
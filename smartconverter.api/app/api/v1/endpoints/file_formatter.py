@@ -7,7 +7,7 @@ from app.models.schemas import ConversionResponse
 from app.services.file_formatter_service import FileFormatterService
 from app.services.conversion_log_service import ConversionLogService
 from app.core.database import get_db
-from app.api.v1.dependencies import get_user_id
+from app.api.v1.dependencies import get_user_id, UploadRoute
 from app.core.exceptions import (
     FileProcessingError, 
     UnsupportedFileTypeError, 
@@ -19,7 +19,7 @@ from app.services.file_service import FileService
 import shutil
 from app.core.config import settings
 
-router = APIRouter()
+router = APIRouter(route_class=UploadRoute)
 
 def _determine_output_filename(original_filename: str, provided_filename: Optional[str], target_extension: str) -> str:
     """
@@ -17,7 +17,7 @@ from app.services.conversion_log_service import ConversionLogService
 from app.services.file_service import FileService
 from app.core.config import settings
 from app.core.database import get_db
-from app.api.v1.dependencies import get_user_id
+from app.api.v1.dependencies import get_user_id, UploadRoute
 from app.core.exceptions import (
     FileProcessingError, 
     UnsupportedFileTypeError, 
@@ -25,7 +25,7 @@ from app.core.exceptions import (
     create_error_response
 )
 
-router = APIRouter()
+router = APIRouter(route_class=UploadRoute)
 logger = logging.getLogger(__name__)
 
 # ---------------------------------------------------------------------------
@@ -0,0 +1,97 @@
+import json
+from fastapi import APIRouter, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from app.api.v1.dependencies import get_caller_identity
+from app.services.job_service import JobService
+from app.core.exceptions import create_error_response
+
+router = APIRouter()
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str, request: Request):
+    """Get the status of a conversion job started by the caller."""
+    job = JobService.get_job(job_id, get_caller_identity(request))
+    if not job:
+        raise create_error_response(
+            error_type="JobNotFound",
+            message=f"Job {job_id} not found",
+            status_code=404
+        )
+    return {
+        "success": True,
+        "job": job.to_dict()
+    }
+
+
+@router.post("/{job_id}/cancel")
+async def cancel_job(job_id: str, request: Request):
+    """Cancel a running conversion job of the caller and terminate its external processes."""
+    job = JobService.get_job(job_id, get_caller_identity(request))
+    if not job:
+        raise create_error_response(
+            error_type="JobNotFound",
+            message=f"Job {job_id} not found",
+            status_code=404
+        )
+    cancelled = JobService.cancel_job(job_id)
+    return {
+        "success": cancelled,
+        "message": "Job cancelled" if cancelled else f"Job already {job.status}",
+        "job": job.to_dict()
+    }
+
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """
+    Stream progress of a conversion job as Server-Sent Events.
+
+    Sends a ``progress`` event whenever the job's stage or percentage changes
+    and a final ``done`` event when it finishes. The stream may be opened
+    before the conversion request that uses the same ``X-Job-Id``; only jobs
+    started by the same caller are reported.
+    """
+    owner = get_caller_identity(request)
+
+    async def event_stream():
+        sent = False
+        async for event in JobService.watch(job_id, owner):
+            if await request.is_disconnected():
+                return
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            sent = True
+            name = "progress" if event["status"] == "running" else "done"
+            yield f"event: {name}\ndata: {json.dumps(event)}\n\n"
+        if not sent:
+            error = {"error": "JobNotFound", "message": f"Job {job_id} not found"}
+            yield f"event: error\ndata: {json.dumps(error)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.websocket("/{job_id}/ws")
+async def job_events_websocket(websocket: WebSocket, job_id: str):
+    """Stream progress of a conversion job over a WebSocket (same messages as /events)."""
+    owner = get_caller_identity(websocket)
+    await websocket.accept()
+    sent = False
+    try:
+        async for event in JobService.watch(job_id, owner):
+            if event is None:
+                await websocket.send_json({"type": "heartbeat"})
+                continue
+            sent = True
+            event_type = "progress" if event["status"] == "running" else "done"
+            await websocket.send_json({"type": event_type, "job": event})
+        if not sent:
+            await websocket.send_json({"type": "error", "error": "JobNotFound", "message": f"Job {job_id} not found"})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
@@ -10,16 +10,18 @@ from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.services.conversion_log_service import ConversionLogService
-from app.api.v1.dependencies import get_user_id
+from app.api.v1.dependencies import get_user_id, UploadRoute
 
 from app.models.schemas import ConversionResponse
 from app.services.json_conversion_service import JSONConversionService
 from app.services.pdf_conversion_service import PDFConversionService
 from app.services.image_conversion_service import ImageConversionService
 from app.services.file_service import FileService
+from app.services.job_service import JobService
 from app.core.config import settings
 from app.core.exceptions import (
     FileProcessingError,
+    JobCancelledError,
     UnsupportedFileTypeError,
     FileSizeExceededError,
     create_error_response,
@@ -46,7 +48,7 @@ async def optional_file_upload(file: Union[UploadFile, str, None] = File(default
 
 
 logger = logging.getLogger(__name__)
-router = APIRouter()
+router = APIRouter(route_class=UploadRoute)
 
 
 # ---------------------------------------------------------------------------
@@ -117,9 +119,11 @@ async def ai_convert_pdf_to_json(
     request: Request,
     file: UploadFile = File(...),
     filename: Optional[str] = Form(None),
+    images: str = Form("inline"),
+    pages: Optional[str] = Form(None),
     db: Session = Depends(get_db)
 ):
-    """AI-assisted PDF to JSON conversion with structured extraction."""
+    """AI-assisted PDF to JSON conversion with structured extraction (`images`: inline, external or none)."""
     input_path: Optional[str] = None
     output_path: Optional[str] = None
 
@@ -160,7 +164,7 @@ async def ai_convert_pdf_to_json(
         
         output_path = os.path.join(settings.output_dir, output_filename)
 
-        result_path = PDFConversionService.pdf_to_json(input_path, output_path)
+        result_path = await JobService.run(request, "pdf", PDFConversionService.pdf_to_json, input_path, output_path, images, pages)
         
         # Create download URL
         result_filename = os.path.basename(result_path)
@@ -183,6 +187,9 @@ async def ai_convert_pdf_to_json(
             download_url=download_url,
         )
 
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except (FileProcessingError, UnsupportedFileTypeError, FileSizeExceededError) as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
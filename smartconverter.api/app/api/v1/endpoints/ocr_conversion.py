@@ -10,17 +10,19 @@ from app.models.schemas import ConversionResponse
 from app.services.ocr_conversion_service import OCRConversionService
 from app.services.conversion_log_service import ConversionLogService
 from app.services.file_service import FileService
+from app.services.job_service import JobService
 from app.core.config import settings
 from app.core.database import get_db
-from app.api.v1.dependencies import get_user_id
+from app.api.v1.dependencies import get_user_id, UploadRoute
 from app.core.exceptions import (
     FileProcessingError, 
     UnsupportedFileTypeError, 
     FileSizeExceededError,
+    JobCancelledError,
     create_error_response
 )
 
-router = APIRouter()
+router = APIRouter(route_class=UploadRoute)
 logger = logging.getLogger(__name__)
 
 # ---------------------------------------------------------------------------
@@ -96,7 +98,7 @@ async def convert_png_to_text(
         FileService.validate_file(file, "png")
         input_path = FileService.save_uploaded_file(file)
         
-        extracted_text = OCRConversionService.extract_text_from_image(input_path, language, ocr_engine)
+        extracted_text = await JobService.run(request, "ocr", OCRConversionService.extract_text_from_image, input_path, language, ocr_engine)
         
         # Save to file
         output_filename = _determine_output_filename(filename, file, "png_to_text", ".txt")
@@ -122,6 +124,9 @@ async def convert_png_to_text(
             download_url=f"/api/v1/ocrconversiontools/download/{output_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except (FileProcessingError, UnsupportedFileTypeError, FileSizeExceededError) as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(type(e).__name__, str(e), 400)
@@ -170,7 +175,7 @@ async def convert_jpg_to_text(
         FileService.validate_file(file, "jpg")
         input_path = FileService.save_uploaded_file(file)
         
-        extracted_text = OCRConversionService.extract_text_from_image(input_path, language, ocr_engine)
+        extracted_text = await JobService.run(request, "ocr", OCRConversionService.extract_text_from_image, input_path, language, ocr_engine)
         
         # Save to file
         output_filename = _determine_output_filename(filename, file, "jpg_to_text", ".txt")
@@ -196,6 +201,9 @@ async def convert_jpg_to_text(
             download_url=f"/api/v1/ocrconversiontools/download/{output_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except (FileProcessingError, UnsupportedFileTypeError, FileSizeExceededError) as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(type(e).__name__, str(e), 400)
@@ -246,7 +254,7 @@ async def convert_png_to_pdf(
         FileService.validate_file(file, "png")
         input_path = FileService.save_uploaded_file(file)
         
-        service_output_path = OCRConversionService.image_to_pdf_with_ocr(input_path, language, ocr_engine)
+        service_output_path = await JobService.run(request, "ocr", OCRConversionService.image_to_pdf_with_ocr, input_path, language, ocr_engine)
         
         output_filename = _determine_output_filename(filename, file, "png_to_pdf", ".pdf")
         output_path = os.path.join(settings.output_dir, output_filename)
@@ -270,6 +278,9 @@ async def convert_png_to_pdf(
             download_url=f"/api/v1/ocrconversiontools/download/{output_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except (FileProcessingError, UnsupportedFileTypeError, FileSizeExceededError) as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(type(e).__name__, str(e), 400)
@@ -320,7 +331,7 @@ async def convert_jpg_to_pdf(
         FileService.validate_file(file, "jpg")
         input_path = FileService.save_uploaded_file(file)
         
-        service_output_path = OCRConversionService.image_to_pdf_with_ocr(input_path, language, ocr_engine)
+        service_output_path = await JobService.run(request, "ocr", OCRConversionService.image_to_pdf_with_ocr, input_path, language, ocr_engine)
         
         output_filename = _determine_output_filename(filename, file, "jpg_to_pdf", ".pdf")
         output_path = os.path.join(settings.output_dir, output_filename)
@@ -344,6 +355,9 @@ async def convert_jpg_to_pdf(
             download_url=f"/api/v1/ocrconversiontools/download/{output_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except (FileProcessingError, UnsupportedFileTypeError, FileSizeExceededError) as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(type(e).__name__, str(e), 400)
@@ -392,7 +406,7 @@ async def convert_pdf_to_text(
         FileService.validate_file(file, "pdf")
         input_path = FileService.save_uploaded_file(file)
         
-        extracted_text = OCRConversionService.pdf_to_text_with_ocr(input_path, language, ocr_engine)
+        extracted_text = await JobService.run(request, "ocr", OCRConversionService.pdf_to_text_with_ocr, input_path, language, ocr_engine)
         
         output_filename = _determine_output_filename(filename, file, "pdf_to_text", ".txt")
         output_path = os.path.join(settings.output_dir, output_filename)
@@ -417,6 +431,9 @@ async def convert_pdf_to_text(
             download_url=f"/api/v1/ocrconversiontools/download/{output_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except (FileProcessingError, UnsupportedFileTypeError, FileSizeExceededError) as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(type(e).__name__, str(e), 400)
@@ -467,7 +484,7 @@ async def convert_pdf_image_to_pdf_text(
         FileService.validate_file(file, "pdf")
         input_path = FileService.save_uploaded_file(file)
         
-        service_output_path = OCRConversionService.pdf_image_to_pdf_text(input_path, language, ocr_engine)
+        service_output_path = await JobService.run(request, "ocr", OCRConversionService.pdf_image_to_pdf_text, input_path, language, ocr_engine)
         
         output_filename = _determine_output_filename(filename, file, "searchable", ".pdf")
         output_path = os.path.join(settings.output_dir, output_filename)
@@ -491,6 +508,9 @@ async def convert_pdf_image_to_pdf_text(
             download_url=f"/api/v1/ocrconversiontools/download/{output_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except (FileProcessingError, UnsupportedFileTypeError, FileSizeExceededError) as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(type(e).__name__, str(e), 400)
@@ -531,6 +551,20 @@ async def get_supported_ocr_engines():
         raise create_error_response("InternalServerError", "Failed to retrieve supported OCR engines", 500, {"error": str(e)})
 
 
+@router.get("/engine-stats")
+async def get_ocr_engine_stats():
+    """Get OCR throughput per engine."""
+    try:
+        stats = OCRConversionService.get_ocr_engine_stats()
+        return {
+            "success": True,
+            "engines": stats,
+            "message": "OCR engine stats retrieved successfully"
+        }
+    except Exception as e:
+        raise create_error_response("InternalServerError", "Failed to retrieve OCR engine stats", 500, {"error": str(e)})
+
+
 @router.get("/download/{filename}")
 async def download_file(filename: str, background_tasks: BackgroundTasks):
     """Download converted file and clean up."""
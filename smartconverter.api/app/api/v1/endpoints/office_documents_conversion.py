@@ -17,7 +17,7 @@ import uuid
 from app.services.office_documents_conversion_service import OfficeDocumentsConversionService
 from app.services.conversion_log_service import ConversionLogService
 from app.core.database import get_db
-from app.api.v1.dependencies import get_user_id
+from app.api.v1.dependencies import get_user_id, UploadRoute
 from app.core.config import settings
 from app.core.exceptions import (
     create_error_response,
@@ -27,7 +27,7 @@ from app.models.schemas import ConversionResponse
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+router = APIRouter(route_class=UploadRoute)
 
 # ---------------------------------------------------------------------------
 # Helper utilities
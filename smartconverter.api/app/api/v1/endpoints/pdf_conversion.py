@@ -2,26 +2,29 @@ import os
 import re
 from typing import List, Optional
 from fastapi import APIRouter, File, UploadFile, HTTPException, Form, Depends, Request, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.services.file_service import FileService
+from app.services.job_service import JobService
 from app.services.pdf_conversion_service import PDFConversionService
+from app.services.stream_service import StreamService
 from app.services.conversion_log_service import ConversionLogService
-from app.api.v1.dependencies import get_current_user, get_user_id
+from app.api.v1.dependencies import get_current_user, get_user_id, UploadRoute
 from app.services.user_list_service import UserListService
 from app.core.config import settings
 from app.core.exceptions import (
     FileProcessingError, 
     UnsupportedFileTypeError, 
     FileSizeExceededError,
+    JobCancelledError,
     create_error_response
 )
 
 from PyPDF2 import PdfReader
 
-router = APIRouter()
+router = APIRouter(route_class=UploadRoute)
 
 
 class PDFConversionResponse(BaseModel):
@@ -36,15 +39,73 @@ class PDFConversionResponse(BaseModel):
     extracted_data: Optional[dict] = None
 
 
+async def _streaming_response(request: Request, db: Session, log, input_path: str, download_name: str,
+                              output_file_type: str, media_type: str, func, *args) -> StreamingResponse:
+    """
+    Stream a conversion to the client as it is produced (``func(*args)``
+    yields bytes). The first chunk is awaited here so that invalid input
+    still gets an error response; the upload is removed and the log updated
+    when the stream ends.
+    """
+    chunks = JobService.stream(request, "pdf", func, *args)
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = b""
+
+    async def body():
+        status, error = "cancelled", "Client disconnected"
+        try:
+            if first:
+                yield first
+            async for chunk in chunks:
+                if chunk:
+                    yield chunk
+            status, error = "success", None
+        except JobCancelledError as e:
+            error = str(e)
+        except Exception as e:
+            status, error = "failed", str(e)
+        finally:
+            await chunks.aclose()
+            if status == "success":
+                ConversionLogService.update_log_status(
+                    db=db,
+                    log_id=log.id,
+                    status="success",
+                    output_filename=download_name,
+                    output_file_type=output_file_type
+                )
+            else:
+                ConversionLogService.update_log_status(db=db, log_id=log.id, status=status, error_message=error)
+            PDFConversionService.cleanup_temp_files(input_path)
+
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{download_name}"', "X-Accel-Buffering": "no"}
+    )
+
+
 # AI: Convert PDF to JSON
 @router.post("/pdf-to-json", response_model=PDFConversionResponse)
 async def convert_pdf_to_json(
     request: Request,
     file: UploadFile = File(...),
     output_filename: Optional[str] = Form(None),
+    images: str = Form("inline"),
+    pages: Optional[str] = Form(None),
+    stream: bool = Form(False),
     db: Session = Depends(get_db)
 ):
-    """AI: Convert PDF to JSON with structured data extraction."""
+    """
+    AI: Convert PDF to JSON with structured data extraction.
+
+    - `images`: `inline` (base64 in the JSON), `external` (files in a `<name>_images/` folder) or `none`.
+    - `pages` picks pages, e.g. `1-3,7` (default: every page); only those are read.
+    - `stream`: send NDJSON instead - a `document_info` line, then one line per page as soon as it is
+      extracted (images listed by xref only).
+    """
     input_path = None
     output_path = None
     
@@ -81,13 +142,24 @@ async def convert_pdf_to_json(
         # Determine desired output filename
         original_name = file.filename or "pdf_json"
         desired_name = (output_filename or original_name).strip() or "pdf_json"
+        if stream:
+            _, stream_filename = FileService.generate_output_path_with_filename(desired_name, default_extension=".ndjson")
+            response = await _streaming_response(
+                request, db, log, input_path, stream_filename, "ndjson", StreamService.NDJSON_MEDIA_TYPE,
+                StreamService.ndjson, PDFConversionService.iter_json_records(input_path, pages),
+            )
+            # The stream removes the upload when it ends
+            input_path = None
+            success = True
+            return response
+
         output_path, final_filename = FileService.generate_output_path_with_filename(
             desired_name,
             default_extension=".json",
         )
         
         # Convert PDF to JSON
-        result_path = PDFConversionService.pdf_to_json(input_path, output_path)
+        result_path = await JobService.run(request, "pdf", PDFConversionService.pdf_to_json, input_path, output_path, images, pages)
         
         # Update log on success
         ConversionLogService.update_log_status(
@@ -106,6 +178,9 @@ async def convert_pdf_to_json(
             download_url=f"/download/{final_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except (FileProcessingError, UnsupportedFileTypeError, FileSizeExceededError) as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -132,6 +207,7 @@ async def convert_pdf_to_markdown(
     request: Request,
     file: UploadFile = File(...),
     output_filename: Optional[str] = Form(None),
+    pages: Optional[str] = Form(None),
     db: Session = Depends(get_db)
 ):
     """AI: Convert PDF to Markdown format."""
@@ -177,7 +253,7 @@ async def convert_pdf_to_markdown(
         )
         
         # Convert PDF to Markdown
-        result_path = PDFConversionService.pdf_to_markdown(input_path, output_path)
+        result_path = await JobService.run(request, "pdf", PDFConversionService.pdf_to_markdown, input_path, output_path, pages)
         
         # Update log on success
         ConversionLogService.update_log_status(
@@ -195,6 +271,9 @@ async def convert_pdf_to_markdown(
             download_url=f"/download/{final_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except (FileProcessingError, UnsupportedFileTypeError, FileSizeExceededError) as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -222,6 +301,7 @@ async def convert_pdf_to_csv(
     request: Request,
     file: UploadFile = File(...),
     output_filename: Optional[str] = Form(None),
+    pages: Optional[str] = Form(None),
     db: Session = Depends(get_db)
 ):
     """AI: Convert PDF to CSV format (extract tabular data)."""
@@ -266,7 +346,7 @@ async def convert_pdf_to_csv(
         )
 
         # Convert PDF to CSV
-        result_path = PDFConversionService.pdf_to_csv(input_path, output_path)
+        result_path = await JobService.run(request, "pdf", PDFConversionService.pdf_to_csv, input_path, output_path, pages)
         
         # Update log on success
         ConversionLogService.update_log_status(
@@ -284,6 +364,9 @@ async def convert_pdf_to_csv(
             download_url=f"/download/{final_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except (FileProcessingError, UnsupportedFileTypeError, FileSizeExceededError) as e:
         raise create_error_response(
             error_type=type(e).__name__,
@@ -309,6 +392,7 @@ async def convert_pdf_to_excel(
     request: Request,
     file: UploadFile = File(...),
     output_filename: Optional[str] = Form(None),
+    pages: Optional[str] = Form(None),
     db: Session = Depends(get_db)
 ):
     """AI: Convert PDF to Excel format."""
@@ -352,7 +436,7 @@ async def convert_pdf_to_excel(
         )
         
         # Convert PDF to Excel
-        result_path = PDFConversionService.pdf_to_excel(input_path, output_path)
+        result_path = await JobService.run(request, "pdf", PDFConversionService.pdf_to_excel, input_path, output_path, pages)
         
         # Update log on success
         ConversionLogService.update_log_status(
@@ -370,6 +454,9 @@ async def convert_pdf_to_excel(
             download_url=f"/download/{final_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except (FileProcessingError, UnsupportedFileTypeError, FileSizeExceededError) as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -1282,6 +1369,7 @@ async def convert_pdf_to_csv_extract(
     request: Request,
     file: UploadFile = File(...),
     output_filename: Optional[str] = Form(None),
+    pages: Optional[str] = Form(None),
     db: Session = Depends(get_db)
 ):
     """Convert PDF to CSV (extract tabular data)."""
@@ -1325,7 +1413,7 @@ async def convert_pdf_to_csv_extract(
         )
 
         # Convert PDF to CSV
-        result_path = PDFConversionService.pdf_to_csv_extract(input_path, output_path)
+        result_path = await JobService.run(request, "pdf", PDFConversionService.pdf_to_csv_extract, input_path, output_path, pages)
         
         # Update log on success
         ConversionLogService.update_log_status(
@@ -1343,6 +1431,9 @@ async def convert_pdf_to_csv_extract(
             download_url=f"/download/{final_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except (FileProcessingError, UnsupportedFileTypeError, FileSizeExceededError) as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -1370,6 +1461,7 @@ async def convert_pdf_to_excel_extract(
     request: Request,
     file: UploadFile = File(...),
     output_filename: Optional[str] = Form(None),
+    pages: Optional[str] = Form(None),
     db: Session = Depends(get_db)
 ):
     """Convert PDF to Excel (extract tabular data)."""
@@ -1413,7 +1505,7 @@ async def convert_pdf_to_excel_extract(
         )
         
         # Convert PDF to Excel
-        result_path = PDFConversionService.pdf_to_excel_extract(input_path, output_path)
+        result_path = await JobService.run(request, "pdf", PDFConversionService.pdf_to_excel_extract, input_path, output_path, pages)
         
         # Update log on success
         ConversionLogService.update_log_status(
@@ -1431,6 +1523,9 @@ async def convert_pdf_to_excel_extract(
             download_url=f"/download/{final_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except (FileProcessingError, UnsupportedFileTypeError, FileSizeExceededError) as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -1458,6 +1553,7 @@ async def convert_pdf_to_word_extract(
     request: Request,
     file: UploadFile = File(...),
     output_filename: Optional[str] = Form(None),
+    pages: Optional[str] = Form(None),
     db: Session = Depends(get_db)
 ):
     """Convert PDF to Word document."""
@@ -1501,7 +1597,7 @@ async def convert_pdf_to_word_extract(
         )
         
         # Convert PDF to Word
-        result_path = PDFConversionService.pdf_to_word_extract(input_path, output_path)
+        result_path = await JobService.run(request, "pdf", PDFConversionService.pdf_to_word_extract, input_path, output_path, pages)
         
         # Update log on success
         ConversionLogService.update_log_status(
@@ -1519,6 +1615,9 @@ async def convert_pdf_to_word_extract(
             download_url=f"/download/{os.path.basename(result_path)}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except (FileProcessingError, UnsupportedFileTypeError, FileSizeExceededError) as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -1546,6 +1645,10 @@ async def convert_pdf_to_jpg(
     request: Request,
     file: UploadFile = File(...),
     output_filename: Optional[str] = Form(None),
+    dpi: Optional[int] = Form(None),
+    colorspace: str = Form("rgb"),
+    pages: Optional[str] = Form(None),
+    stream: bool = Form(False),
     db: Session = Depends(get_db)
 ):
     """
@@ -1554,6 +1657,9 @@ async def convert_pdf_to_jpg(
     - Only PDF files are accepted.
     - Images are saved in a dedicated folder named from the input file (or custom base name).
     - Each image is named: `<base_name>_page_1.jpg`, `<base_name>_page_2.jpg`, ...
+    - `dpi` sets the resolution (default 72) and `colorspace` is `rgb`, `gray` or `cmyk`.
+    - `pages` picks pages, e.g. `1-3,7` (default: every page); only those are read.
+    - `stream`: send the images as a ZIP archive instead, each page added as soon as it is rendered.
     """
     input_path = None
     
@@ -1610,14 +1716,25 @@ async def convert_pdf_to_jpg(
             counter += 1
 
         os.makedirs(folder_path, exist_ok=True)
+
+        if stream:
+            response = await _streaming_response(
+                request, db, log, input_path, f"{folder_name}.zip", "zip", StreamService.ZIP_MEDIA_TYPE,
+                PDFConversionService.iter_image_zip, input_path, folder_path, folder_name, "jpg", dpi, colorspace, pages,
+            )
+            # The stream removes the upload and the folder when it ends
+            input_path = None
+            return response
         
         # Convert PDF to JPG into that folder
-        result_files = PDFConversionService.pdf_to_image(input_path, folder_path, "jpg")
+        result_files = await JobService.run(request, "pdf", PDFConversionService.pdf_to_image, input_path, folder_path, "jpg", dpi, colorspace, pages)
 
         # Rename files to <folder_name>_page_1.jpg, <folder_name>_page_2.jpg, ...
         renamed_files = []
-        for idx, src_path in enumerate(result_files, start=1):
-            new_name = f"{folder_name}_page_{idx}.jpg"
+        for src_path in result_files:
+            # Files are named page_<n>.<ext> after their page in the document
+            page_label = os.path.splitext(os.path.basename(src_path))[0].rsplit("_", 1)[-1]
+            new_name = f"{folder_name}_page_{page_label}.jpg"
             new_path = os.path.join(folder_path, new_name)
             try:
                 os.replace(src_path, new_path)
@@ -1645,6 +1762,9 @@ async def convert_pdf_to_jpg(
             pages_processed=len(renamed_files),
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except (FileProcessingError, UnsupportedFileTypeError, FileSizeExceededError) as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -1672,6 +1792,10 @@ async def convert_pdf_to_png(
     request: Request,
     file: UploadFile = File(...),
     output_filename: Optional[str] = Form(None),
+    dpi: Optional[int] = Form(None),
+    colorspace: str = Form("rgb"),
+    pages: Optional[str] = Form(None),
+    stream: bool = Form(False),
     db: Session = Depends(get_db)
 ):
     """Convert PDF pages to PNG images.
@@ -1679,6 +1803,9 @@ async def convert_pdf_to_png(
     - Only PDF files are accepted.
     - Images are saved in a dedicated folder named from the input file (or custom base name).
     - Each image is named: `<base_name>_page_1.png`, `<base_name>_page_2.png`, ...
+    - `dpi` sets the resolution (default 72) and `colorspace` is `rgb`, `gray`.
+    - `pages` picks pages, e.g. `1-3,7` (default: every page); only those are read.
+    - `stream`: send the images as a ZIP archive instead, each page added as soon as it is rendered.
     """
     input_path = None
 
@@ -1736,13 +1863,24 @@ async def convert_pdf_to_png(
 
         os.makedirs(folder_path, exist_ok=True)
 
+        if stream:
+            response = await _streaming_response(
+                request, db, log, input_path, f"{folder_name}.zip", "zip", StreamService.ZIP_MEDIA_TYPE,
+                PDFConversionService.iter_image_zip, input_path, folder_path, folder_name, "png", dpi, colorspace, pages,
+            )
+            # The stream removes the upload and the folder when it ends
+            input_path = None
+            return response
+
         # Convert PDF to PNG into that folder
-        result_files = PDFConversionService.pdf_to_image(input_path, folder_path, "png")
+        result_files = await JobService.run(request, "pdf", PDFConversionService.pdf_to_image, input_path, folder_path, "png", dpi, colorspace, pages)
 
         # Rename files to <folder_name>_page_1.png, <folder_name>_page_2.png, ...
         renamed_files = []
-        for idx, src_path in enumerate(result_files, start=1):
-            new_name = f"{folder_name}_page_{idx}.png"
+        for src_path in result_files:
+            # Files are named page_<n>.<ext> after their page in the document
+            page_label = os.path.splitext(os.path.basename(src_path))[0].rsplit("_", 1)[-1]
+            new_name = f"{folder_name}_page_{page_label}.png"
             new_path = os.path.join(folder_path, new_name)
             try:
                 os.replace(src_path, new_path)
@@ -1770,6 +1908,9 @@ async def convert_pdf_to_png(
             pages_processed=len(renamed_files),
         )
 
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except (FileProcessingError, UnsupportedFileTypeError, FileSizeExceededError) as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -1797,9 +1938,12 @@ async def convert_pdf_to_tiff(
     request: Request,
     file: UploadFile = File(...),
     output_filename: Optional[str] = Form(None),
+    dpi: Optional[int] = Form(None),
+    colorspace: str = Form("rgb"),
+    pages: Optional[str] = Form(None),
     db: Session = Depends(get_db)
 ):
-    """Convert PDF pages to TIFF images."""
+    """Convert PDF pages to TIFF images (`dpi` default 72; `colorspace` rgb, gray or cmyk)."""
     input_path = None
 
     # Get file size
@@ -1854,14 +1998,16 @@ async def convert_pdf_to_tiff(
         os.makedirs(folder_path, exist_ok=True)
 
         # Convert PDF to TIFF into that folder
-        result_files = PDFConversionService.pdf_to_image(
-            input_path, folder_path, "tiff"
+        result_files = await JobService.run(request, "pdf", PDFConversionService.pdf_to_image,
+            input_path, folder_path, "tiff", dpi, colorspace, pages
         )
 
         # Rename files to <folder_name>_page_1.tiff, etc.
         renamed_files = []
-        for idx, src_path in enumerate(result_files, start=1):
-            new_name = f"{folder_name}_page_{idx}.tiff"
+        for src_path in result_files:
+            # Files are named page_<n>.<ext> after their page in the document
+            page_label = os.path.splitext(os.path.basename(src_path))[0].rsplit("_", 1)[-1]
+            new_name = f"{folder_name}_page_{page_label}.tiff"
             new_path = os.path.join(folder_path, new_name)
             try:
                 os.replace(src_path, new_path)
@@ -1886,6 +2032,9 @@ async def convert_pdf_to_tiff(
             pages_processed=len(renamed_files),
         )
 
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except (FileProcessingError, UnsupportedFileTypeError, FileSizeExceededError) as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -1912,6 +2061,7 @@ async def convert_pdf_to_svg(
     request: Request,
     file: UploadFile = File(...),
     output_filename: Optional[str] = Form(None),
+    pages: Optional[str] = Form(None),
     db: Session = Depends(get_db)
 ):
     """Convert PDF pages to SVG files."""
@@ -1968,11 +2118,13 @@ async def convert_pdf_to_svg(
         os.makedirs(folder_path, exist_ok=True)
 
         # Convert PDF to SVG into that folder
-        result_files = PDFConversionService.pdf_to_svg(input_path, folder_path)
+        result_files = await JobService.run(request, "pdf", PDFConversionService.pdf_to_svg, input_path, folder_path, pages)
 
         renamed_files = []
-        for idx, src_path in enumerate(result_files, start=1):
-            new_name = f"{folder_name}_page_{idx}.svg"
+        for src_path in result_files:
+            # Files are named page_<n>.<ext> after their page in the document
+            page_label = os.path.splitext(os.path.basename(src_path))[0].rsplit("_", 1)[-1]
+            new_name = f"{folder_name}_page_{page_label}.svg"
             new_path = os.path.join(folder_path, new_name)
             try:
                 os.replace(src_path, new_path)
@@ -1997,6 +2149,9 @@ async def convert_pdf_to_svg(
             pages_processed=len(renamed_files),
         )
 
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except (FileProcessingError, UnsupportedFileTypeError, FileSizeExceededError) as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -2023,6 +2178,7 @@ async def convert_pdf_to_html(
     request: Request,
     file: UploadFile = File(...),
     output_filename: Optional[str] = Form(None),
+    pages: Optional[str] = Form(None),
     db: Session = Depends(get_db)
 ):
     """Convert PDF to HTML."""
@@ -2072,7 +2228,7 @@ async def convert_pdf_to_html(
         )
         
         # Convert PDF to HTML
-        result_path = PDFConversionService.pdf_to_html(input_path, output_path)
+        result_path = await JobService.run(request, "pdf", PDFConversionService.pdf_to_html, input_path, output_path, pages)
         
         # Update log on success
         ConversionLogService.update_log_status(
@@ -2090,6 +2246,9 @@ async def convert_pdf_to_html(
             download_url=f"/download/{final_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except (FileProcessingError, UnsupportedFileTypeError, FileSizeExceededError) as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -2117,9 +2276,15 @@ async def convert_pdf_to_text(
     request: Request,
     file: UploadFile = File(...),
     output_filename: Optional[str] = Form(None),
+    pages: Optional[str] = Form(None),
+    stream: bool = Form(False),
     db: Session = Depends(get_db)
 ):
-    """Convert PDF to plain text."""
+    """
+    Convert PDF to plain text.
+
+    - `stream`: send NDJSON instead, one `{"page_number", "text"}` line per page as soon as it is extracted.
+    """
     input_path = None
 
     # Get file size
@@ -2155,13 +2320,23 @@ async def convert_pdf_to_text(
         base_name, _ = os.path.splitext(original_name)
         desired_name = (output_filename or base_name).strip() or "pdf_text"
 
+        if stream:
+            _, stream_filename = FileService.generate_output_path_with_filename(desired_name, default_extension=".ndjson")
+            response = await _streaming_response(
+                request, db, log, input_path, stream_filename, "ndjson", StreamService.NDJSON_MEDIA_TYPE,
+                StreamService.ndjson, PDFConversionService.iter_text_records(input_path, pages),
+            )
+            # The stream removes the upload when it ends
+            input_path = None
+            return response
+
         output_path, final_filename = FileService.generate_output_path_with_filename(
             desired_name,
             default_extension=".txt",
         )
 
         # Convert PDF to Text
-        result_path = PDFConversionService.pdf_to_text(input_path, output_path)
+        result_path = await JobService.run(request, "pdf", PDFConversionService.pdf_to_text, input_path, output_path, pages)
 
         # Update log on success
         ConversionLogService.update_log_status(
@@ -2179,6 +2354,9 @@ async def convert_pdf_to_text(
             download_url=f"/download/{final_filename or os.path.basename(result_path)}",
         )
 
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except (FileProcessingError, UnsupportedFileTypeError, FileSizeExceededError) as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -2225,9 +2403,10 @@ async def merge_pdfs(
     request: Request,
     files: List[UploadFile] = File(...),
     output_filename: Optional[str] = Form(None),
+    preserve_outlines: bool = Form(True),
     db: Session = Depends(get_db)
 ):
-    """Merge multiple PDF files into one."""
+    """Merge multiple PDF files into one, optionally keeping their bookmarks."""
     input_paths = []
     output_path = None
     final_filename = None
@@ -2290,7 +2469,9 @@ async def merge_pdfs(
         )
         
         # Merge PDFs
-        result_path = PDFConversionService.merge_pdfs(input_paths, output_path)
+        result_path = await JobService.run(
+            request, "pdf", PDFConversionService.merge_pdfs, input_paths, output_path, preserve_outlines
+        )
         
         # Update log on success
         ConversionLogService.update_log_status(
@@ -2310,6 +2491,9 @@ async def merge_pdfs(
         
     except HTTPException as e:
         raise e
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except Exception as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -2375,12 +2559,8 @@ async def split_pdf(
         elif st == "":
             st = "every_page"
 
-        result = PDFConversionService.split_pdf(
-            input_path=input_path,
-            split_type=st,
-            ranges=ranges,
-            output_prefix=output_prefix,
-            zip_output=zip,
+        result = await JobService.run(
+            request, "pdf", PDFConversionService.split_pdf, input_path, st, ranges, output_prefix, zip
         )
 
         folder_name = result.get("folder_name")
@@ -2428,6 +2608,9 @@ async def split_pdf(
         )
         return resp
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except Exception as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -2490,7 +2673,7 @@ async def compress_pdf(
             desired_name,
             default_extension=".pdf",
         )
-        result_path = PDFConversionService.compress_pdf(
+        result_path = await JobService.run(request, "pdf", PDFConversionService.compress_pdf,
             input_path,
             output_path,
             compression_level,
@@ -2546,6 +2729,9 @@ async def compress_pdf(
             }
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except Exception as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -2894,7 +3080,7 @@ async def add_watermark(
             default_extension=".pdf",
         )
 
-        result_path = PDFConversionService.add_watermark(input_path, output_path, watermark_text, position)
+        result_path = await JobService.run(request, "pdf", PDFConversionService.add_watermark, input_path, output_path, watermark_text, position)
         
         # Update log on success
         ConversionLogService.update_log_status(
@@ -2912,6 +3098,9 @@ async def add_watermark(
             download_url=f"/download/{final_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except Exception as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))        
         raise create_error_response(
@@ -2973,7 +3162,8 @@ async def add_page_numbers(
             default_extension=".pdf",
         )
 
-        result_path = PDFConversionService.add_page_numbers(
+        result_path = await JobService.run(
+            request, "pdf", PDFConversionService.add_page_numbers,
             input_path,
             output_path,
             position,
@@ -2998,6 +3188,9 @@ async def add_page_numbers(
             download_url=f"/download/{final_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except Exception as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -3321,9 +3514,16 @@ async def compare_pdfs(
     file1: UploadFile = File(...),
     file2: UploadFile = File(...),
     output_filename: Optional[str] = Form(None),
+    visual_diff: bool = Form(False),
     db: Session = Depends(get_db)
 ):
-    """Compare two PDFs."""
+    """
+    Compare two PDFs.
+
+    - Pages are aligned by content, so inserted and deleted pages are reported as such.
+    - The report (JSON) lists line and word changes of every modified page.
+    - With `visual_diff`, a PDF of the second document with the changes highlighted is also produced.
+    """
     input_path1 = None
     input_path2 = None
     output_path = None
@@ -3369,7 +3569,20 @@ async def compare_pdfs(
             desired_name,
             default_extension=".txt",
         )
-        comparison_result = PDFConversionService.compare_pdfs(input_path1, input_path2, output_path)
+        visual_diff_path = None
+        visual_diff_filename = None
+        if visual_diff:
+            visual_diff_path, visual_diff_filename = FileService.generate_output_path_with_filename(
+                f"{os.path.splitext(desired_name)[0]}_visual",
+                default_extension=".pdf",
+            )
+        comparison_result = await JobService.run(
+            request, "pdf", PDFConversionService.compare_pdfs,
+            input_path1, input_path2, output_path, visual_diff_path
+        )
+        if visual_diff_filename:
+            comparison_result["visual_diff_filename"] = visual_diff_filename
+            comparison_result["visual_diff_url"] = f"/download/{visual_diff_filename}"
         
         # Update log on success
         ConversionLogService.update_log_status(
@@ -3388,6 +3601,9 @@ async def compare_pdfs(
             extracted_data=comparison_result
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except Exception as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -3483,6 +3699,97 @@ async def get_pdf_metadata(
             PDFConversionService.cleanup_temp_files(input_path)
 
 
+# Update PDF Metadata
+@router.post("/update-metadata")
+async def update_pdf_metadata(
+    request: Request,
+    file: UploadFile = File(...),
+    title: Optional[str] = Form(None),
+    author: Optional[str] = Form(None),
+    subject: Optional[str] = Form(None),
+    keywords: Optional[str] = Form(None),
+    creator: Optional[str] = Form(None),
+    producer: Optional[str] = Form(None),
+    output_filename: Optional[str] = Form(None),
+    db: Session = Depends(get_db)
+):
+    """Set PDF document information fields; fields left out are kept."""
+    input_path = None
+    
+    # Get file size
+    file.file.seek(0, 2)
+    input_size = file.file.tell()
+    file.file.seek(0)
+    
+    # Get user_id
+    user_id = await get_user_id(request, db)
+    
+    # Initial log
+    log = ConversionLogService.log_conversion(
+        db=db,
+        user_id=user_id,
+        conversion_type="pdf-update-metadata",
+        input_filename=file.filename,
+        input_file_size=input_size,
+        input_file_type="pdf",
+        ip_address=request.client.host,
+        user_agent=request.headers.get("user-agent"),
+        api_endpoint=request.url.path
+    )
+    
+    try:
+        FileService.validate_file(file, "pdf")
+        input_path = FileService.save_uploaded_file(file)
+        
+        original_name = file.filename or "pdf"
+        base_name, _ = os.path.splitext(original_name)
+        desired_name = (output_filename or f"{base_name}_metadata").strip()
+        output_path, final_filename = FileService.generate_output_path_with_filename(
+            desired_name,
+            default_extension=".pdf",
+        )
+
+        updates = {
+            "title": title,
+            "author": author,
+            "subject": subject,
+            "keywords": keywords,
+            "creator": creator,
+            "producer": producer,
+        }
+        result = await JobService.run(request, "pdf", PDFConversionService.set_pdf_metadata, input_path, output_path, updates)
+        
+        # Update log on success
+        ConversionLogService.update_log_status(
+            db=db,
+            log_id=log.id,
+            status="success",
+            output_filename=final_filename,
+            output_file_type="pdf"
+        )
+        
+        return {
+            "success": True,
+            "message": "PDF metadata updated successfully",
+            "metadata": result["metadata"],
+            "output_filename": final_filename,
+            "download_url": f"/download/{final_filename}",
+        }
+        
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
+    except Exception as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
+        raise create_error_response(
+            error_type="PDFMetadataError",
+            message=str(e),
+            status_code=400
+        )
+    finally:
+        if input_path:
+            PDFConversionService.cleanup_temp_files(input_path)
+
 # Download converted file
 @router.get("/download/{filename}")
 async def download_file(filename: str, background_tasks: BackgroundTasks):
@@ -7,7 +7,7 @@ from app.models.schemas import ConversionResponse
 from app.services.subtitle_conversion_service import SubtitleConversionService
 from app.services.conversion_log_service import ConversionLogService
 from app.core.database import get_db
-from app.api.v1.dependencies import get_user_id
+from app.api.v1.dependencies import get_user_id, UploadRoute
 from app.core.exceptions import (
     FileProcessingError, 
     UnsupportedFileTypeError, 
@@ -16,7 +16,7 @@ from app.core.exceptions import (
 )
 from app.services.file_service import FileService
 
-router = APIRouter()
+router = APIRouter(route_class=UploadRoute)
 
 
 @router.post("/translate-srt", response_model=ConversionResponse)
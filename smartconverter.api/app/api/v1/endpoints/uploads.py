@@ -0,0 +1,208 @@
+from typing import Optional
+from fastapi import APIRouter, Form, Header, Query, Request, Response
+from starlette.concurrency import run_in_threadpool
+from app.api.v1.dependencies import get_caller_identity
+from app.services.upload_service import UploadService
+from app.core.config import settings
+from app.core.exceptions import (
+    ChecksumMismatchError,
+    FileProcessingError,
+    FileSizeExceededError,
+    UploadOffsetMismatchError,
+    create_error_response
+)
+
+router = APIRouter()
+
+
+def _get_upload_or_404(upload_id: str):
+    upload = UploadService.get_upload(upload_id)
+    if not upload:
+        raise create_error_response(
+            error_type="UploadNotFound",
+            message=f"Upload {upload_id} not found",
+            status_code=404
+        )
+    return upload
+
+
+def _offset_headers(upload: dict) -> dict:
+    headers = {"Upload-Offset": str(upload["offset"]), "Cache-Control": "no-store"}
+    if upload.get("length") is not None:
+        headers["Upload-Length"] = str(upload["length"])
+    return headers
+
+
+@router.post("")
+async def create_upload(
+    request: Request,
+    response: Response,
+    filename: str = Form(...),
+    length: Optional[int] = Form(None),
+    content_type: Optional[str] = Form(None)
+):
+    """
+    Start a resumable upload.
+
+    Send the file with ``PATCH /uploads/{upload_id}`` in chunks, then call
+    ``POST /uploads/{upload_id}/finalize`` and pass the upload id to any
+    conversion endpoint as ``upload_id`` instead of ``file``.
+    """
+    try:
+        upload = UploadService.create_upload(filename, length, content_type, get_caller_identity(request))
+    except FileSizeExceededError as e:
+        raise create_error_response("FileSizeExceededError", str(e), status_code=413)
+    except FileProcessingError as e:
+        raise create_error_response("FileProcessingError", str(e), status_code=400)
+
+    response.headers.update(_offset_headers(upload))
+    return {
+        "success": True,
+        "upload": upload,
+        "max_chunk_size": settings.resumable_upload_max_chunk_size
+    }
+
+
+@router.head("/check")
+async def check_content_exists(request: Request, sha256: str = Query(...)):
+    """Check whether the caller has already uploaded a file with this SHA-256 (200) or not (404)."""
+    try:
+        size = UploadService.find_content(sha256, get_caller_identity(request))
+    except ChecksumMismatchError as e:
+        raise create_error_response("InvalidChecksum", str(e), status_code=400)
+    if size is None:
+        return Response(status_code=404, headers={"Cache-Control": "no-store"})
+    return Response(status_code=200, headers={"Upload-Length": str(size), "Cache-Control": "no-store"})
+
+
+@router.post("/check")
+async def check_content(
+    request: Request,
+    sha256: str = Form(...),
+    filename: Optional[str] = Form(None),
+    content_type: Optional[str] = Form(None)
+):
+    """
+    Look up a file by its SHA-256 before uploading it.
+
+    If the caller has already uploaded the content (as a resumable upload),
+    the response has ``exists: true`` and an ``upload_id`` that can be passed
+    to any conversion endpoint, so the file does not need to be sent.
+    Otherwise upload it as usual. Files uploaded by other callers are never
+    matched, so a hash alone gives no access to them.
+    """
+    try:
+        upload = UploadService.claim_content(sha256, get_caller_identity(request), filename, content_type)
+    except ChecksumMismatchError as e:
+        raise create_error_response("InvalidChecksum", str(e), status_code=400)
+
+    if upload is None:
+        return {
+            "success": True,
+            "exists": False
+        }
+    return {
+        "success": True,
+        "exists": True,
+        "upload_id": upload["upload_id"],
+        "filename": upload["filename"],
+        "size": upload["length"]
+    }
+
+
+@router.head("/{upload_id}")
+async def get_upload_offset(upload_id: str):
+    """Get the current offset of an upload (to resume after a disconnect)."""
+    upload = _get_upload_or_404(upload_id)
+    return Response(status_code=200, headers=_offset_headers(upload))
+
+
+@router.get("/{upload_id}")
+async def get_upload(upload_id: str, response: Response):
+    """Get the state of a resumable upload."""
+    upload = _get_upload_or_404(upload_id)
+    response.headers.update(_offset_headers(upload))
+    return {
+        "success": True,
+        "upload": upload
+    }
+
+
+@router.patch("/{upload_id}")
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    response: Response,
+    upload_offset: int = Header(..., alias="Upload-Offset"),
+    upload_checksum: Optional[str] = Header(None, alias="Upload-Checksum")
+):
+    """
+    Append a chunk to an upload.
+
+    The request body is the raw chunk. ``Upload-Offset`` must equal the current
+    offset and ``Upload-Checksum`` is ``<sha256|sha1|md5> <base64 or hex digest>``
+    of the chunk. A chunk that is rejected or cut off leaves the offset unchanged.
+    """
+    _get_upload_or_404(upload_id)
+    try:
+        offset = await UploadService.append_chunk(upload_id, upload_offset, request.stream(), upload_checksum)
+    except UploadOffsetMismatchError as e:
+        upload = UploadService.get_upload(upload_id) or {"offset": None}
+        raise create_error_response(
+            error_type="UploadOffsetMismatch",
+            message=str(e),
+            details={"offset": upload["offset"]},
+            status_code=409
+        )
+    except ChecksumMismatchError as e:
+        # 460 Checksum Mismatch, as in the tus protocol
+        raise create_error_response("ChecksumMismatch", str(e), status_code=460)
+    except FileSizeExceededError as e:
+        raise create_error_response("FileSizeExceededError", str(e), status_code=413)
+    except FileProcessingError as e:
+        raise create_error_response("FileProcessingError", str(e), status_code=400)
+
+    response.headers["Upload-Offset"] = str(offset)
+    return {
+        "success": True,
+        "upload_id": upload_id,
+        "offset": offset
+    }
+
+
+@router.post("/{upload_id}/finalize")
+async def finalize_upload(upload_id: str, sha256: Optional[str] = Form(None)):
+    """
+    Complete an upload; its id can then be used in place of a file upload.
+
+    ``sha256`` (optional) is checked against the whole file.
+    """
+    _get_upload_or_404(upload_id)
+    try:
+        # Hashing a multi-GB file must not block the event loop
+        upload = await run_in_threadpool(UploadService.finalize_upload, upload_id, sha256)
+    except ChecksumMismatchError as e:
+        raise create_error_response("ChecksumMismatch", str(e), status_code=460)
+    except UploadOffsetMismatchError as e:
+        raise create_error_response("UploadIncomplete", str(e), status_code=409)
+    except FileSizeExceededError as e:
+        raise create_error_response("FileSizeExceededError", str(e), status_code=413)
+
+    return {
+        "success": True,
+        "upload_id": upload_id,
+        "filename": upload["filename"],
+        "size": upload["length"],
+        "sha256": upload["sha256"]
+    }
+
+
+@router.delete("/{upload_id}")
+async def delete_upload(upload_id: str):
+    """Abort an upload and remove its staged data."""
+    _get_upload_or_404(upload_id)
+    UploadService.delete_upload(upload_id)
+    return {
+        "success": True,
+        "message": "Upload deleted"
+    }
@@ -5,7 +5,7 @@ from fastapi.responses import FileResponse
 from typing import Optional
 from sqlalchemy.orm import Session
 from app.core.database import get_db
-from app.api.v1.dependencies import get_user_id
+from app.api.v1.dependencies import get_user_id, UploadRoute
 from app.services.conversion_log_service import ConversionLogService
 
 from app.models.schemas import ConversionResponse
@@ -14,14 +14,16 @@ from app.core.exceptions import (
     FileProcessingError, 
     UnsupportedFileTypeError, 
     FileSizeExceededError,
+    JobCancelledError,
     create_error_response
 )
 from app.services.file_service import FileService
+from app.services.job_service import JobService
 from app.core.config import settings
 
 
 
-router = APIRouter()
+router = APIRouter(route_class=UploadRoute)
 
 def _determine_output_filename(original_filename: str, provided_filename: Optional[str], target_extension: str) -> str:
     """
@@ -89,7 +91,7 @@ async def convert_mov_to_mp4(
         output_filename = _determine_output_filename(file.filename, filename, "mp4")
         
         # Convert
-        temp_output_path = VideoConversionService.mov_to_mp4(input_path, quality)
+        temp_output_path = await JobService.run(request, "video", VideoConversionService.mov_to_mp4, input_path, quality)
         
         # Update log on success
         ConversionLogService.update_log_status(
@@ -115,6 +117,9 @@ async def convert_mov_to_mp4(
             download_url=f"/api/v1/videoconversiontools/download/{output_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except (FileProcessingError, UnsupportedFileTypeError, FileSizeExceededError) as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -180,7 +185,7 @@ async def convert_mkv_to_mp4(
         output_filename = _determine_output_filename(file.filename, filename, "mp4")
         
         # Convert MKV to MP4
-        temp_output_path = VideoConversionService.mkv_to_mp4(input_path, quality)
+        temp_output_path = await JobService.run(request, "video", VideoConversionService.mkv_to_mp4, input_path, quality)
         
         # Move/Rename
         final_output_path = os.path.join(settings.output_dir, output_filename)
@@ -205,6 +210,9 @@ async def convert_mkv_to_mp4(
             download_url=f"/api/v1/videoconversiontools/download/{output_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except (FileProcessingError, UnsupportedFileTypeError, FileSizeExceededError) as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -269,7 +277,7 @@ async def convert_avi_to_mp4(
         output_filename = _determine_output_filename(file.filename, filename, "mp4")
         
         # Convert AVI to MP4
-        temp_output_path = VideoConversionService.avi_to_mp4(input_path, quality)
+        temp_output_path = await JobService.run(request, "video", VideoConversionService.avi_to_mp4, input_path, quality)
         
         # Move/Rename
         final_output_path = os.path.join(settings.output_dir, output_filename)
@@ -294,6 +302,9 @@ async def convert_avi_to_mp4(
             download_url=f"/api/v1/videoconversiontools/download/{output_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except (FileProcessingError, UnsupportedFileTypeError, FileSizeExceededError) as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -358,7 +369,7 @@ async def convert_mp4_to_mp3(
         output_filename = _determine_output_filename(file.filename, filename, "mp3")
         
         # Convert MP4 to MP3
-        temp_output_path = VideoConversionService.mp4_to_mp3(input_path, bitrate)
+        temp_output_path = await JobService.run(request, "video", VideoConversionService.mp4_to_mp3, input_path, bitrate)
         
         # Move/Rename
         final_output_path = os.path.join(settings.output_dir, output_filename)
@@ -383,6 +394,9 @@ async def convert_mp4_to_mp3(
             download_url=f"/api/v1/videoconversiontools/download/{output_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except (FileProcessingError, UnsupportedFileTypeError, FileSizeExceededError) as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -448,7 +462,7 @@ async def convert_video_format(
         output_filename = _determine_output_filename(file.filename, filename, output_format)
         
         # Convert video format
-        temp_output_path = VideoConversionService.convert_video_format(input_path, output_format, quality)
+        temp_output_path = await JobService.run(request, "video", VideoConversionService.convert_video_format, input_path, output_format, quality)
         
         # Move/Rename
         final_output_path = os.path.join(settings.output_dir, output_filename)
@@ -473,6 +487,9 @@ async def convert_video_format(
             download_url=f"/api/v1/videoconversiontools/download/{output_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except (FileProcessingError, UnsupportedFileTypeError, FileSizeExceededError) as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -537,7 +554,7 @@ async def video_to_audio(
         output_filename = _determine_output_filename(file.filename, filename, output_format)
         
         # Convert video to audio
-        temp_output_path = VideoConversionService.video_to_audio(input_path, output_format)
+        temp_output_path = await JobService.run(request, "video", VideoConversionService.video_to_audio, input_path, output_format)
         
         # Move/Rename
         final_output_path = os.path.join(settings.output_dir, output_filename)
@@ -562,6 +579,9 @@ async def video_to_audio(
             download_url=f"/api/v1/videoconversiontools/download/{output_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except (FileProcessingError, UnsupportedFileTypeError, FileSizeExceededError) as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -627,7 +647,7 @@ async def extract_audio(
         output_filename = _determine_output_filename(file.filename, filename, output_format)
         
         # Extract audio
-        temp_output_path = VideoConversionService.extract_audio(input_path, output_format, bitrate)
+        temp_output_path = await JobService.run(request, "video", VideoConversionService.extract_audio, input_path, output_format, bitrate)
         
         # Move/Rename
         final_output_path = os.path.join(settings.output_dir, output_filename)
@@ -652,6 +672,9 @@ async def extract_audio(
             download_url=f"/api/v1/videoconversiontools/download/{output_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except (FileProcessingError, UnsupportedFileTypeError, FileSizeExceededError) as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -725,7 +748,7 @@ async def resize_video(
              output_filename = f"{base_name}_resized.mp4"
 
         # Resize video
-        temp_output_path = VideoConversionService.resize_video(input_path, width, height, quality)
+        temp_output_path = await JobService.run(request, "video", VideoConversionService.resize_video, input_path, width, height, quality)
         
         # Move/Rename
         final_output_path = os.path.join(settings.output_dir, output_filename)
@@ -750,6 +773,9 @@ async def resize_video(
             download_url=f"/api/v1/videoconversiontools/download/{output_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except (FileProcessingError, UnsupportedFileTypeError, FileSizeExceededError) as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -818,7 +844,7 @@ async def compress_video(
             output_filename = f"{base_name}_compressed.mp4"
             
         # Compress video
-        temp_output_path = VideoConversionService.compress_video(input_path, compression_level)
+        temp_output_path = await JobService.run(request, "video", VideoConversionService.compress_video, input_path, compression_level)
         
         # Move/Rename
         final_output_path = os.path.join(settings.output_dir, output_filename)
@@ -843,6 +869,9 @@ async def compress_video(
             download_url=f"/api/v1/videoconversiontools/download/{output_filename}"
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except (FileProcessingError, UnsupportedFileTypeError, FileSizeExceededError) as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
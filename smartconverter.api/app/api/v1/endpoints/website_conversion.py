@@ -15,14 +15,15 @@ from sqlalchemy.orm import Session
 
 from app.services.website_conversion_service_simple import WebsiteConversionService
 from app.services.conversion_log_service import ConversionLogService
+from app.services.job_service import JobService
 from app.core.database import get_db
-from app.api.v1.dependencies import get_user_id
-from app.core.exceptions import create_error_response
+from app.api.v1.dependencies import get_user_id, UploadRoute
+from app.core.exceptions import JobCancelledError, create_error_response
 from app.models.schemas import ConversionResponse
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+router = APIRouter(route_class=UploadRoute)
 
 
 # HTML to PDF
@@ -80,7 +81,7 @@ async def convert_html_to_pdf(
                 temp_file_path = temp_file.name
                 
             try:
-                result = WebsiteConversionService.convert_html_file_to_pdf(temp_file_path, filename)
+                result = await JobService.run(request, "website", WebsiteConversionService.convert_html_file_to_pdf, temp_file_path, filename)
             finally:
                 # Cleanup temp file
                 if os.path.exists(temp_file_path):
@@ -90,7 +91,7 @@ async def convert_html_to_pdf(
                         pass
         elif html_content:
             # Handle string content
-            result = WebsiteConversionService.html_to_pdf(html_content, css_content, filename)
+            result = await JobService.run(request, "website", WebsiteConversionService.html_to_pdf, html_content, css_content, filename)
         else:
             raise HTTPException(status_code=400, detail="Either html_content or file must be provided")
         
@@ -114,6 +115,9 @@ async def convert_html_to_pdf(
             download_url=download_url
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except HTTPException as he:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(he.detail))
         raise he
@@ -155,7 +159,7 @@ async def convert_website_to_pdf(
     )
 
     try:
-        result = WebsiteConversionService.website_to_pdf(url, filename)
+        result = await JobService.run(request, "website", WebsiteConversionService.website_to_pdf, url, filename)
         
         # Create download URL
         result_filename = os.path.basename(result)
@@ -177,6 +181,9 @@ async def convert_website_to_pdf(
             download_url=download_url
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except Exception as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -435,7 +442,7 @@ async def convert_website_to_jpg(
     )
 
     try:
-        result = WebsiteConversionService.website_to_jpg(url, filename, width, height)
+        result = await JobService.run(request, "website", WebsiteConversionService.website_to_jpg, url, filename, width, height)
         
         # Create download URL
         result_filename = os.path.basename(result)
@@ -458,6 +465,9 @@ async def convert_website_to_jpg(
         )
 
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except Exception as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -523,7 +533,7 @@ async def convert_html_to_jpg(
         else:
             content_to_process = html_content
             
-        result = WebsiteConversionService.html_to_jpg(
+        result = await JobService.run(request, "website", WebsiteConversionService.html_to_jpg,
             content_to_process, 
             original_filename, 
             filename, 
@@ -551,6 +561,9 @@ async def convert_html_to_jpg(
             download_url=download_url
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except HTTPException as he:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(he.detail))
         raise he
@@ -594,7 +607,7 @@ async def convert_website_to_png(
     )
 
     try:
-        result = WebsiteConversionService.website_to_png(url, filename, width, height)
+        result = await JobService.run(request, "website", WebsiteConversionService.website_to_png, url, filename, width, height)
         
         # Create download URL
         result_filename = os.path.basename(result)
@@ -616,6 +629,9 @@ async def convert_website_to_png(
             download_url=download_url
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except Exception as e:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(e))
         raise create_error_response(
@@ -680,7 +696,7 @@ async def convert_html_to_png(
         else:
             content_to_process = html_content
             
-        result = WebsiteConversionService.html_to_png(
+        result = await JobService.run(request, "website", WebsiteConversionService.html_to_png,
             content_to_process, 
             original_filename, 
             filename, 
@@ -708,6 +724,9 @@ async def convert_html_to_png(
             download_url=download_url
         )
         
+    except JobCancelledError as e:
+        ConversionLogService.update_log_status(db=db, log_id=log.id, status="cancelled", error_message=str(e))
+        raise
     except HTTPException as he:
         ConversionLogService.update_log_status(db=db, log_id=log.id, status="failed", error_message=str(he.detail))
         raise he
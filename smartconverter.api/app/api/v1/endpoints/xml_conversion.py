@@ -18,7 +18,7 @@ from sqlalchemy.orm import Session
 from app.services.xml_conversion_service import XMLConversionService
 from app.services.conversion_log_service import ConversionLogService
 from app.core.database import get_db
-from app.api.v1.dependencies import get_user_id
+from app.api.v1.dependencies import get_user_id, UploadRoute
 from app.services.file_service import FileService
 from app.core.config import settings
 from app.core.exceptions import (
@@ -31,7 +31,7 @@ from app.models.schemas import ConversionResponse
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+router = APIRouter(route_class=UploadRoute)
 
 # ---------------------------------------------------------------------------
 # Helper utilities
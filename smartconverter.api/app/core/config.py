@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 import os
 
 
@@ -15,10 +15,19 @@ class Settings(BaseSettings):
     # Server
     host: str = "0.0.0.0"
     port: int = 8000
+    # Peers (the nginx proxy) whose X-Real-IP / X-Forwarded-For headers give the client address
+    trusted_proxy_ips: str = "127.0.0.1,::1,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16"
     
     # Directories
     upload_dir: str = "uploads"
     output_dir: str = "outputs"
+    # Staging area for resumable (chunked) uploads; kept out of the public uploads mount
+    resumable_upload_dir: str = "resumable_uploads"
+    resumable_upload_retention_minutes: int = 24 * 60
+    resumable_upload_max_chunk_size: int = 64 * 1024 * 1024
+    # Finished uploads are kept content-addressed (one copy per SHA-256) so that
+    # POST /uploads/check can skip re-sending a file the caller already uploaded
+    upload_store_retention_minutes: int = 60
     
     # File upload limits
     # max_file_size: int = 50 * 1024 * 1024  # 50MB
@@ -28,8 +37,70 @@ class Settings(BaseSettings):
     # file_retention_minutes: int = 60  # Default 1 hour
     file_retention_minutes: int = 1  # Reduced to 1 minute for testing
     
+    # Job deadlines (in seconds) - conversions running longer are cancelled
+    # Keys are job types; job_deadline_seconds applies to any type not listed. 0 disables.
+    job_deadline_seconds: int = 600
+    job_deadlines: Dict[str, int] = {
+        "video": 1800,
+        "audio": 900,
+        "pdf": 600,
+        "ocr": 900,
+        "website": 120,
+    }
+    # Maximum rate of progress updates sent to /jobs/{id}/events subscribers
+    progress_events_per_second: int = 4
+
+    # Idempotency-Key handling: "local" (per process) or "redis" (shared) store
+    idempotency_store: str = "local"
+    idempotency_ttl_seconds: int = 3600
+    idempotency_max_entries: int = 1000
+    # Larger responses (e.g. file downloads) are not stored for replay
+    idempotency_max_response_bytes: int = 1024 * 1024
+
+    # Worker processes for CPU-bound page work (PDF rendering, extraction) - 0 means one per CPU
+    process_pool_workers: int = 0
+    # PDFs with fewer pages are processed in the request thread
+    pdf_parallel_min_pages: int = 16
+    # Default resolution of PDF to image conversions
+    pdf_image_dpi: int = 72
+    # Pages per pool task when a conversion is streamed, so the first pages arrive early
+    pdf_stream_shard_pages: int = 4
+    # Memory for cached PDF page text shared by the text-based tools
+    text_cache_max_bytes: int = 64 * 1024 * 1024
+
+    # Ghostscript compression: candidate settings run at the same time, and a
+    # disk cache of results keyed by input hash and options (0 disables it)
+    compression_parallel_runs: int = 3
+    compression_cache_dir: str = "compression_cache"
+    compression_cache_max_bytes: int = 1024 * 1024 * 1024
+
+    # Light PDF edits (rotate, metadata) are appended to a copy of the input
+    # as an update section while they rewrite at most this share of its objects
+    incremental_save_max_ratio: float = 0.1
+
+    # External tool limits (ffmpeg, ghostscript, tesseract) - 0 disables
+    subprocess_timeout_seconds: int = 900
+    subprocess_cpu_limit_seconds: int = 0
+
     # OCR Settings
     tesseract_path: Optional[str] = None
+    # Resolution pages are rendered at for OCR
+    ocr_dpi: int = 300
+    # Image preprocessing before OCR: auto (picked per image), fast, standard or thorough
+    ocr_preprocess: str = "auto"
+    # OCR is slow per page, so even short PDFs are spread over the process pool
+    ocr_parallel_min_pages: int = 2
+    # Disk cache of OCR results keyed by the preprocessed image, language and
+    # engine settings, least recently used first out (0 disables it)
+    ocr_cache_dir: str = "ocr_cache"
+    ocr_cache_max_bytes: int = 256 * 1024 * 1024
+    # OCR engine pools (tesseract, easyocr, paddleocr), CPU only: workers per
+    # engine (0: as many as the process pool), languages each worker loads
+    # when it starts, and images a worker reads before it is replaced to
+    # release memory its models have grown (0: never)
+    ocr_pool_workers: int = 0
+    ocr_preload_languages: str = "eng"
+    ocr_worker_max_jobs: int = 200
     
     # Database Settings
     database_url: Optional[str] = None
@@ -89,3 +160,6 @@ settings = Settings()
 # Ensure directories exist
 os.makedirs(settings.upload_dir, exist_ok=True)
 os.makedirs(settings.output_dir, exist_ok=True)
+os.makedirs(settings.resumable_upload_dir, exist_ok=True)
+os.makedirs(settings.compression_cache_dir, exist_ok=True)
+os.makedirs(settings.ocr_cache_dir, exist_ok=True)
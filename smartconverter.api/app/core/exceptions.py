@@ -22,6 +22,26 @@ class FileSizeExceededError(SmartConvertException):
     pass
 
 
+class JobCancelledError(SmartConvertException):
+    """Raised when a conversion job is cancelled before it completes."""
+    pass
+
+
+class JobTimeoutError(JobCancelledError):
+    """Raised when a conversion job runs past its deadline."""
+    pass
+
+
+class UploadOffsetMismatchError(SmartConvertException):
+    """Raised when an upload chunk does not start at the current upload offset."""
+    pass
+
+
+class ChecksumMismatchError(SmartConvertException):
+    """Raised when uploaded data does not match its checksum."""
+    pass
+
+
 def create_error_response(
     error_type: str,
     message: str,
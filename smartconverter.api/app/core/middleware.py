@@ -1,9 +1,12 @@
 from fastapi import Request, HTTPException, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import asyncio
+import hashlib
 import time
 import logging
+import uuid
 
 logger = logging.getLogger(__name__)
 
@@ -115,3 +118,175 @@ class LoggingMiddleware(BaseHTTPMiddleware):
         logger.info(f"Response: {response.status_code} - {process_time:.4f}s")
         
         return response
+
+
+class _BodyDigest:
+    """Hash a request body as the app reads it, so it never has to be held in memory."""
+    
+    def __init__(self, receive: Receive):
+        self._receive = receive
+        self._hash = hashlib.sha256()
+        self.complete = False
+        self.disconnected = False
+    
+    async def receive(self) -> Message:
+        message = await self._receive()
+        if message["type"] == "http.request" and not self.complete:
+            self._hash.update(message.get("body", b""))
+            self.complete = not message.get("more_body", False)
+        elif message["type"] == "http.disconnect":
+            self.disconnected = True
+        return message
+    
+    async def hexdigest(self):
+        """Digest of the whole body, reading whatever the app left unread; None if the client went away."""
+        while not self.complete and not self.disconnected:
+            await self.receive()
+        return self._hash.hexdigest() if self.complete else None
+
+
+class IdempotencyMiddleware(BaseHTTPMiddleware):
+    """
+    Replay the original response for POST requests retried with the same
+    ``Idempotency-Key`` header instead of running the conversion again.
+    A retry whose body differs from the original's is refused with 422.
+    """
+    
+    HEADER = "idempotency-key"
+    SCOPE_KEY = "idempotency.body_digest"
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["method"] == "POST" and any(
+            name.lower() == self.HEADER.encode() for name, _ in scope["headers"]
+        ):
+            digest = _BodyDigest(receive)
+            scope[self.SCOPE_KEY] = digest
+            receive = digest.receive
+        await super().__call__(scope, receive, send)
+    
+    async def dispatch(self, request: Request, call_next):
+        from app.api.v1.dependencies import get_caller_identity
+        from app.core.config import settings
+        from app.services.idempotency_service import IdempotencyService
+        
+        idempotency_key = request.headers.get(self.HEADER)
+        digest = request.scope.get(self.SCOPE_KEY)
+        if request.method != "POST" or not idempotency_key or digest is None:
+            return await call_next(request)
+        
+        key = IdempotencyService.make_key(
+            get_caller_identity(request), request.method, request.url.path, idempotency_key
+        )
+        request.state.idempotency_key = key
+        
+        # Give the request a job id up front so retries can report which job they attached to
+        job_id = request.headers.get("x-job-id")
+        if not job_id:
+            job_id = uuid.uuid4().hex
+            request.scope["headers"] = list(request.scope["headers"]) + [(b"x-job-id", job_id.encode())]
+        
+        existing = IdempotencyService.reserve(key, job_id)
+        if existing is not None:
+            existing = await self._wait_for_original(IdempotencyService, key, existing)
+            if existing is None:
+                # The original request failed and released the key; run this one instead
+                existing = IdempotencyService.reserve(key, job_id)
+        if existing is not None:
+            return await self._replay(IdempotencyService, existing, digest)
+        
+        # The key is kept only once the response is stored; any other way out
+        # (errors, cancellation, oversized or failed responses) releases it
+        completed = False
+        try:
+            response = await call_next(request)
+            
+            # Failed or cancelled requests are not remembered, so a retry runs them again
+            if response.status_code >= 500 or response.status_code == 499:
+                return response
+            
+            chunks = []
+            size = 0
+            body_iterator = response.body_iterator
+            async for chunk in body_iterator:
+                chunks.append(chunk)
+                size += len(chunk)
+                if size > settings.idempotency_max_response_bytes:
+                    break
+            else:
+                body = b"".join(chunks)
+                body_digest = await digest.hexdigest()
+                if body_digest is not None:
+                    IdempotencyService.complete(
+                        key, getattr(request.state, "job_id", job_id), response.status_code,
+                        response.raw_headers, body, body_digest
+                    )
+                    completed = True
+                replayable = Response(
+                    content=body,
+                    status_code=response.status_code,
+                    background=response.background
+                )
+                replayable.raw_headers = list(response.raw_headers)
+                return replayable
+        finally:
+            if not completed:
+                IdempotencyService.release(key)
+        
+        # Too large to keep: pass it through and let a retry run again
+        async def remaining():
+            for chunk in chunks:
+                yield chunk
+            async for chunk in body_iterator:
+                yield chunk
+        
+        streaming = StreamingResponse(
+            remaining(),
+            status_code=response.status_code,
+            background=response.background
+        )
+        streaming.raw_headers = list(response.raw_headers)
+        return streaming
+    
+    async def _wait_for_original(self, service, key: str, record: dict):
+        """Attach to a request that is still running; returns its final record or None if it failed."""
+        waited = 0.0
+        while record is not None and record.get("state") == "running" and waited < service.running_ttl():
+            await asyncio.sleep(service.POLL_INTERVAL)
+            waited += service.POLL_INTERVAL
+            record = service.get(key)
+        return record
+    
+    async def _replay(self, service, record: dict, digest: _BodyDigest):
+        """Build the response for a retried request from the stored record."""
+        if record.get("state") == "running":
+            return JSONResponse(
+                status_code=status.HTTP_409_CONFLICT,
+                content={
+                    "error_type": "IdempotencyConflict",
+                    "message": "A request with this Idempotency-Key is still being processed",
+                    "details": {"job_id": record.get("job_id")}
+                }
+            )
+        
+        if record.get("body_digest") and await digest.hexdigest() != record["body_digest"]:
+            return JSONResponse(
+                status_code=422,
+                content={
+                    "error_type": "IdempotencyKeyReused",
+                    "message": "This Idempotency-Key was already used for a request with a different body",
+                    "details": {"job_id": record.get("job_id")}
+                }
+            )
+        
+        response = Response(
+            content=service.response_body(record),
+            status_code=record["status_code"]
+        )
+        response.raw_headers.extend(
+            (name, value) for name, value in service.response_headers(record)
+            if name not in (b"idempotent-replayed", b"x-job-id")
+        )
+        response.headers["Idempotent-Replayed"] = "true"
+        if record.get("job_id"):
+            response.headers["X-Job-Id"] = record["job_id"]
+        return response
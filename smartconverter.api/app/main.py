@@ -6,9 +6,9 @@ from starlette.middleware.sessions import SessionMiddleware
 from fastapi.exceptions import RequestValidationError
 from fastapi.exception_handlers import request_validation_exception_handler as fastapi_validation_handler
 from app.core.config import settings
-from app.core.exceptions import SmartConvertException
+from app.core.exceptions import SmartConvertException, JobCancelledError, JobTimeoutError
 from app.core.database import init_db, test_connection, SessionLocal
-from app.core.middleware import SecurityHeadersMiddleware, LoggingMiddleware
+from app.core.middleware import SecurityHeadersMiddleware, LoggingMiddleware, IdempotencyMiddleware
 from app.api.v1.api import api_router
 from app.models.request_log import RequestLog
 from app.services.request_logging_service import (
@@ -152,12 +152,14 @@ async def start_cleanup_task():
     """Start the background cleanup task on application startup."""
     import threading
     from app.services.file_service import FileService
+    from app.services.upload_service import UploadService
     
     def run_cleanup():
         while True:
             try:
                 logger.info("Running scheduled file cleanup...")
                 FileService.cleanup_old_files()
+                UploadService.cleanup_expired()
             except Exception as e:
                 logger.error(f"Error in scheduled cleanup: {e}")
             # Run cleanup every 30 minutes
@@ -185,6 +187,7 @@ app.add_middleware(SessionMiddleware, secret_key="CHANGE_ME_SUPER_SECRET")
 # Add security middleware
 app.add_middleware(SecurityHeadersMiddleware)
 app.add_middleware(LoggingMiddleware)
+app.add_middleware(IdempotencyMiddleware)
 
 
 # Custom middleware to handle cases where database is disabled
@@ -233,6 +236,8 @@ async def request_logging_middleware(request: Request, call_next):
             # We still set headers but skip the DB write
             response.headers["X-Process-Time"] = str(duration_ms / 1000.0)
             response.headers["X-Request-Id"] = request_id
+            if getattr(request.state, "job_id", None):
+                response.headers["X-Job-Id"] = request.state.job_id
             return response
 
         ip, xff = extract_ip(request)
@@ -289,6 +294,8 @@ async def request_logging_middleware(request: Request, call_next):
 
     response.headers["X-Process-Time"] = str(duration_ms / 1000.0)
     response.headers["X-Request-Id"] = request_id
+    if getattr(request.state, "job_id", None):
+        response.headers["X-Job-Id"] = request.state.job_id
     return response
 
 # Mount static files for downloads
@@ -351,6 +358,19 @@ async def smart_convert_exception_handler(request: Request, exc: SmartConvertExc
         }
     )
 
+# Cancelled conversions (client disconnect, explicit cancel, or deadline)
+@app.exception_handler(JobCancelledError)
+async def job_cancelled_exception_handler(request: Request, exc: JobCancelledError):
+    """Handle conversion jobs that were stopped before completion."""
+    return JSONResponse(
+        status_code=504 if isinstance(exc, JobTimeoutError) else 499,
+        content={
+            "error_type": type(exc).__name__,
+            "message": str(exc),
+            "details": {"job_id": getattr(request.state, "job_id", None)}
+        }
+    )
+
 # Global exception handler for unhandled exceptions
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -5,8 +5,10 @@ from pydub import AudioSegment
 from pydub.utils import which
 import soundfile as sf
 import numpy as np
-from app.core.exceptions import FileProcessingError
+from app.core.exceptions import FileProcessingError, JobCancelledError
 from app.services.file_service import FileService
+from app.services.job_service import JobService
+from app.services.subprocess_service import SubprocessService
 
 # Configure ffmpeg path
 ffmpeg_path = None
@@ -23,7 +25,6 @@ except ImportError:
     print("AudioConversionService: imageio-ffmpeg not found. Will rely on system PATH.")
 
 # Helper to run ffmpeg command
-import subprocess
 def run_ffmpeg(args):
     """Run ffmpeg command with error handling."""
     exe = ffmpeg_path if ffmpeg_path else "ffmpeg"
@@ -33,9 +34,13 @@ def run_ffmpeg(args):
         if not ffmpeg_path and not which("ffmpeg"):
              raise FileProcessingError("FFmpeg executable not found. Please install ffmpeg or imageio-ffmpeg.")
              
-        process = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        # ffmpeg writes to the last argument; drop it if the job is cancelled midway
+        JobService.add_artifact(args[-1])
+        process = SubprocessService.run_ffmpeg(cmd, capture_stdout=False)
         if process.returncode != 0:
             raise FileProcessingError(f"FFmpeg command failed: {process.stderr}")
+    except JobCancelledError:
+        raise
     except FileNotFoundError:
          raise FileProcessingError("FFmpeg executable not found (FileNotFound).")
     except Exception as e:
@@ -300,7 +305,7 @@ class AudioConversionService:
             
             # ffmpeg prints info to stderr
             try:
-                 result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+                 result = SubprocessService.run(cmd, capture_stdout=False)
                  stderr = result.stderr
             except Exception as e:
                  raise FileProcessingError(f"Failed to run ffmpeg for info: {e}")
@@ -20,12 +20,13 @@ import io
 import pandas as pd
 import docx
 from pptx import Presentation
-import fitz  # PyMuPDF
 from bs4 import BeautifulSoup
 
 # Database logging
 from app.services.request_logging_service import RequestLoggingService
 from app.services.xml_conversion_service import XMLConversionService
+from app.services.job_service import JobService
+from app.services.text_extraction_service import TextExtractionService
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +34,9 @@ logger = logging.getLogger(__name__)
 class CSVConversionService:
     """Service for CSV conversion operations."""
     
+    # Rows per write when exporting to Excel; progress is reported after each chunk
+    EXCEL_CHUNK_ROWS = 5000
+    
     @staticmethod
     def html_table_to_csv(html_content: str) -> str:
         """Convert HTML table to CSV."""
@@ -136,7 +140,7 @@ class CSVConversionService:
             df = pd.read_csv(StringIO(csv_content))
             
             # Save as Excel
-            df.to_excel(output_path, index=False)
+            CSVConversionService.write_excel(df, output_path)
             
             return output_path
             
@@ -144,6 +148,27 @@ class CSVConversionService:
             logger.error(f"Error converting CSV to Excel: {str(e)}")
             raise Exception(f"Failed to convert CSV to Excel: {str(e)}")
     
+    @staticmethod
+    def write_excel(df: pd.DataFrame, output_path: str, sheet_name: str = "Sheet1") -> None:
+        """Write a DataFrame to an Excel file in chunks, reporting rows written to the current job."""
+        total = len(df)
+        chunk = CSVConversionService.EXCEL_CHUNK_ROWS
+        if total <= chunk:
+            df.to_excel(output_path, index=False, sheet_name=sheet_name)
+            return
+        
+        with pd.ExcelWriter(output_path) as writer:
+            for start in range(0, total, chunk):
+                JobService.checkpoint(start, total, "Writing rows")
+                df.iloc[start:start + chunk].to_excel(
+                    writer,
+                    sheet_name=sheet_name,
+                    index=False,
+                    header=start == 0,
+                    # Row 0 holds the header
+                    startrow=start + 1 if start else 0
+                )
+    
     @staticmethod
     def csv_to_xml(csv_content: str, root_name: str = "data") -> str:
         """Convert CSV to XML."""
@@ -157,6 +182,7 @@ class CSVConversionService:
             xml_content = f'<?xml version="1.0" encoding="UTF-8"?>\n<{root_name}>\n'
             
             for index, row in df.iterrows():
+                JobService.checkpoint(index, len(df), "Writing rows")
                 xml_content += f'  <record id="{index}">\n'
                 for column, value in row.items():
                     # Clean column name for XML
@@ -191,16 +217,10 @@ class CSVConversionService:
                 pdf_file.write(file_content)
                 pdf_file_path = pdf_file.name
             
-            # Read PDF
-            doc = fitz.open(pdf_file_path)
-            
             # Extract text and convert to CSV
             csv_content = "Page,Content\n"
             
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                text = page.get_text()
-                
+            for page_num, text in TextExtractionService.page_texts(pdf_file_path):
                 if text.strip():
                     # Clean text for CSV
                     clean_text = text.replace('"', '""').replace('\n', ' ')
@@ -300,7 +320,8 @@ class CSVConversionService:
             writer = csv.writer(output)
             writer.writerow(['Index', 'Start_Time', 'End_Time', 'Text'])
             
-            for entry in srt_entries:
+            for position, entry in enumerate(srt_entries):
+                JobService.checkpoint(position, len(srt_entries), "Writing rows")
                 writer.writerow([
                     entry['index'],
                     entry['start_time'],
@@ -327,6 +348,7 @@ class CSVConversionService:
             srt_content = ""
             
             for index, row in df.iterrows():
+                JobService.checkpoint(index, len(df), "Writing rows")
                 srt_content += f"{index + 1}\n"
                 srt_content += f"{row.get('Start_Time', '00:00:00,000')} --> {row.get('End_Time', '00:00:00,000')}\n"
                 srt_content += f"{row.get('Text', '')}\n\n"
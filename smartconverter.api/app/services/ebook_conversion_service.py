@@ -10,6 +10,7 @@ from markdown.extensions import codehilite, fenced_code, tables
 import fitz  # PyMuPDF
 from app.core.exceptions import FileProcessingError
 from app.services.file_service import FileService
+from app.services.text_extraction_service import TextExtractionService
 
 
 class EBookConversionService:
@@ -516,11 +517,7 @@ class EBookConversionService:
         """Simplified PDF to ePUB conversion."""
         try:
             # Extract text from PDF and create ePUB
-            doc = fitz.open(input_path)
-            text_content = []
-            for page in doc:
-                text_content.append(page.get_text())
-            doc.close()
+            text_content = [text for _, text in TextExtractionService.page_texts(input_path)]
             
             # Create ePUB
             book = epub.EpubBook()
@@ -1,5 +1,6 @@
 import os
 import re
+import shutil
 import uuid
 from typing import Optional, Tuple
 from fastapi import UploadFile
@@ -111,11 +112,19 @@ class FileService:
         file_ext = os.path.splitext(file.filename)[1]
         unique_filename = f"{uuid.uuid4()}{file_ext}"
         file_path = os.path.join(settings.upload_dir, unique_filename)
-        
+
+        # Files from the upload store are linked rather than copied
+        stored_path = getattr(file, "stored_path", None)
+        if stored_path:
+            try:
+                os.link(stored_path, file_path)
+                return file_path
+            except OSError:
+                pass
+
         with open(file_path, "wb") as f:
-            content = file.file.read()
-            f.write(content)
-        
+            shutil.copyfileobj(file.file, f)
+
         return file_path
     
     @staticmethod
@@ -0,0 +1,183 @@
+"""
+Idempotency Service
+
+Remembers the outcome of requests sent with an ``Idempotency-Key`` header so a
+client retrying a POST gets the original response instead of a second
+conversion. While the first request is still running, the key is held with a
+"running" marker and retries wait for it to finish.
+
+Records live in a bounded in-process store, or in Redis when
+``settings.idempotency_store`` is ``"redis"`` so that all workers share them.
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LocalIdempotencyStore:
+    """In-process store holding at most ``max_entries`` records (oldest evicted first)."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._records: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_live(self, key: str) -> Optional[Dict[str, Any]]:
+        record = self._records.get(key)
+        if record is not None and record["expires_at"] <= time.time():
+            del self._records[key]
+            return None
+        return record
+
+    def _store(self, key: str, record: Dict[str, Any], ttl: int) -> None:
+        self._records[key] = dict(record, expires_at=time.time() + ttl)
+        self._records.move_to_end(key)
+        while len(self._records) > self.max_entries:
+            self._records.popitem(last=False)
+
+    def reserve(self, key: str, record: Dict[str, Any], ttl: int) -> Optional[Dict[str, Any]]:
+        """Store ``record`` unless the key is taken; returns the existing record if it is."""
+        with self._lock:
+            existing = self._get_live(key)
+            if existing is not None:
+                return existing
+            self._store(key, record, ttl)
+            return None
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._get_live(key)
+
+    def set(self, key: str, record: Dict[str, Any], ttl: int) -> None:
+        with self._lock:
+            self._store(key, record, ttl)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._records.pop(key, None)
+
+
+class RedisIdempotencyStore:
+    """Redis-backed store; records expire through Redis TTLs."""
+
+    PREFIX = "idempotency:"
+
+    def __init__(self, client):
+        self.client = client
+
+    def reserve(self, key: str, record: Dict[str, Any], ttl: int) -> Optional[Dict[str, Any]]:
+        if self.client.set(self.PREFIX + key, json.dumps(record), nx=True, ex=ttl):
+            return None
+        return self.get(key)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self.client.get(self.PREFIX + key)
+        return json.loads(value) if value else None
+
+    def set(self, key: str, record: Dict[str, Any], ttl: int) -> None:
+        self.client.set(self.PREFIX + key, json.dumps(record), ex=ttl)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.PREFIX + key)
+
+
+def _create_store():
+    if settings.idempotency_store == "redis":
+        try:
+            import redis
+
+            client = redis.Redis(
+                host=settings.redis_host,
+                port=settings.redis_port,
+                db=settings.redis_db,
+                password=settings.redis_password,
+                decode_responses=True,
+                socket_connect_timeout=5,
+                socket_timeout=5,
+                retry_on_timeout=True
+            )
+            client.ping()
+            return RedisIdempotencyStore(client)
+        except Exception as e:
+            logger.warning(f"Redis not available for idempotency keys, using local store: {e}")
+    return LocalIdempotencyStore(settings.idempotency_max_entries)
+
+
+class IdempotencyService:
+    """Reserve, complete and replay idempotent requests."""
+
+    # How often a retry checks whether the original request has finished (seconds)
+    POLL_INTERVAL = 0.5
+    # Headers of the original response that are replayed (each occurrence of a repeated one)
+    REPLAYED_HEADERS = ("content-type", "content-disposition", "x-job-id", "set-cookie")
+
+    store = _create_store()
+
+    @staticmethod
+    def make_key(caller: str, method: str, path: str, idempotency_key: str) -> str:
+        """Scope a client's key to the caller and endpoint."""
+        raw = "\n".join([caller, method, path, idempotency_key])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def running_ttl() -> int:
+        """How long an in-flight marker is kept; covers the longest job deadline."""
+        deadlines = [settings.job_deadline_seconds] + list(settings.job_deadlines.values())
+        return max(deadlines) + 60
+
+    @staticmethod
+    def reserve(key: str, job_id: str) -> Optional[Dict[str, Any]]:
+        """Claim a key for a new request. Returns the existing record if it is already taken."""
+        record = {"state": "running", "job_id": job_id, "created_at": time.time()}
+        return IdempotencyService.store.reserve(key, record, IdempotencyService.running_ttl())
+
+    @staticmethod
+    def get(key: str) -> Optional[Dict[str, Any]]:
+        return IdempotencyService.store.get(key)
+
+    @staticmethod
+    def complete(key: str, job_id: Optional[str], status_code: int, raw_headers: List[Tuple[bytes, bytes]],
+                 body: bytes, body_digest: Optional[str] = None) -> None:
+        """
+        Store the response of a finished request for replay, with the digest
+        of the request body so a retry sending a different body can be refused.
+        """
+        record = {
+            "state": "done",
+            "job_id": job_id,
+            "status_code": status_code,
+            "headers": [
+                [name.decode("latin-1"), value.decode("latin-1")] for name, value in raw_headers
+                if name.decode("latin-1").lower() in IdempotencyService.REPLAYED_HEADERS
+            ],
+            "body": base64.b64encode(body).decode("ascii"),
+            "body_digest": body_digest,
+        }
+        IdempotencyService.store.set(key, record, settings.idempotency_ttl_seconds)
+
+    @staticmethod
+    def release(key: str) -> None:
+        """Forget a key whose request failed so that a retry runs it again."""
+        IdempotencyService.store.delete(key)
+
+    @staticmethod
+    def response_body(record: Dict[str, Any]) -> bytes:
+        return base64.b64decode(record.get("body") or "")
+
+    @staticmethod
+    def response_headers(record: Dict[str, Any]) -> List[Tuple[bytes, bytes]]:
+        """The stored headers as raw pairs; records written before they were kept as pairs hold a dict."""
+        headers = record.get("headers") or []
+        if isinstance(headers, dict):
+            headers = headers.items()
+        return [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
@@ -2,6 +2,7 @@ import os
 import json
 import base64
 import io
+from itertools import groupby
 from typing import Optional, Dict, Any, List, Tuple
 from PIL import Image, ImageOps
 import cv2
@@ -106,63 +107,50 @@ class ImageConversionService:
                 output_path = FileService.get_output_path(input_path, ".json")
             
             with Image.open(input_path) as img:
-                # Extract text using OCR (pytesseract)
+                # Extract text, word boxes and confidences in one OCR pass
                 try:
-                    import pytesseract
+                    from app.services.ocr_engine_service import OCREngineService
                     
-                    # Get full extracted text
-                    extracted_text = pytesseract.image_to_string(img)
-                    
-                    # Get detailed OCR data for structured extraction
-                    ocr_data = pytesseract.image_to_data(img, output_type=pytesseract.Output.DICT)
+                    result = OCREngineService.recognize(img)
+                    extracted_text = result.text
                     
                     # Organize text by lines and paragraphs
                     lines = []
                     current_line = []
-                    current_line_num = -1
-                    
-                    for i in range(len(ocr_data['text'])):
-                        text = ocr_data['text'][i].strip()
-                        if text:
-                            line_num = ocr_data['line_num'][i]
-                            
-                            # New line detected
-                            if line_num != current_line_num:
-                                if current_line:
-                                    lines.append({
-                                        "line_number": current_line_num,
-                                        "text": " ".join([w["text"] for w in current_line]),
-                                        "confidence": sum([w["confidence"] for w in current_line]) / len(current_line)
-                                    })
-                                current_line = []
-                                current_line_num = line_num
-                            
-                            current_line.append({
-                                "text": text,
-                                "confidence": float(ocr_data['conf'][i])
-                            })
+                    current_line_key = None
                     
-                    # Add last line
-                    if current_line:
+                    def add_line():
                         lines.append({
-                            "line_number": current_line_num,
+                            "paragraph": current_line_key[:2],
+                            "line_number": current_line_key[2],
                             "text": " ".join([w["text"] for w in current_line]),
                             "confidence": sum([w["confidence"] for w in current_line]) / len(current_line)
                         })
                     
-                    # Group lines into paragraphs (lines separated by significant vertical gaps)
-                    paragraphs = []
-                    current_paragraph = []
+                    for word in result.words:
+                        line_key = (word.block_num, word.par_num, word.line_num)
+                        
+                        # New line detected
+                        if line_key != current_line_key:
+                            if current_line:
+                                add_line()
+                            current_line = []
+                            current_line_key = line_key
+                        
+                        current_line.append({
+                            "text": word.text,
+                            "confidence": float(word.conf)
+                        })
                     
-                    for line in lines:
-                        if line["text"].strip():
-                            current_paragraph.append(line["text"])
-                        elif current_paragraph:
-                            paragraphs.append(" ".join(current_paragraph))
-                            current_paragraph = []
+                    # Add last line
+                    if current_line:
+                        add_line()
                     
-                    if current_paragraph:
-                        paragraphs.append(" ".join(current_paragraph))
+                    # Group lines into paragraphs as tesseract found them
+                    paragraphs = [
+                        " ".join(line["text"] for line in paragraph_lines)
+                        for _, paragraph_lines in groupby(lines, key=lambda line: line["paragraph"])
+                    ]
                     
                     # Create clean, structured JSON focused on content
                     json_data = {
@@ -184,10 +172,10 @@ class ImageConversionService:
                         }
                     }
                     
-                except ImportError:
+                except FileNotFoundError:
                     json_data = {
                         "error": "OCR not available",
-                        "message": "pytesseract is not installed. Please install it to extract text from images.",
+                        "message": "tesseract is not installed. Please install it to extract text from images.",
                         "content": {
                             "full_text": "",
                             "paragraphs": [],
@@ -0,0 +1,489 @@
+"""
+Job Service
+
+Tracks in-flight conversion jobs so that work nobody is waiting for can be
+stopped: when the client disconnects, when the job is cancelled through the
+jobs API, or when the per-type deadline passes.
+
+Services never receive the job explicitly. The job that is running is kept in
+a context variable, so any service code can call ``JobService.check_cancelled()``
+(or ``JobService.checkpoint()``, which also reports progress) between pages or
+frames and register the external processes it starts.
+
+Progress is only stored on the job by the worker; subscribers of
+``JobService.watch()`` sample it a few times per second, so reporting stays
+cheap however often a loop calls it.
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+import re
+import signal
+import subprocess
+import threading
+import time
+import uuid
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from fastapi import Request
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.exceptions import JobCancelledError, JobTimeoutError
+
+logger = logging.getLogger(__name__)
+
+_current_job: contextvars.ContextVar = contextvars.ContextVar("current_job", default=None)
+
+_JOB_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+_STREAM_END = object()
+
+
+class CancelToken:
+    """Cooperative cancellation flag shared between a job and the code it runs."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._processes: List[subprocess.Popen] = []
+        self._callbacks: List[Callable[[], None]] = []
+        self._artifacts: List[str] = []
+        self.reason: Optional[str] = None
+        self.timed_out = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "Job cancelled", timed_out: bool = False) -> None:
+        """Cancel the job and terminate every process registered with it."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self.timed_out = timed_out
+            self._event.set()
+            processes = list(self._processes)
+            callbacks = list(self._callbacks)
+
+        logger.info(f"Cancelling job: {reason}")
+        for process in processes:
+            JobService.terminate_process(process)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Cancel callback failed: {e}")
+
+    def raise_if_cancelled(self) -> None:
+        if not self._event.is_set():
+            return
+        if self.timed_out:
+            raise JobTimeoutError(self.reason or "Job deadline exceeded")
+        raise JobCancelledError(self.reason or "Job cancelled")
+
+    def register_process(self, process: subprocess.Popen) -> None:
+        """Track a child process; it is killed immediately if the job is already cancelled."""
+        with self._lock:
+            if not self._event.is_set():
+                self._processes.append(process)
+                return
+        JobService.terminate_process(process)
+
+    def unregister_process(self, process: subprocess.Popen) -> None:
+        with self._lock:
+            if process in self._processes:
+                self._processes.remove(process)
+
+    def add_callback(self, callback: Callable[[], None]) -> None:
+        """Run ``callback`` on cancellation (e.g. to quit a browser session)."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def add_artifact(self, path: str) -> None:
+        """Remember a path that must be removed if the job does not complete."""
+        if path:
+            with self._lock:
+                self._artifacts.append(path)
+
+    def cleanup_artifacts(self) -> None:
+        """Remove partial outputs left behind by a cancelled job."""
+        import shutil
+        from app.services.file_service import FileService
+
+        with self._lock:
+            artifacts = list(self._artifacts)
+            self._artifacts.clear()
+        for path in artifacts:
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                FileService.cleanup_file(path)
+
+
+class Job:
+    """A single conversion request being processed by the server."""
+
+    def __init__(self, job_id: str, job_type: str, deadline_seconds: Optional[int] = None,
+                 owner: Optional[str] = None):
+        self.id = job_id
+        self.job_type = job_type
+        # Caller identity of the request that started the job; only it may see or cancel the job
+        self.owner = owner
+        self.token = CancelToken()
+        self.status = "running"
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.deadline = self.created_at + deadline_seconds if deadline_seconds else None
+        self.stage: Optional[str] = None
+        self.progress: Optional[float] = None
+        self.process_stats: List[Dict[str, Any]] = []
+        # Most bytes of working data (e.g. page images) the job reported holding at once
+        self.peak_memory = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "job_type": self.job_type,
+            "status": self.status,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "deadline": self.deadline,
+            "cancel_reason": self.token.reason,
+            "stage": self.stage,
+            "progress": self.progress,
+            "processes": list(self.process_stats),
+            "peak_memory_bytes": self.peak_memory,
+        }
+
+
+class JobService:
+    """Registry of running jobs and helpers for cancelling them."""
+
+    # How often the client connection and deadline are checked (seconds)
+    WATCH_INTERVAL = 0.5
+    # Time a process group gets between SIGTERM and SIGKILL (seconds)
+    TERMINATE_GRACE_SECONDS = 5.0
+    # How long finished jobs remain queryable (seconds)
+    FINISHED_JOB_RETENTION = 300
+    # How long an event subscriber waits for a job that has not started yet (seconds)
+    EVENTS_WAIT_FOR_JOB_SECONDS = 30
+    # Idle time after which event subscribers receive a heartbeat (seconds)
+    EVENTS_HEARTBEAT_SECONDS = 15
+
+    _jobs: Dict[str, Job] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get_deadline(job_type: str) -> Optional[int]:
+        """Get the deadline in seconds for a job type, or None when disabled."""
+        seconds = settings.job_deadlines.get(job_type, settings.job_deadline_seconds)
+        return seconds if seconds and seconds > 0 else None
+
+    @staticmethod
+    def create_job(job_type: str, job_id: Optional[str] = None, owner: Optional[str] = None) -> Job:
+        """Register a new job. A client-supplied id is used when valid and free."""
+        JobService._prune_finished()
+        with JobService._lock:
+            if not job_id or not _JOB_ID_PATTERN.match(job_id) or job_id in JobService._jobs:
+                job_id = uuid.uuid4().hex
+            job = Job(job_id, job_type, JobService.get_deadline(job_type), owner)
+            JobService._jobs[job_id] = job
+        return job
+
+    @staticmethod
+    def get_job(job_id: str, owner: Optional[str] = None) -> Optional[Job]:
+        """
+        Get a job by id. With ``owner``, only a job started by that caller is
+        returned, so client-chosen (guessable) ids do not expose other callers' jobs.
+        """
+        with JobService._lock:
+            job = JobService._jobs.get(job_id)
+        if job is not None and owner is not None and job.owner != owner:
+            return None
+        return job
+
+    @staticmethod
+    def _create_request_job(request: Optional[Request], job_type: str) -> Job:
+        """Create the job of a conversion request, owned by its caller."""
+        from app.api.v1.dependencies import get_caller_identity
+
+        if request is None:
+            return JobService.create_job(job_type)
+        job = JobService.create_job(job_type, request.headers.get("x-job-id"), get_caller_identity(request))
+        request.state.job_id = job.id
+        return job
+
+    @staticmethod
+    def cancel_job(job_id: str, reason: str = "Job cancelled by client") -> bool:
+        """Cancel a running job. Returns False if the job is unknown or already finished."""
+        job = JobService.get_job(job_id)
+        if not job or job.status != "running":
+            return False
+        job.token.cancel(reason)
+        return True
+
+    @staticmethod
+    def finish_job(job: Job, status: str) -> None:
+        job.status = status
+        job.finished_at = time.time()
+
+    @staticmethod
+    def _prune_finished() -> None:
+        cutoff = time.time() - JobService.FINISHED_JOB_RETENTION
+        with JobService._lock:
+            expired = [
+                job_id for job_id, job in JobService._jobs.items()
+                if job.finished_at and job.finished_at < cutoff
+            ]
+            for job_id in expired:
+                del JobService._jobs[job_id]
+
+    @staticmethod
+    def current_job() -> Optional[Job]:
+        """Get the job the calling code is running under, if any."""
+        return _current_job.get()
+
+    @staticmethod
+    def check_cancelled() -> None:
+        """Raise JobCancelledError if the current job has been cancelled."""
+        job = _current_job.get()
+        if job is not None:
+            job.token.raise_if_cancelled()
+
+    @staticmethod
+    def add_artifact(path: str) -> None:
+        """Mark a path for removal if the current job is cancelled."""
+        job = _current_job.get()
+        if job is not None:
+            job.token.add_artifact(path)
+
+    @staticmethod
+    def register_process(process: Optional[subprocess.Popen]) -> None:
+        """Tie a child process to the current job so cancelling the job kills it."""
+        job = _current_job.get()
+        if job is not None and process is not None:
+            job.token.register_process(process)
+
+    @staticmethod
+    def unregister_process(process: Optional[subprocess.Popen]) -> None:
+        job = _current_job.get()
+        if job is not None and process is not None:
+            job.token.unregister_process(process)
+
+    @staticmethod
+    def add_cancel_callback(callback: Callable[[], None]) -> None:
+        job = _current_job.get()
+        if job is not None:
+            job.token.add_callback(callback)
+
+    @staticmethod
+    def popen_kwargs() -> Dict[str, Any]:
+        """Popen arguments that start the child in its own process group."""
+        if os.name == "posix":
+            return {"start_new_session": True}
+        return {"creationflags": getattr(subprocess, "CREATE_NEW_PROCESS_GROUP", 0)}
+
+    @staticmethod
+    def terminate_process(process: subprocess.Popen, grace_seconds: Optional[float] = None) -> None:
+        """Terminate a child process (and its process group when it leads one)."""
+        if process.poll() is not None:
+            return
+        grace = JobService.TERMINATE_GRACE_SECONDS if grace_seconds is None else grace_seconds
+
+        def _signal(sig: int) -> None:
+            try:
+                if os.name == "posix" and os.getpgid(process.pid) == process.pid:
+                    os.killpg(process.pid, sig)
+                elif sig == signal.SIGTERM:
+                    process.terminate()
+                else:
+                    process.kill()
+            except (ProcessLookupError, PermissionError, OSError):
+                pass
+
+        _signal(signal.SIGTERM)
+
+        def _escalate() -> None:
+            try:
+                process.wait(timeout=grace)
+            except subprocess.TimeoutExpired:
+                _signal(getattr(signal, "SIGKILL", signal.SIGTERM))
+
+        threading.Thread(target=_escalate, daemon=True).start()
+
+    @staticmethod
+    def set_progress(percent: float, stage: Optional[str] = None) -> None:
+        """Report progress (0-100) and optionally the stage of the current job."""
+        job = _current_job.get()
+        if job is not None:
+            job.progress = percent
+            if stage is not None:
+                job.stage = stage
+
+    @staticmethod
+    def set_stage(stage: str) -> None:
+        """Report the stage the current job has entered."""
+        job = _current_job.get()
+        if job is not None:
+            job.stage = stage
+
+    @staticmethod
+    def checkpoint(done: int, total: int, stage: Optional[str] = None) -> None:
+        """Report ``done`` of ``total`` items processed and stop if the job was cancelled."""
+        job = _current_job.get()
+        if job is None:
+            return
+        job.token.raise_if_cancelled()
+        if total:
+            job.progress = round(min(done, total) * 100.0 / total, 1)
+        if stage is not None:
+            job.stage = stage
+
+    @staticmethod
+    def record_process_stats(stats: Dict[str, Any]) -> None:
+        """Attach resource usage of a finished external process to the current job."""
+        job = _current_job.get()
+        if job is not None:
+            job.process_stats.append(stats)
+
+    @staticmethod
+    def record_memory(nbytes: int) -> None:
+        """Report the bytes of working data the current job holds; the job keeps the peak."""
+        job = _current_job.get()
+        if job is not None and nbytes > job.peak_memory:
+            job.peak_memory = nbytes
+
+    @staticmethod
+    async def watch(job_id: str, owner: Optional[str] = None) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        Yield the job's state whenever it changes, until the job finishes.
+
+        Changes are sampled at most ``settings.progress_events_per_second``
+        times per second, so bursts of updates are coalesced. ``None`` is
+        yielded as a heartbeat when nothing changed for a while. Nothing is
+        yielded if the job does not appear within EVENTS_WAIT_FOR_JOB_SECONDS
+        (a job of another caller than ``owner``, when given, never appears).
+        """
+        interval = 1.0 / max(settings.progress_events_per_second, 1)
+        waited = 0.0
+        job = JobService.get_job(job_id, owner)
+        while job is None:
+            if waited >= JobService.EVENTS_WAIT_FOR_JOB_SECONDS:
+                return
+            await asyncio.sleep(interval)
+            waited += interval
+            job = JobService.get_job(job_id, owner)
+
+        last_event = None
+        last_sent = time.monotonic()
+        while True:
+            event = job.to_dict()
+            if event != last_event:
+                last_event = event
+                last_sent = time.monotonic()
+                yield event
+            elif time.monotonic() - last_sent >= JobService.EVENTS_HEARTBEAT_SECONDS:
+                last_sent = time.monotonic()
+                yield None
+            if event["status"] != "running":
+                return
+            await asyncio.sleep(interval)
+
+    @staticmethod
+    async def _watch(request: Optional[Request], job: Job) -> None:
+        """Cancel the job when the client goes away or the deadline passes."""
+        # Requests sent with an Idempotency-Key keep running after a disconnect
+        # so that the client's retry can pick up the result
+        watch_client = request is not None and not getattr(request.state, "idempotency_key", None)
+        while not job.token.cancelled:
+            if job.deadline and time.time() > job.deadline:
+                job.token.cancel(f"Job exceeded its {job.job_type} deadline", timed_out=True)
+                return
+            if watch_client and await request.is_disconnected():
+                job.token.cancel("Client disconnected")
+                return
+            await asyncio.sleep(JobService.WATCH_INTERVAL)
+
+    @staticmethod
+    async def run(request: Optional[Request], job_type: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Run a blocking conversion in the threadpool as a cancellable job.
+
+        The client may choose the job id with the ``X-Job-Id`` header so it can
+        cancel the job while waiting for the response; the jobs API only shows
+        the job to the same caller.
+        """
+        job = JobService._create_request_job(request, job_type)
+
+        context_token = _current_job.set(job)
+        watcher = asyncio.ensure_future(JobService._watch(request, job))
+        try:
+            result = await run_in_threadpool(func, *args, **kwargs)
+            job.token.raise_if_cancelled()
+            job.progress = 100.0
+            JobService.finish_job(job, "completed")
+            return result
+        except Exception:
+            if job.token.cancelled:
+                job.token.cleanup_artifacts()
+                JobService.finish_job(job, "timed_out" if job.token.timed_out else "cancelled")
+                job.token.raise_if_cancelled()
+            JobService.finish_job(job, "failed")
+            raise
+        finally:
+            watcher.cancel()
+            _current_job.reset(context_token)
+
+    @staticmethod
+    async def stream(request: Optional[Request], job_type: str, func: Callable[..., Iterator[Any]],
+                     *args: Any, **kwargs: Any) -> AsyncIterator[Any]:
+        """
+        Run a blocking generator as a cancellable job and yield its items as
+        they are produced, each step in the threadpool.
+
+        The response that streams the items may be sent from another task than
+        the one that started the job, so the job is carried in a context of
+        its own. Closing the iterator early (the client went away) cancels the
+        job, closes the generator and removes its artifacts.
+        """
+        job = JobService._create_request_job(request, job_type)
+
+        context = contextvars.copy_context()
+        context.run(_current_job.set, job)
+        watcher = asyncio.ensure_future(JobService._watch(request, job))
+        items: Optional[Iterator[Any]] = None
+        try:
+            items = await run_in_threadpool(context.run, func, *args, **kwargs)
+            while True:
+                item = await run_in_threadpool(context.run, next, items, _STREAM_END)
+                if item is _STREAM_END:
+                    break
+                yield item
+            job.token.raise_if_cancelled()
+            job.progress = 100.0
+            JobService.finish_job(job, "completed")
+        except Exception:
+            if job.token.cancelled:
+                job.token.cleanup_artifacts()
+                JobService.finish_job(job, "timed_out" if job.token.timed_out else "cancelled")
+                job.token.raise_if_cancelled()
+            JobService.finish_job(job, "failed")
+            raise
+        finally:
+            watcher.cancel()
+            if job.status == "running":
+                # No step is running: a cancelled step is still waited for. The
+                # generator is closed here because awaiting is not possible once
+                # the streaming task is cancelled.
+                job.token.cancel("Stream closed")
+                if items is not None and hasattr(items, "close"):
+                    context.run(items.close)
+                job.token.cleanup_artifacts()
+                JobService.finish_job(job, "cancelled")
@@ -1,20 +1,24 @@
 import os
 import io
 import base64
-from typing import Optional, Dict, Any, List, Tuple
-from PIL import Image
-import pytesseract
-import cv2
-import numpy as np
-from pdf2image import convert_from_path
+from collections import deque
+from typing import Optional, Dict, Any, Deque, Iterator, List, Sequence, Tuple
 import fitz  # PyMuPDF
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib import colors
-from app.core.exceptions import FileProcessingError
+from app.core.config import settings
+from app.core.exceptions import FileProcessingError, JobCancelledError
 from app.services.file_service import FileService
+from app.services import ocr_workers, pdf_workers
+from app.services.job_service import JobService
+from app.services.ocr_engine_service import OCREngineService
+from app.services.ocr_preprocess_service import OCRPreprocessService
+from app.services.ocr_workers import OCRResult, OCRWord
+from app.services.process_pool_service import ProcessPoolService
+from app.services.subprocess_service import SubprocessService
 
 
 class OCRConversionService:
@@ -25,32 +29,33 @@ class OCRConversionService:
         'PNG', 'JPG', 'JPEG', 'TIFF', 'BMP', 'PDF'
     }
     
+    # Fonts of the invisible text layer, loaded once
+    _TEXT_LAYER_FONTS: Dict[str, fitz.Font] = {}
+    
     @staticmethod
-    def extract_text_from_image(input_path: str, language: str = 'eng', ocr_engine: str = 'tesseract') -> str:
-        """Extract text from image using OCR."""
+    def extract_text_from_image(input_path: str, language: str = 'eng', ocr_engine: str = 'tesseract',
+                                preprocess: Optional[str] = None) -> str:
+        """
+        Extract text from image using OCR.
+        
+        The image is decoded straight to grayscale, prepared with the
+        ``preprocess`` tier (default ``settings.ocr_preprocess``) and read by
+        ``ocr_engine`` (tesseract, easyocr or paddleocr).
+        """
         try:
             if not os.path.exists(input_path):
                 raise FileProcessingError(f"Input image file not found: {input_path}")
             
-            # Load and preprocess image
-            image = Image.open(input_path)
-            
-            # Convert to RGB if necessary
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # Preprocess image for better OCR
-            processed_image = OCRConversionService._preprocess_image_for_ocr(image)
+            # Load image as a grayscale array
+            image = OCRPreprocessService.load_gray(input_path)
+            preprocess = preprocess or settings.ocr_preprocess
             
             # Extract text using specified OCR engine
-            if ocr_engine.lower() == 'tesseract':
-                text = OCRConversionService._extract_text_tesseract(processed_image, language)
-            else:
-                # Default to tesseract
-                text = OCRConversionService._extract_text_tesseract(processed_image, language)
-            
-            return text.strip()
+            result = OCREngineService.recognize(image, language, preprocess=preprocess, engine=ocr_engine)
+            return result.text.strip()
             
+        except (FileProcessingError, JobCancelledError):
+            raise
         except Exception as e:
             raise FileProcessingError(f"OCR text extraction failed: {str(e)}")
     
@@ -77,51 +82,161 @@ class OCRConversionService:
     
     @staticmethod
     def pdf_to_text_with_ocr(input_path: str, language: str = 'eng', ocr_engine: str = 'tesseract') -> str:
-        """Extract text from PDF using OCR."""
+        """
+        Extract text from PDF using OCR.
+        
+        Each page is read from its own text unless it is a scan (see
+        ``classify_pdf_pages``); only scanned pages are OCR'd, in parallel,
+        and all pages are put back together in page order.
+        """
         try:
             if not os.path.exists(input_path):
                 raise FileProcessingError(f"Input PDF file not found: {input_path}")
             
-            # First try to extract text directly from PDF
-            try:
-                doc = fitz.open(input_path)
-                direct_text = ""
-                for page in doc:
-                    direct_text += page.get_text()
-                doc.close()
-                
-                # If we got substantial text, return it
-                if len(direct_text.strip()) > 50:
-                    return direct_text.strip()
-            except:
-                pass  # Fall back to OCR
-            
-            # Convert PDF to images and extract text using OCR
-            images = convert_from_path(input_path, dpi=300)
-            all_text = ""
+            texts, ocr_pages = OCRConversionService.classify_pdf_pages(input_path)
+            if not ocr_pages:
+                # A digital document: return its text as it is
+                return "".join(texts[page_num] for page_num in sorted(texts)).strip()
             
-            for i, image in enumerate(images):
-                # Save temporary image
-                temp_path = FileService.get_output_path(f"temp_page_{i}", ".png")
-                image.save(temp_path)
-                
-                try:
-                    # Extract text from this page
-                    page_text = OCRConversionService.extract_text_from_image(temp_path, language, ocr_engine)
-                    all_text += f"\n--- Page {i+1} ---\n{page_text}\n"
-                finally:
-                    # Clean up temporary file
-                    if os.path.exists(temp_path):
-                        os.remove(temp_path)
+            for page_num, result in OCRConversionService.ocr_pdf_pages(input_path, ocr_pages, language, ocr_engine):
+                texts[page_num] = result.text
             
-            return all_text.strip()
+            return "".join(
+                f"\n--- Page {page_num + 1} ---\n{texts[page_num].strip()}\n" for page_num in sorted(texts)
+            ).strip()
             
+        except (FileProcessingError, JobCancelledError):
+            raise
         except Exception as e:
             raise FileProcessingError(f"PDF to text with OCR conversion failed: {str(e)}")
     
+    @staticmethod
+    def classify_pdf_pages(pdf_path: str) -> Tuple[Dict[int, str], List[int]]:
+        """
+        Sort the pages of a PDF into those with text of their own and scans
+        that need OCR (see ``pdf_workers.needs_ocr``). Returns the text of
+        each text page by page number, and the page numbers to OCR in order.
+        """
+        with fitz.open(pdf_path) as doc:
+            page_numbers = list(range(len(doc)))
+        page_count = len(page_numbers)
+        
+        JobService.set_stage("Classifying pages")
+        if not ProcessPoolService.should_parallelize(page_count):
+            classified = pdf_workers.classify_pages(page_numbers, pdf_path)
+        else:
+            classified = []
+            results = ProcessPoolService.map_shards(
+                pdf_workers.classify_pages, ProcessPoolService.shard(page_numbers), pdf_path
+            )
+            try:
+                for shard_result in results:
+                    classified.extend(shard_result)
+                    JobService.checkpoint(len(classified), page_count, "Classifying pages")
+            finally:
+                results.close()
+        
+        texts = {page_num: text.text for page_num, text in classified if text is not None}
+        ocr_pages = sorted(page_num for page_num, text in classified if text is None)
+        return texts, ocr_pages
+    
+    @staticmethod
+    def ocr_pdf_pages(pdf_path: str, page_numbers: Sequence[int], language: str = 'eng',
+                      ocr_engine: str = 'tesseract') -> Iterator[Tuple[int, OCRResult]]:
+        """
+        OCR the given pages of a PDF with ``ocr_engine``, yielding
+        ``(page_num, result)`` in page order, with word boxes in points.
+        
+        Pages are rendered here one at a time at ``settings.ocr_dpi`` and sent
+        to the engine's workers as in-memory PNGs, which preprocess them with the
+        ``settings.ocr_preprocess`` tier; a page is only rendered once a
+        worker slot is free, so a few pages per worker exist at any time
+        whatever the length of the document. The most page image bytes held
+        at once is recorded as the job's peak memory. No page images are
+        written to disk; results of pages seen before come from the OCR cache.
+        """
+        dpi = settings.ocr_dpi
+        preprocess = settings.ocr_preprocess
+        page_count = len(page_numbers)
+        # Encoded sizes of the pages rendered and not yet recognised
+        in_flight: Deque[int] = deque()
+        
+        def render() -> Iterator[bytes]:
+            with fitz.open(pdf_path) as doc:
+                for page_num in page_numbers:
+                    pix = ocr_workers.render_page(doc.load_page(page_num), dpi)
+                    image = pix.tobytes("png")
+                    JobService.record_memory(sum(in_flight) + len(pix.samples_mv) + len(image))
+                    del pix
+                    in_flight.append(len(image))
+                    yield image
+        
+        images = render()
+        parallel = ProcessPoolService.should_parallelize(page_count, settings.ocr_parallel_min_pages)
+        results = OCREngineService.recognize_all(images, language, dpi, preprocess, ocr_engine, parallel)
+        
+        JobService.set_stage("OCR pages")
+        try:
+            for index, (page_num, result) in enumerate(zip(page_numbers, results)):
+                in_flight.popleft()
+                yield page_num, result
+                JobService.checkpoint(index + 1, page_count, "OCR pages")
+        finally:
+            results.close()
+            images.close()
+    
+    @staticmethod
+    def _text_layer_font(text: str) -> Tuple[str, fitz.Font]:
+        """Helvetica for Latin-1 text, the built-in CJK font (which also covers Cyrillic and Greek) otherwise."""
+        try:
+            text.encode('latin-1')
+            fontname = 'helv'
+        except UnicodeEncodeError:
+            fontname = 'china-s'
+        font = OCRConversionService._TEXT_LAYER_FONTS.get(fontname)
+        if font is None:
+            font = OCRConversionService._TEXT_LAYER_FONTS[fontname] = fitz.Font(fontname)
+        return fontname, font
+    
+    @staticmethod
+    def add_text_layer(page: fitz.Page, words: Sequence[OCRWord]) -> None:
+        """
+        Put ``words`` on the page as invisible text (render mode 3), each
+        sized and stretched to cover its box, so the page can be searched and
+        selected but looks the same. Boxes are in displayed page coordinates.
+        """
+        if not words:
+            return
+        shape = page.new_shape()
+        derotate = page.derotation_matrix
+        rotation = page.rotation
+        for word in words:
+            width, height = word.x1 - word.x0, word.y1 - word.y0
+            if width <= 0 or height <= 0:
+                continue
+            fontname, font = OCRConversionService._text_layer_font(word.text)
+            # Size the line height (ascender to descender) to the box
+            fontsize = height / (font.ascender - font.descender)
+            length = font.text_length(word.text, fontsize)
+            stretch = width / length if length else 1.0
+            origin = fitz.Point(word.x0, word.y1 + font.descender * fontsize) * derotate
+            # The stretch runs along the text, which is vertical in unrotated space on 90/270 pages
+            morph = fitz.Matrix(stretch, 1) if rotation % 180 == 0 else fitz.Matrix(1, stretch)
+            shape.insert_text(
+                origin, word.text, fontname=fontname, fontsize=fontsize,
+                rotate=rotation, render_mode=3, morph=(origin, morph),
+            )
+        shape.commit()
+    
     @staticmethod
     def pdf_image_to_pdf_text(input_path: str, language: str = 'eng', ocr_engine: str = 'tesseract') -> str:
-        """Convert PDF with images to PDF with searchable text."""
+        """
+        Convert PDF with images to PDF with searchable text.
+        
+        Scanned pages are OCR'd in parallel and each recognised word is added
+        as invisible text over its place on the page; the page content is
+        unchanged. Pages with text of their own are left as they are.
+        """
         try:
             if not os.path.exists(input_path):
                 raise FileProcessingError(f"Input PDF file not found: {input_path}")
@@ -129,89 +244,22 @@ class OCRConversionService:
             # Generate output path
             output_path = FileService.get_output_path(input_path, "_searchable.pdf")
             
-            # Open PDF
-            doc = fitz.open(input_path)
-            
-            # Process each page
-            for page_num in range(len(doc)):
-                page = doc[page_num]
+            _, ocr_pages = OCRConversionService.classify_pdf_pages(input_path)
+            with fitz.open(input_path) as doc:
+                for page_num, result in OCRConversionService.ocr_pdf_pages(input_path, ocr_pages, language, ocr_engine):
+                    OCRConversionService.add_text_layer(doc[page_num], result.words)
                 
-                # Convert page to image
-                mat = fitz.Matrix(2.0, 2.0)  # High resolution
-                pix = page.get_pixmap(matrix=mat)
-                img_data = pix.tobytes("png")
-                
-                # Save temporary image
-                temp_path = FileService.get_output_path(f"temp_page_{page_num}", ".png")
-                with open(temp_path, "wb") as f:
-                    f.write(img_data)
-                
-                try:
-                    # Extract text using OCR
-                    extracted_text = OCRConversionService.extract_text_from_image(temp_path, language, ocr_engine)
-                    
-                    # Add text to PDF page
-                    if extracted_text.strip():
-                        # Create text block
-                        text_rect = fitz.Rect(0, 0, page.rect.width, page.rect.height)
-                        page.insert_textbox(text_rect, extracted_text, fontsize=12, color=(0, 0, 0))
-                
-                finally:
-                    # Clean up temporary file
-                    if os.path.exists(temp_path):
-                        os.remove(temp_path)
-            
-            # Save the modified PDF
-            doc.save(output_path)
-            doc.close()
+                JobService.set_stage("Saving")
+                JobService.add_artifact(output_path)
+                doc.save(output_path, deflate=True)
             
             return output_path
             
+        except (FileProcessingError, JobCancelledError):
+            raise
         except Exception as e:
             raise FileProcessingError(f"PDF image to PDF text conversion failed: {str(e)}")
     
-    @staticmethod
-    def _preprocess_image_for_ocr(image: Image.Image) -> Image.Image:
-        """Preprocess image for better OCR results."""
-        try:
-            # Convert PIL image to OpenCV format
-            cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-            
-            # Convert to grayscale
-            gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
-            
-            # Apply denoising
-            denoised = cv2.fastNlMeansDenoising(gray)
-            
-            # Apply thresholding
-            _, thresh = cv2.threshold(denoised, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-            
-            # Convert back to PIL
-            processed_image = Image.fromarray(thresh)
-            
-            return processed_image
-            
-        except Exception as e:
-            # If preprocessing fails, return original image
-            return image
-    
-    @staticmethod
-    def _extract_text_tesseract(image: Image.Image, language: str = 'eng') -> str:
-        """Extract text using Tesseract OCR."""
-        try:
-            # Configure tesseract path if needed
-            if os.name == 'nt':  # Windows
-                tesseract_path = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
-                if os.path.exists(tesseract_path):
-                    pytesseract.pytesseract.tesseract_cmd = tesseract_path
-            
-            # Extract text
-            text = pytesseract.image_to_string(image, lang=language)
-            return text
-            
-        except Exception as e:
-            raise FileProcessingError(f"Tesseract OCR failed: {str(e)}")
-    
     @staticmethod
     def _create_pdf_with_text(text: str, output_path: str, original_image_path: str):
         """Create PDF with extracted text and original image."""
@@ -265,9 +313,10 @@ class OCRConversionService:
     def get_supported_languages() -> List[str]:
         """Get list of supported OCR languages."""
         try:
-            # Get available languages from tesseract
-            langs = pytesseract.get_languages()
-            return langs
+            # Get available languages from tesseract; the first line is a heading
+            result = SubprocessService.run([OCREngineService.tesseract_cmd(), '--list-langs'], text=True)
+            result.check_returncode()
+            return [line.strip() for line in result.stdout.splitlines()[1:] if line.strip()]
         except:
             # Return default languages if tesseract is not properly configured
             return ['eng', 'spa', 'fra', 'deu', 'ita', 'por', 'rus', 'ara', 'chi_sim', 'chi_tra']
@@ -275,7 +324,12 @@ class OCRConversionService:
     @staticmethod
     def get_supported_ocr_engines() -> List[str]:
         """Get list of supported OCR engines."""
-        return ['tesseract']  # Can be extended with other engines
+        return OCREngineService.available_engines()
+    
+    @staticmethod
+    def get_ocr_engine_stats() -> Dict[str, Dict[str, Any]]:
+        """Get OCR throughput per engine."""
+        return OCREngineService.engine_stats()
     
     @staticmethod
     def cleanup_temp_files(*file_paths: str) -> None:
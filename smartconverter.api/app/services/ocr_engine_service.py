@@ -0,0 +1,213 @@
+"""
+OCR Engine Service
+
+Single entry point for recognising images: one engine pass returns the text
+together with each word's box and confidence (``OCRResult``).
+
+Each engine - tesseract, easyocr or paddleocr - runs in its own pool of
+``ProcessPoolService`` workers, which load the engine and the languages in
+``settings.ocr_preload_languages`` when they start and keep them (see
+``ocr_workers``), so requests go to workers that are already warm. Workers
+are replaced after ``settings.ocr_worker_max_jobs`` images to release memory
+the models grow. Without tesserocr, tesseract has no state to keep: the CLI
+is run under the current job via ``SubprocessService``, and only documents
+worth spreading out go to the pool. Either way results go through the
+on-disk OCR cache (``settings.ocr_cache_dir``), and each engine's throughput
+is counted (``engine_stats``).
+"""
+
+import io
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+import numpy as np
+from PIL import Image
+
+from app.core.config import settings
+from app.core.exceptions import FileProcessingError
+from app.services import ocr_workers
+from app.services.ocr_preprocess_service import OCRPreprocessService
+from app.services.ocr_workers import OCRCache, OCRResult
+from app.services.process_pool_service import ProcessPoolService, WorkerPool
+from app.services.subprocess_service import SubprocessService
+
+# Images the engine accepts: PIL images, NumPy arrays (as OpenCV decodes them) or encoded bytes
+OCRImage = Union[Image.Image, np.ndarray, bytes]
+
+
+class OCREngineService:
+    """Recognise images with the requested OCR engine on warm engine workers."""
+
+    # Images, cache hits and engine seconds per engine since the server started
+    _stats: Dict[str, Dict[str, float]] = {}
+    _stats_lock = threading.Lock()
+
+    @staticmethod
+    def persistent(engine: str = ocr_workers.DEFAULT_ENGINE) -> bool:
+        """Whether ``engine`` runs on models kept in its pool workers."""
+        return engine != ocr_workers.DEFAULT_ENGINE or ocr_workers.TESSEROCR_AVAILABLE
+
+    @staticmethod
+    def available_engines() -> List[str]:
+        return [engine for engine in ocr_workers.ENGINES if ocr_workers.engine_available(engine)]
+
+    @staticmethod
+    def check_engine(engine: Optional[str], language: str) -> str:
+        """The engine name to use, after checking it is installed and reads ``language``."""
+        engine = (engine or ocr_workers.DEFAULT_ENGINE).lower()
+        if engine not in ocr_workers.ENGINES:
+            raise FileProcessingError(
+                f"Unsupported OCR engine {engine}; use one of {', '.join(ocr_workers.ENGINES)}"
+            )
+        if not ocr_workers.engine_available(engine):
+            raise FileProcessingError(f"OCR engine {engine} is not installed")
+        try:
+            ocr_workers.engine_languages(engine, language)
+        except ValueError as e:
+            raise FileProcessingError(str(e))
+        return engine
+
+    @staticmethod
+    def tesseract_cmd() -> str:
+        """Get the tesseract executable to run."""
+        if settings.tesseract_path:
+            return settings.tesseract_path
+        if os.name == 'nt':  # Windows
+            tesseract_path = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+            if os.path.exists(tesseract_path):
+                return tesseract_path
+        return 'tesseract'
+
+    @staticmethod
+    def cache() -> Optional[OCRCache]:
+        """The OCR result cache, or None when it is disabled."""
+        if settings.ocr_cache_max_bytes <= 0:
+            return None
+        return OCRCache(settings.ocr_cache_dir, settings.ocr_cache_max_bytes)
+
+    @staticmethod
+    def pool(engine: str) -> WorkerPool:
+        """The worker pool of ``engine``, whose workers share the cores between them."""
+        workers = settings.ocr_pool_workers or ProcessPoolService.max_workers()
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        languages = tuple(
+            language.strip() for language in settings.ocr_preload_languages.split(",") if language.strip()
+        )
+        return WorkerPool(
+            f"ocr-{engine}", workers, ocr_workers.load_engine, (engine, languages, threads),
+            settings.ocr_worker_max_jobs or None,
+        )
+
+    @staticmethod
+    def encode(image: OCRImage) -> bytes:
+        """PNG bytes of a PIL image or NumPy array; encoded images are returned as they are."""
+        if isinstance(image, np.ndarray):
+            return OCRPreprocessService.encode_png(image)
+        if not isinstance(image, Image.Image):
+            return image
+        if image.mode not in ('1', 'L', 'LA', 'P', 'RGB', 'RGBA'):
+            image = image.convert('RGB')
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    @staticmethod
+    def run_tesseract(image: OCRImage, language: str = 'eng', output: str = 'txt',
+                      dpi: Optional[int] = None) -> str:
+        """
+        Run the tesseract CLI on an in-memory image.
+
+        The image (a PIL image, NumPy array, or encoded image such as PNG) is
+        piped to tesseract's stdin and the result read from stdout, so no
+        temporary files are written. ``output`` is a tesseract config name such as
+        ``txt`` or ``tsv``.
+        """
+        cmd = ocr_workers.tesseract_command(OCREngineService.tesseract_cmd(), language, output, dpi)
+        result = SubprocessService.run(cmd, input=OCREngineService.encode(image), text=True)
+        if result.returncode != 0:
+            raise FileProcessingError(f"Tesseract exited with code {result.returncode}: {result.stderr.strip()}")
+        return result.stdout
+
+    @staticmethod
+    def _recognize_here(image: OCRImage, language: str, dpi: Optional[int], preprocess: Optional[str]) -> OCRResult:
+        """Recognise an image with the tesseract CLI in the current thread, through the cache."""
+        cache = OCREngineService.cache()
+        if isinstance(image, Image.Image):
+            image = OCREngineService.encode(image)
+        bitmap, data = ocr_workers.prepare_image(image, preprocess)
+        key = ocr_workers.cache_key(bitmap, language, dpi)
+        result = ocr_workers.load_cached(cache, key)
+        if result is None:
+            started = time.perf_counter()
+            tsv = OCREngineService.run_tesseract(data, language, 'tsv', dpi)
+            result = ocr_workers.ocr_result(tsv, dpi)._replace(seconds=time.perf_counter() - started)
+            ocr_workers.store_cached(cache, key, result)
+        return result
+
+    @staticmethod
+    def recognize_all(images: Iterable[OCRImage], language: str = 'eng', dpi: Optional[int] = None,
+                      preprocess: Optional[str] = None, engine: str = ocr_workers.DEFAULT_ENGINE,
+                      parallel: bool = False) -> Iterator[OCRResult]:
+        """
+        Recognise images with ``engine``, yielding results in order; images
+        are only taken from ``images`` as workers become free. ``parallel``
+        sends tesseract CLI runs to its pool too.
+        """
+        engine = OCREngineService.check_engine(engine, language)
+        # Warm models live in the pool workers, so use them whenever there are any
+        if OCREngineService.persistent(engine) or parallel:
+            results = ProcessPoolService.imap(
+                ocr_workers.recognize_image, (OCREngineService.encode(image) for image in images), language, dpi,
+                OCREngineService.tesseract_cmd(), settings.subprocess_timeout_seconds, preprocess,
+                OCREngineService.cache(), engine=engine, cpu_limit=settings.subprocess_cpu_limit_seconds,
+                pool=OCREngineService.pool(engine),
+            )
+        else:
+            results = (OCREngineService._recognize_here(image, language, dpi, preprocess) for image in images)
+        try:
+            for result in results:
+                OCREngineService.record(engine, result)
+                yield result
+        finally:
+            results.close()
+
+    @staticmethod
+    def recognize(image: OCRImage, language: str = 'eng', dpi: Optional[int] = None,
+                  preprocess: Optional[str] = None, engine: str = ocr_workers.DEFAULT_ENGINE) -> OCRResult:
+        """
+        Recognise an image in a single pass, after the ``preprocess`` tier
+        (see OCRPreprocessService) if one is given, or take its result from
+        the OCR cache. ``dpi`` is the resolution the image was rendered at:
+        word boxes are in points when it is given and in pixels otherwise.
+        """
+        results = OCREngineService.recognize_all([image], language, dpi, preprocess, engine)
+        try:
+            return next(results)
+        finally:
+            results.close()
+
+    @staticmethod
+    def record(engine: str, result: OCRResult) -> None:
+        with OCREngineService._stats_lock:
+            stats = OCREngineService._stats.setdefault(engine, {"images": 0, "cached": 0, "seconds": 0.0})
+            stats["images"] += 1
+            if result.seconds is None:
+                stats["cached"] += 1
+            else:
+                stats["seconds"] += result.seconds
+
+    @staticmethod
+    def engine_stats() -> Dict[str, Dict[str, Any]]:
+        """
+        Throughput of each engine: images recognised and served from the
+        cache, and images per second of engine time in one worker.
+        """
+        with OCREngineService._stats_lock:
+            stats = {engine: dict(values) for engine, values in OCREngineService._stats.items()}
+        for values in stats.values():
+            recognised = values["images"] - values["cached"]
+            values["seconds"] = round(values["seconds"], 3)
+            values["images_per_second"] = round(recognised / values["seconds"], 3) if values["seconds"] else None
+        return stats
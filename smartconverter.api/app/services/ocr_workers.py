@@ -0,0 +1,520 @@
+"""
+OCR Workers
+
+OCR run in ``ProcessPoolService`` workers. Images arrive encoded in memory
+(PDF pages as grayscale PNGs) and are recognised in one pass that gives text,
+word boxes and confidences (tesseract's TSV output). Nothing is written to
+disk.
+
+Each engine (tesseract, easyocr, paddleocr) has its own pool, whose workers
+load the engine and its language models when they start (``load_engine``)
+and keep them, so models are loaded once per worker rather than once per
+image. With tesserocr installed tesseract runs the same way; otherwise the
+tesseract CLI is run per image. easyocr and paddleocr find lines of text,
+which are split into words like tesseract's (``detections_result``).
+Inference stays on the CPU. Like ``pdf_workers``, this module only imports
+what the workers need: the deep learning engines are imported by the
+workers that use them.
+
+Results are cached on disk (``OCRCache``) under a hash of the bitmap OCR
+actually reads, after preprocessing, with the language, resolution and
+engine, so the same scan uploaded again as an image or inside a PDF is not
+recognised twice. Workers read and write the cache themselves.
+
+The tesseract CLI is run here with ``subprocess`` rather than through
+``SubprocessService``: workers are separate processes with no current job,
+so a child cannot be registered with a job or have its usage recorded on it.
+It gets the same limits instead - the wall-clock timeout and the CPU-time
+limit from the settings, passed in by ``OCREngineService`` - and a
+cancelled job stops sending images, so at most the images already running
+finish, each within those limits.
+"""
+
+import hashlib
+import importlib.util
+import io
+import json
+import logging
+import os
+import re
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image
+
+from app.services.ocr_preprocess_service import OCRPreprocessService
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tesserocr
+    TESSEROCR_AVAILABLE = True
+except ImportError:
+    tesserocr = None
+    TESSEROCR_AVAILABLE = False
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    resource = None
+    RESOURCE_AVAILABLE = False
+
+# Checked without importing: both load a deep learning framework
+EASYOCR_AVAILABLE = importlib.util.find_spec("easyocr") is not None
+PADDLEOCR_AVAILABLE = importlib.util.find_spec("paddleocr") is not None
+
+DEFAULT_ENGINE = "tesseract"
+ENGINES = ("tesseract", "easyocr", "paddleocr")
+# Tesseract language codes, which the API takes, in the codes of the other engines
+ENGINE_LANGUAGES = {
+    "easyocr": {
+        "eng": "en", "deu": "de", "fra": "fr", "spa": "es", "ita": "it", "por": "pt", "rus": "ru",
+        "ara": "ar", "hin": "hi", "urd": "ur", "jpn": "ja", "kor": "ko", "chi_sim": "ch_sim", "chi_tra": "ch_tra",
+    },
+    "paddleocr": {
+        "eng": "en", "deu": "german", "fra": "french", "spa": "es", "ita": "it", "por": "pt", "rus": "ru",
+        "ara": "ar", "hin": "hi", "urd": "ur", "jpn": "japan", "kor": "korean", "chi_sim": "ch", "chi_tra": "chinese_cht",
+    },
+}
+
+# Tesseract TSV level of a word row
+TSV_WORD_LEVEL = 5
+TSV_HEADER = "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext"
+# Tesseract API handles (one per language) kept per worker
+MAX_TESSERACT_APIS = 4
+# Extra CPU seconds between the soft (SIGXCPU) and hard (SIGKILL) limit, as in SubprocessService
+CPU_LIMIT_GRACE_SECONDS = 5
+# easyocr / paddleocr models (one per language set) kept per worker; each takes hundreds of MB
+MAX_ENGINE_READERS = 2
+# Bump when cached results change shape or meaning
+CACHE_VERSION = 1
+# Stores between rescans of the cache directory, and the share of its limit eviction brings it down to
+CACHE_SCAN_STORES = 100
+CACHE_EVICT_TO = 0.9
+
+
+class OCRWord(NamedTuple):
+    """
+    A recognised word. The box is in pixels of the image, or in points of
+    the page as displayed (``page.rect``) for rendered PDF pages.
+    """
+    x0: float
+    y0: float
+    x1: float
+    y1: float
+    text: str
+    conf: float
+    block_num: int
+    par_num: int
+    line_num: int
+
+
+class OCRResult(NamedTuple):
+    """
+    Text and words of an image from one recognition pass; ``seconds`` is
+    the time the engine took, None when the result came from the cache.
+    """
+    text: str
+    words: List[OCRWord]
+    seconds: Optional[float] = None
+
+
+class OCRCache(NamedTuple):
+    """The on-disk result cache: its directory and size limit in bytes."""
+    directory: str
+    max_bytes: int
+
+
+_apis: "OrderedDict[str, Any]" = OrderedDict()
+_readers: "OrderedDict[Tuple[str, str], Any]" = OrderedDict()
+# Inference threads of this worker, set by load_engine
+_threads: Optional[int] = None
+# Per cache directory: this process's running total of its size (None until scanned) and stores since the scan
+_cache_totals: Dict[str, Tuple[Optional[int], int]] = {}
+_cache_lock = threading.Lock()
+
+
+def engine_available(engine: str) -> bool:
+    """Whether ``engine`` is installed; tesseract is an external program, found when it runs."""
+    return {
+        "tesseract": True,
+        "easyocr": EASYOCR_AVAILABLE,
+        "paddleocr": PADDLEOCR_AVAILABLE,
+    }.get(engine, False)
+
+
+def engine_languages(engine: str, language: str) -> List[str]:
+    """A tesseract language string (``eng+deu``) in the language codes ``engine`` takes."""
+    if engine == DEFAULT_ENGINE:
+        return [language]
+    codes = ENGINE_LANGUAGES[engine]
+    try:
+        return [codes[code] for code in language.split("+")]
+    except KeyError as e:
+        raise ValueError(f"{engine} does not support language {e.args[0]}")
+
+
+def render_page(page: fitz.Page, dpi: int) -> fitz.Pixmap:
+    """Render a page for OCR as a grayscale pixmap."""
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+    pix.set_dpi(dpi, dpi)
+    return pix
+
+
+def tesseract_command(tesseract_cmd: str, language: str, output: str = "txt", dpi: Optional[int] = None) -> List[str]:
+    """Tesseract arguments reading an image from stdin and writing ``output`` to stdout."""
+    cmd = [tesseract_cmd, "stdin", "stdout", "-l", language]
+    if dpi:
+        cmd += ["--dpi", str(dpi)]
+    if output != "txt":
+        cmd.append(output)
+    return cmd
+
+
+def parse_tsv(tsv: str) -> Dict[str, List[Any]]:
+    """Parse tesseract TSV output into column lists (``text``, ``conf``, ``line_num``, ...)."""
+    rows = [line.split("\t") for line in tsv.splitlines() if line]
+    if not rows:
+        return {}
+    header = rows[0]
+    data: Dict[str, List[Any]] = {column: [] for column in header}
+    for row in rows[1:]:
+        # Rows without text have no trailing text column
+        row = row + [""] * (len(header) - len(row))
+        for column, value in zip(header, row):
+            if column == "text":
+                data[column].append(value)
+            elif column == "conf":
+                data[column].append(float(value) if value else -1.0)
+            else:
+                data[column].append(int(value) if value else 0)
+    return data
+
+
+def tsv_words(tsv: str, dpi: Optional[int] = None) -> List[OCRWord]:
+    """The words of TSV output; boxes are scaled from pixels to points when ``dpi`` is given."""
+    data = parse_tsv(tsv)
+    scale = 72.0 / dpi if dpi else 1.0
+    words = []
+    for index, text in enumerate(data.get("text", [])):
+        text = text.strip()
+        if data["level"][index] != TSV_WORD_LEVEL or not text:
+            continue
+        left, top = data["left"][index], data["top"][index]
+        words.append(OCRWord(
+            left * scale,
+            top * scale,
+            (left + data["width"][index]) * scale,
+            (top + data["height"][index]) * scale,
+            text,
+            data["conf"][index],
+            data["block_num"][index],
+            data["par_num"][index],
+            data["line_num"][index],
+        ))
+    return words
+
+
+def words_text(words: Sequence[OCRWord]) -> str:
+    """Plain text of the words as tesseract lays it out: lines on their own line, a blank line between paragraphs."""
+    paragraphs: List[List[str]] = []
+    lines: List[List[str]] = []
+    paragraph = line = None
+    for word in words:
+        if (word.block_num, word.par_num) != paragraph:
+            paragraph = (word.block_num, word.par_num)
+            lines = []
+            paragraphs.append(lines)
+            line = None
+        if word.line_num != line:
+            line = word.line_num
+            lines.append([])
+        lines[-1].append(word.text)
+    return "\n\n".join("\n".join(" ".join(line) for line in lines) for lines in paragraphs)
+
+
+def ocr_result(tsv: str, dpi: Optional[int] = None) -> OCRResult:
+    words = tsv_words(tsv, dpi)
+    return OCRResult(words_text(words), words)
+
+
+def _limit_cpu(cpu_limit: Optional[int]):
+    """preexec_fn applying the CPU-time limit in the child."""
+    if not cpu_limit or not RESOURCE_AVAILABLE:
+        return None
+
+    def _apply() -> None:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_limit + CPU_LIMIT_GRACE_SECONDS))
+
+    return _apply
+
+
+def run_tesseract(cmd: List[str], image: bytes, timeout: Optional[float] = None,
+                  cpu_limit: Optional[int] = None) -> str:
+    """Run tesseract on an encoded image and return its stdout, within ``timeout`` and ``cpu_limit`` seconds."""
+    result = subprocess.run(
+        cmd, input=image, capture_output=True, timeout=timeout or None, preexec_fn=_limit_cpu(cpu_limit)
+    )
+    if result.returncode != 0:
+        stderr = result.stderr.decode("utf-8", errors="replace").strip()
+        raise RuntimeError(f"Tesseract exited with code {result.returncode}: {stderr}")
+    return result.stdout.decode("utf-8", errors="replace")
+
+
+def _tesseract_api(language: str):
+    """This worker's tesseract API for ``language``, initialised on first use."""
+    api = _apis.pop(language, None)
+    if api is None:
+        api = tesserocr.PyTessBaseAPI(lang=language)
+    _apis[language] = api
+    while len(_apis) > MAX_TESSERACT_APIS:
+        _apis.popitem(last=False)[1].End()
+    return api
+
+
+def recognize_tsv(image: bytes, language: str, dpi: Optional[int], tesseract_cmd: str,
+                  timeout: Optional[float] = None, cpu_limit: Optional[int] = None) -> str:
+    """Recognise an encoded image and return tesseract's TSV output."""
+    if not TESSEROCR_AVAILABLE:
+        return run_tesseract(tesseract_command(tesseract_cmd, language, "tsv", dpi), image, timeout, cpu_limit)
+    api = _tesseract_api(language)
+    with Image.open(io.BytesIO(image)) as img:
+        api.SetImage(img)
+        if dpi:
+            api.SetSourceResolution(dpi)
+        api.Recognize()
+        return TSV_HEADER + "\n" + api.GetTSVText(0)
+
+
+def load_engine(engine: str, languages: Sequence[str], threads: int) -> None:
+    """
+    Start a worker of an engine pool: keep inference on the CPU with
+    ``threads`` threads, so the pool's workers do not compete for cores,
+    and load the models of ``languages`` before the first image arrives.
+    """
+    global _threads
+    _threads = threads
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+    # Tesseract's own OpenMP threads, for the CLI and tesserocr alike
+    os.environ["OMP_THREAD_LIMIT"] = str(threads)
+    for language in languages:
+        if engine != DEFAULT_ENGINE:
+            _engine_reader(engine, language)
+        elif TESSEROCR_AVAILABLE:
+            _tesseract_api(language)
+
+
+def _engine_reader(engine: str, language: str):
+    """This worker's easyocr or paddleocr model for ``language``, loaded on first use."""
+    key = (engine, language)
+    reader = _readers.pop(key, None)
+    if reader is None:
+        languages = engine_languages(engine, language)
+        threads = _threads or os.cpu_count() or 1
+        if engine == "easyocr":
+            import easyocr
+            import torch
+            torch.set_num_threads(threads)
+            reader = easyocr.Reader(languages, gpu=False, verbose=False)
+        else:
+            from paddleocr import PaddleOCR
+            # A PaddleOCR model reads one language
+            reader = PaddleOCR(lang=languages[0], use_angle_cls=False, use_gpu=False,
+                               cpu_threads=threads, show_log=False)
+    _readers[key] = reader
+    while len(_readers) > MAX_ENGINE_READERS:
+        _readers.popitem(last=False)
+    return reader
+
+
+def engine_detections(engine: str, language: str, bitmap: np.ndarray) -> List[Tuple[Any, str, float]]:
+    """Lines of text easyocr or paddleocr finds, as ``(polygon, text, confidence 0-1)``."""
+    reader = _engine_reader(engine, language)
+    if engine == "easyocr":
+        return [(box, text, conf) for box, text, conf in reader.readtext(bitmap)]
+    pages = reader.ocr(bitmap, cls=False)
+    return [(box, text, conf) for box, (text, conf) in (pages[0] or [])]
+
+
+def _line_words(box: Tuple[float, float, float, float, str, float], par_num: int, line_num: int) -> Iterator[OCRWord]:
+    """Split a detected line into words, sharing its width out by characters."""
+    x0, y0, x1, y1, text, conf = box
+    per_char = (x1 - x0) / len(text)
+    for match in re.finditer(r"\S+", text):
+        yield OCRWord(x0 + match.start() * per_char, y0, x0 + match.end() * per_char, y1,
+                      match.group(), conf, 1, par_num, line_num)
+
+
+def detections_result(detections: Iterable[Tuple[Any, str, float]], dpi: Optional[int] = None) -> OCRResult:
+    """
+    Words and text of ``(polygon, text, confidence 0-1)`` detections.
+
+    Detections whose vertical centres fall within the same line are read
+    left to right, a new paragraph starts where the gap above a line is
+    taller than the line before it, and boxes are scaled to points when
+    ``dpi`` is given, so the result matches tesseract's.
+    """
+    scale = 72.0 / dpi if dpi else 1.0
+    boxes = []
+    for polygon, text, conf in detections:
+        text = text.strip()
+        if not text:
+            continue
+        xs = [point[0] for point in polygon]
+        ys = [point[1] for point in polygon]
+        boxes.append((min(xs) * scale, min(ys) * scale, max(xs) * scale, max(ys) * scale, text, float(conf) * 100))
+
+    lines: List[List[Tuple[float, float, float, float, str, float]]] = []
+    for box in sorted(boxes, key=lambda box: box[1] + box[3]):
+        if lines and lines[-1][0][1] <= (box[1] + box[3]) / 2 <= lines[-1][0][3]:
+            lines[-1].append(box)
+        else:
+            lines.append([box])
+
+    words: List[OCRWord] = []
+    par_num, previous = 1, None
+    for line_num, line in enumerate(lines, 1):
+        top, bottom = min(box[1] for box in line), max(box[3] for box in line)
+        if previous is not None and top - previous[1] > previous[1] - previous[0]:
+            par_num += 1
+        previous = (top, bottom)
+        for box in sorted(line):
+            words.extend(_line_words(box, par_num, line_num))
+    return OCRResult(words_text(words), words)
+
+
+def prepare_image(image: Union[bytes, np.ndarray], preprocess: Optional[str] = None) -> Tuple[np.ndarray, bytes]:
+    """
+    The grayscale bitmap OCR reads, after the ``preprocess`` tier (see
+    OCRPreprocessService), and the encoded image sent to tesseract. Without
+    preprocessing an encoded image is sent as it is.
+    """
+    if isinstance(image, np.ndarray):
+        bitmap = OCRPreprocessService.to_gray(image)
+    else:
+        bitmap = OCRPreprocessService.decode_gray(image)
+    if preprocess:
+        bitmap = OCRPreprocessService.preprocess(bitmap, preprocess)
+        return bitmap, OCRPreprocessService.encode_png(bitmap)
+    if isinstance(image, np.ndarray):
+        return bitmap, OCRPreprocessService.encode_png(image)
+    return bitmap, image
+
+
+def cache_key(bitmap: np.ndarray, language: str, dpi: Optional[int], engine: str = DEFAULT_ENGINE) -> str:
+    """Hash of a bitmap with the settings its result depends on."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([CACHE_VERSION, engine, language, dpi, bitmap.shape]).encode("utf-8"))
+    digest.update(np.ascontiguousarray(bitmap).data)
+    return digest.hexdigest()
+
+
+def _cache_path(cache: OCRCache, key: str) -> str:
+    return os.path.join(cache.directory, f"{key}.json")
+
+
+def load_cached(cache: Optional[OCRCache], key: str) -> Optional[OCRResult]:
+    """A cached result, or None on a miss."""
+    if not cache or cache.max_bytes <= 0:
+        return None
+    path = _cache_path(cache, key)
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        # Touch it so eviction removes the least recently used entries
+        os.utime(path)
+    except (OSError, ValueError):
+        return None
+    return OCRResult(data["text"], [OCRWord(*word) for word in data["words"]])
+
+
+def _evict(cache: OCRCache) -> int:
+    """Remove the least recently used entries until the cache is below its eviction target; returns its size."""
+    entries = []
+    with os.scandir(cache.directory) as it:
+        for entry in it:
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    target = cache.max_bytes * CACHE_EVICT_TO
+    for _, size, entry_path in sorted(entries):
+        if total <= target:
+            break
+        try:
+            os.remove(entry_path)
+        except FileNotFoundError:
+            pass
+        total -= size
+    return total
+
+
+def store_cached(cache: Optional[OCRCache], key: str, result: OCRResult) -> None:
+    """
+    Add a result to the cache, evicting the least recently used entries over
+    its size limit. Threads and workers may do this at once: each write is
+    atomic and entries already removed by another writer are skipped. The
+    directory is only scanned when this process's running total of the cache
+    size passes the limit, or every CACHE_SCAN_STORES stores to catch up with
+    other processes' writes. A cache that cannot be written is skipped.
+    """
+    if not cache or cache.max_bytes <= 0:
+        return
+    data = json.dumps({"text": result.text, "words": result.words}, ensure_ascii=False).encode("utf-8")
+    if len(data) > cache.max_bytes:
+        return
+    path = _cache_path(cache, key)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(cache.directory, exist_ok=True)
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+        with _cache_lock:
+            total, stores = _cache_totals.get(cache.directory, (None, 0))
+            stores += 1
+            if total is not None:
+                total += len(data)
+            if total is None or total > cache.max_bytes or stores >= CACHE_SCAN_STORES:
+                total, stores = _evict(cache), 0
+            _cache_totals[cache.directory] = (total, stores)
+    except OSError as e:
+        logger.warning("Could not store OCR result in the cache: %s", e)
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+
+def recognize_image(image: Union[bytes, np.ndarray], language: str, dpi: Optional[int], tesseract_cmd: str,
+                    timeout: Optional[float] = None, preprocess: Optional[str] = None,
+                    cache: Optional[OCRCache] = None, engine: str = DEFAULT_ENGINE,
+                    cpu_limit: Optional[int] = None) -> OCRResult:
+    """
+    Preprocess and recognise one image with ``engine``, or take its result
+    from ``cache``; word boxes are in points when ``dpi`` is given.
+    ``timeout`` and ``cpu_limit`` bound a tesseract CLI run.
+    """
+    bitmap, image = prepare_image(image, preprocess)
+    key = cache_key(bitmap, language, dpi, engine)
+    result = load_cached(cache, key)
+    if result is None:
+        started = time.perf_counter()
+        if engine == DEFAULT_ENGINE:
+            result = ocr_result(recognize_tsv(image, language, dpi, tesseract_cmd, timeout, cpu_limit), dpi)
+        else:
+            result = detections_result(engine_detections(engine, language, bitmap), dpi)
+        result = result._replace(seconds=time.perf_counter() - started)
+        store_cached(cache, key, result)
+    return result
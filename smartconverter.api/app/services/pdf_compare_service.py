@@ -0,0 +1,300 @@
+"""
+PDF Compare Service
+
+Compares two PDFs page by page:
+
+1. Each page is reduced to a hash of its normalized text (or of its content
+   stream when it has no text), and the two hash sequences are aligned with
+   Myers' O(ND) diff, so inserted or deleted pages do not make every later
+   page look changed.
+2. Aligned pages whose hashes differ get a line diff of their text, with a
+   word diff inside replaced lines.
+3. Optionally a visual diff PDF is written: the second document with added
+   words highlighted, removed words noted, and deleted pages put back in
+   place with a banner.
+
+Only page hashes are kept for whole documents; page text comes from the
+shared text cache one page pair at a time, and the JSON report is written as
+it is produced, so memory stays bounded on very long documents.
+"""
+
+import hashlib
+import json
+import os
+from contextlib import nullcontext
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import fitz  # PyMuPDF
+
+from app.core.exceptions import FileProcessingError, JobCancelledError
+from app.services.job_service import JobService
+from app.services.text_extraction_service import TextExtractionService
+
+# (tag, a_start, a_end, b_start, b_end), tags as in difflib: equal, replace, delete, insert
+Opcode = Tuple[str, int, int, int, int]
+
+ADDED_COLOR = (0.55, 0.95, 0.55)
+REMOVED_COLOR = (0.9, 0.1, 0.1)
+
+
+class PDFCompareService:
+    """Align, diff and visualize the differences between two PDFs."""
+
+    # Diffs costlier than this are reported as a single replacement (bounds time and memory)
+    MAX_EDIT_DISTANCE = 1000
+    # Removed text shown per note in the visual diff
+    MAX_NOTE_CHARS = 500
+
+    @staticmethod
+    def _myers_moves(a: Sequence[Any], b: Sequence[Any], max_cost: int) -> Optional[List[str]]:
+        """Shortest edit script from ``a`` to ``b`` as ``equal``/``delete``/``insert`` steps, or None if it costs more than ``max_cost``."""
+        n, m = len(a), len(b)
+        max_d = min(n + m, max_cost)
+        offset = max_d + 1
+        v = [0] * (2 * max_d + 3)
+        trace = []
+        for d in range(max_d + 1):
+            # Furthest x per diagonal k after d - 1 edits, for k in [-d - 1, d + 1]
+            trace.append(v[offset - d - 1:offset + d + 2])
+            for k in range(-d, d + 1, 2):
+                if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                    x = v[offset + k + 1]
+                else:
+                    x = v[offset + k - 1] + 1
+                y = x - k
+                while x < n and y < m and a[x] == b[y]:
+                    x += 1
+                    y += 1
+                v[offset + k] = x
+                if x >= n and y >= m:
+                    return PDFCompareService._backtrack(trace, n, m)
+        return None
+
+    @staticmethod
+    def _backtrack(trace: List[List[int]], n: int, m: int) -> List[str]:
+        moves = []
+        x, y = n, m
+        for d in range(len(trace) - 1, -1, -1):
+            v = trace[d]
+            base = d + 1
+            k = x - y
+            if k == -d or (k != d and v[base + k - 1] < v[base + k + 1]):
+                prev_k = k + 1
+            else:
+                prev_k = k - 1
+            prev_x = v[base + prev_k]
+            prev_y = prev_x - prev_k
+            while x > prev_x and y > prev_y:
+                x -= 1
+                y -= 1
+                moves.append("equal")
+            if d > 0:
+                moves.append("insert" if x == prev_x else "delete")
+            x, y = prev_x, prev_y
+        moves.reverse()
+        return moves
+
+    @staticmethod
+    def diff_opcodes(a: Sequence[Any], b: Sequence[Any], max_cost: Optional[int] = None) -> List[Opcode]:
+        """Diff two sequences with Myers' O(ND) algorithm; returns difflib-style opcodes."""
+        moves = PDFCompareService._myers_moves(a, b, max_cost or PDFCompareService.MAX_EDIT_DISTANCE)
+        if moves is None:
+            return [("replace", 0, len(a), 0, len(b))]
+
+        opcodes: List[Opcode] = []
+        i = j = i1 = j1 = 0
+        run = None
+        for move in moves + [None]:
+            kind = None if move is None else ("equal" if move == "equal" else "change")
+            if kind != run:
+                if run == "equal":
+                    opcodes.append(("equal", i1, i, j1, j))
+                elif run == "change":
+                    tag = "replace" if i > i1 and j > j1 else ("delete" if i > i1 else "insert")
+                    opcodes.append((tag, i1, i, j1, j))
+                run, i1, j1 = kind, i, j
+            if move in ("equal", "delete"):
+                i += 1
+            if move in ("equal", "insert"):
+                j += 1
+        return opcodes
+
+    @staticmethod
+    def _page_hashes(pdf_path: str) -> List[str]:
+        """Hash every page's normalized text (its content stream if it has no text)."""
+        digest = TextExtractionService.document_hash(pdf_path)
+        hashes = []
+        with fitz.open(pdf_path) as doc:
+            for page_num in range(len(doc)):
+                JobService.checkpoint(page_num, len(doc), "Hashing pages")
+                text = " ".join(TextExtractionService.get_page(digest, doc, page_num).text.split())
+                if text:
+                    data = text.encode("utf-8")
+                else:
+                    data = doc.load_page(page_num).read_contents()
+                hashes.append(hashlib.sha1(data).hexdigest())
+        return hashes
+
+    @staticmethod
+    def align_pages(hashes1: Sequence[str], hashes2: Sequence[str]) -> Iterator[Tuple[str, Optional[int], Optional[int]]]:
+        """
+        Yield ``(status, page1, page2)`` (0-based) in document order. Status is
+        ``equal``, ``modified`` (pages paired inside a replaced run),
+        ``deleted`` (only in the first document) or ``inserted`` (only in the second).
+        """
+        for tag, i1, i2, j1, j2 in PDFCompareService.diff_opcodes(hashes1, hashes2):
+            if tag == "equal":
+                for offset in range(i2 - i1):
+                    yield "equal", i1 + offset, j1 + offset
+                continue
+            paired = min(i2 - i1, j2 - j1)
+            for offset in range(paired):
+                yield "modified", i1 + offset, j1 + offset
+            for page1 in range(i1 + paired, i2):
+                yield "deleted", page1, None
+            for page2 in range(j1 + paired, j2):
+                yield "inserted", None, page2
+
+    @staticmethod
+    def diff_lines(text1: str, text2: str) -> List[Dict[str, Any]]:
+        """Line diff of two page texts; replaced lines also carry a word diff."""
+        lines1 = [line.rstrip() for line in text1.splitlines()]
+        lines2 = [line.rstrip() for line in text2.splitlines()]
+        changes = []
+        for tag, i1, i2, j1, j2 in PDFCompareService.diff_opcodes(lines1, lines2):
+            if tag == "equal":
+                continue
+            change = {
+                "type": tag,
+                "lines1": [i1 + 1, i2],
+                "lines2": [j1 + 1, j2],
+                "removed": lines1[i1:i2],
+                "added": lines2[j1:j2],
+            }
+            if tag == "replace":
+                words1 = " ".join(change["removed"]).split()
+                words2 = " ".join(change["added"]).split()
+                change["words"] = [
+                    {"type": word_tag, "removed": " ".join(words1[a1:a2]), "added": " ".join(words2[b1:b2])}
+                    for word_tag, a1, a2, b1, b2 in PDFCompareService.diff_opcodes(words1, words2)
+                    if word_tag != "equal"
+                ]
+            changes.append(change)
+        return changes
+
+    @staticmethod
+    def _annotate_words(page: fitz.Page, words1: Sequence[tuple], words2: Sequence[tuple]) -> None:
+        """Highlight words of ``page`` (the second document) that differ from the first."""
+        opcodes = PDFCompareService.diff_opcodes([w[4] for w in words1], [w[4] for w in words2])
+        added_rects = []
+        for tag, i1, i2, j1, j2 in opcodes:
+            if tag in ("replace", "insert"):
+                added_rects.extend(fitz.Rect(w[:4]) for w in words2[j1:j2])
+            if tag in ("replace", "delete"):
+                removed = " ".join(w[4] for w in words1[i1:i2])[:PDFCompareService.MAX_NOTE_CHARS]
+                anchor = words2[j1] if j1 < len(words2) else (words2[-1] if words2 else None)
+                point = fitz.Point(anchor[0], anchor[1]) if anchor else fitz.Point(10, 10)
+                note = page.add_text_annot(point, f"Removed: {removed}")
+                note.set_colors(stroke=REMOVED_COLOR)
+                note.update()
+        if added_rects:
+            highlight = page.add_highlight_annot(added_rects)
+            highlight.set_colors(stroke=ADDED_COLOR)
+            highlight.update()
+
+    @staticmethod
+    def _add_banner(page: fitz.Page, text: str, color: Tuple[float, float, float]) -> None:
+        frame = page.add_rect_annot(page.rect + (4, 4, -4, -4))
+        frame.set_border(width=3)
+        frame.set_colors(stroke=color)
+        frame.update()
+        label = page.add_freetext_annot(
+            fitz.Rect(10, 10, min(page.rect.width - 10, 360), 34), text,
+            fontsize=11, text_color=color, fill_color=(1, 1, 1)
+        )
+        label.update()
+
+    @staticmethod
+    def compare(input_path1: str, input_path2: str, output_path: str,
+                visual_diff_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Compare two PDFs, write the JSON report to ``output_path`` (and the
+        visual diff to ``visual_diff_path``) and return a summary.
+        """
+        try:
+            hashes1 = PDFCompareService._page_hashes(input_path1)
+            hashes2 = PDFCompareService._page_hashes(input_path2)
+            alignment = list(PDFCompareService.align_pages(hashes1, hashes2))
+            del hashes1, hashes2
+
+            digest1 = TextExtractionService.document_hash(input_path1)
+            digest2 = TextExtractionService.document_hash(input_path2)
+            differences: List[Dict[str, Any]] = []
+            os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+            # The visual diff is drawn on a copy of the second document
+            with fitz.open(input_path1) as doc1, fitz.open(input_path2) as doc2, \
+                    (fitz.open(input_path2) if visual_diff_path else nullcontext()) as out, \
+                    open(output_path, "w", encoding="utf-8") as f:
+                # Pages of the second document seen so far, and deleted pages put back before them
+                seen_page2 = 0
+                deleted_before = 0
+                f.write('{"pages": [')
+                for index, (status, page1, page2) in enumerate(alignment):
+                    JobService.checkpoint(index, len(alignment), "Comparing pages")
+                    entry: Dict[str, Any] = {
+                        "page1": None if page1 is None else page1 + 1,
+                        "page2": None if page2 is None else page2 + 1,
+                        "status": status,
+                    }
+                    if status == "modified":
+                        text1 = TextExtractionService.get_page(digest1, doc1, page1)
+                        text2 = TextExtractionService.get_page(digest2, doc2, page2)
+                        entry["changes"] = PDFCompareService.diff_lines(text1.text, text2.text)
+                        if out is not None:
+                            PDFCompareService._annotate_words(out[page2 + deleted_before], text1.words, text2.words)
+                    elif status == "inserted" and out is not None:
+                        PDFCompareService._add_banner(
+                            out[page2 + deleted_before], "Page added in second document", ADDED_COLOR
+                        )
+                    elif status == "deleted" and out is not None:
+                        position = seen_page2 + deleted_before
+                        out.insert_pdf(doc1, from_page=page1, to_page=page1, start_at=position)
+                        PDFCompareService._add_banner(
+                            out[position], f"Page {page1 + 1} of first document was removed", REMOVED_COLOR
+                        )
+                        deleted_before += 1
+
+                    if page2 is not None:
+                        seen_page2 += 1
+                    f.write(("," if index else "") + "\n" + json.dumps(entry, ensure_ascii=False))
+                    if status != "equal":
+                        differences.append({
+                            "page": entry["page2"] or entry["page1"],
+                            "page1": entry["page1"],
+                            "page2": entry["page2"],
+                            "status": status,
+                            "difference": True,
+                            "lines_removed": sum(len(c["removed"]) for c in entry.get("changes", [])),
+                            "lines_added": sum(len(c["added"]) for c in entry.get("changes", [])),
+                        })
+
+                summary = {
+                    "pages_doc1": len(doc1),
+                    "pages_doc2": len(doc2),
+                    "differences_count": len(differences),
+                    "inserted_pages": [d["page2"] for d in differences if d["status"] == "inserted"],
+                    "deleted_pages": [d["page1"] for d in differences if d["status"] == "deleted"],
+                    "modified_pages": [[d["page1"], d["page2"]] for d in differences if d["status"] == "modified"],
+                    "differences": differences,
+                }
+                f.write('\n],\n"summary": ' + json.dumps(summary, ensure_ascii=False) + "}\n")
+
+                if out is not None:
+                    out.save(visual_diff_path, garbage=3, deflate=True)
+                    JobService.add_artifact(visual_diff_path)
+            return summary
+
+        except (FileProcessingError, JobCancelledError):
+            raise
+        except Exception as e:
+            raise FileProcessingError(f"Error comparing PDFs: {str(e)}")
@@ -0,0 +1,385 @@
+"""
+PDF Compress Service
+
+Compresses PDFs with Ghostscript by trying several candidate configurations
+(a ``PDFSETTINGS`` preset and an image resolution) and keeping the smallest
+valid result:
+
+1. When a size target is given and the document is long enough, every
+   candidate is first run on a small sample of its pages. The sample ratios
+   estimate the size each candidate would reach on the whole document, and
+   candidates expected to meet the target are tried first (least aggressive
+   first), so the image quality given up is no more than needed.
+2. Candidates run on the whole document in parallel, each into its own
+   temporary file. As soon as one meets the target the others are killed.
+3. If Ghostscript is missing or does not make the file smaller, PyMuPDF's
+   garbage collection and stream compression is used instead.
+
+Results are cached on disk by the SHA-256 of the input and the options, so
+compressing the same file again with the same options is a file copy.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+from app.core.config import settings
+from app.core.exceptions import FileProcessingError, JobCancelledError
+from app.services.job_service import JobService
+from app.services.subprocess_service import SubprocessService
+from app.services.text_extraction_service import TextExtractionService
+
+logger = logging.getLogger(__name__)
+
+# (PDFSETTINGS preset, image resolution)
+Candidate = Tuple[str, Optional[int]]
+# Candidate -> (output path, size in bytes)
+CandidateResults = Dict[Candidate, Tuple[str, int]]
+
+
+class PDFCompressService:
+    """Search Ghostscript settings for the best compression of a PDF."""
+
+    GS_SETTINGS_ORDER = {
+        "low": ["/printer", "/ebook"],
+        "medium": ["/ebook", "/screen"],
+        "high": ["/screen"],
+    }
+    DPI_CANDIDATES = {
+        "low": [300, 200, 150],
+        "medium": [150, 96, 72],
+        "high": [96, 72, 50],
+    }
+    # Last resort when no candidate of the level reaches the target
+    FALLBACK_CANDIDATE: Candidate = ("/screen", 72)
+    PYMUPDF_GARBAGE = {"low": 4, "medium": 3, "high": 2}
+
+    # Pages compressed to estimate each candidate; smaller documents are not sampled
+    SAMPLE_PAGES = 6
+    MIN_PAGES_TO_SAMPLE = 3 * SAMPLE_PAGES
+    # Estimates within this fraction of the target count as likely to meet it
+    ESTIMATE_MARGIN = 0.1
+    # Bump when the candidates or Ghostscript options change, to invalidate the cache
+    CACHE_VERSION = 1
+
+    _cache_lock = threading.Lock()
+
+    @staticmethod
+    def find_ghostscript() -> Optional[str]:
+        return shutil.which("gswin64c") or shutil.which("gswin32c") or shutil.which("gs")
+
+    @staticmethod
+    def candidates(level_key: str, max_image_dpi: Optional[int] = None) -> List[Candidate]:
+        """Candidate configurations for a level, from the best quality to the smallest output."""
+        if isinstance(max_image_dpi, int) and max_image_dpi > 0:
+            dpis = [max_image_dpi, max(max_image_dpi - 50, 50)]
+        else:
+            dpis = PDFCompressService.DPI_CANDIDATES.get(level_key, PDFCompressService.DPI_CANDIDATES["medium"])
+        result = [
+            (setting, dpi)
+            for setting in PDFCompressService.GS_SETTINGS_ORDER.get(level_key, ["/ebook"])
+            for dpi in dpis
+        ]
+        if PDFCompressService.FALLBACK_CANDIDATE not in result:
+            result.append(PDFCompressService.FALLBACK_CANDIDATE)
+        return result
+
+    @staticmethod
+    def gs_command(gs_exe: str, candidate: Candidate, input_path: str, output_path: str) -> List[str]:
+        setting, dpi = candidate
+        cmd = [
+            gs_exe,
+            "-sDEVICE=pdfwrite",
+            "-dCompatibilityLevel=1.4",
+            f"-dPDFSETTINGS={setting}",
+            "-dNOPAUSE",
+            "-dQUIET",
+            "-dBATCH",
+        ]
+        if dpi:
+            cmd += [
+                "-dDownsampleColorImages=true",
+                f"-dColorImageResolution={dpi}",
+                "-dColorImageDownsampleType=/Average",
+                "-dDownsampleGrayImages=true",
+                f"-dGrayImageResolution={dpi}",
+                "-dGrayImageDownsampleType=/Average",
+                "-dDownsampleMonoImages=true",
+                f"-dMonoImageResolution={dpi}",
+                "-dMonoImageDownsampleType=/Subsample",
+            ]
+        cmd += [f"-sOutputFile={output_path}", input_path]
+        return cmd
+
+    @staticmethod
+    def _valid_size(path: str) -> Optional[int]:
+        """Size of a Ghostscript output, or None if it is missing, empty or unreadable."""
+        try:
+            size = os.path.getsize(path)
+            if not size:
+                return None
+            with fitz.open(path) as doc:
+                if not doc.page_count:
+                    return None
+            return size
+        except Exception:
+            return None
+
+    @staticmethod
+    async def _run_candidates(
+        gs_exe: str,
+        input_path: str,
+        candidates: List[Candidate],
+        work_dir: str,
+        parallel_runs: int,
+        is_good_enough: Callable[[int], bool],
+        stage: str,
+    ) -> CandidateResults:
+        """
+        Run ``candidates`` (in order, ``parallel_runs`` at a time) and return
+        the valid results. Stops, killing the runs still going, as soon as a
+        result satisfies ``is_good_enough(size)``.
+        """
+        queue = list(candidates)
+        running: Dict[asyncio.Future, Tuple[Candidate, str]] = {}
+        results: CandidateResults = {}
+        started = finished = 0
+        try:
+            while queue or running:
+                while queue and len(running) < parallel_runs:
+                    candidate = queue.pop(0)
+                    setting, dpi = candidate
+                    path = os.path.join(work_dir, f"{started}_{setting.strip('/')}_{dpi or 0}.pdf")
+                    started += 1
+                    cmd = PDFCompressService.gs_command(gs_exe, candidate, input_path, path)
+                    task = asyncio.ensure_future(SubprocessService.run_async(cmd, capture_stdout=False))
+                    running[task] = (candidate, path)
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    candidate, path = running.pop(task)
+                    finished += 1
+                    JobService.checkpoint(finished, len(candidates), stage)
+                    JobService.check_cancelled()
+                    try:
+                        task.result().check_returncode()
+                    except Exception as e:
+                        logger.info("Ghostscript candidate %s failed: %s", candidate, e)
+                        continue
+                    size = PDFCompressService._valid_size(path)
+                    if size is None:
+                        continue
+                    results[candidate] = (path, size)
+                    if is_good_enough(size):
+                        return results
+            return results
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+    @staticmethod
+    def _write_sample(input_path: str, sample_path: str) -> Optional[int]:
+        """Write evenly spaced pages of the document to ``sample_path``; returns its size."""
+        with fitz.open(input_path) as doc:
+            page_count = doc.page_count
+            if page_count < PDFCompressService.MIN_PAGES_TO_SAMPLE or doc.needs_pass:
+                return None
+            count = PDFCompressService.SAMPLE_PAGES
+            pages = sorted({round(i * (page_count - 1) / (count - 1)) for i in range(count)})
+            doc.select(pages)
+            # Drop the resources of the pages left out, but keep the streams as they are
+            doc.save(sample_path, garbage=1)
+        return os.path.getsize(sample_path)
+
+    @staticmethod
+    def estimate_sizes(
+        gs_exe: str,
+        input_path: str,
+        candidates: List[Candidate],
+        work_dir: str,
+        parallel_runs: int,
+    ) -> Dict[Candidate, int]:
+        """Estimate the whole-document output size of each candidate from a sample of pages."""
+        sample_path = os.path.join(work_dir, "sample.pdf")
+        try:
+            sample_size = PDFCompressService._write_sample(input_path, sample_path)
+        except Exception as e:
+            logger.info("Could not sample %s: %s", input_path, e)
+            return {}
+        if not sample_size:
+            return {}
+
+        sample_dir = os.path.join(work_dir, "sample")
+        os.makedirs(sample_dir, exist_ok=True)
+        results = SubprocessService.run_coroutine(lambda: PDFCompressService._run_candidates(
+            gs_exe, sample_path, candidates, sample_dir, parallel_runs,
+            lambda size: False, "Estimating compression",
+        ))
+        original_size = os.path.getsize(input_path)
+        return {
+            candidate: int(original_size * size / sample_size)
+            for candidate, (_, size) in results.items()
+        }
+
+    @staticmethod
+    def plan(candidates: List[Candidate], estimates: Dict[Candidate, int],
+             desired_size: Optional[int]) -> List[Candidate]:
+        """
+        Order candidates for the whole-document runs: those estimated to meet
+        the target in quality order, then the rest from the smallest estimate.
+        Candidates that failed on the sample go last.
+        """
+        if desired_size is None or not estimates:
+            return list(candidates)
+        limit = desired_size * (1 + PDFCompressService.ESTIMATE_MARGIN)
+        likely = [c for c in candidates if c in estimates and estimates[c] <= limit]
+        rest = sorted((c for c in candidates if c in estimates and c not in likely), key=estimates.get)
+        failed = [c for c in candidates if c not in estimates]
+        return likely + rest + failed
+
+    @staticmethod
+    def cache_key(input_path: str, **options) -> str:
+        payload = json.dumps(
+            [PDFCompressService.CACHE_VERSION, TextExtractionService.document_hash(input_path), options],
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _cache_path(key: str) -> str:
+        return os.path.join(settings.compression_cache_dir, f"{key}.pdf")
+
+    @staticmethod
+    def load_cached(key: str, output_path: str) -> bool:
+        """Copy a cached result to ``output_path``; returns False on a miss."""
+        if settings.compression_cache_max_bytes <= 0:
+            return False
+        path = PDFCompressService._cache_path(key)
+        try:
+            # Touch it so eviction removes the least recently used entries
+            os.utime(path)
+            temp_path = f"{output_path}.tmp"
+            try:
+                os.link(path, temp_path)
+            except OSError:
+                shutil.copyfile(path, temp_path)
+            os.replace(temp_path, output_path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    @staticmethod
+    def store_cached(key: str, output_path: str) -> None:
+        """Add a result to the cache, evicting the least recently used entries over the size limit."""
+        max_bytes = settings.compression_cache_max_bytes
+        if max_bytes <= 0 or os.path.getsize(output_path) > max_bytes:
+            return
+        cache_dir = settings.compression_cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        path = PDFCompressService._cache_path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.copyfile(output_path, temp_path)
+        os.replace(temp_path, path)
+
+        with PDFCompressService._cache_lock:
+            entries = []
+            for name in os.listdir(cache_dir):
+                if not name.endswith(".pdf"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(cache_dir, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(cache_dir, name))
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    @staticmethod
+    def compress(
+        input_path: str,
+        output_path: str,
+        compression_level: str = "medium",
+        target_reduction_pct: Optional[int] = None,
+        max_image_dpi: Optional[int] = None,
+    ) -> str:
+        try:
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            JobService.add_artifact(output_path)
+
+            level_key = (compression_level or "medium").lower()
+            original_size = os.path.getsize(input_path)
+            desired_size = None
+            if original_size and isinstance(target_reduction_pct, int):
+                target_reduction_pct = min(max(target_reduction_pct, 0), 100)
+                desired_size = int(original_size * (1 - (target_reduction_pct / 100.0)))
+
+            gs_exe = PDFCompressService.find_ghostscript()
+            key = PDFCompressService.cache_key(
+                input_path, level=level_key, target=target_reduction_pct,
+                max_image_dpi=max_image_dpi, ghostscript=bool(gs_exe),
+            )
+            if PDFCompressService.load_cached(key, output_path):
+                return output_path
+
+            used_method = None
+            work_dir = tempfile.mkdtemp(prefix=".compress_", dir=os.path.dirname(output_path))
+            try:
+                results: CandidateResults = {}
+                if gs_exe:
+                    candidates = PDFCompressService.candidates(level_key, max_image_dpi)
+                    if desired_size is None:
+                        # No target: the first candidate that works is used
+                        parallel_runs = 1
+                    else:
+                        parallel_runs = max(1, settings.compression_parallel_runs)
+                        estimates = PDFCompressService.estimate_sizes(
+                            gs_exe, input_path, candidates, work_dir, parallel_runs
+                        )
+                        candidates = PDFCompressService.plan(candidates, estimates, desired_size)
+                    results = SubprocessService.run_coroutine(lambda: PDFCompressService._run_candidates(
+                        gs_exe, input_path, candidates, work_dir, parallel_runs,
+                        lambda size: desired_size is None or size <= desired_size, "Compressing",
+                    ))
+
+                best = min(results.values(), key=lambda result: result[1]) if results else None
+                if best is None or best[1] >= original_size:
+                    with fitz.open(input_path) as doc:
+                        doc.save(
+                            output_path, deflate=True, clean=True,
+                            garbage=PDFCompressService.PYMUPDF_GARBAGE.get(level_key, 3),
+                        )
+                    used_method = "pymupdf"
+                if best is not None and (used_method is None or best[1] < os.path.getsize(output_path)):
+                    os.replace(best[0], output_path)
+                    used_method = "ghostscript"
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+            logger.info("Compressed %s with %s: %d -> %d bytes", input_path, used_method,
+                        original_size, os.path.getsize(output_path))
+            try:
+                PDFCompressService.store_cached(key, output_path)
+            except OSError as e:
+                logger.warning("Could not cache compressed PDF: %s", e)
+            return output_path
+        except JobCancelledError:
+            raise
+        except Exception as e:
+            raise FileProcessingError(f"Error compressing PDF: {str(e)}")
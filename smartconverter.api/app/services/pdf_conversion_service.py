@@ -2,7 +2,7 @@ import os
 import json
 import csv
 import tempfile
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple, Union
 from pathlib import Path
 import fitz  # PyMuPDF
 import pandas as pd
@@ -30,7 +30,7 @@ except (ImportError, OSError):
 try:
     import cairosvg
     CAIROSVG_AVAILABLE = True
-except ImportError:
+except (ImportError, OSError):
     CAIROSVG_AVAILABLE = False
 from io import BytesIO
 import base64
@@ -39,10 +39,18 @@ import zipfile
 from datetime import datetime
 from PyPDF2 import PdfReader, PdfWriter
 import shutil
-import subprocess
 from app.core.config import settings
-from app.core.exceptions import FileProcessingError
-from PyPDF2 import PdfMerger
+from app.core.exceptions import FileProcessingError, JobCancelledError
+from app.services import pdf_workers
+from app.services.job_service import JobService
+from app.services.pdf_compare_service import PDFCompareService
+from app.services.pdf_compress_service import PDFCompressService
+from app.services.pdf_incremental_service import PDFIncrementalService
+from app.services.pdf_merge_service import PDFMergeService
+from app.services.pdf_overlay_service import PAGE_NUMBER_POSITIONS, WATERMARK_POSITIONS, PDFOverlayService
+from app.services.process_pool_service import ProcessPoolService
+from app.services.stream_service import StreamService
+from app.services.text_extraction_service import TextExtractionService
 
 
 class PDFConversionService:
@@ -59,254 +67,356 @@ class PDFConversionService:
         "PDF", "JSON", "MD", "CSV", "XLSX", "XPS", "JPG", "PNG", 
         "TIFF", "SVG", "HTML", "TXT", "DOCX"
     ]
+
+    # How pdf_to_json includes images: base64 in the JSON, files next to it, or not at all
+    JSON_IMAGE_MODES = ("inline", "external", "none")
+
+    # Document information fields set_pdf_metadata can change
+    EDITABLE_METADATA = ("title", "author", "subject", "keywords", "creator", "producer")
     
     @staticmethod
-    def merge_pdfs(input_paths: List[str], output_path: str) -> str:
+    def merge_pdfs(input_paths: List[str], output_path: str, preserve_outlines: bool = True) -> str:
         """Merge multiple PDF files into a single PDF."""
-        if not input_paths:
-            raise FileProcessingError("No PDF files provided for merging.")
+        return PDFMergeService.merge(input_paths, output_path, preserve_outlines)
 
-        try:
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            merger = PdfMerger()
+    @staticmethod
+    def parse_pages(pages: Optional[str], page_count: int) -> List[int]:
+        """
+        Turn a page selection like ``"1-3,7"`` (1-based; ``"5-"`` runs to the
+        last page) into 0-based page numbers in document order. An empty
+        selection means every page.
+        """
+        if not pages or not pages.strip():
+            return list(range(page_count))
+        selected = set()
+        for token in pages.split(","):
+            token = token.strip()
+            if not token:
+                continue
+            try:
+                if "-" in token:
+                    first, last = token.split("-", 1)
+                    start = int(first) if first.strip() else 1
+                    end = int(last) if last.strip() else page_count
+                else:
+                    start = end = int(token)
+            except ValueError:
+                raise FileProcessingError(f"Invalid page range: {token}")
+            if start > end:
+                start, end = end, start
+            if start < 1 or end > page_count:
+                raise FileProcessingError(f"Page range {token} is outside the document (1-{page_count})")
+            selected.update(range(start - 1, end))
+        if not selected:
+            raise FileProcessingError("No pages selected")
+        return sorted(selected)
 
-            for path in input_paths:
-                if not os.path.exists(path):
-                    raise FileProcessingError(f"Input file not found: {path}")
-                with open(path, "rb") as pdf_file:
-                    merger.append(pdf_file)
+    @staticmethod
+    def _selected_pages(pdf_path: str, pages: Optional[str]) -> Optional[List[int]]:
+        """The page numbers ``pages`` selects in ``pdf_path``, or None for every page."""
+        if not pages or not pages.strip():
+            return None
+        with fitz.open(pdf_path) as doc:
+            return PDFConversionService.parse_pages(pages, len(doc))
 
-            with open(output_path, "wb") as merged_file:
-                merger.write(merged_file)
-            merger.close()
+    @staticmethod
+    def _extract_image(doc: fitz.Document, xref: int):
+        """Get an image's bytes and format, keeping the stored encoding when it is PNG or JPEG."""
+        info = doc.extract_image(xref)
+        if info and info.get("ext") in ("png", "jpeg", "jpg"):
+            return info["image"], info["ext"]
+        pix = fitz.Pixmap(doc, xref)
+        if pix.n - pix.alpha >= 4:  # CMYK
+            pix = fitz.Pixmap(fitz.csRGB, pix)
+        return pix.tobytes("png"), "png"
 
-            return output_path
-        except FileProcessingError:
-            raise
-        except Exception as e:
-            raise FileProcessingError(f"Error merging PDFs: {str(e)}")
-    
     @staticmethod
-    def pdf_to_json(pdf_path: str, output_path: str) -> str:
-        """Convert PDF to JSON format with structured data extraction."""
-        try:
-            doc = fitz.open(pdf_path)
-            pages_data = []
-            
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                
-                # Extract text
-                text = page.get_text()
-                
-                # Extract images
-                images = []
-                image_list = page.get_images()
-                for img_index, img in enumerate(image_list):
-                    xref = img[0]
-                    pix = fitz.Pixmap(doc, xref)
-                    if pix.n - pix.alpha < 4:  # GRAY or RGB
-                        img_data = pix.tobytes("png")
-                        images.append({
-                            "index": img_index,
-                            "format": "png",
-                            "data": base64.b64encode(img_data).decode()
-                        })
-                    pix = None
-                
-                # Extract annotations
-                annotations = []
-                for annot in page.annots():
-                    annotations.append({
-                        "type": annot.type[1],
-                        "content": annot.content,
-                        "rect": list(annot.rect)
-                    })
-                
-                # Extract tables (basic)
-                tables = []
-                # This is a simplified table extraction
-                # In production, you'd want to use more sophisticated table detection
-                
-                page_data = {
-                    "page_number": page_num + 1,
-                    "text": text,
-                    "images": images,
-                    "annotations": annotations,
-                    "tables": tables,
-                    "dimensions": {
-                        "width": page.rect.width,
-                        "height": page.rect.height
-                    }
-                }
-                pages_data.append(page_data)
-            
-            doc.close()
-            
-            # Create structured JSON
-            pdf_data = {
-                "document_info": {
-                    "total_pages": len(pages_data),
-                    "title": doc.metadata.get("title", ""),
-                    "author": doc.metadata.get("author", ""),
-                    "subject": doc.metadata.get("subject", ""),
-                    "creator": doc.metadata.get("creator", ""),
-                    "producer": doc.metadata.get("producer", ""),
-                    "creation_date": doc.metadata.get("creationDate", ""),
-                    "modification_date": doc.metadata.get("modDate", "")
-                },
-                "pages": pages_data
+    def _document_info(doc: fitz.Document) -> Dict[str, Any]:
+        metadata = doc.metadata or {}
+        return {
+            "total_pages": len(doc),
+            "title": metadata.get("title", ""),
+            "author": metadata.get("author", ""),
+            "subject": metadata.get("subject", ""),
+            "creator": metadata.get("creator", ""),
+            "producer": metadata.get("producer", ""),
+            "creation_date": metadata.get("creationDate", ""),
+            "modification_date": metadata.get("modDate", "")
+        }
+
+    @staticmethod
+    def _page_record(page: fitz.Page, text: str) -> Dict[str, Any]:
+        """The JSON object describing a page in pdf_to_json output."""
+        annotations = []
+        for annot in page.annots():
+            annotations.append({
+                "type": annot.type[1],
+                "content": annot.content,
+                "rect": list(annot.rect)
+            })
+
+        return {
+            "page_number": page.number + 1,
+            "text": text,
+            "images": [
+                {"index": img_index, "xref": img[0]}
+                for img_index, img in enumerate(page.get_images())
+            ],
+            "annotations": annotations,
+            # Table detection is done by pdf_to_excel / pdf_to_csv
+            "tables": [],
+            "dimensions": {
+                "width": page.rect.width,
+                "height": page.rect.height
             }
-            
-            # Save JSON
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(pdf_data, f, indent=2, ensure_ascii=False)
-            
+        }
+
+    @staticmethod
+    def iter_json_records(pdf_path: str, pages: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the content of pdf_to_json as separate records for streaming: a
+        ``document_info`` record, then one page record per selected page, in
+        order, as soon as its text is extracted. Images are listed by xref
+        only.
+        """
+        with fitz.open(pdf_path) as doc:
+            selected = PDFConversionService.parse_pages(pages, len(doc))
+            yield {"document_info": PDFConversionService._document_info(doc)}
+            for page_num, entry in TextExtractionService.iter_pages(
+                pdf_path, selected, "Processing pages", settings.pdf_stream_shard_pages
+            ):
+                yield PDFConversionService._page_record(doc.load_page(page_num), entry.text)
+
+    @staticmethod
+    def iter_text_records(pdf_path: str, pages: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Yield ``{"page_number", "text"}`` for every selected page, in order, as soon as it is extracted."""
+        with fitz.open(pdf_path) as doc:
+            selected = PDFConversionService.parse_pages(pages, len(doc))
+        for page_num, entry in TextExtractionService.iter_pages(
+            pdf_path, selected, "Extracting text", settings.pdf_stream_shard_pages
+        ):
+            yield {"page_number": page_num + 1, "text": entry.text}
+
+    @staticmethod
+    def pdf_to_json(pdf_path: str, output_path: str, images: str = "inline", pages: Optional[str] = None) -> str:
+        """
+        Convert PDF to JSON format with structured data extraction.
+
+        The JSON is written as it is produced: an ``images`` table holding every
+        image once (by xref) however many pages show it, then one page object at
+        a time. Pages refer to images by xref. ``images`` is ``inline`` (base64
+        in the table), ``external`` (files in ``<output>_images/``) or ``none``.
+        Only the pages selected by ``pages`` (see ``parse_pages``) are read.
+        """
+        images = (images or "inline").lower()
+        if images not in PDFConversionService.JSON_IMAGE_MODES:
+            raise FileProcessingError(
+                f"Unsupported images mode {images}; use one of {', '.join(PDFConversionService.JSON_IMAGE_MODES)}"
+            )
+        try:
+            digest = TextExtractionService.document_hash(pdf_path)
+            with fitz.open(pdf_path) as doc, open(output_path, "w", encoding="utf-8") as f:
+                selected = PDFConversionService.parse_pages(pages, len(doc))
+                document_info = PDFConversionService._document_info(doc)
+                f.write('{"document_info": ' + json.dumps(document_info, ensure_ascii=False) + ',\n"images": {')
+
+                image_dir = os.path.splitext(output_path)[0] + "_images"
+                seen_xrefs = set()
+                for index, page_num in enumerate(selected):
+                    JobService.checkpoint(index, 2 * len(selected), "Extracting images")
+                    for img in doc.get_page_images(page_num):
+                        xref = img[0]
+                        if xref in seen_xrefs:
+                            continue
+                        entry = {"xref": xref, "width": img[2], "height": img[3]}
+                        if images != "none":
+                            data, ext = PDFConversionService._extract_image(doc, xref)
+                            entry["format"] = ext
+                            if images == "inline":
+                                entry["data"] = base64.b64encode(data).decode()
+                            else:
+                                os.makedirs(image_dir, exist_ok=True)
+                                image_file = os.path.join(image_dir, f"image_{xref}.{ext}")
+                                with open(image_file, "wb") as image_out:
+                                    image_out.write(data)
+                                JobService.add_artifact(image_file)
+                                entry["file"] = f"{os.path.basename(image_dir)}/{os.path.basename(image_file)}"
+                        f.write(("," if seen_xrefs else "") + "\n" + json.dumps(str(xref)) + ": " + json.dumps(entry))
+                        seen_xrefs.add(xref)
+
+                f.write('\n},\n"pages": [')
+                for index, page_num in enumerate(selected):
+                    JobService.checkpoint(len(selected) + index, 2 * len(selected), "Processing pages")
+                    page_data = PDFConversionService._page_record(
+                        doc.load_page(page_num), TextExtractionService.get_page(digest, doc, page_num).text
+                    )
+                    f.write(("," if index else "") + "\n" + json.dumps(page_data, ensure_ascii=False))
+                f.write("\n]}\n")
+
             return output_path
-            
+
+        except (FileProcessingError, JobCancelledError):
+            raise
         except Exception as e:
             raise FileProcessingError(f"Error converting PDF to JSON: {str(e)}")
     
     @staticmethod
-    def pdf_to_markdown(pdf_path: str, output_path: str) -> str:
+    def _write_lines(output_path: str, lines: Iterable[str]) -> None:
+        """Write ``'\\n'.join(lines)`` to a file as the lines are produced."""
+        with open(output_path, 'w', encoding='utf-8') as f:
+            for index, line in enumerate(lines):
+                if index:
+                    f.write('\n')
+                f.write(line)
+
+    @staticmethod
+    def pdf_to_markdown(pdf_path: str, output_path: str, pages: Optional[str] = None) -> str:
         """Convert PDF to Markdown format."""
         try:
-            doc = fitz.open(pdf_path)
-            markdown_content = []
-            
-            # Add document metadata
-            metadata = doc.metadata
-            if metadata.get("title"):
-                markdown_content.append(f"# {metadata['title']}\n")
-            if metadata.get("author"):
-                markdown_content.append(f"**Author:** {metadata['author']}\n")
-            if metadata.get("subject"):
-                markdown_content.append(f"**Subject:** {metadata['subject']}\n")
-            markdown_content.append("---\n")
-            
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                text = page.get_text()
-                
-                if text.strip():
-                    markdown_content.append(f"## Page {page_num + 1}\n")
-                    markdown_content.append(text)
-                    markdown_content.append("\n---\n")
-            
-            doc.close()
-            
-            # Save markdown
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(markdown_content))
-            
+            with fitz.open(pdf_path) as doc:
+                metadata = doc.metadata or {}
+                selected = PDFConversionService.parse_pages(pages, len(doc))
+
+            def markdown_lines():
+                # Add document metadata
+                if metadata.get("title"):
+                    yield f"# {metadata['title']}\n"
+                if metadata.get("author"):
+                    yield f"**Author:** {metadata['author']}\n"
+                if metadata.get("subject"):
+                    yield f"**Subject:** {metadata['subject']}\n"
+                yield "---\n"
+
+                for page_num, text in TextExtractionService.page_texts(pdf_path, selected):
+                    if text.strip():
+                        yield f"## Page {page_num + 1}\n"
+                        yield text
+                        yield "\n---\n"
+
+            PDFConversionService._write_lines(output_path, markdown_lines())
             return output_path
             
+        except FileProcessingError:
+            raise
         except Exception as e:
             raise FileProcessingError(f"Error converting PDF to Markdown: {str(e)}")
     
     @staticmethod
-    def pdf_to_csv(pdf_path: str, output_path: str) -> str:
+    def _iter_page_tables(pdf_path: str, pages: Optional[List[int]] = None) -> Iterable[tuple]:
+        """
+        Yield ``(page_num, tables)`` for every page (or just ``pages``) in
+        order, each table a list of rows. Only pages with ruling lines are
+        searched for tables; when there are many, they are searched in the
+        process pool.
+        """
+        with fitz.open(pdf_path) as doc:
+            selected = list(range(len(doc))) if pages is None else pages
+            page_count = len(selected)
+            candidates = []
+            for index, page_num in enumerate(selected):
+                JobService.checkpoint(index, 2 * page_count, "Finding tables")
+                if pdf_workers.has_table_edges(doc.load_page(page_num)):
+                    candidates.append(page_num)
+
+            results = None
+            if ProcessPoolService.should_parallelize(len(candidates)):
+                results = ProcessPoolService.map_shards(
+                    pdf_workers.find_tables, ProcessPoolService.shard(candidates), pdf_path
+                )
+            pending = set(candidates)
+            ready: Dict[int, list] = {}
+            try:
+                for index, page_num in enumerate(selected):
+                    JobService.checkpoint(page_count + index, 2 * page_count, "Extracting tables")
+                    if page_num not in pending:
+                        yield page_num, []
+                    elif results is None:
+                        yield page_num, pdf_workers.page_tables(doc.load_page(page_num))
+                    else:
+                        while page_num not in ready:
+                            ready.update(next(results))
+                        yield page_num, ready.pop(page_num)
+            finally:
+                if results is not None:
+                    results.close()
+
+    @staticmethod
+    def pdf_to_csv(pdf_path: str, output_path: str, pages: Optional[str] = None) -> str:
         """Convert PDF to CSV format (extract tabular data)."""
         try:
-            doc = fitz.open(pdf_path)
-            all_tables = []
-            
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                
-                # Extract tables using PyMuPDF's table detection
-                tables = page.find_tables()
-                for table in tables:
-                    table_data = table.extract()
-                    if table_data:
-                        all_tables.extend(table_data)
-            
-            doc.close()
-            
-            # Save as CSV
-            if all_tables:
-                with open(output_path, 'w', newline='', encoding='utf-8') as f:
-                    writer = csv.writer(f)
-                    writer.writerows(all_tables)
-            else:
-                # If no tables found, create a simple text-based CSV
-                with open(output_path, 'w', newline='', encoding='utf-8') as f:
-                    writer = csv.writer(f)
+            selected = PDFConversionService._selected_pages(pdf_path, pages)
+            with open(output_path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                found_tables = False
+                for _, tables in PDFConversionService._iter_page_tables(pdf_path, selected):
+                    for table_data in tables:
+                        found_tables = True
+                        writer.writerows(table_data)
+
+                if not found_tables:
+                    # If no tables found, create a simple text-based CSV
                     writer.writerow(['Page', 'Content'])
-                    doc = fitz.open(pdf_path)
-                    for page_num in range(len(doc)):
-                        page = doc.load_page(page_num)
-                        text = page.get_text()
+                    for page_num, text in TextExtractionService.page_texts(pdf_path, selected):
                         if text.strip():
                             writer.writerow([page_num + 1, text.strip()])
-                    doc.close()
             
             return output_path
             
+        except (FileProcessingError, JobCancelledError):
+            raise
         except Exception as e:
             raise FileProcessingError(f"Error converting PDF to CSV: {str(e)}")
     
     @staticmethod
-    def pdf_to_excel(pdf_path: str, output_path: str) -> str:
+    def pdf_to_excel(pdf_path: str, output_path: str, pages: Optional[str] = None) -> str:
         """Convert PDF to Excel format."""
         try:
-            doc = fitz.open(pdf_path)
-            workbook = Workbook()
-            workbook.remove(workbook.active)  # Remove default sheet
-            
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                
-                # Create a new sheet for each page
-                ws = workbook.create_sheet(title=f"Page_{page_num + 1}")
-                
-                # Extract tables
-                tables = list(page.find_tables())  # Convert to list to check if empty
-                row_offset = 1
-                has_table_data = False
-                
-                # Extract and add table data
-                for table in tables:
-                    try:
-                        table_data = table.extract()
-                        if table_data and len(table_data) > 0:
-                            has_table_data = True
-                            for row_idx, row in enumerate(table_data):
-                                for col_idx, cell in enumerate(row):
-                                    if cell:  # Only add non-empty cells
-                                        ws.cell(row=row_offset + row_idx, column=col_idx + 1, value=str(cell))
-                            row_offset += len(table_data) + 2  # Add spacing between tables
-                    except Exception as e:
-                        # If table extraction fails, continue with text extraction
-                        pass
-                
-                # Extract text content
-                text = page.get_text()
-                if text and text.strip():
-                    # If we have table data, add text after tables, otherwise start from row 1
-                    if not has_table_data:
-                        row_offset = 1
-                    
-                    lines = text.split('\n')
-                    # Filter out empty lines and limit to reasonable number
-                    non_empty_lines = [line.strip() for line in lines if line.strip()][:500]
+            selected = PDFConversionService._selected_pages(pdf_path, pages)
+            digest = TextExtractionService.document_hash(pdf_path)
+            # Write-only: rows go straight to the file instead of being kept as cell objects
+            workbook = Workbook(write_only=True)
+            
+            with fitz.open(pdf_path) as doc:
+                for page_num, tables in PDFConversionService._iter_page_tables(pdf_path, selected):
+                    # Create a new sheet for each page
+                    ws = workbook.create_sheet(title=f"Page_{page_num + 1}")
                     
-                    if non_empty_lines:
-                        # Add header if we have both tables and text
+                    # Add table data, with two empty rows between tables
+                    has_table_data = False
+                    for table_data in tables:
                         if has_table_data:
-                            ws.cell(row=row_offset, column=1, value="Text Content:")
-                            row_offset += 1
+                            ws.append([])
+                            ws.append([])
+                        has_table_data = True
+                        for row in table_data:
+                            ws.append([str(cell) if cell else None for cell in row])
+                    
+                    # Extract text content
+                    text = TextExtractionService.get_page(digest, doc, page_num).text
+                    if text and text.strip():
+                        lines = text.split('\n')
+                        # Filter out empty lines and limit to reasonable number
+                        non_empty_lines = [line.strip() for line in lines if line.strip()][:500]
                         
-                        for row_idx, line in enumerate(non_empty_lines):
-                            ws.cell(row=row_offset + row_idx, column=1, value=line)
+                        if non_empty_lines:
+                            # Add header if we have both tables and text
+                            if has_table_data:
+                                ws.append([])
+                                ws.append([])
+                                ws.append(["Text Content:"])
+                            
+                            for line in non_empty_lines:
+                                ws.append([line])
             
-            doc.close()
             workbook.save(output_path)
             return output_path
             
+        except (FileProcessingError, JobCancelledError):
+            raise
         except Exception as e:
             raise FileProcessingError(f"Error converting PDF to Excel: {str(e)}")
     
+    
     @staticmethod
     def html_to_pdf(html_path: str, output_path: str) -> str:
         """Convert HTML to PDF."""
@@ -1011,26 +1121,24 @@ class PDFConversionService:
             raise FileProcessingError(f"Error converting ODS to PDF: {str(e)}")
     
     @staticmethod
-    def pdf_to_csv_extract(pdf_path: str, output_path: str) -> str:
+    def pdf_to_csv_extract(pdf_path: str, output_path: str, pages: Optional[str] = None) -> str:
         """Extract tabular data from PDF to CSV."""
-        return PDFConversionService.pdf_to_csv(pdf_path, output_path)
+        return PDFConversionService.pdf_to_csv(pdf_path, output_path, pages)
     
     @staticmethod
-    def pdf_to_excel_extract(pdf_path: str, output_path: str) -> str:
+    def pdf_to_excel_extract(pdf_path: str, output_path: str, pages: Optional[str] = None) -> str:
         """Extract tabular data from PDF to Excel."""
-        return PDFConversionService.pdf_to_excel(pdf_path, output_path)
+        return PDFConversionService.pdf_to_excel(pdf_path, output_path, pages)
     
     @staticmethod
-    def pdf_to_word_extract(pdf_path: str, output_path: str) -> str:
+    def pdf_to_word_extract(pdf_path: str, output_path: str, pages: Optional[str] = None) -> str:
         """Convert PDF to Word document."""
         try:
-            doc = fitz.open(pdf_path)
+            with fitz.open(pdf_path) as doc:
+                selected = PDFConversionService.parse_pages(pages, len(doc))
             word_doc = Document()
             
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                text = page.get_text()
-                
+            for page_num, text in TextExtractionService.page_texts(pdf_path, selected):
                 if text.strip():
                     # Add page heading
                     word_doc.add_heading(f'Page {page_num + 1}', level=2)
@@ -1042,57 +1150,124 @@ class PDFConversionService:
                             word_doc.add_paragraph(para.strip())
                     
                     # Add page break (except for last page)
-                    if page_num < len(doc) - 1:
+                    if page_num < selected[-1]:
                         word_doc.add_page_break()
             
-            doc.close()
             word_doc.save(output_path)
             return output_path
             
+        except FileProcessingError:
+            raise
         except Exception as e:
             raise FileProcessingError(f"Error converting PDF to Word: {str(e)}")
     
     @staticmethod
-    def pdf_to_image(pdf_path: str, output_dir: str, format: str = "jpg") -> List[str]:
-        """Convert PDF pages to images."""
+    def pdf_to_image(pdf_path: str, output_dir: str, format: str = "jpg",
+                     dpi: Optional[int] = None, colorspace: str = "rgb",
+                     pages: Optional[str] = None) -> List[str]:
+        """
+        Convert PDF pages (all, or those selected by ``pages``) to images.
+
+        Large selections are rendered in the shared process pool, a range of
+        pages per task; the workers write each page as soon as it is rendered.
+        """
+        output_files = dict(PDFConversionService.iter_rendered_pages(
+            pdf_path, output_dir, format, dpi, colorspace, pages
+        ))
+        return [output_files[page_num] for page_num in sorted(output_files)]
+
+    @staticmethod
+    def iter_rendered_pages(pdf_path: str, output_dir: str, format: str = "jpg",
+                            dpi: Optional[int] = None, colorspace: str = "rgb",
+                            pages: Optional[str] = None,
+                            shard_pages: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+        """
+        Render the selected pages into ``output_dir``, yielding ``(page_num,
+        path)`` as each page is written - in page order when rendered here,
+        in completion order when rendered in the pool. ``shard_pages`` sets
+        the pages per pool task (default: a few tasks per worker).
+        """
+        target_format = (format or "jpg").lower()
+        dpi = dpi or settings.pdf_image_dpi
+        colorspace = (colorspace or "rgb").lower()
+        if not 18 <= dpi <= 1200:
+            raise FileProcessingError("DPI must be between 18 and 1200")
+        if colorspace not in pdf_workers.COLORSPACES:
+            raise FileProcessingError(
+                f"Unsupported colorspace {colorspace}; use one of {', '.join(pdf_workers.COLORSPACES)}"
+            )
+        if colorspace == "cmyk" and target_format == "png":
+            raise FileProcessingError("PNG images cannot be CMYK; use rgb or gray")
+
         try:
-            doc = fitz.open(pdf_path)
-            output_files = []
-            target_format = (format or "jpg").lower()
-            
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                pix = page.get_pixmap()
-                
-                output_file = os.path.join(output_dir, f"page_{page_num + 1}.{target_format}")
-                
-                if target_format in {"tiff", "tif"}:
-                    mode = "RGBA" if pix.alpha else "RGB"
-                    image = Image.frombytes(mode, [pix.width, pix.height], pix.samples)
-                    image.save(output_file, format="TIFF")
-                else:
-                    pix.save(output_file)
-                output_files.append(output_file)
-            
-            doc.close()
-            return output_files
-            
+            with fitz.open(pdf_path) as doc:
+                selected = PDFConversionService.parse_pages(pages, len(doc))
+                page_count = len(selected)
+                if not ProcessPoolService.should_parallelize(page_count):
+                    for index, page_num in enumerate(selected):
+                        JobService.checkpoint(index, page_count, "Rendering pages")
+                        output_file = pdf_workers.render_page(doc, page_num, output_dir, target_format, dpi, colorspace)
+                        JobService.add_artifact(output_file)
+                        yield page_num, output_file
+                    return
+
+            shards = ProcessPoolService.shard(
+                selected, -(-page_count // shard_pages) if shard_pages else None
+            )
+            rendered = 0
+            results = ProcessPoolService.map_shards(
+                pdf_workers.render_pages, shards, pdf_path, output_dir, target_format, dpi, colorspace
+            )
+            try:
+                for shard_result in results:
+                    for page_num, output_file in shard_result:
+                        JobService.add_artifact(output_file)
+                        yield page_num, output_file
+                    rendered += len(shard_result)
+                    JobService.checkpoint(rendered, page_count, "Rendering pages")
+            finally:
+                results.close()
+
+        except (FileProcessingError, JobCancelledError):
+            raise
         except Exception as e:
             raise FileProcessingError(f"Error converting PDF to images: {str(e)}")
     
     @staticmethod
-    def pdf_to_tiff(pdf_path: str, output_dir: str) -> List[str]:
+    def iter_image_zip(pdf_path: str, work_dir: str, name_prefix: str, format: str = "jpg",
+                       dpi: Optional[int] = None, colorspace: str = "rgb",
+                       pages: Optional[str] = None) -> Iterator[bytes]:
+        """
+        Render the selected pages into ``work_dir`` and stream them as a ZIP
+        archive of ``<name_prefix>_page_<n>.<format>`` entries, each sent and
+        deleted as soon as it is rendered. ``work_dir`` is removed at the end.
+        """
+        extension = (format or "jpg").lower()
+        rendered = PDFConversionService.iter_rendered_pages(
+            pdf_path, work_dir, format, dpi, colorspace, pages, settings.pdf_stream_shard_pages
+        )
+        files = ((f"{name_prefix}_page_{page_num + 1}.{extension}", path) for page_num, path in rendered)
+        try:
+            yield from StreamService.zip_files(files)
+        finally:
+            rendered.close()
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    @staticmethod
+    def pdf_to_tiff(pdf_path: str, output_dir: str, pages: Optional[str] = None) -> List[str]:
         """Convert PDF pages to TIFF images."""
-        return PDFConversionService.pdf_to_image(pdf_path, output_dir, "tiff")
+        return PDFConversionService.pdf_to_image(pdf_path, output_dir, "tiff", pages=pages)
     
     @staticmethod
-    def pdf_to_svg(pdf_path: str, output_dir: str) -> List[str]:
+    def pdf_to_svg(pdf_path: str, output_dir: str, pages: Optional[str] = None) -> List[str]:
         """Convert PDF pages to SVG."""
         try:
             doc = fitz.open(pdf_path)
+            selected = PDFConversionService.parse_pages(pages, len(doc))
             output_files = []
             
-            for page_num in range(len(doc)):
+            for index, page_num in enumerate(selected):
+                JobService.checkpoint(index, len(selected), "Processing pages")
                 page = doc.load_page(page_num)
                 svg_string = page.get_svg_image()
                 
@@ -1104,67 +1279,57 @@ class PDFConversionService:
             doc.close()
             return output_files
             
+        except FileProcessingError:
+            raise
         except Exception as e:
             raise FileProcessingError(f"Error converting PDF to SVG: {str(e)}")
     
     @staticmethod
-    def pdf_to_html(pdf_path: str, output_path: str) -> str:
+    def pdf_to_html(pdf_path: str, output_path: str, pages: Optional[str] = None) -> str:
         """Convert PDF to HTML."""
         try:
-            doc = fitz.open(pdf_path)
-            html_content = []
-            
-            # Add HTML header
-            html_content.append("<!DOCTYPE html>")
-            html_content.append("<html><head><title>PDF Content</title></head><body>")
-            
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                text = page.get_text()
-                
-                if text.strip():
-                    html_content.append(f"<div class='page' id='page-{page_num + 1}'>")
-                    html_content.append(f"<h2>Page {page_num + 1}</h2>")
-                    html_content.append(f"<p>{text.replace(chr(10), '<br>')}</p>")
-                    html_content.append("</div>")
-            
-            html_content.append("</body></html>")
-            
-            doc.close()
-            
-            # Save HTML
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(html_content))
-            
+            selected = PDFConversionService._selected_pages(pdf_path, pages)
+
+            def html_lines():
+                # Add HTML header
+                yield "<!DOCTYPE html>"
+                yield "<html><head><title>PDF Content</title></head><body>"
+
+                for page_num, text in TextExtractionService.page_texts(pdf_path, selected):
+                    if text.strip():
+                        yield f"<div class='page' id='page-{page_num + 1}'>"
+                        yield f"<h2>Page {page_num + 1}</h2>"
+                        yield f"<p>{text.replace(chr(10), '<br>')}</p>"
+                        yield "</div>"
+
+                yield "</body></html>"
+
+            PDFConversionService._write_lines(output_path, html_lines())
             return output_path
             
+        except FileProcessingError:
+            raise
         except Exception as e:
             raise FileProcessingError(f"Error converting PDF to HTML: {str(e)}")
     
     @staticmethod
-    def pdf_to_text(pdf_path: str, output_path: str) -> str:
+    def pdf_to_text(pdf_path: str, output_path: str, pages: Optional[str] = None) -> str:
         """Convert PDF to plain text."""
         try:
-            doc = fitz.open(pdf_path)
-            text_content = []
-            
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                text = page.get_text()
-                
-                if text.strip():
-                    text_content.append(f"--- Page {page_num + 1} ---")
-                    text_content.append(text)
-                    text_content.append("")
-            
-            doc.close()
-            
-            # Save text
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(text_content))
-            
+            selected = PDFConversionService._selected_pages(pdf_path, pages)
+
+            def text_lines():
+                for page_num, text in TextExtractionService.page_texts(pdf_path, selected):
+                    if text.strip():
+                        yield f"--- Page {page_num + 1} ---"
+                        yield text
+                        yield ""
+
+            PDFConversionService._write_lines(output_path, text_lines())
             return output_path
             
+        except FileProcessingError:
+            raise
         except Exception as e:
             raise FileProcessingError(f"Error converting PDF to text: {str(e)}")
 
@@ -1239,6 +1404,13 @@ class PDFConversionService:
     @staticmethod
     def unlock_pdf(input_path: str, output_path: str, password: str) -> str:
         try:
+            with fitz.open(input_path) as doc:
+                encrypted = doc.is_encrypted
+            if not encrypted:
+                # Nothing to remove; the input is the result
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                shutil.copyfile(input_path, output_path)
+                return output_path
             try:
                 reader = PdfReader(input_path)
                 if reader.is_encrypted:
@@ -1281,34 +1453,10 @@ class PDFConversionService:
             raise FileProcessingError(str(e))
 
     @staticmethod
-    def compare_pdfs(input_path1: str, input_path2: str, output_path: str) -> Dict[str, Any]:
-        try:
-            doc1 = fitz.open(input_path1)
-            doc2 = fitz.open(input_path2)
-            pages1 = len(doc1)
-            pages2 = len(doc2)
-            max_pages = max(pages1, pages2)
-            diffs: List[Dict[str, Any]] = []
-            for i in range(max_pages):
-                t1 = doc1.load_page(i).get_text() if i < pages1 else ""
-                t2 = doc2.load_page(i).get_text() if i < pages2 else ""
-                if (t1 or "").strip() != (t2 or "").strip():
-                    diffs.append({"page": i + 1, "difference": True})
-            doc1.close()
-            doc2.close()
-            summary = {
-                "pages_doc1": pages1,
-                "pages_doc2": pages2,
-                "differences_count": len(diffs),
-                "differences": diffs,
-            }
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            with open(output_path, "w", encoding="utf-8") as f:
-                import json as _json
-                _json.dump(summary, f, indent=2, ensure_ascii=False)
-            return summary
-        except Exception as e:
-            raise FileProcessingError(str(e))
+    def compare_pdfs(input_path1: str, input_path2: str, output_path: str,
+                     visual_diff_path: Optional[str] = None) -> Dict[str, Any]:
+        """Compare two PDFs (see PDFCompareService); writes a JSON report and optionally a visual diff PDF."""
+        return PDFCompareService.compare(input_path1, input_path2, output_path, visual_diff_path)
 
     @staticmethod
     def get_pdf_metadata(input_path: str) -> Dict[str, Any]:
@@ -1323,6 +1471,27 @@ class PDFConversionService:
         except Exception as e:
             raise FileProcessingError(str(e))
     
+    @staticmethod
+    def set_pdf_metadata(input_path: str, output_path: str, updates: Dict[str, Optional[str]]) -> Dict[str, Any]:
+        """Set the document information fields in ``updates``; None leaves a field as it is."""
+        unknown = set(updates) - set(PDFConversionService.EDITABLE_METADATA)
+        if unknown:
+            raise FileProcessingError(f"Unsupported metadata fields: {', '.join(sorted(unknown))}")
+
+        result: Dict[str, Any] = {}
+
+        def update(doc: fitz.Document) -> int:
+            metadata = dict(doc.metadata or {})
+            changes = {key: value for key, value in updates.items() if value is not None and value != metadata.get(key)}
+            if changes:
+                metadata.update(changes)
+                doc.set_metadata(metadata)
+            result["metadata"] = doc.metadata
+            return 1 if changes else 0
+
+        incremental = PDFIncrementalService.save_edits(input_path, output_path, update)
+        return {"metadata": result["metadata"], "incremental": incremental}
+
     @staticmethod
     def get_supported_formats() -> Dict[str, List[str]]:
         """Get supported input and output formats."""
@@ -1348,112 +1517,9 @@ class PDFConversionService:
         target_reduction_pct: Optional[int] = None,
         max_image_dpi: Optional[int] = None,
     ) -> str:
-        try:
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
-            level_key = (compression_level or "medium").lower()
-            gs_settings_order = {
-                "low": ["/printer", "/ebook"],
-                "medium": ["/ebook", "/screen"],
-                "high": ["/screen"],
-            }
-            original_size = os.path.getsize(input_path) if os.path.exists(input_path) else None
-            desired_size = None
-            if original_size and isinstance(target_reduction_pct, int):
-                if target_reduction_pct < 0:
-                    target_reduction_pct = 0
-                if target_reduction_pct > 100:
-                    target_reduction_pct = 100
-                desired_size = int(original_size * (1 - (target_reduction_pct / 100.0)))
-
-            gs_exe = shutil.which("gswin64c") or shutil.which("gswin32c") or shutil.which("gs")
-            used_method = None
-
-            def _run_gs(setting: str, dpi: Optional[int]) -> Optional[int]:
-                try:
-                    cmd = [
-                        gs_exe,
-                        "-sDEVICE=pdfwrite",
-                        "-dCompatibilityLevel=1.4",
-                        f"-dPDFSETTINGS={setting}",
-                        "-dNOPAUSE",
-                        "-dQUIET",
-                        "-dBATCH",
-                    ]
-                    if dpi:
-                        cmd += [
-                            "-dDownsampleColorImages=true",
-                            f"-dColorImageResolution={dpi}",
-                            "-dColorImageDownsampleType=/Average",
-                            "-dDownsampleGrayImages=true",
-                            f"-dGrayImageResolution={dpi}",
-                            "-dGrayImageDownsampleType=/Average",
-                            "-dDownsampleMonoImages=true",
-                            f"-dMonoImageResolution={dpi}",
-                            "-dMonoImageDownsampleType=/Subsample",
-                        ]
-                    cmd += [f"-sOutputFile={output_path}", input_path]
-                    subprocess.run(cmd, check=True)
-                    if os.path.exists(output_path):
-                        return os.path.getsize(output_path)
-                    return None
-                except Exception:
-                    return None
-
-            if gs_exe:
-                dpi_candidates = []
-                if isinstance(max_image_dpi, int) and max_image_dpi > 0:
-                    dpi_candidates = [max_image_dpi, max(max_image_dpi - 50, 50)]
-                else:
-                    if level_key == "low":
-                        dpi_candidates = [300, 200, 150]
-                    elif level_key == "medium":
-                        dpi_candidates = [150, 96, 72]
-                    else:
-                        dpi_candidates = [96, 72, 50]
-
-                satisfied = False
-                for setting in gs_settings_order.get(level_key, ["/ebook"]):
-                    for dpi in dpi_candidates:
-                        size_after = _run_gs(setting, dpi)
-                        if size_after:
-                            used_method = "ghostscript"
-                            if desired_size is None or size_after <= desired_size:
-                                satisfied = True
-                                break
-                    if satisfied:
-                        break
-
-            if not used_method:
-                levels = {
-                    "low": {"garbage": 4},
-                    "medium": {"garbage": 3},
-                    "high": {"garbage": 2},
-                }
-                level = levels.get(level_key, levels["medium"])
-                doc = fitz.open(input_path)
-                doc.save(output_path, deflate=True, garbage=level["garbage"], clean=True)
-                doc.close()
-                used_method = "pymupdf"
-
-            try:
-                if original_size is not None and os.path.exists(output_path):
-                    new_size = os.path.getsize(output_path)
-                    if desired_size and new_size > desired_size and gs_exe:
-                        size_after = _run_gs("/screen", 72)
-                        if size_after and size_after <= desired_size:
-                            used_method = "ghostscript"
-                    elif new_size >= original_size and used_method != "pymupdf":
-                        doc = fitz.open(input_path)
-                        doc.save(output_path, deflate=True, garbage=2, clean=True)
-                        doc.close()
-                        used_method = "pymupdf"
-            except Exception:
-                pass
-
-            return output_path
-        except Exception as e:
-            raise FileProcessingError(f"Error compressing PDF: {str(e)}")
+        return PDFCompressService.compress(
+            input_path, output_path, compression_level, target_reduction_pct, max_image_dpi
+        )
 
     @staticmethod
     def split_pdf(
@@ -1474,40 +1540,14 @@ class PDFConversionService:
             output_folder = os.path.join(output_root, folder_name)
             os.makedirs(output_folder, exist_ok=True)
 
-            reader = PdfReader(input_path)
-            total_pages = len(reader.pages)
-            results: List[Dict[str, Any]] = []
-
-            def _unique_path(name_without_ext: str) -> str:
-                candidate = f"{name_without_ext}.pdf"
-                path = os.path.join(output_folder, candidate)
-                counter = 1
-                while os.path.exists(path):
-                    candidate = f"{name_without_ext}_{counter}.pdf"
-                    path = os.path.join(output_folder, candidate)
-                    counter += 1
-                return path
-
-            def _emit(start: int, end: int, pages_desc: str, pages_list: List[int]):
-                writer = PdfWriter()
-                for p in pages_list:
-                    if p < 1 or p > total_pages:
-                        raise FileProcessingError("Invalid page range")
-                    writer.add_page(reader.pages[p - 1])
-                name_without_ext = f"{sanitized_prefix}_{pages_desc}" if pages_desc else f"{sanitized_prefix}"
-                out_path = _unique_path(name_without_ext)
-                with open(out_path, "wb") as f:
-                    writer.write(f)
-                results.append({
-                    "path": out_path,
-                    "filename": os.path.basename(out_path),
-                    "pages": pages_list,
-                })
+            with fitz.open(input_path) as doc:
+                total_pages = len(doc)
 
+            # (description, first page, last page), 1-based
+            spans: List[tuple] = []
             st = (split_type or "").strip().lower()
             if st == "every_page" or (st == "" and not ranges):
-                for i in range(1, total_pages + 1):
-                    _emit(i, i, f"page_{i}", [i])
+                spans = [(f"page_{i}", i, i) for i in range(1, total_pages + 1)]
             elif st == "page_ranges" or (st == "" and ranges):
                 if not ranges:
                     raise FileProcessingError("page_ranges required for split_type=page_ranges")
@@ -1524,14 +1564,31 @@ class PDFConversionService:
                         end = start
                     if start > end:
                         start, end = end, start
-                    pages_list = list(range(start, end + 1))
+                    if start < 1 or end > total_pages:
+                        raise FileProcessingError("Invalid page range")
                     # Naming as requested: prefix_page_1 and prefix_page_3_5
                     desc = f"page_{start}_{end}" if start != end else f"page_{start}"
-                    _emit(start, end, desc, pages_list)
+                    spans.append((desc, start, end))
             else:
                 raise FileProcessingError("Unsupported split type")
 
-            result: Dict[str, Any] = {"files": results, "count": len(results), "folder_name": folder_name}
+            # Pick every part's file name up front, against one listing of the folder
+            taken = set(os.listdir(output_folder))
+            parts = []
+            for index, (desc, start, end) in enumerate(spans):
+                name_without_ext = f"{sanitized_prefix}_{desc}" if desc else f"{sanitized_prefix}"
+                candidate = f"{name_without_ext}.pdf"
+                counter = 1
+                while candidate in taken:
+                    candidate = f"{name_without_ext}_{counter}.pdf"
+                    counter += 1
+                taken.add(candidate)
+                out_path = os.path.join(output_folder, candidate)
+                JobService.add_artifact(out_path)
+                parts.append((index, start - 1, end - 1, out_path))
+
+            result: Dict[str, Any] = {"folder_name": folder_name}
+            zf = None
             if zip_output:
                 zip_name = f"{folder_name}.zip"
                 zip_path = os.path.join(output_root, zip_name)
@@ -1540,15 +1597,64 @@ class PDFConversionService:
                     zip_name = f"{folder_name}_{counter}.zip"
                     zip_path = os.path.join(output_root, zip_name)
                     counter += 1
-                with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
-                    for item in results:
-                        zf.write(item["path"], arcname=os.path.join(folder_name, item["filename"]))
+                JobService.add_artifact(zip_path)
+                # The parts' streams are already compressed
+                zf = zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED, compresslevel=1)
                 result["zip_path"] = zip_path
                 result["zip_filename"] = os.path.basename(zip_path)
+
+            results: List[Dict[str, Any]] = []
+            try:
+                # Parts are added to the zip in order, each as soon as it and those before it are written
+                for index, out_path in PDFConversionService._write_split_parts(input_path, parts):
+                    _, start, end, _ = parts[index]
+                    filename = os.path.basename(out_path)
+                    results.append({
+                        "path": out_path,
+                        "filename": filename,
+                        "pages": list(range(start + 1, end + 2)),
+                    })
+                    if zf is not None:
+                        zf.write(out_path, arcname=os.path.join(folder_name, filename))
+            finally:
+                if zf is not None:
+                    zf.close()
+
+            result.update({"files": results, "count": len(results)})
             return result
+        except (FileProcessingError, JobCancelledError):
+            raise
         except Exception as e:
             raise FileProcessingError(str(e))
 
+    @staticmethod
+    def _write_split_parts(input_path: str, parts: List[tuple]) -> Iterable[tuple]:
+        """
+        Write split parts (``(index, first_page, last_page, path)``, 0-based
+        pages) and yield ``(index, path)`` in order. Many pages are written in
+        the process pool, each worker parsing the source once for all its parts.
+        """
+        page_total = sum(last - first + 1 for _, first, last, _ in parts)
+        if not ProcessPoolService.should_parallelize(page_total):
+            with fitz.open(input_path) as doc:
+                for index, first, last, out_path in parts:
+                    JobService.checkpoint(index, len(parts), "Writing parts")
+                    yield index, pdf_workers.write_part(doc, first, last, out_path)
+            return
+
+        ready: Dict[int, str] = {}
+        next_index = 0
+        results = ProcessPoolService.map_shards(pdf_workers.write_parts, ProcessPoolService.shard(parts), input_path)
+        try:
+            for written in results:
+                ready.update(written)
+                while next_index in ready:
+                    JobService.checkpoint(next_index, len(parts), "Writing parts")
+                    yield next_index, ready.pop(next_index)
+                    next_index += 1
+        finally:
+            results.close()
+
     @staticmethod
     def extract_pages_to_single(input_path: str, output_path: str, ranges: List[str]) -> str:
         try:
@@ -1644,35 +1750,11 @@ class PDFConversionService:
             if deg % 90 != 0:
                 deg = (deg // 90) * 90
 
-            try:
-                doc = fitz.open(input_path)
-                if deg == 0:
-                    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                    doc.save(output_path)
-                    doc.close()
-                    return output_path
+            def rotate(doc: fitz.Document) -> int:
+                return PDFIncrementalService.set_rotation(doc, deg) if deg else 0
 
-                for page in doc:
-                    try:
-                        if hasattr(page, "set_rotation"):
-                            page.set_rotation(deg)
-                        elif hasattr(page, "setRotation"):
-                            page.setRotation(deg)
-                        else:
-                            current = 0
-                            try:
-                                current = page.rotation  # type: ignore
-                            except Exception:
-                                current = 0
-                            target = (current + deg) % 360
-                            if hasattr(page, "set_rotation"):
-                                page.set_rotation(target)
-                    except Exception:
-                        pass
-
-                os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                doc.save(output_path)
-                doc.close()
+            try:
+                PDFIncrementalService.save_edits(input_path, output_path, rotate)
                 return output_path
             except Exception:
                 reader = PdfReader(input_path)
@@ -1711,82 +1793,23 @@ class PDFConversionService:
                 raise FileProcessingError("Watermark text cannot be empty")
 
             pos = (position or "center").strip().lower()
-            base_positions = {
-                "top-left", "top-center", "top-right",
-                "middle-left", "center", "middle-right",
-                "bottom-left", "bottom-center", "bottom-right",
-            }
             diag = False
             base = pos
             if pos.endswith("-diagonal"):
                 diag = True
                 base = pos[:-9]
-            if base not in base_positions:
+            if base not in WATERMARK_POSITIONS:
                 base = "center"
                 diag = True
 
-            # Primary implementation: draw watermark using PyMuPDF
+            # Primary implementation: stamp one shared watermark XObject using PyMuPDF
             try:
-                doc = fitz.open(input_path)
-
-                def _rect_for_position(r: fitz.Rect, where: str) -> fitz.Rect:
-                    w, h = r.width, r.height
-                    margin = max(20, int(min(w, h) * 0.03))
-                    box_w = max(200, int(w * 0.6))
-                    box_h = max(60, int(h * 0.15))
-                    if where == "top-left":
-                        return fitz.Rect(r.x0 + margin, r.y0 + margin, r.x0 + margin + box_w, r.y0 + margin + box_h)
-                    if where == "top-center":
-                        cx = r.x0 + w / 2
-                        return fitz.Rect(cx - box_w / 2, r.y0 + margin, cx + box_w / 2, r.y0 + margin + box_h)
-                    if where == "top-right":
-                        return fitz.Rect(r.x1 - margin - box_w, r.y0 + margin, r.x1 - margin, r.y0 + margin + box_h)
-                    if where == "middle-left":
-                        cy = r.y0 + h / 2
-                        return fitz.Rect(r.x0 + margin, cy - box_h / 2, r.x0 + margin + box_w, cy + box_h / 2)
-                    if where == "middle-right":
-                        cy = r.y0 + h / 2
-                        return fitz.Rect(r.x1 - margin - box_w, cy - box_h / 2, r.x1 - margin, cy + box_h / 2)
-                    if where == "bottom-left":
-                        return fitz.Rect(r.x0 + margin, r.y1 - margin - box_h, r.x0 + margin + box_w, r.y1 - margin)
-                    if where == "bottom-center":
-                        cx = r.x0 + w / 2
-                        return fitz.Rect(cx - box_w / 2, r.y1 - margin - box_h, cx + box_w / 2, r.y1 - margin)
-                    if where == "bottom-right":
-                        return fitz.Rect(r.x1 - margin - box_w, r.y1 - margin - box_h, r.x1 - margin, r.y1 - margin)
-                    # center
-                    cx = r.x0 + w / 2
-                    cy = r.y0 + h / 2
-                    return fitz.Rect(cx - box_w / 2, cy - box_h / 2, cx + box_w / 2, cy + box_h / 2)
-
-                for page in doc:
-                    r = page.rect
-                    target_rect = _rect_for_position(r, base)
-                    fs = max(24, int(r.width * 0.06))
-                    try:
-                        page.insert_textbox(
-                            target_rect,
-                            str(watermark_text),
-                            fontsize=fs,
-                            fontname="Helvetica-Bold",
-                            color=(0.5, 0.5, 0.5),
-                            align=fitz.TEXT_ALIGN_CENTER,
-                            rotate=(45 if diag or base == "center" else 0),
-                        )
-                    except Exception:
-                        # Fallback text insert without textbox
-                        center_pt = fitz.Point(target_rect.x0 + target_rect.width / 2, target_rect.y0 + target_rect.height / 2)
-                        page.insert_text(
-                            center_pt,
-                            str(watermark_text),
-                            fontsize=fs,
-                            fontname="Helvetica-Bold",
-                            color=(0.5, 0.5, 0.5),
-                        )
-
-                os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                doc.save(output_path)
-                doc.close()
+                with fitz.open(input_path) as doc:
+                    PDFOverlayService.stamp_watermark(
+                        doc, str(watermark_text), base, diagonal=(diag or base == "center")
+                    )
+                    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                    doc.save(output_path)
                 return output_path
             except Exception:
                 # Fallback: overlay watermark using ReportLab + PyPDF2
@@ -1877,11 +1900,7 @@ class PDFConversionService:
     ) -> str:
         try:
             pos = (position or "bottom-center").strip().lower()
-            allowed = {
-                "top-left", "top-center", "top-right",
-                "bottom-left", "bottom-center", "bottom-right",
-            }
-            if pos not in allowed:
+            if pos not in PAGE_NUMBER_POSITIONS:
                 pos = "bottom-center"
 
             sp = int(start_page) if start_page is not None else 1
@@ -1891,47 +1910,12 @@ class PDFConversionService:
             if fs <= 0:
                 fs = 12.0
 
-            # Primary implementation: PyMuPDF
+            # Primary implementation: PyMuPDF, with only the number's glyph run written per page
             try:
-                doc = fitz.open(input_path)
-                for idx, page in enumerate(doc, start=1):
-                    if idx < sp:
-                        continue
-                    r = page.rect
-                    margin = max(20, int(min(r.width, r.height) * 0.03))
-                    box_h = max(24, int(fs * 2))
-                    # Rectangle spanning width (respect margins), choose top/bottom band
-                    if pos.startswith("top-"):
-                        rect = fitz.Rect(r.x0 + margin, r.y0 + margin, r.x1 - margin, r.y0 + margin + box_h)
-                    else:
-                        rect = fitz.Rect(r.x0 + margin, r.y1 - margin - box_h, r.x1 - margin, r.y1 - margin)
-
-                    align_map = {
-                        "left": fitz.TEXT_ALIGN_LEFT,
-                        "center": fitz.TEXT_ALIGN_CENTER,
-                        "right": fitz.TEXT_ALIGN_RIGHT,
-                    }
-                    align_key = pos.split("-")[1]  # left/center/right
-                    align = align_map.get(align_key, fitz.TEXT_ALIGN_CENTER)
-
-                    text = (fmt or "{page}")
-                    try:
-                        text = text.replace("{page}", str(idx))
-                    except Exception:
-                        text = str(idx)
-
-                    page.insert_textbox(
-                        rect,
-                        text,
-                        fontsize=fs,
-                        fontname="Helvetica-Bold",
-                        color=(0, 0, 0),
-                        align=align,
-                    )
-
-                os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                doc.save(output_path)
-                doc.close()
+                with fitz.open(input_path) as doc:
+                    PDFOverlayService.stamp_page_numbers(doc, pos, sp, fmt or "{page}", fs)
+                    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                    doc.save(output_path)
                 return output_path
             except Exception:
                 # Fallback: ReportLab overlay merged via PyPDF2
@@ -0,0 +1,101 @@
+"""
+PDF Incremental Save Service
+
+Saves light edits (page rotation, document metadata) as a PDF incremental
+update: the input is copied byte for byte and only the changed objects are
+appended after it, with a new cross-reference section. Nothing is parsed or
+serialized beyond those objects, so the cost is a file copy (done in the
+kernel, and free on filesystems that share copied extents) rather than a
+rewrite of every page, image and font.
+
+The update repeats each changed object in full, so it is used while an edit
+rewrites at most ``settings.incremental_save_max_ratio`` of the document's
+objects. Larger edits, and documents PyMuPDF had to repair on opening, are
+saved in full as before.
+"""
+
+import os
+import shutil
+from typing import Callable, Dict
+
+import fitz  # PyMuPDF
+
+from app.core.config import settings
+from app.core.exceptions import FileProcessingError, JobCancelledError
+from app.services.job_service import JobService
+
+
+class PDFIncrementalService:
+    """Apply small edits to a PDF and save them as an incremental update."""
+
+    @staticmethod
+    def is_small(changed_objects: int, object_count: int) -> bool:
+        return changed_objects <= settings.incremental_save_max_ratio * max(object_count, 1)
+
+    @staticmethod
+    def _inherited_rotation(doc: fitz.Document, xref: int, cache: Dict[int, int]) -> int:
+        if xref in cache:
+            return cache[xref]
+        kind, value = doc.xref_get_key(xref, "Rotate")
+        if kind != "null":
+            rotation = int(float(value))
+        else:
+            kind, parent = doc.xref_get_key(xref, "Parent")
+            rotation = PDFIncrementalService._inherited_rotation(doc, int(parent.split()[0]), cache) if kind == "xref" else 0
+        cache[xref] = rotation
+        return rotation
+
+    @staticmethod
+    def set_rotation(doc: fitz.Document, rotation: int) -> int:
+        """
+        Set the /Rotate of every page to ``rotation`` (a multiple of 90),
+        through the page dictionaries rather than loading each page.
+        Returns the number of pages changed.
+        """
+        cache: Dict[int, int] = {}
+        # Look every page up before changing any: an edit makes MuPDF walk the page tree again
+        page_xrefs = [doc.page_xref(page_num) for page_num in range(doc.page_count)]
+        changed = [
+            xref for xref in page_xrefs
+            if PDFIncrementalService._inherited_rotation(doc, xref, cache) % 360 != rotation
+        ]
+        for xref in changed:
+            doc.xref_set_key(xref, "Rotate", str(rotation))
+        return len(changed)
+
+    @staticmethod
+    def save_edits(input_path: str, output_path: str, edit: Callable[[fitz.Document], int]) -> bool:
+        """
+        Write ``input_path`` with ``edit`` applied to ``output_path``.
+        ``edit`` changes the document in place and returns the number of
+        objects it rewrote. Returns True if the output was saved as an
+        incremental update of the input.
+        """
+        if not os.path.exists(input_path):
+            raise FileProcessingError(f"Input file not found: {input_path}")
+
+        try:
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            JobService.add_artifact(output_path)
+            with fitz.open(input_path) as doc:
+                if doc.needs_pass:
+                    raise FileProcessingError("PDF is password protected; unlock it first.")
+                if not doc.can_save_incrementally():
+                    edit(doc)
+                    doc.save(output_path)
+                    return False
+
+            shutil.copyfile(input_path, output_path)
+            with fitz.open(output_path) as doc:
+                changed = edit(doc)
+                if PDFIncrementalService.is_small(changed, doc.xref_length()):
+                    doc.save(output_path, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+                    return True
+                temp_path = output_path + ".full"
+                doc.save(temp_path)
+            os.replace(temp_path, output_path)
+            return False
+        except (FileProcessingError, JobCancelledError):
+            raise
+        except Exception as e:
+            raise FileProcessingError(f"Error saving PDF: {str(e)}")
@@ -0,0 +1,139 @@
+"""
+PDF Merge Service
+
+Merges PDFs with PyMuPDF's ``insert_pdf``. Inputs are opened one at a time,
+in order, and closed once their pages are copied.
+
+Files produced by the same tool tend to embed the same fonts, images and
+color profiles. As each input is copied, its new objects are hashed bottom-up
+(an object's hash covers the hashes of the objects it references, and a
+stream's its raw bytes), and references to an object identical to one
+already in the output are pointed at the existing copy. The duplicates are
+dropped by one garbage collection and compression pass when the output is
+saved. This does what ``garbage=4`` does, but in time linear in the number of
+objects rather than comparing every stream with every other.
+
+Outlines (bookmarks) of the inputs can be kept, with their page numbers
+shifted to where each input lands in the output.
+"""
+
+import hashlib
+import os
+import re
+from typing import Dict, List, Set
+
+import fitz  # PyMuPDF
+
+from app.core.exceptions import FileProcessingError, JobCancelledError
+from app.services.job_service import JobService
+
+_REFERENCE = re.compile(r"\b(\d+) 0 R\b")
+# Objects that belong to one page and must not be shared, even when identical
+_NEVER_SHARED = re.compile(r"/Type\s*/(?:Page|Pages|Catalog|Annot)\b|/Rect\b")
+
+
+class PDFMergeService:
+    """Merge PDFs into one, sharing identical resources."""
+
+    @staticmethod
+    def _object_hash(doc: fitz.Document, xref: int, source: str) -> bytes:
+        hasher = hashlib.sha256(source.encode("utf-8", "surrogatepass"))
+        if doc.xref_is_stream(xref):
+            hasher.update(b"\0stream\0")
+            hasher.update(doc.xref_stream_raw(xref))
+        return hasher.digest()
+
+    @staticmethod
+    def deduplicate(doc: fitz.Document, first_xref: int, seen: Dict[bytes, int]) -> int:
+        """
+        Point references to objects numbered ``first_xref`` and above at
+        identical objects already listed in ``seen`` (hash -> xref), adding
+        the new unique objects to ``seen``. Returns the number of objects
+        made redundant.
+        """
+        last_xref = doc.xref_length()
+        sources = {xref: doc.xref_object(xref, compressed=True) for xref in range(first_xref, last_xref)}
+        mapping: Dict[int, int] = {}
+
+        def substitute(source: str) -> str:
+            return _REFERENCE.sub(
+                lambda m: f"{mapping.get(int(m.group(1)), int(m.group(1)))} 0 R", source
+            )
+
+        # References to other new objects, which must be hashed first
+        pending: Dict[int, Set[int]] = {}
+        for xref, source in sources.items():
+            if not source or _NEVER_SHARED.search(source):
+                continue
+            pending[xref] = {
+                int(ref) for ref in _REFERENCE.findall(source)
+                if first_xref <= int(ref) < last_xref and int(ref) != xref
+            }
+
+        # Objects in reference cycles or referring to pages are never resolved and stay as they are
+        resolved: Set[int] = set()
+        progress = True
+        while pending and progress:
+            progress = False
+            for xref in list(pending):
+                if not pending[xref] <= resolved:
+                    continue
+                del pending[xref]
+                resolved.add(xref)
+                progress = True
+                digest = PDFMergeService._object_hash(doc, xref, substitute(sources[xref]))
+                if digest in seen:
+                    mapping[xref] = seen[digest]
+                else:
+                    seen[digest] = xref
+
+        if mapping:
+            for xref, source in sources.items():
+                if xref in mapping or not source:
+                    continue
+                updated = substitute(source)
+                if updated != source:
+                    doc.update_object(xref, updated)
+        return len(mapping)
+
+    @staticmethod
+    def merge(input_paths: List[str], output_path: str, preserve_outlines: bool = True) -> str:
+        """Merge ``input_paths`` in order into ``output_path``."""
+        if not input_paths:
+            raise FileProcessingError("No PDF files provided for merging.")
+        for path in input_paths:
+            if not os.path.exists(path):
+                raise FileProcessingError(f"Input file not found: {path}")
+
+        try:
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            JobService.add_artifact(output_path)
+            seen: Dict[bytes, int] = {}
+            toc: List[list] = []
+            with fitz.open() as merged:
+                for index, path in enumerate(input_paths):
+                    JobService.checkpoint(index, len(input_paths), "Merging")
+                    with fitz.open(path) as src:
+                        if src.needs_pass:
+                            raise FileProcessingError(
+                                f"{os.path.basename(path)} is password protected; unlock it before merging."
+                            )
+                        offset = merged.page_count
+                        if preserve_outlines:
+                            toc.extend(
+                                [level, title, page + offset if page > 0 else page]
+                                for level, title, page in src.get_toc(simple=True)
+                            )
+                        first_xref = merged.xref_length()
+                        merged.insert_pdf(src)
+                    PDFMergeService.deduplicate(merged, first_xref, seen)
+
+                JobService.set_stage("Writing")
+                if toc:
+                    merged.set_toc(toc)
+                merged.save(output_path, garbage=3, deflate=True)
+            return output_path
+        except (FileProcessingError, JobCancelledError):
+            raise
+        except Exception as e:
+            raise FileProcessingError(f"Error merging PDFs: {str(e)}")
@@ -0,0 +1,272 @@
+"""
+PDF Overlay Service
+
+Stamps watermarks and page numbers on PDFs without laying out text on every
+page:
+
+- A watermark is laid out once per page size, as a template page drawn into
+  a Form XObject. Every page of that size gets a reference to the same
+  XObject and the same one-line content stream, so the output grows by a
+  constant amount however many pages there are.
+- Page numbers share one font object and one positioning computation per
+  page size; each page only gets a content stream with its own glyph run.
+
+Existing page content is wrapped in ``q``/``Q`` by a single shared stream, so
+a page that leaves the graphics state changed cannot move the stamp.
+
+The stamping functions take the pages to stamp, so a range of a document can
+be stamped on its own.
+"""
+
+from typing import Dict, Iterable, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+WATERMARK_POSITIONS = (
+    "top-left", "top-center", "top-right",
+    "middle-left", "center", "middle-right",
+    "bottom-left", "bottom-center", "bottom-right",
+)
+PAGE_NUMBER_POSITIONS = (
+    "top-left", "top-center", "top-right",
+    "bottom-left", "bottom-center", "bottom-right",
+)
+
+
+class PDFOverlayService:
+    """Stamp shared overlays on the pages of an open document."""
+
+    WATERMARK_COLOR = (0.5, 0.5, 0.5)
+    PAGE_NUMBER_COLOR = (0, 0, 0)
+    # Helvetica-Bold, as the stamps were drawn with insert_textbox before
+    FONT = "hebo"
+    FONT_OBJECT = "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>"
+    # Resource names; the prefix keeps them apart from names the document already uses
+    STAMP_PREFIX = "SCStamp"
+    FONT_NAME = "SCStampFont"
+    # Watermark text is shrunk by this factor until it fits its box
+    SHRINK_FACTOR = 0.85
+    MIN_FONT_SIZE = 4
+
+    @staticmethod
+    def _ref(value: str) -> int:
+        return int(value.split()[0])
+
+    @staticmethod
+    def _new_stream(doc: fitz.Document, data: bytes) -> int:
+        xref = doc.get_new_xref()
+        doc.update_object(xref, "<<>>")
+        doc.update_stream(xref, data)
+        return xref
+
+    @staticmethod
+    def _inherited_resources(doc: fitz.Document, xref: int) -> str:
+        """The ``/Resources`` a page inherits from its page tree ancestors."""
+        seen = set()
+        while xref not in seen:
+            seen.add(xref)
+            kind, value = doc.xref_get_key(xref, "Parent")
+            if kind != "xref":
+                break
+            xref = PDFOverlayService._ref(value)
+            kind, value = doc.xref_get_key(xref, "Resources")
+            if kind in ("xref", "dict"):
+                return value
+        return "<<>>"
+
+    @staticmethod
+    def add_resource(doc: fitz.Document, page: fitz.Page, category: str, name: str, xref: int) -> None:
+        """Add ``/<category>/<name> xref 0 R`` to a page's resources, following indirect dictionaries."""
+        holder, prefix = page.xref, "Resources/"
+        kind, value = doc.xref_get_key(holder, "Resources")
+        if kind not in ("xref", "dict"):
+            # Give the page its own copy of what it inherits before adding to it
+            value = PDFOverlayService._inherited_resources(doc, page.xref)
+            doc.xref_set_key(page.xref, "Resources", value)
+            kind = "xref" if value.endswith(" R") else "dict"
+        if kind == "xref":
+            holder, prefix = PDFOverlayService._ref(value), ""
+
+        kind, value = doc.xref_get_key(holder, prefix + category)
+        if kind == "xref":
+            holder, key = PDFOverlayService._ref(value), name
+        else:
+            key = f"{prefix}{category}/{name}"
+        doc.xref_set_key(holder, key, f"{xref} 0 R")
+
+    @staticmethod
+    def append_contents(doc: fitz.Document, page: fitz.Page, wrap_xref: int, *stamp_xrefs: int) -> None:
+        """Put the page's content between ``wrap_xref`` (``q``) and ``stamp_xrefs`` (``Q`` and the stamp)."""
+        xrefs = [wrap_xref] + page.get_contents() + list(stamp_xrefs)
+        doc.xref_set_key(page.xref, "Contents", "[" + " ".join(f"{xref} 0 R" for xref in xrefs) + "]")
+
+    @staticmethod
+    def _geometry(page: fitz.Page) -> tuple:
+        return tuple(page.mediabox), tuple(page.cropbox), page.rotation
+
+    @staticmethod
+    def _pdf_matrix(page: fitz.Page, x: float, y: float) -> fitz.Matrix:
+        """Matrix placing upright content at ``(x, y)`` of the page as displayed (rotation included)."""
+        to_display = page.transformation_matrix * page.rotation_matrix
+        return fitz.Matrix(1, 0, 0, -1, x, y) * ~to_display
+
+    @staticmethod
+    def watermark_rect(r: fitz.Rect, where: str, diagonal: bool = False) -> fitz.Rect:
+        """Where the watermark goes on a page; a square around that spot when it is drawn diagonally."""
+        w, h = r.width, r.height
+        margin = max(20, int(min(w, h) * 0.03))
+        box_w = max(200, int(w * 0.6))
+        box_h = max(60, int(h * 0.15))
+        if where.startswith("top-"):
+            y0 = r.y0 + margin
+        elif where.startswith("bottom-"):
+            y0 = r.y1 - margin - box_h
+        else:
+            y0 = r.y0 + h / 2 - box_h / 2
+        if where.endswith("-left"):
+            x0 = r.x0 + margin
+        elif where.endswith("-right"):
+            x0 = r.x1 - margin - box_w
+        else:
+            x0 = r.x0 + w / 2 - box_w / 2
+        rect = fitz.Rect(x0, y0, x0 + box_w, y0 + box_h)
+        if diagonal:
+            center = (rect.tl + rect.br) / 2
+            half = box_w / 2
+            rect = fitz.Rect(center.x - half, center.y - half, center.x + half, center.y + half)
+        return rect
+
+    @staticmethod
+    def _watermark_template(text: str, width: float, height: float, fontsize: float) -> fitz.Document:
+        """Lay the watermark out once, centered on a ``width`` x ``height`` page of a new document."""
+        box = fitz.Rect(0, 0, width, height)
+        spare = -1.0
+        while fontsize >= PDFOverlayService.MIN_FONT_SIZE:
+            with fitz.open() as trial:
+                spare = trial.new_page(width=width, height=height).insert_textbox(
+                    box, text, fontsize=fontsize, fontname=PDFOverlayService.FONT, align=fitz.TEXT_ALIGN_CENTER
+                )
+            if spare >= 0:
+                break
+            fontsize *= PDFOverlayService.SHRINK_FACTOR
+        template = fitz.open()
+        template.new_page(width=width, height=height).insert_textbox(
+            box + (0, max(spare, 0) / 2, 0, max(spare, 0) / 2),
+            text,
+            fontsize=fontsize,
+            fontname=PDFOverlayService.FONT,
+            color=PDFOverlayService.WATERMARK_COLOR,
+            align=fitz.TEXT_ALIGN_CENTER,
+        )
+        return template
+
+    @staticmethod
+    def _stamp_form(doc: fitz.Document, geometry: tuple, rect: fitz.Rect, template: fitz.Document,
+                    rotate: float) -> int:
+        """
+        Draw a template's page into ``rect`` of a scratch page with the given
+        ``(mediabox, cropbox, rotation)`` and return the Form XObject that
+        places it, which can be shown on every page of that shape.
+        """
+        mediabox, cropbox, rotation = geometry
+        mediabox = fitz.Rect(mediabox)
+        scratch = doc.new_page(-1, width=mediabox.width, height=mediabox.height)
+        try:
+            scratch.set_mediabox(mediabox)
+            scratch.set_cropbox(fitz.Rect(cropbox))
+            scratch.set_rotation(rotation)
+            scratch.show_pdf_page(rect, template, 0, rotate=rotate, overlay=True)
+            return scratch.get_xobjects()[0][0]
+        finally:
+            doc.delete_page(scratch.number)
+
+    @staticmethod
+    def stamp_watermark(doc: fitz.Document, text: str, position: str = "center", diagonal: bool = False,
+                        pages: Optional[Iterable[int]] = None) -> None:
+        """Stamp ``text`` on ``pages`` (default all, 0-based) of ``doc``."""
+        page_numbers = list(range(doc.page_count) if pages is None else pages)
+        wrap_xref = PDFOverlayService._new_stream(doc, b"q\n")
+        # Page shape -> (XObject name, XObject xref, content stream xref)
+        stamps: Dict[tuple, Tuple[str, int, int]] = {}
+        for page_num in page_numbers:
+            page = doc[page_num]
+            key = PDFOverlayService._geometry(page)
+            if key not in stamps:
+                r = page.rect
+                box = PDFOverlayService.watermark_rect(r, position)
+                with PDFOverlayService._watermark_template(
+                    text, box.width, box.height, max(24, int(r.width * 0.06))
+                ) as template:
+                    form_xref = PDFOverlayService._stamp_form(
+                        doc, key, PDFOverlayService.watermark_rect(r, position, diagonal),
+                        template, 45 if diagonal else 0,
+                    )
+                name = f"{PDFOverlayService.STAMP_PREFIX}{len(stamps)}"
+                stamp_xref = PDFOverlayService._new_stream(doc, f"\nQ\nq\n/{name} Do\nQ\n".encode("ascii"))
+                stamps[key] = (name, form_xref, stamp_xref)
+                # Reload: adding and removing the scratch page invalidates page objects
+                page = doc[page_num]
+            name, form_xref, stamp_xref = stamps[key]
+            PDFOverlayService.add_resource(doc, page, "XObject", name, form_xref)
+            PDFOverlayService.append_contents(doc, page, wrap_xref, stamp_xref)
+
+    @staticmethod
+    def _pdf_string(text: str) -> str:
+        data = text.encode("cp1252", errors="replace").decode("latin-1")
+        return "(" + data.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+    @staticmethod
+    def stamp_page_numbers(doc: fitz.Document, position: str = "bottom-center", start_page: int = 1,
+                           fmt: str = "{page}", font_size: float = 12.0,
+                           pages: Optional[Iterable[int]] = None) -> None:
+        """Number ``pages`` (default all, 0-based) of ``doc``, from page ``start_page`` (1-based) on."""
+        page_numbers = [
+            page_num for page_num in (range(doc.page_count) if pages is None else pages)
+            if page_num + 1 >= start_page
+        ]
+        if not page_numbers:
+            return
+        font = fitz.Font(PDFOverlayService.FONT)
+        font_xref = doc.get_new_xref()
+        doc.update_object(font_xref, PDFOverlayService.FONT_OBJECT)
+        wrap_xref = PDFOverlayService._new_stream(doc, b"q\n")
+        # Only the text position and glyph run differ between pages; the rest is shared
+        color = " ".join(f"{c:g}" for c in PDFOverlayService.PAGE_NUMBER_COLOR)
+        head_xref = PDFOverlayService._new_stream(
+            doc, f"\nQ\nq\n{color} rg\nBT\n/{PDFOverlayService.FONT_NAME} {font_size:g} Tf\n".encode("ascii")
+        )
+        tail_xref = PDFOverlayService._new_stream(doc, b"\nET\nQ\n")
+        align = position.split("-")[1]
+        template = (fmt or "{page}").replace("\n", " ")
+        # Page shape -> band the number is written in
+        bands: Dict[tuple, fitz.Rect] = {}
+
+        for page_num in page_numbers:
+            page = doc[page_num]
+            key = PDFOverlayService._geometry(page)
+            rect = bands.get(key)
+            if rect is None:
+                r = page.rect
+                margin = max(20, int(min(r.width, r.height) * 0.03))
+                box_h = max(24, int(font_size * 2))
+                if position.startswith("top-"):
+                    rect = fitz.Rect(r.x0 + margin, r.y0 + margin, r.x1 - margin, r.y0 + margin + box_h)
+                else:
+                    rect = fitz.Rect(r.x0 + margin, r.y1 - margin - box_h, r.x1 - margin, r.y1 - margin)
+                bands[key] = rect
+
+            text = template.replace("{page}", str(page_num + 1))
+            width = font.text_length(text, font_size)
+            if align == "left":
+                x = rect.x0
+            elif align == "right":
+                x = rect.x1 - width
+            else:
+                x = (rect.x0 + rect.x1 - width) / 2
+            m = PDFOverlayService._pdf_matrix(page, x, rect.y0 + font_size * font.ascender)
+            glyph_run = f"{m.a:g} {m.b:g} {m.c:g} {m.d:g} {m.e:g} {m.f:g} Tm {PDFOverlayService._pdf_string(text)} Tj"
+            PDFOverlayService.add_resource(doc, page, "Font", PDFOverlayService.FONT_NAME, font_xref)
+            PDFOverlayService.append_contents(
+                doc, page, wrap_xref,
+                head_xref, PDFOverlayService._new_stream(doc, glyph_run.encode("latin-1")), tail_xref,
+            )
@@ -0,0 +1,226 @@
+"""
+PDF Workers
+
+Page-level functions run in ``ProcessPoolService`` workers. Each worker keeps
+its own open ``fitz.Document`` per input file, so a shard only pays for loading
+its pages. This module only imports what the workers need, so they start quickly.
+"""
+
+import multiprocessing
+import os
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+COLORSPACES = {
+    "rgb": fitz.csRGB,
+    "gray": fitz.csGRAY,
+    "cmyk": fitz.csCMYK,
+}
+# PIL modes for pixmaps by number of components
+_PIL_MODES = {1: "L", 3: "RGB", 4: "CMYK"}
+# Documents kept open per worker
+MAX_OPEN_DOCUMENTS = 4
+# Lines within this many points of horizontal or vertical count as table ruling
+TABLE_EDGE_TOLERANCE = 1.0
+# A page is read with OCR when images cover at least this share of it...
+OCR_MIN_IMAGE_COVERAGE = 0.3
+# ...and its text covers less than this share (a scan, at most with a stamped header)
+OCR_MAX_TEXT_COVERAGE = 0.02
+
+
+
+class PageText(NamedTuple):
+    """
+    Text extracted from one page.
+
+    ``blocks`` are ``(x0, y0, x1, y1, text, block_no, block_type)`` and
+    ``words`` are ``(x0, y0, x1, y1, word, block_no, line_no, word_no)``, as
+    returned by ``page.get_text("blocks")`` / ``("words")``, with coordinates
+    rounded to 0.01pt.
+    """
+    text: str
+    blocks: Tuple[tuple, ...]
+    words: Tuple[tuple, ...]
+
+    def approximate_size(self) -> int:
+        """Rough memory footprint in bytes, for cache accounting."""
+        return (
+            len(self.text)
+            + sum(len(block[4]) + 120 for block in self.blocks)
+            + sum(len(word[4]) + 130 for word in self.words)
+        )
+
+
+_documents: "OrderedDict[Tuple[str, float, int], fitz.Document]" = OrderedDict()
+
+
+def _cached_document(path: str) -> fitz.Document:
+    stat = os.stat(path)
+    key = (path, stat.st_mtime, stat.st_size)
+    doc = _documents.pop(key, None)
+    if doc is None:
+        doc = fitz.open(path)
+    _documents[key] = doc
+    while len(_documents) > MAX_OPEN_DOCUMENTS:
+        _documents.popitem(last=False)[1].close()
+    return doc
+
+
+@contextmanager
+def open_document(path: str) -> Iterator[fitz.Document]:
+    """Open a document; pool workers reuse it across shards, other callers get a private copy."""
+    if multiprocessing.parent_process() is not None:
+        yield _cached_document(path)
+        return
+    doc = fitz.open(path)
+    try:
+        yield doc
+    finally:
+        doc.close()
+
+
+def render_page(doc: fitz.Document, page_num: int, output_dir: str, fmt: str, dpi: int, colorspace: str) -> str:
+    """Render one page to ``page_<n>.<fmt>`` in ``output_dir`` and return its path."""
+    pix = doc.load_page(page_num).get_pixmap(dpi=dpi, colorspace=COLORSPACES[colorspace], alpha=False)
+    output_file = os.path.join(output_dir, f"page_{page_num + 1}.{fmt}")
+    if fmt in {"tiff", "tif"}:
+        # Wrap the pixmap's samples instead of copying them
+        mode = _PIL_MODES[pix.n]
+        image = Image.frombuffer(mode, (pix.width, pix.height), pix.samples_mv, "raw", mode, pix.stride, 1)
+        image.save(output_file, format="TIFF")
+        del image
+    else:
+        pix.save(output_file)
+    return output_file
+
+
+def render_pages(page_numbers: Sequence[int], pdf_path: str, output_dir: str, fmt: str,
+                 dpi: int, colorspace: str) -> List[Tuple[int, str]]:
+    """Render a shard of pages; returns ``(page_num, path)`` pairs."""
+    with open_document(pdf_path) as doc:
+        return [
+            (page_num, render_page(doc, page_num, output_dir, fmt, dpi, colorspace))
+            for page_num in page_numbers
+        ]
+
+
+def _round_boxes(items: List[tuple]) -> Tuple[tuple, ...]:
+    return tuple(
+        (round(item[0], 2), round(item[1], 2), round(item[2], 2), round(item[3], 2)) + tuple(item[4:])
+        for item in items
+    )
+
+
+def extract_page(page: fitz.Page) -> PageText:
+    """Extract text, blocks and word boxes of a page from a single text page parse."""
+    textpage = page.get_textpage()
+    return PageText(
+        text=page.get_text("text", textpage=textpage),
+        blocks=_round_boxes(page.get_text("blocks", textpage=textpage)),
+        words=_round_boxes(page.get_text("words", textpage=textpage)),
+    )
+
+
+def extract_pages(page_numbers: Sequence[int], pdf_path: str) -> List[Tuple[int, PageText]]:
+    """Extract a shard of pages; returns ``(page_num, PageText)`` pairs."""
+    with open_document(pdf_path) as doc:
+        return [(page_num, extract_page(doc.load_page(page_num))) for page_num in page_numbers]
+
+
+def write_part(doc: fitz.Document, first_page: int, last_page: int, output_path: str) -> str:
+    """
+    Copy pages ``first_page`` to ``last_page`` (0-based, inclusive) to a new
+    PDF. Only objects the pages reference are copied, and cleaning the
+    content streams drops resources the pages list but never draw.
+    """
+    with fitz.open() as part:
+        part.insert_pdf(doc, from_page=first_page, to_page=last_page)
+        part.save(output_path, garbage=3, deflate=True, clean=True)
+    return output_path
+
+
+def write_parts(parts: Sequence[Tuple[int, int, int, str]], pdf_path: str) -> List[Tuple[int, str]]:
+    """Write a shard of ``(index, first_page, last_page, path)`` parts; returns ``(index, path)`` pairs."""
+    with open_document(pdf_path) as doc:
+        return [(index, write_part(doc, first, last, path)) for index, first, last, path in parts]
+
+
+def has_table_edges(page: fitz.Page) -> bool:
+    """
+    Whether a page has the ruling lines a table needs. ``find_tables`` (with
+    its default ``lines`` strategy) builds cells from horizontal and vertical
+    vector edges, so a page without at least two of each cannot hold a table.
+    Reading the drawings is much cheaper than running the table finder.
+    """
+    horizontal = vertical = 0
+    for path in page.get_cdrawings():
+        for item in path["items"]:
+            kind = item[0]
+            if kind in ("re", "qu"):
+                horizontal += 2
+                vertical += 2
+            elif kind == "l":
+                (x0, y0), (x1, y1) = item[1], item[2]
+                if abs(y0 - y1) <= TABLE_EDGE_TOLERANCE:
+                    horizontal += 1
+                elif abs(x0 - x1) <= TABLE_EDGE_TOLERANCE:
+                    vertical += 1
+            if horizontal >= 2 and vertical >= 2:
+                return True
+    return False
+
+
+def page_tables(page: fitz.Page) -> List[List[list]]:
+    """The rows of every table on a page."""
+    tables = []
+    for table in page.find_tables():
+        try:
+            rows = table.extract()
+        except Exception:
+            continue
+        if rows:
+            tables.append(rows)
+    return tables
+
+
+def find_tables(page_numbers: Sequence[int], pdf_path: str) -> List[Tuple[int, List[List[list]]]]:
+    """Find the tables of a shard of pages; returns ``(page_num, tables)`` pairs."""
+    with open_document(pdf_path) as doc:
+        return [(page_num, page_tables(doc.load_page(page_num))) for page_num in page_numbers]
+
+
+def needs_ocr(page: fitz.Page, text: PageText) -> bool:
+    """
+    Whether a page's content is in images rather than text: images cover
+    much of it and it has no fonts, or too little text for the image area
+    to be anything but a scan. Pages with an OCR text layer already (as
+    invisible text) have their words, so they are not read again.
+    """
+    area = abs(page.rect)
+    if not area:
+        return False
+    image_area = sum(abs(fitz.Rect(info["bbox"]) & page.rect) for info in page.get_image_info())
+    if image_area < OCR_MIN_IMAGE_COVERAGE * area:
+        return False
+    if not page.get_fonts():
+        return True
+    text_area = sum(abs(fitz.Rect(word[:4]) & page.rect) for word in text.words)
+    return text_area < OCR_MAX_TEXT_COVERAGE * area
+
+
+def classify_pages(page_numbers: Sequence[int], pdf_path: str) -> List[Tuple[int, Optional[PageText]]]:
+    """
+    Extract the text of a shard of pages; returns ``(page_num, PageText)``
+    pairs, with ``None`` for pages that need OCR.
+    """
+    results = []
+    with open_document(pdf_path) as doc:
+        for page_num in page_numbers:
+            page = doc.load_page(page_num)
+            text = extract_page(page)
+            results.append((page_num, None if needs_ocr(page, text) else text))
+    return results
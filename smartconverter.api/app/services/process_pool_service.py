@@ -0,0 +1,201 @@
+"""
+Process Pool Service
+
+A shared pool of worker processes for CPU-bound page work (rendering and
+extracting PDF pages) that would otherwise run on one core in the request
+thread. Work is split into shards - contiguous page ranges - and results are
+yielded as each shard finishes, so callers can write output and report
+progress while the rest of the document is still being processed. ``imap``
+instead feeds items from a lazy iterable a few at a time, for work whose
+inputs are large (rendered pages) and should not all exist at once.
+
+Workers are started with ``spawn`` so they do not inherit locks held by other
+threads of the server, and are kept for the life of the process.
+
+Work that needs state loaded up front, such as OCR models, runs in dedicated
+pools (``WorkerPool``) instead: their workers load it once when they start and
+can be replaced after a number of tasks to release memory the state grows.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.services.job_service import JobService
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPool(NamedTuple):
+    """
+    A dedicated pool: each worker runs ``initializer(*initargs)`` when it
+    starts and is replaced after ``max_tasks`` tasks (never when None). A
+    pool whose settings change is replaced by a new one.
+    """
+    name: str
+    max_workers: int
+    initializer: Optional[Callable[..., None]] = None
+    initargs: Tuple[Any, ...] = ()
+    max_tasks: Optional[int] = None
+
+
+class ProcessPoolService:
+    """Run sharded work in a shared process pool."""
+
+    # Shards per worker: more shards give smoother progress and load balancing
+    SHARDS_PER_WORKER = 4
+
+    _executor: Optional[ProcessPoolExecutor] = None
+    _pools: Dict[str, Tuple[WorkerPool, ProcessPoolExecutor]] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def max_workers() -> int:
+        return settings.process_pool_workers or os.cpu_count() or 1
+
+    @staticmethod
+    def should_parallelize(page_count: int, min_pages: Optional[int] = None) -> bool:
+        """
+        Whether a document is large enough to be worth sending to the pool;
+        ``min_pages`` overrides ``settings.pdf_parallel_min_pages``.
+        """
+        if min_pages is None:
+            min_pages = settings.pdf_parallel_min_pages
+        return ProcessPoolService.max_workers() > 1 and page_count >= min_pages
+
+    @staticmethod
+    def get_executor(pool: Optional[WorkerPool] = None) -> ProcessPoolExecutor:
+        """The shared pool, or the dedicated ``pool`` (started on first use)."""
+        with ProcessPoolService._lock:
+            if pool is None:
+                if ProcessPoolService._executor is None:
+                    ProcessPoolService._executor = ProcessPoolExecutor(
+                        max_workers=ProcessPoolService.max_workers(),
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                return ProcessPoolService._executor
+
+            current = ProcessPoolService._pools.get(pool.name)
+            if current is not None and current[0] == pool:
+                return current[1]
+            if current is not None:
+                # Settings changed: tasks already running finish on the old workers
+                current[1].shutdown(wait=False)
+            executor = ProcessPoolExecutor(
+                max_workers=pool.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=pool.initializer,
+                initargs=pool.initargs,
+                max_tasks_per_child=pool.max_tasks,
+            )
+            ProcessPoolService._pools[pool.name] = (pool, executor)
+            return executor
+
+    @staticmethod
+    def shutdown() -> None:
+        with ProcessPoolService._lock:
+            executors = [executor for _, executor in ProcessPoolService._pools.values()]
+            if ProcessPoolService._executor is not None:
+                executors.append(ProcessPoolService._executor)
+            ProcessPoolService._executor = None
+            ProcessPoolService._pools.clear()
+        for executor in executors:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    @staticmethod
+    def shard(items: Sequence[Any], shards: Optional[int] = None) -> List[List[Any]]:
+        """Split ``items`` into at most ``shards`` contiguous, similarly sized lists."""
+        items = list(items)
+        if shards is None:
+            shards = ProcessPoolService.max_workers() * ProcessPoolService.SHARDS_PER_WORKER
+        shards = max(1, min(shards, len(items)))
+        size, extra = divmod(len(items), shards)
+        result, start = [], 0
+        for index in range(shards):
+            end = start + size + (1 if index < extra else 0)
+            if end > start:
+                result.append(items[start:end])
+            start = end
+        return result
+
+    @staticmethod
+    def map_shards(func: Callable[..., Any], shards: Sequence[Any], *args: Any, **kwargs: Any) -> Iterator[Any]:
+        """
+        Run ``func(shard, *args, **kwargs)`` for every shard in the pool and
+        yield the results in completion order.
+
+        ``func`` must be a module-level function. Shards not yet started are
+        dropped if the current job is cancelled or a shard fails.
+        """
+        executor = ProcessPoolService.get_executor()
+        pending = {executor.submit(func, shard, *args, **kwargs) for shard in shards}
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=JobService.WATCH_INTERVAL, return_when=FIRST_COMPLETED)
+                JobService.check_cancelled()
+                for future in done:
+                    yield future.result()
+        except BrokenProcessPool:
+            ProcessPoolService._discard(executor)
+            raise
+        finally:
+            for future in pending:
+                future.cancel()
+
+    @staticmethod
+    def imap(func: Callable[..., Any], items: Iterable[Any], *args: Any,
+             max_pending: Optional[int] = None, pool: Optional[WorkerPool] = None,
+             **kwargs: Any) -> Iterator[Any]:
+        """
+        Run ``func(item, *args, **kwargs)`` in the pool (or the dedicated
+        ``pool``) for each item and yield the results in the order of ``items``.
+
+        At most ``max_pending`` items (default: two per worker) are in the
+        pool at a time and ``items`` is only advanced when one finishes, so a
+        generator of large items, such as rendered pages, never has more than
+        that many alive. ``func`` must be a module-level function.
+        """
+        executor = ProcessPoolService.get_executor(pool)
+        if max_pending is None:
+            max_pending = (pool.max_workers if pool else ProcessPoolService.max_workers()) * 2
+        items = iter(items)
+        pending: Deque[Future] = deque()
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) < max_pending:
+                    try:
+                        item = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending.append(executor.submit(func, item, *args, **kwargs))
+                    del item
+                if not pending:
+                    return
+                wait([pending[0]], timeout=JobService.WATCH_INTERVAL)
+                JobService.check_cancelled()
+                if pending[0].done():
+                    yield pending.popleft().result()
+        except BrokenProcessPool:
+            ProcessPoolService._discard(executor)
+            raise
+        finally:
+            for future in pending:
+                future.cancel()
+
+    @staticmethod
+    def _discard(executor: ProcessPoolExecutor) -> None:
+        logger.error("Process pool worker died; the pool will be restarted")
+        with ProcessPoolService._lock:
+            if ProcessPoolService._executor is executor:
+                ProcessPoolService._executor = None
+            for name, (_, pool_executor) in list(ProcessPoolService._pools.items()):
+                if pool_executor is executor:
+                    del ProcessPoolService._pools[name]
@@ -0,0 +1,76 @@
+"""
+Stream Service
+
+Encodes results produced page by page for streamed responses: NDJSON (one
+JSON object per line) for text and structured data, and a ZIP archive written
+entry by entry for files such as rendered pages. Only the entry being written
+is held in memory; the archive is never assembled on the server.
+"""
+
+import json
+import os
+import zipfile
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+
+class _ChunkBuffer:
+    """Write-only file object whose contents are taken out as they are written."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class StreamService:
+    """Encode page-by-page results as NDJSON or a streamed ZIP archive."""
+
+    NDJSON_MEDIA_TYPE = "application/x-ndjson"
+    ZIP_MEDIA_TYPE = "application/zip"
+    # Bytes of a file copied into the archive between flushes
+    ZIP_COPY_CHUNK_SIZE = 1024 * 1024
+
+    @staticmethod
+    def ndjson(records: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+        """Yield one line of JSON per record."""
+        try:
+            for record in records:
+                yield (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        finally:
+            if hasattr(records, "close"):
+                records.close()
+
+    @staticmethod
+    def zip_files(files: Iterable[Tuple[str, str]], remove: bool = True) -> Iterator[bytes]:
+        """
+        Yield a ZIP archive of ``(name in archive, path)`` files, sending each
+        file as soon as ``files`` produces it and removing it once sent.
+        Entries are stored uncompressed: rendered images are compressed already.
+        """
+        buffer = _ChunkBuffer()
+        try:
+            # A stream without tell() makes zipfile write sizes after each entry
+            with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+                for name, path in files:
+                    with open(path, "rb") as source, archive.open(name, "w", force_zip64=True) as entry:
+                        for data in iter(lambda: source.read(StreamService.ZIP_COPY_CHUNK_SIZE), b""):
+                            entry.write(data)
+                            yield buffer.drain()
+                    if remove:
+                        os.remove(path)
+                    yield buffer.drain()
+            # The central directory
+            yield buffer.drain()
+        finally:
+            if hasattr(files, "close"):
+                files.close()
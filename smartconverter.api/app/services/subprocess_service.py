@@ -0,0 +1,372 @@
+"""
+Subprocess Service
+
+Shared runner for the external tools the services call (ffmpeg, ghostscript,
+tesseract). Children run in their own process group under the current job, so
+cancelling the job kills them. Output is read with asyncio while the child runs:
+stderr is streamed line by line to progress parsers and only a bounded tail is
+kept. Each run enforces a wall-clock timeout and an optional CPU-time limit and
+records the child's CPU time and peak RSS from ``wait4``.
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.services.job_service import JobService
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    resource = None
+    RESOURCE_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class SubprocessResult:
+    """Outcome of a finished external command."""
+
+    def __init__(
+        self,
+        cmd: List[str],
+        returncode: int,
+        stdout: Any,
+        stderr: str,
+        wall_time: float,
+        cpu_time: Optional[float] = None,
+        max_rss_kb: Optional[int] = None,
+    ):
+        self.cmd = cmd
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.wall_time = wall_time
+        self.cpu_time = cpu_time
+        self.max_rss_kb = max_rss_kb
+
+    def check_returncode(self) -> None:
+        if self.returncode != 0:
+            raise subprocess.CalledProcessError(self.returncode, self.cmd, self.stdout, self.stderr)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "command": os.path.basename(self.cmd[0]) if self.cmd else None,
+            "returncode": self.returncode,
+            "wall_time": round(self.wall_time, 3),
+            "cpu_time": round(self.cpu_time, 3) if self.cpu_time is not None else None,
+            "max_rss_kb": self.max_rss_kb,
+        }
+
+
+class FfmpegProgress:
+    """Turns ffmpeg stderr (stats ``time=`` or ``-progress`` key=value lines) into a percentage."""
+
+    _DURATION = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+    _TIME = re.compile(r"\btime=\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+    _OUT_TIME = re.compile(r"^out_time=(\d+):(\d+):(\d+(?:\.\d+)?)")
+    # ffmpeg reports out_time_ms in microseconds as well
+    _OUT_TIME_US = re.compile(r"^out_time_(?:us|ms)=(\d+)")
+    _PROGRESS_END = re.compile(r"^progress=end")
+
+    def __init__(self, duration: Optional[float] = None, callback: Optional[Callable[[float], None]] = None):
+        self.duration = duration if duration and duration > 0 else None
+        self.callback = callback
+        self.percent: Optional[float] = None
+
+    @staticmethod
+    def _seconds(h: str, m: str, s: str) -> float:
+        return int(h) * 3600 + int(m) * 60 + float(s)
+
+    @staticmethod
+    def parse_time(value: str) -> Optional[float]:
+        """Parse an ffmpeg time argument (``90``, ``1.5`` or ``00:01:30.5``)."""
+        try:
+            parts = [float(p) for p in str(value).split(":")]
+        except ValueError:
+            return None
+        seconds = 0.0
+        for part in parts:
+            seconds = seconds * 60 + part
+        return seconds
+
+    @staticmethod
+    def duration_from_args(args: List[str]) -> Optional[float]:
+        """Output duration implied by ``-t`` or ``-ss``/``-to`` arguments, if any."""
+        values = {}
+        for flag, value in zip(args, args[1:]):
+            if flag in ("-t", "-ss", "-to"):
+                values[flag] = FfmpegProgress.parse_time(value)
+        if values.get("-t"):
+            return values["-t"]
+        if values.get("-to") is not None:
+            return values["-to"] - (values.get("-ss") or 0.0)
+        return None
+
+    def feed(self, line: str) -> Optional[float]:
+        """Parse one stderr line; returns the new percentage when it changed."""
+        if self.duration is None:
+            match = self._DURATION.search(line)
+            if match:
+                self.duration = self._seconds(*match.groups()) or None
+            return None
+
+        position = None
+        if self._PROGRESS_END.match(line):
+            return self._update(100.0)
+        match = self._OUT_TIME_US.match(line)
+        if match:
+            position = int(match.group(1)) / 1_000_000
+        else:
+            match = self._OUT_TIME.match(line) or self._TIME.search(line)
+            if match:
+                position = self._seconds(*match.groups())
+        if position is None:
+            return None
+        return self._update(min(99.9, max(0.0, position / self.duration * 100)))
+
+    def _update(self, percent: float) -> Optional[float]:
+        percent = round(percent, 1)
+        if percent == self.percent:
+            return None
+        self.percent = percent
+        if self.callback:
+            self.callback(percent)
+        return percent
+
+
+class SubprocessService:
+    """Run external commands with streaming output, limits and resource accounting."""
+
+    # Number of stderr lines kept for error messages
+    STDERR_TAIL_LINES = 200
+    READ_CHUNK_SIZE = 64 * 1024
+    # Extra CPU seconds between the soft (SIGXCPU) and hard (SIGKILL) limit
+    CPU_LIMIT_GRACE_SECONDS = 5
+
+    _LINE_SPLIT = re.compile(rb"[\r\n]")
+
+    @staticmethod
+    def _limit_resources(cpu_limit: Optional[int]) -> Optional[Callable[[], None]]:
+        """preexec_fn applying the CPU-time limit in the child."""
+        if not cpu_limit or not RESOURCE_AVAILABLE:
+            return None
+
+        def _apply() -> None:
+            resource.setrlimit(
+                resource.RLIMIT_CPU,
+                (cpu_limit, cpu_limit + SubprocessService.CPU_LIMIT_GRACE_SECONDS),
+            )
+
+        return _apply
+
+    @staticmethod
+    async def _read_chunks(pipe):
+        """Yield chunks from a child pipe without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        if os.name == "posix":
+            reader = asyncio.StreamReader(limit=SubprocessService.READ_CHUNK_SIZE)
+            transport, _ = await loop.connect_read_pipe(
+                lambda: asyncio.StreamReaderProtocol(reader), pipe
+            )
+            try:
+                while True:
+                    chunk = await reader.read(SubprocessService.READ_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+            finally:
+                transport.close()
+        else:
+            # Proactor loops cannot watch anonymous pipes; read them in the executor
+            try:
+                while True:
+                    chunk = await loop.run_in_executor(None, pipe.read1, SubprocessService.READ_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+            finally:
+                pipe.close()
+
+    @staticmethod
+    async def _collect(pipe) -> bytes:
+        chunks = []
+        async for chunk in SubprocessService._read_chunks(pipe):
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    @staticmethod
+    async def _stream_lines(pipe, on_line: Optional[Callable[[str], None]]) -> str:
+        """Split stderr on CR/LF as it arrives, passing each line to ``on_line``."""
+        tail = deque(maxlen=SubprocessService.STDERR_TAIL_LINES)
+        pending = b""
+        async for chunk in SubprocessService._read_chunks(pipe):
+            parts = SubprocessService._LINE_SPLIT.split(pending + chunk)
+            pending = parts.pop()
+            for raw in parts:
+                if not raw:
+                    continue
+                line = raw.decode("utf-8", errors="replace")
+                tail.append(line)
+                if on_line:
+                    on_line(line)
+        if pending:
+            line = pending.decode("utf-8", errors="replace")
+            tail.append(line)
+            if on_line:
+                on_line(line)
+        return "\n".join(tail)
+
+    @staticmethod
+    def _write_stdin(process: subprocess.Popen, data: bytes) -> None:
+        try:
+            process.stdin.write(data)
+            process.stdin.close()
+        except (BrokenPipeError, OSError):
+            # The child exited without reading everything; its return code tells why
+            pass
+
+    @staticmethod
+    def _reap(process: subprocess.Popen):
+        """Wait for the child and return its rusage (None where wait4 is unavailable)."""
+        if hasattr(os, "wait4"):
+            try:
+                _, status, usage = os.wait4(process.pid, 0)
+            except ChildProcessError:
+                # Already reaped by Popen (e.g. while being terminated)
+                process.wait()
+                return None
+            process.returncode = os.waitstatus_to_exitcode(status)
+            return usage
+        process.wait()
+        return None
+
+    @staticmethod
+    async def run_async(
+        cmd: List[str],
+        input: Optional[bytes] = None,
+        capture_stdout: bool = True,
+        text: bool = False,
+        timeout: Optional[float] = None,
+        cpu_limit: Optional[int] = None,
+        on_stderr_line: Optional[Callable[[str], None]] = None,
+        cwd: Optional[str] = None,
+    ) -> SubprocessResult:
+        """
+        Run a command and wait for it without blocking the event loop.
+
+        Raises subprocess.TimeoutExpired when the wall-clock limit is hit and
+        JobCancelledError when the current job is cancelled while it runs.
+        """
+        JobService.check_cancelled()
+        timeout = settings.subprocess_timeout_seconds if timeout is None else timeout
+        cpu_limit = settings.subprocess_cpu_limit_seconds if cpu_limit is None else cpu_limit
+        job = JobService.current_job()
+        if job is not None and job.deadline:
+            remaining = max(job.deadline - time.time(), 1.0)
+            timeout = min(timeout, remaining) if timeout else remaining
+
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE if capture_stdout else subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            cwd=cwd,
+            preexec_fn=SubprocessService._limit_resources(cpu_limit),
+            **JobService.popen_kwargs(),
+        )
+        JobService.register_process(process)
+        try:
+            stderr_task = asyncio.ensure_future(
+                SubprocessService._stream_lines(process.stderr, on_stderr_line)
+            )
+            stdout_task = (
+                asyncio.ensure_future(SubprocessService._collect(process.stdout))
+                if capture_stdout else None
+            )
+            if input is not None:
+                loop.run_in_executor(None, SubprocessService._write_stdin, process, input)
+
+            reap = loop.run_in_executor(None, SubprocessService._reap, process)
+            timed_out = False
+            try:
+                await asyncio.wait_for(asyncio.shield(reap), timeout or None)
+            except asyncio.TimeoutError:
+                timed_out = True
+                JobService.terminate_process(process)
+            except asyncio.CancelledError:
+                # The caller no longer wants the result (e.g. another candidate won)
+                JobService.terminate_process(process)
+                stderr_task.cancel()
+                if stdout_task:
+                    stdout_task.cancel()
+                raise
+            usage = await reap
+
+            stderr = await stderr_task
+            stdout = await stdout_task if stdout_task else None
+        finally:
+            JobService.unregister_process(process)
+
+        if text and stdout is not None:
+            stdout = stdout.decode("utf-8", errors="replace")
+
+        cpu_time = max_rss_kb = None
+        if usage is not None:
+            cpu_time = usage.ru_utime + usage.ru_stime
+            # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+            max_rss_kb = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+        result = SubprocessResult(
+            cmd, process.returncode, stdout, stderr,
+            time.monotonic() - started, cpu_time, max_rss_kb,
+        )
+        logger.info(
+            f"{os.path.basename(cmd[0])} exited with {result.returncode} in {result.wall_time:.2f}s "
+            f"(cpu {cpu_time}s, peak rss {max_rss_kb} KB)"
+        )
+        JobService.record_process_stats(result.stats())
+
+        JobService.check_cancelled()
+        if timed_out:
+            raise subprocess.TimeoutExpired(cmd, timeout, output=stdout, stderr=stderr)
+        return result
+
+    @staticmethod
+    def run_coroutine(make_coroutine: Callable[[], Awaitable[Any]]) -> Any:
+        """Run a coroutine to completion from synchronous service code."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(make_coroutine())
+
+        # Called from inside an event loop: run on a helper thread with the same job context
+        context = contextvars.copy_context()
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            return pool.submit(context.run, lambda: asyncio.run(make_coroutine())).result()
+
+    @staticmethod
+    def run(cmd: List[str], **kwargs: Any) -> SubprocessResult:
+        """Blocking wrapper around ``run_async`` for the synchronous service code."""
+        return SubprocessService.run_coroutine(lambda: SubprocessService.run_async(cmd, **kwargs))
+
+    @staticmethod
+    def run_ffmpeg(cmd: List[str], duration: Optional[float] = None, **kwargs: Any) -> SubprocessResult:
+        """Run ffmpeg, reporting its progress to the current job."""
+        JobService.set_stage("Encoding")
+        progress = FfmpegProgress(
+            duration or FfmpegProgress.duration_from_args(cmd),
+            callback=JobService.set_progress,
+        )
+        return SubprocessService.run(cmd, on_stderr_line=progress.feed, **kwargs)
@@ -3,11 +3,11 @@ import io
 from typing import Optional, Dict, Any, List, Tuple
 from docx import Document
 from pptx import Presentation
-import fitz  # PyMuPDF
 import pysrt
 import webvtt
 from app.core.exceptions import FileProcessingError
 from app.services.file_service import FileService
+from app.services.text_extraction_service import TextExtractionService
 
 
 class TextConversionService:
@@ -127,23 +127,14 @@ class TextConversionService:
             if not os.path.exists(input_path):
                 raise FileProcessingError(f"Input PDF file not found: {input_path}")
             
-            # Open PDF document
-            doc = fitz.open(input_path)
-            
             # Extract text from all pages
             text_content = []
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                page_text = page.get_text()
-                
+            for page_num, page_text in TextExtractionService.page_texts(input_path):
                 if page_text.strip():
                     text_content.append(f"--- Page {page_num + 1} ---")
                     text_content.append(page_text.strip())
                     text_content.append("")  # Add empty line between pages
             
-            # Close document
-            doc.close()
-            
             # Join all text content
             extracted_text = "\n".join(text_content)
             
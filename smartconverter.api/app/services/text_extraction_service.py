@@ -0,0 +1,158 @@
+"""
+Text Extraction Service
+
+Page-level cache of text extracted from PDFs, shared by every tool that reads
+PDF text (text, markdown, HTML, CSV, Word, comparison, OCR and ebook
+conversions). Entries are keyed by the SHA-256 of the document and the page
+number, so converting one upload to several formats - or the same content
+uploaded twice - extracts each page only once per process.
+
+Each entry holds the page text, its blocks and its word boxes (see
+``pdf_workers.PageText``). The cache is an in-process LRU bounded by
+``settings.text_cache_max_bytes``. Large documents are extracted in the
+shared process pool.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+from app.core.config import settings
+from app.services import pdf_workers
+from app.services.job_service import JobService
+from app.services.pdf_workers import PageText
+from app.services.process_pool_service import ProcessPoolService
+
+
+class TextExtractionService:
+    """Extract PDF page text through a shared cache."""
+
+    HASH_CHUNK_SIZE = 1024 * 1024
+    # Remembered file hashes (by inode, size and mtime) so a file is hashed once
+    MAX_REMEMBERED_HASHES = 256
+
+    _pages: "OrderedDict[Tuple[str, int], PageText]" = OrderedDict()
+    _sizes: "dict[Tuple[str, int], int]" = {}
+    _total_bytes = 0
+    _hashes: "OrderedDict[tuple, str]" = OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def document_hash(path: str) -> str:
+        """SHA-256 of a file, remembered while the file is unchanged."""
+        stat = os.stat(path)
+        key = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        with TextExtractionService._lock:
+            digest = TextExtractionService._hashes.get(key)
+        if digest is not None:
+            return digest
+
+        hasher = hashlib.sha256()
+        with open(path, "rb") as f:
+            for data in iter(lambda: f.read(TextExtractionService.HASH_CHUNK_SIZE), b""):
+                hasher.update(data)
+        digest = hasher.hexdigest()
+        with TextExtractionService._lock:
+            TextExtractionService._hashes[key] = digest
+            while len(TextExtractionService._hashes) > TextExtractionService.MAX_REMEMBERED_HASHES:
+                TextExtractionService._hashes.popitem(last=False)
+        return digest
+
+    @staticmethod
+    def get_cached(digest: str, page_num: int) -> Optional[PageText]:
+        key = (digest, page_num)
+        with TextExtractionService._lock:
+            entry = TextExtractionService._pages.get(key)
+            if entry is not None:
+                TextExtractionService._pages.move_to_end(key)
+            return entry
+
+    @staticmethod
+    def put_cached(digest: str, page_num: int, entry: PageText) -> None:
+        key = (digest, page_num)
+        size = entry.approximate_size()
+        if size > settings.text_cache_max_bytes:
+            return
+        with TextExtractionService._lock:
+            if key in TextExtractionService._pages:
+                TextExtractionService._total_bytes -= TextExtractionService._sizes[key]
+            TextExtractionService._pages[key] = entry
+            TextExtractionService._pages.move_to_end(key)
+            TextExtractionService._sizes[key] = size
+            TextExtractionService._total_bytes += size
+            while TextExtractionService._total_bytes > settings.text_cache_max_bytes:
+                old_key, _ = TextExtractionService._pages.popitem(last=False)
+                TextExtractionService._total_bytes -= TextExtractionService._sizes.pop(old_key)
+
+    @staticmethod
+    def clear() -> None:
+        with TextExtractionService._lock:
+            TextExtractionService._pages.clear()
+            TextExtractionService._sizes.clear()
+            TextExtractionService._total_bytes = 0
+
+    @staticmethod
+    def get_page(digest: str, doc: fitz.Document, page_num: int) -> PageText:
+        """Get a page of an open document (whose hash is ``digest``) from the cache, extracting it on a miss."""
+        entry = TextExtractionService.get_cached(digest, page_num)
+        if entry is None:
+            entry = pdf_workers.extract_page(doc.load_page(page_num))
+            TextExtractionService.put_cached(digest, page_num, entry)
+        return entry
+
+    @staticmethod
+    def iter_pages(pdf_path: str, pages: Optional[Iterable[int]] = None,
+                   stage: str = "Extracting text",
+                   shard_pages: Optional[int] = None) -> Iterator[Tuple[int, PageText]]:
+        """
+        Yield ``(page_num, PageText)`` for the document's pages (or just
+        ``pages``, 0-based) in order, extracting only pages not in the cache.
+
+        When many pages are missing they are extracted in the process pool,
+        and each page is yielded as soon as it and all pages before it are
+        available; small documents are extracted in this thread.
+        ``shard_pages`` sets the pages per pool task, so that the first pages
+        arrive early (default: a few tasks per worker).
+        """
+        digest = TextExtractionService.document_hash(pdf_path)
+        with fitz.open(pdf_path) as doc:
+            page_numbers = list(range(len(doc))) if pages is None else list(pages)
+            missing = [
+                page_num for page_num in page_numbers
+                if TextExtractionService.get_cached(digest, page_num) is None
+            ]
+            results = None
+            if ProcessPoolService.should_parallelize(len(missing)):
+                shards = ProcessPoolService.shard(
+                    missing, -(-len(missing) // shard_pages) if shard_pages else None
+                )
+                results = ProcessPoolService.map_shards(pdf_workers.extract_pages, shards, pdf_path)
+            pending = set(missing) if results is not None else set()
+            ready: Dict[int, PageText] = {}
+            try:
+                for index, page_num in enumerate(page_numbers):
+                    JobService.checkpoint(index, len(page_numbers), stage)
+                    if page_num in pending:
+                        # Pages of later shards that finish first wait here
+                        while page_num not in ready:
+                            for done_num, entry in next(results):
+                                TextExtractionService.put_cached(digest, done_num, entry)
+                                ready[done_num] = entry
+                        pending.discard(page_num)
+                        yield page_num, ready.pop(page_num)
+                    else:
+                        yield page_num, TextExtractionService.get_page(digest, doc, page_num)
+            finally:
+                if results is not None:
+                    results.close()
+
+    @staticmethod
+    def page_texts(pdf_path: str, pages: Optional[Iterable[int]] = None,
+                   stage: str = "Extracting text") -> Iterator[Tuple[int, str]]:
+        """Yield ``(page_num, text)`` for every page (or just ``pages``), in order."""
+        for page_num, entry in TextExtractionService.iter_pages(pdf_path, pages, stage):
+            yield page_num, entry.text
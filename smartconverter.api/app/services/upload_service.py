@@ -0,0 +1,507 @@
+"""
+Upload Service
+
+Resumable uploads for large files. A client creates an upload, sends the file
+in chunks (each with the offset it starts at and a checksum), can ask for the
+current offset after a disconnect and continue from there, and finally
+finalizes the upload. The resulting upload id can be sent to any conversion
+endpoint in place of the ``file`` field.
+
+Chunks are appended to a staging file in ``settings.resumable_upload_dir``;
+the offset is always the staging file's size, so a chunk that was cut off or
+failed its checksum is simply truncated away.
+
+Finalized uploads are kept in a content-addressed store: one file per SHA-256
+under ``blobs/``, with a list of the upload ids referencing it. Each upload
+records the caller that created it, and a client that already knows the hash of
+its file can ask for an upload id with ``POST /uploads/check`` and skip sending
+the file again - but only for content it uploaded itself, so a hash alone gives
+no access to another caller's file. Conversion inputs are hard links to the
+stored copy, so concurrent conversions of the same file share it on disk. A
+blob is removed when its last upload id is deleted or expires.
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import FormData, Headers, UploadFile
+
+from app.core.config import settings
+from app.core.exceptions import (
+    ChecksumMismatchError,
+    FileProcessingError,
+    FileSizeExceededError,
+    UploadOffsetMismatchError,
+)
+from app.services.file_service import FileService
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    fcntl = None
+    FCNTL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+_UPLOAD_ID_PATTERN = re.compile(r"^[a-f0-9]{32}$")
+_SHA256_PATTERN = re.compile(r"^[a-f0-9]{64}$")
+
+
+class StoredUploadFile(UploadFile):
+    """An UploadFile backed by a file in the upload store."""
+
+    def __init__(self, *args, stored_path: str, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stored_path = stored_path
+
+
+class UploadService:
+    """Create, append to and finalize resumable uploads."""
+
+    CHECKSUM_ALGORITHMS = ("sha256", "sha1", "md5")
+    # Form field that replaces ``file``; ``<field>_upload_id`` replaces ``<field>``
+    UPLOAD_ID_FIELD = "upload_id"
+    UPLOAD_ID_SUFFIX = "_upload_id"
+
+    HASH_CHUNK_SIZE = 1024 * 1024
+
+    _locks: Dict[str, threading.Lock] = {}
+    _locks_guard = threading.Lock()
+    _store_guard = threading.Lock()
+
+    @staticmethod
+    def _data_path(upload_id: str) -> str:
+        return os.path.join(settings.resumable_upload_dir, f"{upload_id}.part")
+
+    @staticmethod
+    def _meta_path(upload_id: str) -> str:
+        return os.path.join(settings.resumable_upload_dir, f"{upload_id}.json")
+
+    @staticmethod
+    def _store_dir() -> str:
+        return os.path.join(settings.resumable_upload_dir, "blobs")
+
+    @staticmethod
+    def _blob_path(sha256: str) -> str:
+        return os.path.join(UploadService._store_dir(), sha256)
+
+    @staticmethod
+    def _refs_path(sha256: str) -> str:
+        return os.path.join(UploadService._store_dir(), f"{sha256}.refs")
+
+    @staticmethod
+    def _lock(upload_id: str) -> threading.Lock:
+        with UploadService._locks_guard:
+            return UploadService._locks.setdefault(upload_id, threading.Lock())
+
+    @staticmethod
+    def _write_meta(meta: Dict[str, Any]) -> None:
+        path = UploadService._meta_path(meta["upload_id"])
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    @contextmanager
+    def _store_lock():
+        """Serialize changes to the upload store across threads and worker processes."""
+        os.makedirs(UploadService._store_dir(), exist_ok=True)
+        with UploadService._store_guard:
+            with open(os.path.join(UploadService._store_dir(), ".lock"), "a") as f:
+                if FCNTL_AVAILABLE:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                yield
+
+    @staticmethod
+    def _read_refs(sha256: str) -> List[str]:
+        try:
+            with open(UploadService._refs_path(sha256), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    @staticmethod
+    def _write_refs(sha256: str, refs: List[str]) -> None:
+        """Save the references to a blob, removing the blob once none are left."""
+        path = UploadService._refs_path(sha256)
+        if not refs:
+            FileService.cleanup_files(UploadService._blob_path(sha256), path)
+            return
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(refs, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _release_ref(sha256: str, upload_id: str) -> None:
+        with UploadService._store_lock():
+            refs = UploadService._read_refs(sha256)
+            UploadService._write_refs(sha256, [ref for ref in refs if ref != upload_id])
+
+    @staticmethod
+    def _owned_by(sha256: str, owner: str) -> bool:
+        """Whether ``owner`` created one of the uploads referencing a blob."""
+        return any(
+            (UploadService.get_upload(upload_id) or {}).get("owner") == owner
+            for upload_id in UploadService._read_refs(sha256)
+        )
+
+    @staticmethod
+    def _add_record(sha256: str, filename: Optional[str], content_type: Optional[str],
+                    owner: Optional[str]) -> Dict[str, Any]:
+        """Create a finalized upload id referencing a stored blob. The caller holds the store lock."""
+        upload_id = uuid.uuid4().hex
+        now = time.time()
+        meta = {
+            "upload_id": upload_id,
+            "filename": os.path.basename(filename or "upload"),
+            "content_type": content_type or mimetypes.guess_type(filename or "")[0] or "application/octet-stream",
+            "length": os.path.getsize(UploadService._blob_path(sha256)),
+            "sha256": sha256,
+            "created_at": now,
+            "last_used_at": now,
+            "completed": True,
+            "owner": owner,
+        }
+        UploadService._write_refs(sha256, UploadService._read_refs(sha256) + [upload_id])
+        UploadService._write_meta(meta)
+        return meta
+
+    @staticmethod
+    def normalize_sha256(value: Optional[str]) -> str:
+        value = (value or "").strip().lower()
+        if not _SHA256_PATTERN.match(value):
+            raise ChecksumMismatchError("sha256 must be a 64 character hex digest")
+        return value
+
+    @staticmethod
+    def hash_file(path: str) -> str:
+        hasher = hashlib.sha256()
+        with open(path, "rb") as f:
+            for data in iter(lambda: f.read(UploadService.HASH_CHUNK_SIZE), b""):
+                hasher.update(data)
+        return hasher.hexdigest()
+
+    @staticmethod
+    def find_content(sha256: str, owner: str) -> Optional[int]:
+        """
+        Return the size of the stored content with this SHA-256, or None if
+        ``owner`` has not uploaded it (whether or not another caller has).
+        """
+        sha256 = UploadService.normalize_sha256(sha256)
+        with UploadService._store_lock():
+            if not UploadService._owned_by(sha256, owner):
+                return None
+            try:
+                return os.path.getsize(UploadService._blob_path(sha256))
+            except OSError:
+                return None
+
+    @staticmethod
+    def claim_content(sha256: str, owner: str, filename: Optional[str] = None,
+                      content_type: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get a new upload id for content ``owner`` has already uploaded, or None
+        if it has not.
+
+        The upload id behaves like a finalized upload of the same file.
+        """
+        sha256 = UploadService.normalize_sha256(sha256)
+        with UploadService._store_lock():
+            if not os.path.exists(UploadService._blob_path(sha256)) or not UploadService._owned_by(sha256, owner):
+                return None
+            meta = UploadService._add_record(sha256, filename, content_type, owner)
+        return UploadService.get_upload(meta["upload_id"])
+
+    @staticmethod
+    def create_upload(filename: str, length: Optional[int] = None, content_type: Optional[str] = None,
+                      owner: Optional[str] = None) -> Dict[str, Any]:
+        """Start a resumable upload for the caller ``owner`` and return its state."""
+        if length is not None and length < 0:
+            raise FileProcessingError("Upload length must not be negative")
+        if length and settings.max_file_size > 0 and length > settings.max_file_size:
+            raise FileSizeExceededError(
+                f"File size {length} exceeds maximum allowed size {settings.max_file_size}"
+            )
+
+        upload_id = uuid.uuid4().hex
+        meta = {
+            "upload_id": upload_id,
+            "filename": os.path.basename(filename or "upload"),
+            "content_type": content_type or mimetypes.guess_type(filename or "")[0] or "application/octet-stream",
+            "length": length,
+            "created_at": time.time(),
+            "completed": False,
+            "owner": owner,
+        }
+        open(UploadService._data_path(upload_id), "wb").close()
+        UploadService._write_meta(meta)
+        return UploadService.get_upload(upload_id)
+
+    @staticmethod
+    def get_upload(upload_id: str) -> Optional[Dict[str, Any]]:
+        """Get the state of an upload (including its current offset), or None if unknown."""
+        if not upload_id or not _UPLOAD_ID_PATTERN.match(upload_id):
+            return None
+        try:
+            with open(UploadService._meta_path(upload_id), encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta["completed"]:
+                meta["offset"] = os.path.getsize(UploadService._blob_path(meta["sha256"]))
+            else:
+                meta["offset"] = os.path.getsize(UploadService._data_path(upload_id))
+        except (OSError, ValueError, KeyError):
+            return None
+        return meta
+
+    @staticmethod
+    def parse_checksum(header: Optional[str]):
+        """Parse an ``Upload-Checksum`` header (``<algorithm> <base64 or hex digest>``)."""
+        if not header:
+            raise ChecksumMismatchError("Upload-Checksum header is required for every chunk")
+        try:
+            algorithm, value = header.strip().split(" ", 1)
+        except ValueError:
+            raise ChecksumMismatchError("Upload-Checksum must be '<algorithm> <digest>'")
+        algorithm = algorithm.lower()
+        if algorithm not in UploadService.CHECKSUM_ALGORITHMS:
+            raise ChecksumMismatchError(
+                f"Unsupported checksum algorithm {algorithm}; use one of {', '.join(UploadService.CHECKSUM_ALGORITHMS)}"
+            )
+        value = value.strip()
+        digest_size = hashlib.new(algorithm).digest_size
+        try:
+            if len(value) == digest_size * 2:
+                digest = bytes.fromhex(value)
+            else:
+                digest = base64.b64decode(value, validate=True)
+        except (ValueError, binascii.Error):
+            raise ChecksumMismatchError("Upload-Checksum digest is not valid hex or base64")
+        if len(digest) != digest_size:
+            raise ChecksumMismatchError("Upload-Checksum digest has the wrong length")
+        return algorithm, digest
+
+    @staticmethod
+    async def append_chunk(upload_id: str, offset: int, chunks: AsyncIterator[bytes], checksum: Optional[str]) -> int:
+        """
+        Append a chunk at ``offset`` and return the new offset.
+
+        The chunk is discarded (and the offset unchanged) if it does not start at
+        the current offset, is larger than the chunk limit, is cut off, or does
+        not match its checksum. Writes and the final fsync run in the
+        threadpool so a large chunk does not stall the event loop.
+        """
+        algorithm, expected = UploadService.parse_checksum(checksum)
+        meta = UploadService.get_upload(upload_id)
+        if meta is None:
+            raise FileProcessingError(f"Upload {upload_id} not found")
+        if meta["completed"]:
+            raise UploadOffsetMismatchError("Upload is already finalized")
+
+        lock = UploadService._lock(upload_id)
+        if not lock.acquire(blocking=False):
+            raise UploadOffsetMismatchError("Another chunk is being written to this upload")
+        try:
+            with open(UploadService._data_path(upload_id), "r+b") as f:
+                if FCNTL_AVAILABLE:
+                    try:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        raise UploadOffsetMismatchError("Another chunk is being written to this upload")
+
+                current = os.fstat(f.fileno()).st_size
+                if offset != current:
+                    raise UploadOffsetMismatchError(f"Chunk offset {offset} does not match upload offset {current}")
+
+                hasher = hashlib.new(algorithm)
+                written = 0
+                committed = False
+                f.seek(current)
+                try:
+                    async for data in chunks:
+                        written += len(data)
+                        if written > settings.resumable_upload_max_chunk_size:
+                            raise FileSizeExceededError(
+                                f"Chunk exceeds maximum size {settings.resumable_upload_max_chunk_size}"
+                            )
+                        if meta["length"] is not None and current + written > meta["length"]:
+                            raise FileSizeExceededError("Chunk extends past the declared upload length")
+                        hasher.update(data)
+                        await run_in_threadpool(f.write, data)
+                    if hasher.digest() != expected:
+                        raise ChecksumMismatchError("Chunk checksum does not match")
+                    await run_in_threadpool(UploadService._sync, f)
+                    committed = True
+                finally:
+                    if not committed:
+                        await run_in_threadpool(f.truncate, current)
+                return current + written
+        finally:
+            lock.release()
+
+    @staticmethod
+    def _sync(f) -> None:
+        f.flush()
+        os.fsync(f.fileno())
+
+    @staticmethod
+    def finalize_upload(upload_id: str, sha256: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Mark an upload complete so conversion endpoints can use it. This
+        hashes the whole file, so async callers run it in the threadpool.
+
+        The staged file moves into the upload store (or is dropped if the store
+        already holds the same content). If ``sha256`` is given, the whole file
+        must match it.
+        """
+        meta = UploadService.get_upload(upload_id)
+        if meta is None:
+            raise FileProcessingError(f"Upload {upload_id} not found")
+        if meta["completed"]:
+            return meta
+        if meta["length"] is not None and meta["offset"] != meta["length"]:
+            raise UploadOffsetMismatchError(
+                f"Upload has {meta['offset']} of {meta['length']} bytes; send the remaining chunks first"
+            )
+        if settings.max_file_size > 0 and meta["offset"] > settings.max_file_size:
+            raise FileSizeExceededError(
+                f"File size {meta['offset']} exceeds maximum allowed size {settings.max_file_size}"
+            )
+
+        data_path = UploadService._data_path(upload_id)
+        digest = UploadService.hash_file(data_path)
+        if sha256 is not None and UploadService.normalize_sha256(sha256) != digest:
+            raise ChecksumMismatchError("Uploaded file does not match the given sha256")
+
+        with UploadService._store_lock():
+            blob_path = UploadService._blob_path(digest)
+            if os.path.exists(blob_path):
+                FileService.cleanup_file(data_path)
+            else:
+                os.replace(data_path, blob_path)
+            UploadService._write_refs(digest, UploadService._read_refs(digest) + [upload_id])
+            meta.pop("offset")
+            meta.update(
+                completed=True,
+                sha256=digest,
+                length=os.path.getsize(blob_path),
+                last_used_at=time.time(),
+            )
+            UploadService._write_meta(meta)
+        return UploadService.get_upload(upload_id)
+
+    @staticmethod
+    def delete_upload(upload_id: str) -> bool:
+        meta = UploadService.get_upload(upload_id)
+        if meta is None:
+            return False
+        if meta["completed"]:
+            UploadService._release_ref(meta["sha256"], upload_id)
+        FileService.cleanup_files(UploadService._data_path(upload_id), UploadService._meta_path(upload_id))
+        with UploadService._locks_guard:
+            UploadService._locks.pop(upload_id, None)
+        return True
+
+    @staticmethod
+    def open_upload(upload_id: str) -> UploadFile:
+        """Open a finalized upload as an UploadFile, as if it had been posted in the request."""
+        meta = UploadService.get_upload(upload_id)
+        if meta is None or not meta["completed"]:
+            raise FileProcessingError(f"Upload {upload_id} not found or not finalized")
+        blob_path = UploadService._blob_path(meta["sha256"])
+        upload = StoredUploadFile(
+            file=open(blob_path, "rb"),
+            size=meta["offset"],
+            filename=meta["filename"],
+            headers=Headers({"content-type": meta["content_type"]}),
+            stored_path=blob_path,
+        )
+        # Using an upload keeps it (and its content) in the store for another retention period
+        meta.pop("offset")
+        meta["last_used_at"] = time.time()
+        UploadService._write_meta(meta)
+        return upload
+
+    @staticmethod
+    def resolve_form(form: FormData) -> FormData:
+        """Replace ``upload_id`` / ``<field>_upload_id`` form fields with the uploaded files."""
+        items: List[Any] = []
+        replacements: List[Any] = []
+        for name, value in form.multi_items():
+            if name == UploadService.UPLOAD_ID_FIELD:
+                replacements.append(("file", value))
+            elif name.endswith(UploadService.UPLOAD_ID_SUFFIX):
+                replacements.append((name[:-len(UploadService.UPLOAD_ID_SUFFIX)], value))
+            else:
+                items.append((name, value))
+        if not replacements:
+            return form
+
+        for field, upload_id in replacements:
+            if isinstance(upload_id, str) and upload_id and field not in form:
+                items.append((field, UploadService.open_upload(upload_id)))
+        return FormData(items)
+
+    @staticmethod
+    def cleanup_expired() -> None:
+        """
+        Remove expired uploads: staged uploads older than the resumable upload
+        retention period and finalized ones unused for the upload store retention period.
+        """
+        directory = settings.resumable_upload_dir
+        if not os.path.exists(directory):
+            return
+        now = time.time()
+        staging_cutoff = now - settings.resumable_upload_retention_minutes * 60
+        store_cutoff = now - settings.upload_store_retention_minutes * 60
+
+        for filename in os.listdir(directory):
+            path = os.path.join(directory, filename)
+            upload_id, ext = os.path.splitext(filename)
+            try:
+                if ext == ".json" and _UPLOAD_ID_PATTERN.match(upload_id):
+                    meta = UploadService.get_upload(upload_id)
+                    if meta is None:
+                        if os.path.getmtime(path) < staging_cutoff:
+                            FileService.cleanup_files(path, UploadService._data_path(upload_id))
+                    elif meta["completed"]:
+                        if meta.get("last_used_at", meta["created_at"]) < store_cutoff:
+                            UploadService.delete_upload(upload_id)
+                    elif os.path.getmtime(UploadService._data_path(upload_id)) < staging_cutoff:
+                        UploadService.delete_upload(upload_id)
+                elif os.path.isfile(path) and os.path.getmtime(path) < staging_cutoff:
+                    # Leftover .part / .tmp files without an upload record
+                    if not os.path.exists(UploadService._meta_path(upload_id)):
+                        FileService.cleanup_file(path)
+            except OSError:
+                continue
+
+        # Blobs left without references (e.g. after a crash)
+        store_dir = UploadService._store_dir()
+        if not os.path.exists(store_dir):
+            return
+        with UploadService._store_lock():
+            for filename in os.listdir(store_dir):
+                path = os.path.join(store_dir, filename)
+                try:
+                    if _SHA256_PATTERN.match(filename):
+                        if not UploadService._read_refs(filename) and os.path.getmtime(path) < staging_cutoff:
+                            FileService.cleanup_file(path)
+                    elif filename.endswith(".tmp") and os.path.getmtime(path) < staging_cutoff:
+                        FileService.cleanup_file(path)
+                except OSError:
+                    continue
@@ -3,13 +3,31 @@ import tempfile
 from typing import Optional, Dict, Any, List, Tuple
 try:
     import moviepy.editor as mp
+    from moviepy.tools import find_extension
+    from proglog import ProgressBarLogger
     MOVIEPY_AVAILABLE = True
 except ImportError:
     MOVIEPY_AVAILABLE = False
     mp = None
+    find_extension = None
+    ProgressBarLogger = object
 import ffmpeg
 from app.core.exceptions import FileProcessingError
 from app.services.file_service import FileService
+from app.services.job_service import JobService
+
+
+class _JobProgressLogger(ProgressBarLogger):
+    """MoviePy logger that reports frame progress to the current job and stops encoding once it is cancelled."""
+
+    # MoviePy iterates video frames over the "t" bar and audio over "chunk"
+    STAGES = {"t": "Encoding video", "chunk": "Encoding audio"}
+
+    def bars_callback(self, bar, attr, value, old_value=None):
+        if attr == "index":
+            JobService.checkpoint(value, self.bars[bar].get("total") or 0, self.STAGES.get(bar, bar))
+        else:
+            JobService.check_cancelled()
 
 
 class VideoConversionService:
@@ -45,7 +63,8 @@ class VideoConversionService:
             quality_settings = VideoConversionService._get_quality_settings(quality)
             
             # Write MP4 file
-            video.write_videofile(
+            VideoConversionService._write_videofile(
+                video,
                 output_path,
                 codec='libx264',
                 audio_codec='aac',
@@ -82,7 +101,8 @@ class VideoConversionService:
             quality_settings = VideoConversionService._get_quality_settings(quality)
             
             # Write MP4 file
-            video.write_videofile(
+            VideoConversionService._write_videofile(
+                video,
                 output_path,
                 codec='libx264',
                 audio_codec='aac',
@@ -119,7 +139,8 @@ class VideoConversionService:
             quality_settings = VideoConversionService._get_quality_settings(quality)
             
             # Write MP4 file
-            video.write_videofile(
+            VideoConversionService._write_videofile(
+                video,
                 output_path,
                 codec='libx264',
                 audio_codec='aac',
@@ -163,7 +184,7 @@ class VideoConversionService:
                 output_path,
                 bitrate=bitrate,
                 verbose=False,
-                logger=None
+                logger=VideoConversionService._job_logger(output_path)
             )
             
             # Close video and audio to free memory
@@ -198,7 +219,8 @@ class VideoConversionService:
             codec_settings = VideoConversionService._get_codec_settings(output_format)
             
             # Write video file
-            video.write_videofile(
+            VideoConversionService._write_videofile(
+                video,
                 output_path,
                 codec=codec_settings['video_codec'],
                 audio_codec=codec_settings['audio_codec'],
@@ -242,7 +264,7 @@ class VideoConversionService:
                 output_path,
                 bitrate=bitrate,
                 verbose=False,
-                logger=None
+                logger=VideoConversionService._job_logger(output_path)
             )
             
             # Close video and audio to free memory
@@ -280,7 +302,7 @@ class VideoConversionService:
                 raise FileProcessingError("No audio track found in the video file")
             
             # Write audio file (matching user's code: audio.write_audiofile("audio.mp3"))
-            audio.write_audiofile(output_path)
+            audio.write_audiofile(output_path, logger=VideoConversionService._job_logger(output_path))
             
             # Close video and audio to free memory
             audio.close()
@@ -347,7 +369,8 @@ class VideoConversionService:
             quality_settings = VideoConversionService._get_quality_settings(quality)
             
             # Write resized video
-            resized_video.write_videofile(
+            VideoConversionService._write_videofile(
+                resized_video,
                 output_path,
                 codec='libx264',
                 audio_codec='aac',
@@ -385,7 +408,8 @@ class VideoConversionService:
             compression_settings = VideoConversionService._get_compression_settings(compression_level)
             
             # Write compressed video
-            video.write_videofile(
+            VideoConversionService._write_videofile(
+                video,
                 output_path,
                 codec='libx264',
                 audio_codec='aac',
@@ -402,6 +426,26 @@ class VideoConversionService:
         except Exception as e:
             raise FileProcessingError(f"Video compression failed: {str(e)}")
     
+    @staticmethod
+    def _job_logger(output_path: str) -> "_JobProgressLogger":
+        """Get a MoviePy logger bound to the current job; the output is dropped if the job is cancelled."""
+        JobService.add_artifact(output_path)
+        return _JobProgressLogger()
+    
+    @staticmethod
+    def _write_videofile(clip, output_path: str, **kwargs) -> None:
+        """Write a clip with MoviePy, checking for job cancellation between frames."""
+        audio_codec = kwargs.get("audio_codec")
+        if clip.audio is not None and audio_codec:
+            # Keep MoviePy's temporary audio track next to the output so it can be cleaned up
+            try:
+                temp_audiofile = f"{os.path.splitext(output_path)[0]}_TEMP_MPY_wvf_snd.{find_extension(audio_codec)}"
+                kwargs.setdefault("temp_audiofile", temp_audiofile)
+                JobService.add_artifact(temp_audiofile)
+            except ValueError:
+                pass
+        clip.write_videofile(output_path, logger=VideoConversionService._job_logger(output_path), **kwargs)
+    
     @staticmethod
     def _get_quality_settings(quality: str) -> Dict[str, Any]:
         """Get quality settings based on quality level."""
@@ -35,6 +35,7 @@ import fitz  # PyMuPDF
 
 # Database logging
 from app.services.request_logging_service import RequestLoggingService
+from app.services.job_service import JobService
 
 logger = logging.getLogger(__name__)
 
@@ -53,6 +54,15 @@ class WebsiteConversionService:
         chrome_options.add_argument('--disable-gpu')
         return chrome_options
 
+    @staticmethod
+    def _start_driver(chrome_options: Optional[Options] = None):
+        """Start Chrome in its own process group so a cancelled job can kill the whole browser."""
+        popen_kw = {"start_new_session": True} if os.name == "posix" else {}
+        service = ChromeService(ChromeDriverManager().install(), popen_kw=popen_kw)
+        driver = webdriver.Chrome(service=service, options=chrome_options or WebsiteConversionService._get_chrome_options())
+        JobService.register_process(service.process)
+        return driver
+
     @staticmethod
     def _generate_error_pdf(output_path: str, error_message: str, url_or_content: str):
         """Generate a PDF with error details using PIL."""
@@ -119,7 +129,8 @@ class WebsiteConversionService:
             os.makedirs("outputs", exist_ok=True)
 
             # Initialize WebDriver
-            driver = webdriver.Chrome(service=ChromeService(ChromeDriverManager().install()), options=WebsiteConversionService._get_chrome_options())
+            JobService.add_artifact(output_path)
+            driver = WebsiteConversionService._start_driver()
             
             # Load HTML file
             abs_path = os.path.abspath(file_path)
@@ -137,6 +148,7 @@ class WebsiteConversionService:
             return output_path
 
         except Exception as e:
+            JobService.check_cancelled()
             logger.error(f"Error converting HTML file to PDF: {str(e)}")
             try:
                 # Generate fallback PDF
@@ -175,7 +187,8 @@ class WebsiteConversionService:
                 html_file_path = html_file.name
 
             # Initialize WebDriver
-            driver = webdriver.Chrome(service=ChromeService(ChromeDriverManager().install()), options=WebsiteConversionService._get_chrome_options())
+            JobService.add_artifact(output_path)
+            driver = WebsiteConversionService._start_driver()
             
             # Load HTML file
             # Use absolute path with file protocol
@@ -194,6 +207,7 @@ class WebsiteConversionService:
             return output_path
 
         except Exception as e:
+            JobService.check_cancelled()
             logger.error(f"Error converting HTML to PDF: {str(e)}")
             try:
                 # Generate fallback PDF
@@ -228,7 +242,8 @@ class WebsiteConversionService:
             os.makedirs("outputs", exist_ok=True)
 
             # Initialize WebDriver
-            driver = webdriver.Chrome(service=ChromeService(ChromeDriverManager().install()), options=WebsiteConversionService._get_chrome_options())
+            JobService.add_artifact(output_path)
+            driver = WebsiteConversionService._start_driver()
             
             # Load URL
             driver.get(url)
@@ -245,6 +260,7 @@ class WebsiteConversionService:
             return output_path
             
         except Exception as e:
+            JobService.check_cancelled()
             logger.error(f"Error converting Website to PDF: {str(e)}")
             try:
                 # Generate fallback PDF
@@ -690,8 +706,8 @@ class WebsiteConversionService:
             chrome_options.add_argument("--hide-scrollbars")
             
             # Setup driver
-            service = ChromeService(ChromeDriverManager().install())
-            driver = webdriver.Chrome(service=service, options=chrome_options)
+            JobService.add_artifact(output_path)
+            driver = WebsiteConversionService._start_driver(chrome_options)
             
             try:
                 driver.get(url)
@@ -716,6 +732,7 @@ class WebsiteConversionService:
                 driver.quit()
 
         except Exception as e:
+            JobService.check_cancelled()
             logger.warning(f"Selenium conversion failed: {str(e)}. Falling back to placeholder.")
             
             try:
@@ -790,8 +807,8 @@ class WebsiteConversionService:
             chrome_options.add_argument("--hide-scrollbars")
             
             # Setup driver
-            service = ChromeService(ChromeDriverManager().install())
-            driver = webdriver.Chrome(service=service, options=chrome_options)
+            JobService.add_artifact(output_path)
+            driver = WebsiteConversionService._start_driver(chrome_options)
             
             try:
                 driver.get(file_url)
@@ -827,6 +844,7 @@ class WebsiteConversionService:
                 driver.quit()
 
         except Exception as e:
+            JobService.check_cancelled()
             logger.warning(f"Selenium conversion failed: {str(e)}. Falling back to placeholder.")
             
             try:
@@ -895,8 +913,8 @@ class WebsiteConversionService:
             chrome_options.add_argument("--hide-scrollbars")
             
             # Setup driver
-            service = ChromeService(ChromeDriverManager().install())
-            driver = webdriver.Chrome(service=service, options=chrome_options)
+            JobService.add_artifact(output_path)
+            driver = WebsiteConversionService._start_driver(chrome_options)
             
             try:
                 driver.get(url)
@@ -921,6 +939,7 @@ class WebsiteConversionService:
                 driver.quit()
 
         except Exception as e:
+            JobService.check_cancelled()
             logger.warning(f"Selenium conversion failed: {str(e)}. Falling back to placeholder.")
             
             try:
@@ -995,8 +1014,8 @@ class WebsiteConversionService:
             chrome_options.add_argument("--hide-scrollbars")
             
             # Setup driver
-            service = ChromeService(ChromeDriverManager().install())
-            driver = webdriver.Chrome(service=service, options=chrome_options)
+            JobService.add_artifact(output_path)
+            driver = WebsiteConversionService._start_driver(chrome_options)
             
             try:
                 driver.get(file_url)
@@ -1032,6 +1051,7 @@ class WebsiteConversionService:
                 driver.quit()
 
         except Exception as e:
+            JobService.check_cancelled()
             logger.warning(f"Selenium conversion failed: {str(e)}. Falling back to placeholder.")
             
             try:
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark incremental saves of light PDF edits against full saves.
+
+Generates a scanned-style PDF of ``--pages`` pages, each a full-page JPEG,
+and a text PDF of ``--text-pages`` pages, then rotates every page and edits
+the metadata of each, saving every edit in full (``doc.save``) and as an
+incremental update (PDFIncrementalService). Prints the time taken, the
+output size and, for incremental saves, the bytes appended after the copied
+input.
+
+    python scripts/benchmark_pdf_incremental.py --pages 200 --text-pages 5000
+"""
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fitz  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from app.services.pdf_incremental_service import PDFIncrementalService  # noqa: E402
+
+
+def make_scanned_input(path, pages):
+    """Write the scanned-style input PDF."""
+    doc = fitz.open()
+    for page_num in range(pages):
+        buffer = io.BytesIO()
+        Image.effect_noise((1240, 1754), 40 + page_num % 20).convert("RGB").save(buffer, "JPEG", quality=85)
+        page = doc.new_page()
+        page.insert_image(page.rect, stream=buffer.getvalue())
+    doc.save(path)
+    doc.close()
+
+
+def make_text_input(path, pages):
+    """Write the text input PDF, which has many small objects."""
+    doc = fitz.open()
+    for page_num in range(pages):
+        lines = [f"Line {line} of page {page_num}: lorem ipsum dolor sit amet" for line in range(40)]
+        doc.new_page().insert_text((50, 50), "\n".join(lines), fontsize=10)
+    doc.save(path, garbage=1, deflate=True)
+    doc.close()
+
+
+def rotate(doc):
+    return PDFIncrementalService.set_rotation(doc, 90)
+
+
+def set_title(doc):
+    metadata = doc.metadata
+    metadata["title"] = "Benchmark"
+    doc.set_metadata(metadata)
+    return 1
+
+
+def save_full(input_path, output_path, edit):
+    with fitz.open(input_path) as doc:
+        edit(doc)
+        doc.save(output_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--text-pages", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        inputs = [
+            ("scanned", make_scanned_input, args.pages),
+            ("text", make_text_input, args.text_pages),
+        ]
+        for kind, make_input, pages in inputs:
+            input_path = os.path.join(directory, f"{kind}.pdf")
+            make_input(input_path, pages)
+            input_size = os.path.getsize(input_path)
+            print(f"{kind}: {pages} pages, {input_size / 1e6:.1f} MB")
+
+            for name, edit in (("rotate", rotate), ("metadata", set_title)):
+                for mode in ("full", "incremental"):
+                    output_path = os.path.join(directory, "out", f"{kind}_{name}_{mode}.pdf")
+                    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                    started = time.perf_counter()
+                    if mode == "full":
+                        save_full(input_path, output_path, edit)
+                        appended = ""
+                    else:
+                        if not PDFIncrementalService.save_edits(input_path, output_path, edit):
+                            print(f"  {name}: change set too large, saved in full")
+                        appended = f" ({os.path.getsize(output_path) - input_size} bytes appended)"
+                    elapsed = time.perf_counter() - started
+                    output_size = os.path.getsize(output_path)
+                    print(f"  {name:<9} {mode:<12} {elapsed:7.3f} s {output_size / 1e6:8.2f} MB{appended}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark the PDF merge engine against PyPDF2's PdfMerger.
+
+Generates ``--docs`` PDFs of ``--pages`` pages that share an embedded font
+and an image (as files exported from the same tool do), merges them both
+ways and prints the time taken and the output size.
+
+    python scripts/benchmark_pdf_merge.py --docs 50 --pages 100
+"""
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fitz  # noqa: E402
+from PIL import Image  # noqa: E402
+from PyPDF2 import PdfMerger  # noqa: E402
+
+from app.services.pdf_merge_service import PDFMergeService  # noqa: E402
+
+
+def make_inputs(directory, docs, pages):
+    """Write the input PDFs and return their paths."""
+    buffer = io.BytesIO()
+    Image.effect_noise((200, 200), 60).convert("RGB").save(buffer, "JPEG")
+    image = buffer.getvalue()
+    font = fitz.Font("helv").buffer
+
+    paths = []
+    for doc_num in range(docs):
+        doc = fitz.open()
+        for page_num in range(pages):
+            page = doc.new_page()
+            page.insert_font(fontname="F0", fontbuffer=font)
+            page.insert_text((72, 100), f"Document {doc_num} page {page_num}", fontname="F0")
+            page.insert_image(fitz.Rect(72, 200, 272, 400), stream=image)
+        doc.set_toc([[1, f"Document {doc_num}", 1], [2, "Middle", pages // 2 + 1]])
+        path = os.path.join(directory, f"input_{doc_num:03d}.pdf")
+        doc.save(path, garbage=4, deflate=True)
+        doc.close()
+        paths.append(path)
+    return paths
+
+
+def merge_pypdf2(paths, output_path):
+    merger = PdfMerger()
+    for path in paths:
+        merger.append(path)
+    with open(output_path, "wb") as f:
+        merger.write(f)
+    merger.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--docs", type=int, default=50)
+    parser.add_argument("--pages", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = make_inputs(directory, args.docs, args.pages)
+        input_size = sum(os.path.getsize(path) for path in paths)
+        print(f"{args.docs} inputs x {args.pages} pages, {input_size / 1e6:.1f} MB in total")
+
+        engines = [
+            ("PyPDF2 PdfMerger", merge_pypdf2),
+            ("PDFMergeService", PDFMergeService.merge),
+        ]
+        for name, merge in engines:
+            output_path = os.path.join(directory, "out", f"{name.split()[0]}.pdf")
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            started = time.perf_counter()
+            merge(paths, output_path)
+            elapsed = time.perf_counter() - started
+            print(f"{name:<18} {elapsed:7.2f} s {os.path.getsize(output_path) / 1e6:8.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
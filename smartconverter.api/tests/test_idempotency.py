@@ -0,0 +1,159 @@
+import asyncio
+import contextlib
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from app.core.middleware import IdempotencyMiddleware
+from app.services.idempotency_service import IdempotencyService, LocalIdempotencyStore
+
+
+def _make_app(calls, delay=0.0, status_code=200, error=False):
+    app = FastAPI()
+    app.add_middleware(IdempotencyMiddleware)
+
+    @app.post("/convert")
+    async def convert(request: Request):
+        calls.append(time.time())
+        body = await request.body()
+        await asyncio.sleep(delay)
+        if error:
+            raise RuntimeError("conversion crashed")
+        if status_code != 200:
+            return JSONResponse({"success": False}, status_code=status_code)
+        response = JSONResponse({"success": True, "run": len(calls), "size": len(body)})
+        response.set_cookie("first", "1")
+        response.set_cookie("second", "2")
+        return response
+
+    return app
+
+
+async def _post(app, key, count=1, content=b"", headers=None):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        requests = [
+            client.post("/convert", content=content, headers={"Idempotency-Key": key, **(headers or {})})
+            for _ in range(count)
+        ]
+        return await asyncio.gather(*requests)
+
+
+class TestLocalIdempotencyStore:
+    """Test cases for LocalIdempotencyStore."""
+
+    def test_reserve_returns_existing_record(self):
+        """Test that a taken key returns the stored record."""
+        store = LocalIdempotencyStore(max_entries=10)
+        assert store.reserve("a", {"state": "running"}, ttl=60) is None
+        assert store.reserve("a", {"state": "running"}, ttl=60)["state"] == "running"
+
+    def test_expired_and_evicted_records(self):
+        """Test that records expire after their TTL and the store stays bounded."""
+        store = LocalIdempotencyStore(max_entries=2)
+        store.set("old", {"state": "done"}, ttl=-1)
+        assert store.get("old") is None
+
+        for key in ("a", "b", "c"):
+            store.set(key, {"state": "done"}, ttl=60)
+        assert store.get("a") is None
+        assert store.get("c") is not None
+
+
+class TestIdempotencyMiddleware:
+    """Test cases for IdempotencyMiddleware."""
+
+    def setup_method(self):
+        IdempotencyService.store = LocalIdempotencyStore(max_entries=100)
+
+    def test_retry_replays_response(self):
+        """Test that a retried request returns the original response without running again."""
+        calls = []
+        app = _make_app(calls)
+        first, = asyncio.run(_post(app, "key-1"))
+        second, = asyncio.run(_post(app, "key-1"))
+
+        assert len(calls) == 1
+        assert second.json() == first.json()
+        assert second.headers["Idempotent-Replayed"] == "true"
+        assert second.headers["X-Job-Id"]
+
+    def test_concurrent_retry_attaches_to_running_request(self):
+        """Test that a retry sent while the original runs waits for its result."""
+        calls = []
+        app = _make_app(calls, delay=0.3)
+        responses = asyncio.run(_post(app, "key-2", count=2))
+
+        assert len(calls) == 1
+        assert responses[0].json() == responses[1].json()
+
+    def test_failed_request_is_not_remembered(self):
+        """Test that a server error releases the key so a retry runs again."""
+        calls = []
+        app = _make_app(calls, status_code=500)
+        asyncio.run(_post(app, "key-3"))
+        asyncio.run(_post(app, "key-3"))
+
+        assert len(calls) == 2
+
+    def test_retry_with_different_body_is_refused(self):
+        """Test that reusing a key for a different request body returns 422 instead of the old result."""
+        calls = []
+        app = _make_app(calls)
+        first, = asyncio.run(_post(app, "key-4", content=b"document one"))
+        same, = asyncio.run(_post(app, "key-4", content=b"document one"))
+        other, = asyncio.run(_post(app, "key-4", content=b"document two"))
+
+        assert len(calls) == 1
+        assert same.json() == first.json()
+        assert other.status_code == 422
+        assert other.json()["error_type"] == "IdempotencyKeyReused"
+
+    def test_keys_are_scoped_to_the_caller(self):
+        """Test that two callers sending the same key each get their own run."""
+        calls = []
+        app = _make_app(calls)
+        asyncio.run(_post(app, "key-5", headers={"X-Device-Id": "device-a"}))
+        other, = asyncio.run(_post(app, "key-5", headers={"X-Device-Id": "device-b"}))
+
+        assert len(calls) == 2
+        assert "Idempotent-Replayed" not in other.headers
+
+    def test_repeated_headers_are_kept(self):
+        """Test that every Set-Cookie header survives both the live response and the replay."""
+        calls = []
+        app = _make_app(calls)
+        first, = asyncio.run(_post(app, "key-6"))
+        second, = asyncio.run(_post(app, "key-6"))
+
+        for response in (first, second):
+            cookies = response.headers.get_list("set-cookie")
+            assert [cookie.split(";")[0] for cookie in cookies] == ["first=1", "second=2"]
+
+    def test_crashed_request_is_not_remembered(self):
+        """Test that an exception in the endpoint releases the key."""
+        calls = []
+        app = _make_app(calls, error=True)
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                asyncio.run(_post(app, "key-7"))
+
+        assert len(calls) == 2
+
+    def test_cancelled_request_is_not_remembered(self):
+        """Test that a request cancelled mid-flight releases the key instead of leaving it running."""
+        calls = []
+        app = _make_app(calls, delay=0.5)
+
+        async def cancelled():
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(_post(app, "key-8"), 0.1)
+
+        asyncio.run(cancelled())
+        retry, = asyncio.run(_post(app, "key-8"))
+
+        assert len(calls) == 2
+        assert retry.status_code == 200
@@ -0,0 +1,21 @@
+import json
+
+from PIL import Image
+
+from app.services.image_conversion_service import ImageConversionService
+from tests.test_ocr_conversion_service import _calls, fake_tesseract  # noqa: F401
+
+
+class TestImageToJSON:
+    """Test cases for OCR of images to JSON."""
+
+    def test_image_to_json_runs_tesseract_once(self, fake_tesseract, tmp_path):
+        image_path = tmp_path / "scan.png"
+        Image.new("RGB", (200, 100), "white").save(image_path)
+        output_path = ImageConversionService.image_to_json(str(image_path), str(tmp_path / "scan.json"))
+        with open(output_path) as f:
+            data = json.load(f)
+        assert data["content"]["full_text"] == "Scanned"
+        assert data["content"]["paragraphs"] == ["Scanned"]
+        assert data["structure"]["lines_detail"] == [{"line": 1, "text": "Scanned", "confidence": 96.5}]
+        assert [call.split()[-1] for call in _calls(fake_tesseract)] == ["tsv"]
@@ -0,0 +1,184 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+
+import pytest
+from fastapi import Request
+
+from app.core.exceptions import JobCancelledError, JobTimeoutError
+from app.services.job_service import CancelToken, JobService
+from app.services.subprocess_service import SubprocessService
+
+
+class TestCancelToken:
+    """Test cases for CancelToken."""
+
+    def test_raise_if_cancelled(self):
+        """Test that a cancelled token raises the matching error."""
+        token = CancelToken()
+        token.raise_if_cancelled()
+
+        token.cancel("stop")
+        assert token.cancelled
+        with pytest.raises(JobCancelledError):
+            token.raise_if_cancelled()
+
+    def test_timeout_raises_timeout_error(self):
+        """Test that a deadline cancellation raises JobTimeoutError."""
+        token = CancelToken()
+        token.cancel("too slow", timed_out=True)
+        with pytest.raises(JobTimeoutError):
+            token.raise_if_cancelled()
+
+    def test_cleanup_artifacts(self):
+        """Test that registered partial outputs are removed."""
+        token = CancelToken()
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        token.add_artifact(path)
+        token.cleanup_artifacts()
+        assert not os.path.exists(path)
+
+
+class TestJobService:
+    """Test cases for JobService."""
+
+    def test_check_cancelled_without_job(self):
+        """Test that service code outside a job is never cancelled."""
+        JobService.check_cancelled()
+
+    def test_run_completes(self):
+        """Test that a job that finishes is marked completed."""
+        result = asyncio.run(JobService.run(None, "pdf", lambda x: x * 2, 21))
+        assert result == 42
+
+    def test_run_cancel_kills_subprocess(self):
+        """Test that cancelling a job kills its running subprocess and removes artifacts."""
+        fd, artifact = tempfile.mkstemp()
+        os.close(fd)
+        jobs = []
+
+        def work():
+            jobs.append(JobService.current_job())
+            JobService.add_artifact(artifact)
+            SubprocessService.run(["sleep", "30"])
+
+        def cancel_soon():
+            while not jobs:
+                time.sleep(0.05)
+            time.sleep(0.2)
+            JobService.cancel_job(jobs[0].id)
+
+        threading.Thread(target=cancel_soon, daemon=True).start()
+        started = time.time()
+        with pytest.raises(JobCancelledError):
+            asyncio.run(JobService.run(None, "pdf", work))
+
+        assert time.time() - started < 10
+        assert jobs[0].status == "cancelled"
+        assert not os.path.exists(artifact)
+
+    def test_checkpoint_reports_progress(self):
+        """Test that loop checkpoints update the job's stage and percentage."""
+        def work():
+            for page in range(4):
+                JobService.checkpoint(page, 4, "Processing pages")
+            return JobService.current_job().to_dict()
+
+        state = asyncio.run(JobService.run(None, "pdf", work))
+        assert state["stage"] == "Processing pages"
+        assert state["progress"] == 75.0
+
+    def test_watch_coalesces_updates(self):
+        """Test that subscribers see sampled progress and a final event."""
+        async def scenario():
+            job = JobService.create_job("pdf")
+            events = []
+
+            async def subscribe():
+                async for event in JobService.watch(job.id):
+                    if event is not None:
+                        events.append(event)
+
+            subscriber = asyncio.ensure_future(subscribe())
+            await asyncio.sleep(0)
+            for step in range(1000):
+                job.progress = step / 10
+            await asyncio.sleep(0.3)
+            JobService.finish_job(job, "completed")
+            await asyncio.wait_for(subscriber, 5)
+            return events
+
+        events = asyncio.run(scenario())
+        assert 2 <= len(events) < 10
+        assert events[-1]["status"] == "completed"
+
+    def test_watch_unknown_job(self, monkeypatch):
+        """Test that watching a job that never starts ends without events."""
+        monkeypatch.setattr(JobService, "EVENTS_WAIT_FOR_JOB_SECONDS", 0.1)
+
+        async def scenario():
+            return [event async for event in JobService.watch("missing-job")]
+
+        assert asyncio.run(scenario()) == []
+
+    def test_jobs_are_only_visible_to_their_owner(self, monkeypatch):
+        """Test that a job started by one caller cannot be read, watched or cancelled by another."""
+        monkeypatch.setattr(JobService, "EVENTS_WAIT_FOR_JOB_SECONDS", 0.1)
+        request = Request({
+            "type": "http", "method": "POST", "path": "/convert", "client": ("10.0.0.5", 1234),
+            "headers": [(b"x-job-id", b"my-job"), (b"x-device-id", b"device-a")],
+        })
+
+        async def scenario():
+            owner_job = await JobService.run(request, "pdf", JobService.current_job)
+            events = [event async for event in JobService.watch(owner_job.id, "device:b")]
+            return owner_job, events
+
+        job, events = asyncio.run(scenario())
+        assert job.id == "my-job" and job.owner == "device:device-a"
+        assert JobService.get_job("my-job", "device:device-a") is job
+        assert JobService.get_job("my-job", "device:b") is None
+        assert events == []
+
+    def test_stream_yields_items_under_the_job(self):
+        """Test that a streamed generator runs every step as part of one job."""
+        def produce():
+            for page in range(3):
+                JobService.checkpoint(page, 3, "Streaming")
+                yield JobService.current_job()
+
+        async def scenario():
+            return [job async for job in JobService.stream(None, "pdf", produce)]
+
+        jobs = asyncio.run(scenario())
+        assert len(set(jobs)) == 1 and jobs[0] is not None
+        assert jobs[0].status == "completed"
+
+    def test_closed_stream_cancels_job(self):
+        """Test that a stream closed early cancels its job, stops the generator and removes artifacts."""
+        fd, artifact = tempfile.mkstemp()
+        os.close(fd)
+        closed = []
+
+        def produce():
+            JobService.add_artifact(artifact)
+            try:
+                for page in range(100):
+                    yield page
+            finally:
+                closed.append(JobService.current_job())
+
+        async def scenario():
+            stream = JobService.stream(None, "pdf", produce)
+            first = await stream.__anext__()
+            # Resumed from another task, as a streamed response is
+            second = await asyncio.ensure_future(stream.__anext__())
+            await stream.aclose()
+            return first, second
+
+        assert asyncio.run(scenario()) == (0, 1)
+        assert closed[0].status == "cancelled"
+        assert not os.path.exists(artifact)
@@ -0,0 +1,399 @@
+import asyncio
+import io
+import json
+import os
+import stat
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import fitz
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.core.config import settings
+from app.core.exceptions import FileProcessingError
+from app.services import ocr_workers
+from app.services.job_service import JobService
+from app.services.ocr_conversion_service import OCRConversionService
+from app.services.ocr_engine_service import OCREngineService
+from app.services.ocr_preprocess_service import OCRPreprocessService
+from app.services.process_pool_service import ProcessPoolService
+
+FAKE_TESSERACT = """#!{python}
+# Reads a PNG from stdin and reports one word covering the box at 10-40% x 10-15% of the image
+import struct, sys
+with open(__file__ + ".calls", "a") as calls:
+    calls.write(" ".join(sys.argv[1:]) + "\\n")
+data = sys.stdin.buffer.read()
+assert data[:8] == b"\\x89PNG\\r\\n\\x1a\\n", "not a PNG"
+width, height = struct.unpack(">II", data[16:24])
+header = "level\\tpage_num\\tblock_num\\tpar_num\\tline_num\\tword_num\\tleft\\ttop\\twidth\\theight\\tconf\\ttext"
+rows = [
+    header,
+    "1\\t1\\t0\\t0\\t0\\t0\\t0\\t0\\t%d\\t%d\\t-1\\t" % (width, height),
+    "5\\t1\\t1\\t1\\t1\\t1\\t%d\\t%d\\t%d\\t%d\\t96.5\\tScanned" % (width // 10, height // 10, width * 3 // 10, height // 20),
+]
+sys.stdout.write("\\n".join(rows) + "\\n")
+"""
+
+
+@pytest.fixture
+def fake_tesseract(tmp_path, monkeypatch):
+    script = tmp_path / "tesseract"
+    script.write_text(FAKE_TESSERACT.format(python=sys.executable))
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setattr(settings, "tesseract_path", str(script))
+    monkeypatch.setattr(settings, "ocr_dpi", 72)
+    monkeypatch.setattr(settings, "output_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "ocr_cache_dir", str(tmp_path / "ocr_cache"))
+    return str(script)
+
+
+def _calls(script):
+    with open(script + ".calls") as f:
+        return f.read().splitlines()
+
+
+def _scan_image():
+    buffer = io.BytesIO()
+    image = Image.new("L", (400, 600), 235)
+    image.paste(40, (40, 60, 160, 90))
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def scanned_pdf(tmp_path):
+    """Four image-only pages; the last one is rotated."""
+    path = tmp_path / "scanned.pdf"
+    image = _scan_image()
+    doc = fitz.open()
+    for page_num in range(4):
+        page = doc.new_page(width=400, height=600)
+        page.insert_image(page.rect, stream=image)
+        if page_num == 3:
+            page.set_rotation(90)
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+@pytest.fixture
+def mixed_pdf(tmp_path):
+    """A digital cover, two scans (one with a small printed header), a digital page and a scan with an OCR layer."""
+    path = tmp_path / "mixed.pdf"
+    image = _scan_image()
+    lines = "\n".join(["The quick brown fox jumps over the lazy dog"] * 30)
+    doc = fitz.open()
+    doc.new_page(width=400, height=600).insert_text((40, 60), "Annual report\n" + lines, fontsize=10)
+    for header in ("", "Received 2024-01-05"):
+        page = doc.new_page(width=400, height=600)
+        page.insert_image(page.rect, stream=image)
+        if header:
+            page.insert_text((20, 20), header, fontsize=7)
+    doc.new_page(width=400, height=600).insert_text((40, 60), "Appendix\n" + lines, fontsize=10)
+    page = doc.new_page(width=400, height=600)
+    page.insert_image(page.rect, stream=image)
+    page.insert_text((40, 60), "Already searchable\n" + lines, fontsize=10, render_mode=3)
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+def _expected_box(page):
+    """Where the fake tesseract's word is, in the unrotated coordinates search_for uses."""
+    r = page.rect
+    return fitz.Rect(r.width * 0.1, r.height * 0.1, r.width * 0.4, r.height * 0.15) * page.derotation_matrix
+
+
+class TestSearchablePDF:
+    """Test cases for the invisible OCR text layer."""
+
+    def test_tsv_words_are_scaled_to_points(self):
+        """Test that word rows are kept and their pixel boxes scaled by the render DPI."""
+        tsv = (
+            "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext\n"
+            "4\t1\t1\t1\t1\t0\t300\t600\t600\t60\t-1\t\n"
+            "5\t1\t1\t1\t1\t1\t300\t600\t300\t60\t91.0\tHello\n"
+            "5\t1\t1\t1\t1\t2\t650\t600\t250\t60\t88.5\t \n"
+        )
+        words = ocr_workers.tsv_words(tsv, 300)
+        assert [word.text for word in words] == ["Hello"]
+        assert words[0][:4] == pytest.approx((72, 144, 144, 158.4))
+        assert words[0].conf == 91.0
+
+    def test_text_layer_is_invisible_and_placed(self, scanned_pdf):
+        """Test that words land on their boxes, also on rotated pages, without changing how pages look."""
+        with fitz.open(scanned_pdf) as doc:
+            for page in doc:
+                before = page.get_pixmap().samples
+                box = fitz.Rect(50, 70, 150, 85)
+                OCRConversionService.add_text_layer(page, [ocr_workers.OCRWord(*box, "Invoice", 95.0, 1, 1, 1)])
+                page = doc.reload_page(page)
+                assert page.get_pixmap().samples == before
+                found = page.search_for("Invoice")
+                assert len(found) == 1
+                box = box * page.derotation_matrix
+                assert abs(found[0] & box) > 0.8 * abs(box)
+
+    def test_non_latin_words_are_searchable(self, scanned_pdf):
+        with fitz.open(scanned_pdf) as doc:
+            page = doc[0]
+            OCRConversionService.add_text_layer(page, [ocr_workers.OCRWord(50, 70, 150, 85, "Привет", 90.0, 1, 1, 1)])
+            assert "Привет" in doc.reload_page(page).get_text()
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_pdf_image_to_pdf_text(self, fake_tesseract, scanned_pdf, monkeypatch, workers):
+        """Test that every page gets its words, in the request thread and in the pool."""
+        monkeypatch.setattr(settings, "process_pool_workers", workers)
+        try:
+            output_path = OCRConversionService.pdf_image_to_pdf_text(scanned_pdf)
+        finally:
+            ProcessPoolService.shutdown()
+
+        with fitz.open(scanned_pdf) as original, fitz.open(output_path) as doc:
+            assert len(doc) == 4
+            for page, original_page in zip(doc, original):
+                assert page.get_pixmap().samples == original_page.get_pixmap().samples
+                expected = _expected_box(page)
+                found = page.search_for("Scanned")
+                assert len(found) == 1
+                assert abs(found[0] & expected) > 0.8 * abs(expected)
+
+
+class TestPDFTextOCR:
+    """Test cases for OCR of PDF pages to text."""
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_pages_are_streamed_in_order(self, fake_tesseract, scanned_pdf, monkeypatch, workers):
+        """Test that pages come back in order and only a few page images are held at once."""
+        monkeypatch.setattr(settings, "process_pool_workers", workers)
+
+        def work():
+            text = OCRConversionService.pdf_to_text_with_ocr(scanned_pdf)
+            return text, JobService.current_job().peak_memory
+
+        try:
+            text, peak_memory = asyncio.run(JobService.run(None, "ocr", work))
+        finally:
+            ProcessPoolService.shutdown()
+
+        assert text.split("\n") == [
+            line for page in range(1, 5) for line in (f"--- Page {page} ---", "Scanned", "")
+        ][:-1]
+        # A raw page at 72 dpi is 400 x 600 gray bytes; its PNG is smaller
+        page_bytes = 400 * 600
+        assert page_bytes <= peak_memory < (2 * workers + 1) * 2 * page_bytes
+        # No page images were written out
+        assert sorted(os.listdir(settings.output_dir)) == ["ocr_cache", "scanned.pdf", "tesseract", "tesseract.calls"]
+        # The four pages are the same scan: one result is cached per orientation
+        assert len(os.listdir(settings.ocr_cache_dir)) == 2
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_only_scanned_pages_are_ocrd(self, fake_tesseract, mixed_pdf, monkeypatch, workers):
+        """Test that text pages keep their own text and scans are OCR'd, merged in page order."""
+        monkeypatch.setattr(settings, "process_pool_workers", workers)
+        monkeypatch.setattr(settings, "pdf_parallel_min_pages", 1)
+        try:
+            texts, ocr_pages = OCRConversionService.classify_pdf_pages(mixed_pdf)
+            text = OCRConversionService.pdf_to_text_with_ocr(mixed_pdf)
+        finally:
+            ProcessPoolService.shutdown()
+
+        assert ocr_pages == [1, 2]
+        assert sorted(texts) == [0, 3, 4]
+        pages = text.split("--- Page ")[1:]
+        assert [page.split(" ---")[0] for page in pages] == ["1", "2", "3", "4", "5"]
+        assert pages[0].split("\n")[1] == "Annual report"
+        assert pages[1].strip().endswith("Scanned")
+        assert "Received 2024-01-05" not in pages[2] and pages[2].strip().endswith("Scanned")
+        assert pages[3].split("\n")[1] == "Appendix"
+        assert pages[4].split("\n")[1] == "Already searchable"
+        assert len(_calls(fake_tesseract)) == 2
+
+    def test_digital_pdf_is_not_ocrd(self, fake_tesseract, tmp_path):
+        path = tmp_path / "digital.pdf"
+        with fitz.open() as doc:
+            doc.new_page().insert_text((72, 72), "Plain text")
+            doc.save(str(path))
+        assert OCRConversionService.pdf_to_text_with_ocr(str(path)) == "Plain text"
+        assert not os.path.exists(fake_tesseract + ".calls")
+
+
+class TestOCREngine:
+    """Test cases for single-pass recognition."""
+
+    def test_text_follows_tesseract_layout(self):
+        """Test that text rebuilt from the words keeps lines and blank lines between paragraphs."""
+        words = [
+            ocr_workers.OCRWord(0, 0, 1, 1, text, 90.0, block, par, line)
+            for text, block, par, line in [
+                ("Dear", 1, 1, 1), ("Sir,", 1, 1, 1), ("thanks", 1, 1, 2),
+                ("Regards", 2, 1, 1),
+            ]
+        ]
+        assert ocr_workers.words_text(words) == "Dear Sir,\nthanks\n\nRegards"
+
+    def test_recognize_runs_tesseract_once(self, fake_tesseract):
+        """Test that text, boxes and confidences come from one tesseract run."""
+        result = OCREngineService.recognize(Image.new("L", (200, 100), 255))
+        assert result.text == "Scanned"
+        assert result.words[0][:4] == (20, 10, 80, 15)
+        assert result.words[0].conf == 96.5
+        assert len(_calls(fake_tesseract)) == 1
+
+    def test_results_are_cached(self, fake_tesseract, tmp_path):
+        """Test that the same image in another encoding, and the same image as a PDF page, hit the cache."""
+        image = _page_image()
+        png_path, bmp_path = tmp_path / "scan.png", tmp_path / "scan.bmp"
+        cv2.imwrite(str(png_path), image)
+        cv2.imwrite(str(bmp_path), image)
+        assert OCRConversionService.extract_text_from_image(str(png_path)) == "Scanned"
+        assert OCRConversionService.extract_text_from_image(str(bmp_path)) == "Scanned"
+        assert len(_calls(fake_tesseract)) == 1
+        # Another language is recognised again
+        OCRConversionService.extract_text_from_image(str(png_path), language="deu")
+        assert len(_calls(fake_tesseract)) == 2
+
+        cached = OCREngineService.recognize(OCRPreprocessService.encode_png(image), preprocess="auto")
+        assert cached.words[0].conf == 96.5 and len(_calls(fake_tesseract)) == 2
+
+    def test_cache_evicts_least_recently_used(self, tmp_path):
+        cache = ocr_workers.OCRCache(str(tmp_path), 0)
+        result = ocr_workers.OCRResult("Scanned", [ocr_workers.OCRWord(1, 2, 3, 4, "Scanned", 90.0, 1, 1, 1)])
+        size = len(json.dumps({"text": result.text, "words": result.words}))
+        cache = cache._replace(max_bytes=3 * size)
+        for mtime, key in enumerate(("a", "b", "c")):
+            ocr_workers.store_cached(cache, key, result)
+            os.utime(tmp_path / f"{key}.json", (mtime, mtime))
+        assert ocr_workers.load_cached(cache, "a") == result
+        # Over the limit: b and c go, bringing the cache under 90% of it
+        ocr_workers.store_cached(cache, "d", result)
+        assert sorted(os.listdir(tmp_path)) == ["a.json", "d.json"]
+        assert ocr_workers.load_cached(cache._replace(max_bytes=0), "a") is None
+
+    def test_cache_writes_are_thread_safe_and_never_fail(self, tmp_path):
+        """Test that threads storing one key do not trip over each other, and an unwritable cache is skipped."""
+        cache = ocr_workers.OCRCache(str(tmp_path / "cache"), 1024 * 1024)
+        result = ocr_workers.OCRResult("Scanned", [])
+
+        def store():
+            for _ in range(100):
+                ocr_workers.store_cached(cache, "same", result)
+
+        with ThreadPoolExecutor(4) as executor:
+            for future in [executor.submit(store) for _ in range(4)]:
+                future.result()
+        assert os.listdir(cache.directory) == ["same.json"]
+
+        (tmp_path / "file").write_text("not a directory")
+        ocr_workers.store_cached(cache._replace(directory=str(tmp_path / "file")), "key", result)
+
+    def test_detections_become_lines_and_words(self):
+        """Test that easyocr/paddleocr style line detections are read in order and split into words."""
+        detections = [
+            ([[10, 200], [110, 200], [110, 220], [10, 220]], "New para", 0.8),
+            ([[150, 12], [250, 12], [250, 30], [150, 30]], "world", 0.9),
+            ([[10, 10], [130, 10], [130, 30], [10, 30]], "Hello big", 0.95),
+            ([[10, 40], [70, 40], [70, 60], [10, 60]], "again", 0.7),
+        ]
+        result = ocr_workers.detections_result(detections)
+        assert result.text == "Hello big world\nagain\n\nNew para"
+        big = result.words[1]
+        assert big.text == "big" and big[:4] == pytest.approx((10 + 6 * 120 / 9, 10, 130, 30))
+        assert big.conf == pytest.approx(95)
+
+    def test_engine_is_checked(self, monkeypatch):
+        """Test that unknown or missing engines, and languages an engine lacks, are refused."""
+        monkeypatch.setattr(ocr_workers, "PADDLEOCR_AVAILABLE", False)
+        monkeypatch.setattr(ocr_workers, "EASYOCR_AVAILABLE", True)
+        assert OCREngineService.available_engines() == ["tesseract", "easyocr"]
+        assert OCREngineService.check_engine("EasyOCR", "eng+deu") == "easyocr"
+        for engine, language in [("cuneiform", "eng"), ("paddleocr", "eng"), ("easyocr", "tlh")]:
+            with pytest.raises(FileProcessingError):
+                OCREngineService.check_engine(engine, language)
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_engine_stats_count_images_and_cache_hits(self, fake_tesseract, scanned_pdf, monkeypatch, workers):
+        """Test that recognised and cached images are counted per engine, in the thread and in the engine pool."""
+        monkeypatch.setattr(settings, "process_pool_workers", workers)
+        monkeypatch.setattr(OCREngineService, "_stats", {})
+        try:
+            OCRConversionService.pdf_to_text_with_ocr(scanned_pdf)
+            OCRConversionService.pdf_to_text_with_ocr(scanned_pdf)
+            # The pages went to the warm tesseract pool, not the shared one
+            assert ("ocr-tesseract" in ProcessPoolService._pools) == (workers > 1)
+            assert ProcessPoolService._executor is None
+        finally:
+            ProcessPoolService.shutdown()
+        stats = OCREngineService.engine_stats()["tesseract"]
+        assert stats["images"] == 8
+        assert stats["cached"] >= 4
+        assert stats["images_per_second"] > 0
+        assert len(_calls(fake_tesseract)) == 8 - stats["cached"]
+
+    def test_worker_reuses_tesseract_handles(self):
+        pytest.importorskip("tesserocr")
+        assert ocr_workers._tesseract_api("eng") is ocr_workers._tesseract_api("eng")
+
+    @pytest.mark.skipif(not ocr_workers.RESOURCE_AVAILABLE, reason="needs the resource module")
+    def test_worker_tesseract_runs_are_limited(self):
+        """Test that the CLI run in pool workers gets the CPU-time limit and timeout of the shared runner."""
+        script = "import resource; print(resource.getrlimit(resource.RLIMIT_CPU)[0])"
+        assert ocr_workers.run_tesseract([sys.executable, "-c", script], b"", cpu_limit=7).strip() == "7"
+        with pytest.raises(subprocess.TimeoutExpired):
+            ocr_workers.run_tesseract([sys.executable, "-c", "import time; time.sleep(5)"], b"", timeout=0.2)
+
+
+def _page_image(noise=0.0, contrast=(245, 20), angle=0.0):
+    """A grayscale page of text lines, optionally rotated, faded and noisy."""
+    background, ink = contrast
+    gray = np.full((1200, 900), background, dtype=np.uint8)
+    for row in range(8):
+        cv2.putText(gray, "The quick brown fox jumps", (60, 120 + row * 120),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.6, int(ink), 4)
+    if angle:
+        matrix = cv2.getRotationMatrix2D((450, 600), angle, 1.0)
+        gray = cv2.warpAffine(gray, matrix, (900, 1200), borderValue=background)
+    if noise:
+        noisy = gray + np.random.default_rng(0).normal(0, noise, gray.shape)
+        gray = np.clip(noisy, 0, 255).astype(np.uint8)
+    return gray
+
+
+class TestOCRPreprocess:
+    """Test cases for tiered preprocessing."""
+
+    @pytest.mark.parametrize("image, tier", [
+        (dict(), "fast"),
+        (dict(noise=5), "standard"),
+        (dict(contrast=(170, 110)), "standard"),
+        (dict(noise=20), "thorough"),
+    ])
+    def test_auto_picks_cheapest_suitable_tier(self, image, tier):
+        assert OCRPreprocessService.choose_tier(_page_image(**image)) == tier
+
+    def test_skew_is_measured(self):
+        """Test that the angle straightening a rotated page is found."""
+        assert OCRPreprocessService.skew_angle(_page_image(angle=2)) == pytest.approx(-2, abs=0.3)
+        assert OCRPreprocessService.skew_angle(_page_image()) == 0
+
+    @pytest.mark.parametrize("tier", ["auto", "fast", "standard", "thorough"])
+    def test_output_is_binary(self, tier):
+        binary = OCRPreprocessService.preprocess(_page_image(noise=5), tier)
+        assert binary.shape == (1200, 900)
+        assert set(np.unique(binary)) <= {0, 255}
+
+    def test_unknown_tier_is_rejected(self):
+        with pytest.raises(FileProcessingError):
+            OCRPreprocessService.preprocess(_page_image(), "sharpen")
+
+    def test_recognize_preprocesses_before_tesseract(self, fake_tesseract, tmp_path):
+        """Test that an image file goes through preprocessing to tesseract as a PNG."""
+        path = tmp_path / "scan.png"
+        cv2.imwrite(str(path), _page_image(noise=5))
+        assert OCRConversionService.extract_text_from_image(str(path), preprocess="standard") == "Scanned"
+        assert len(_calls(fake_tesseract)) == 1
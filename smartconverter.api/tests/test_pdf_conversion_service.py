@@ -0,0 +1,701 @@
+import asyncio
+import json
+import os
+import stat
+import sys
+import time
+import zipfile
+
+import fitz
+import httpx
+import openpyxl
+import pytest
+from fastapi import FastAPI
+from PIL import Image
+
+from app.core.config import settings
+from app.core.exceptions import FileProcessingError
+from app.services import pdf_compress_service, pdf_workers
+from app.services.pdf_compare_service import PDFCompareService
+from app.services.pdf_compress_service import PDFCompressService
+from app.services.pdf_incremental_service import PDFIncrementalService
+from app.services.pdf_merge_service import PDFMergeService
+from app.services.job_service import JobService
+from app.services.pdf_conversion_service import PDFConversionService
+from app.services.stream_service import StreamService
+from app.services.text_extraction_service import TextExtractionService
+
+
+@pytest.fixture
+def logo_pdf(tmp_path):
+    """Three pages showing the same logo image, plus one page with a second image."""
+    logo = tmp_path / "logo.png"
+    Image.new("RGB", (40, 20), (200, 30, 30)).save(logo)
+    photo = tmp_path / "photo.jpg"
+    Image.new("RGB", (30, 30), (30, 30, 200)).save(photo)
+
+    path = tmp_path / "logo.pdf"
+    doc = fitz.open()
+    for page_num in range(3):
+        page = doc.new_page(width=300, height=300)
+        page.insert_text((40, 100), f"Page {page_num + 1}")
+        page.insert_image(fitz.Rect(10, 10, 90, 50), filename=str(logo))
+    doc[2].insert_image(fitz.Rect(100, 150, 160, 210), filename=str(photo))
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+class TestPDFToJSON:
+    """Test cases for the streaming PDF to JSON export."""
+
+    def test_images_are_stored_once(self, logo_pdf, tmp_path):
+        """Test that an image shown on every page appears once in the image table."""
+        output = tmp_path / "out.json"
+        PDFConversionService.pdf_to_json(logo_pdf, str(output))
+        data = json.loads(output.read_text(encoding="utf-8"))
+
+        assert data["document_info"]["total_pages"] == 3
+        assert len(data["images"]) == 2
+        logo_xref = data["pages"][0]["images"][0]["xref"]
+        assert [page["images"][0]["xref"] for page in data["pages"]] == [logo_xref] * 3
+        assert data["images"][str(logo_xref)]["format"] == "png"
+        assert data["images"][str(logo_xref)]["data"]
+        assert [page["text"].strip() for page in data["pages"]] == ["Page 1", "Page 2", "Page 3"]
+
+    def test_external_and_no_images(self, logo_pdf, tmp_path):
+        """Test writing images to files, or leaving them out."""
+        output = tmp_path / "external.json"
+        PDFConversionService.pdf_to_json(logo_pdf, str(output), images="external")
+        data = json.loads(output.read_text(encoding="utf-8"))
+        for entry in data["images"].values():
+            assert "data" not in entry
+            assert os.path.exists(tmp_path / entry["file"])
+
+        output = tmp_path / "none.json"
+        PDFConversionService.pdf_to_json(logo_pdf, str(output), images="none")
+        data = json.loads(output.read_text(encoding="utf-8"))
+        assert all(set(entry) == {"xref", "width", "height"} for entry in data["images"].values())
+
+        with pytest.raises(FileProcessingError):
+            PDFConversionService.pdf_to_json(logo_pdf, str(output), images="thumbnails")
+
+
+class TestTextExtractionCache:
+    """Test cases for the shared page text cache."""
+
+    def test_formats_of_one_upload_extract_once(self, logo_pdf, tmp_path, monkeypatch):
+        """Test that text, markdown and HTML exports of the same file reuse extracted pages."""
+        TextExtractionService.clear()
+        calls = []
+        extract_page = pdf_workers.extract_page
+        monkeypatch.setattr(pdf_workers, "extract_page", lambda page: calls.append(page.number) or extract_page(page))
+
+        PDFConversionService.pdf_to_text(logo_pdf, str(tmp_path / "out.txt"))
+        PDFConversionService.pdf_to_markdown(logo_pdf, str(tmp_path / "out.md"))
+        # A copy of the same content is recognised by its hash
+        copy = tmp_path / "copy.pdf"
+        copy.write_bytes(open(logo_pdf, "rb").read())
+        PDFConversionService.pdf_to_html(str(copy), str(tmp_path / "out.html"))
+
+        assert calls == [0, 1, 2]
+        assert "Page 2" in (tmp_path / "out.md").read_text(encoding="utf-8")
+        assert "Page 3" in (tmp_path / "out.html").read_text(encoding="utf-8")
+
+    def test_text_endpoints_run_as_jobs(self, logo_pdf, pdf_app):
+        """Test that the text, markdown and HTML endpoints extract pages under a job of their own."""
+        with open(logo_pdf, "rb") as f:
+            data = f.read()
+
+        async def scenario():
+            transport = httpx.ASGITransport(app=pdf_app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return [
+                    await client.post(
+                        f"/{endpoint}", files={"file": ("logo.pdf", data, "application/pdf")},
+                        headers={"X-Job-Id": f"{endpoint}-job"}
+                    )
+                    for endpoint in ("pdf-to-text", "pdf-to-markdown", "pdf-to-html")
+                ]
+
+        responses = asyncio.run(scenario())
+        assert [response.status_code for response in responses] == [200, 200, 200]
+        for endpoint in ("pdf-to-text", "pdf-to-markdown", "pdf-to-html"):
+            job = JobService.get_job(f"{endpoint}-job")
+            assert job.status == "completed" and job.progress == 100.0
+
+    def test_entries_hold_blocks_and_words(self, logo_pdf):
+        """Test that cached pages carry word boxes and the cache stays within its budget."""
+        TextExtractionService.clear()
+        pages = dict(TextExtractionService.iter_pages(logo_pdf))
+        assert [word[4] for word in pages[0].words] == ["Page", "1"]
+        assert any("Page 1" in block[4] for block in pages[0].blocks)
+        assert TextExtractionService._total_bytes == sum(page.approximate_size() for page in pages.values())
+
+
+def _text_pdf(path, pages):
+    doc = fitz.open()
+    for lines in pages:
+        page = doc.new_page(width=400, height=400)
+        for line_num, line in enumerate(lines):
+            page.insert_text((40, 60 + line_num * 20), line)
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+class TestPDFCompare:
+    """Test cases for the PDF comparison engine."""
+
+    def test_diff_is_minimal_and_reconstructs_target(self):
+        """Test Myers opcodes against an LCS oracle on random sequences."""
+        import random
+        rng = random.Random(7)
+        for _ in range(200):
+            a = [rng.choice("abc") for _ in range(rng.randint(0, 12))]
+            b = [rng.choice("abc") for _ in range(rng.randint(0, 12))]
+            opcodes = PDFCompareService.diff_opcodes(a, b)
+
+            rebuilt = []
+            for tag, i1, i2, j1, j2 in opcodes:
+                rebuilt.extend(a[i1:i2] if tag == "equal" else b[j1:j2])
+            assert rebuilt == b
+
+            lcs = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+            for i in range(len(a) - 1, -1, -1):
+                for j in range(len(b) - 1, -1, -1):
+                    lcs[i][j] = lcs[i + 1][j + 1] + 1 if a[i] == b[j] else max(lcs[i + 1][j], lcs[i][j + 1])
+            assert sum(i2 - i1 for tag, i1, i2, _, _ in opcodes if tag == "equal") == lcs[0][0]
+
+    def test_inserted_page_does_not_shift_later_pages(self, tmp_path):
+        """Test page alignment, line diffs and the visual diff output."""
+        pages = [[f"Section {n}", f"Body text of section {n}"] for n in range(1, 6)]
+        first = _text_pdf(tmp_path / "first.pdf", pages)
+        changed = [list(page) for page in pages]
+        changed[3][1] = "Body text of section four, revised"
+        changed.insert(1, ["A brand new page"])
+        del changed[5]
+        second = _text_pdf(tmp_path / "second.pdf", changed)
+
+        report = tmp_path / "report.json"
+        visual = tmp_path / "visual.pdf"
+        summary = PDFConversionService.compare_pdfs(first, second, str(report), str(visual))
+
+        assert summary["inserted_pages"] == [2]
+        assert summary["deleted_pages"] == [5]
+        assert summary["modified_pages"] == [[4, 5]]
+        assert summary["differences_count"] == 3
+
+        pages_report = json.loads(report.read_text(encoding="utf-8"))["pages"]
+        modified = next(page for page in pages_report if page["status"] == "modified")
+        assert modified["changes"][0]["words"] == [{"type": "replace", "removed": "4", "added": "four, revised"}]
+
+        with fitz.open(str(visual)) as doc:
+            # Second document plus the deleted page put back in place
+            assert len(doc) == 6
+            assert any(annot.type[1] == "Highlight" for annot in doc[4].annots())
+            assert "Section 5" in doc[5].get_text()
+
+
+FAKE_GS = """#!{python}
+import os, sys, time
+import fitz
+args = sys.argv[1:]
+dpi = next((int(a.split("=")[1]) for a in args if a.startswith("-dColorImageResolution=")), 0)
+output = next(a.split("=", 1)[1] for a in args if a.startswith("-sOutputFile="))
+if str(dpi) == os.environ.get("FAKE_GS_SLOW_DPI"):
+    time.sleep(60)
+doc = fitz.open(args[-1])
+doc.set_metadata({{"subject": "y" * (dpi * 100)}})
+doc.save(output, garbage=4, deflate=True)
+"""
+
+
+@pytest.fixture
+def fake_gs(tmp_path, monkeypatch):
+    """A stand-in for Ghostscript whose output size grows with the image resolution."""
+    script = tmp_path / "gs"
+    script.write_text(FAKE_GS.format(python=sys.executable))
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setattr(PDFCompressService, "find_ghostscript", staticmethod(lambda: str(script)))
+    return str(script)
+
+
+@pytest.fixture
+def large_pdf(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "compression_cache_dir", str(tmp_path / "cache"))
+    path = tmp_path / "large.pdf"
+    doc = fitz.open()
+    for page_num in range(3):
+        doc.new_page().insert_text((72, 72), f"Page {page_num + 1}")
+    doc.set_metadata({"subject": "x" * 100000})
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+def _subject_length(path):
+    with fitz.open(path) as doc:
+        return len(doc.metadata["subject"])
+
+
+class TestPDFCompress:
+    """Test cases for the Ghostscript compression search."""
+
+    def test_plan_puts_likely_candidates_first(self):
+        """Test that candidates estimated to meet the target run first, in quality order."""
+        candidates = [("/ebook", 150), ("/ebook", 96), ("/ebook", 72), ("/screen", 72)]
+        estimates = {("/ebook", 150): 900, ("/ebook", 96): 500, ("/screen", 72): 300}
+        plan = PDFCompressService.plan(candidates, estimates, desired_size=520)
+        assert plan == [("/ebook", 96), ("/screen", 72), ("/ebook", 150), ("/ebook", 72)]
+        assert PDFCompressService.plan(candidates, estimates, desired_size=None) == candidates
+
+    def test_stops_once_target_is_met(self, fake_gs, large_pdf, tmp_path, monkeypatch):
+        """Test that a run meeting the target ends the search and the slow runs are killed."""
+        monkeypatch.setenv("FAKE_GS_SLOW_DPI", "150")
+        output = tmp_path / "out" / "compressed.pdf"
+        started = time.monotonic()
+        PDFCompressService.compress(large_pdf, str(output), "medium", target_reduction_pct=50)
+        assert time.monotonic() - started < 30
+        assert _subject_length(str(output)) in (96 * 100, 72 * 100)
+        assert os.path.getsize(output) <= os.path.getsize(large_pdf) / 2
+        assert os.listdir(tmp_path / "out") == ["compressed.pdf"]
+
+    def test_keeps_smallest_result_when_target_is_missed(self, fake_gs, large_pdf, tmp_path):
+        """Test that every candidate is tried and the smallest output kept."""
+        output = tmp_path / "compressed.pdf"
+        PDFCompressService.compress(large_pdf, str(output), "low", target_reduction_pct=99)
+        assert _subject_length(str(output)) == 72 * 100
+
+    def test_results_are_cached(self, large_pdf, tmp_path, monkeypatch):
+        """Test the PyMuPDF fallback and that a repeated request is served from the cache."""
+        monkeypatch.setattr(PDFCompressService, "find_ghostscript", staticmethod(lambda: None))
+        first = tmp_path / "first.pdf"
+        PDFCompressService.compress(large_pdf, str(first), "high")
+        assert os.path.getsize(first) < os.path.getsize(large_pdf)
+        assert len(os.listdir(settings.compression_cache_dir)) == 1
+
+        class NoFitz:
+            def open(self, *args, **kwargs):
+                raise AssertionError("cache miss")
+
+        monkeypatch.setattr(pdf_compress_service, "fitz", NoFitz())
+        second = tmp_path / "second.pdf"
+        PDFCompressService.compress(large_pdf, str(second), "high")
+        assert second.read_bytes() == first.read_bytes()
+
+        with pytest.raises(FileProcessingError):
+            PDFCompressService.compress(large_pdf, str(tmp_path / "third.pdf"), "low")
+
+
+class TestPDFMerge:
+    """Test cases for the PyMuPDF merge engine."""
+
+    def _copies(self, logo_pdf, tmp_path, count):
+        paths = []
+        for index in range(count):
+            with fitz.open(logo_pdf) as doc:
+                doc.set_toc([[1, f"Copy {index}", 1], [2, "Last page", 3]])
+                path = tmp_path / f"copy_{index}.pdf"
+                doc.save(str(path))
+            paths.append(str(path))
+        return paths
+
+    def test_shared_images_are_stored_once(self, logo_pdf, tmp_path):
+        """Test that images repeated across inputs appear once in the merged file."""
+        paths = self._copies(logo_pdf, tmp_path, 3)
+        output = tmp_path / "out" / "merged.pdf"
+        PDFConversionService.merge_pdfs(paths, str(output))
+
+        with fitz.open(str(output)) as doc:
+            assert doc.page_count == 9
+            assert [doc[page_num].get_text().strip() for page_num in (0, 4, 8)] == ["Page 1", "Page 2", "Page 3"]
+            xrefs = {image[0] for page in doc for image in page.get_images()}
+            assert len(xrefs) == 2
+            assert doc.get_toc() == [
+                [1, "Copy 0", 1], [2, "Last page", 3],
+                [1, "Copy 1", 4], [2, "Last page", 6],
+                [1, "Copy 2", 7], [2, "Last page", 9],
+            ]
+        assert os.path.getsize(output) < sum(os.path.getsize(path) for path in paths)
+
+    def test_outlines_can_be_dropped(self, logo_pdf, tmp_path):
+        output = tmp_path / "merged.pdf"
+        PDFMergeService.merge(self._copies(logo_pdf, tmp_path, 2), str(output), preserve_outlines=False)
+        with fitz.open(str(output)) as doc:
+            assert doc.get_toc() == []
+
+    def test_missing_input(self, logo_pdf, tmp_path):
+        with pytest.raises(FileProcessingError):
+            PDFMergeService.merge([logo_pdf, str(tmp_path / "missing.pdf")], str(tmp_path / "merged.pdf"))
+
+
+class TestPDFSplit:
+    """Test cases for splitting a PDF into parts."""
+
+    def test_page_ranges(self, logo_pdf, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "output_dir", str(tmp_path / "outputs"))
+        result = PDFConversionService.split_pdf(logo_pdf, "page_ranges", ["3-2", "1"], output_prefix="doc")
+        assert [item["filename"] for item in result["files"]] == ["doc_page_2_3.pdf", "doc_page_1.pdf"]
+        assert [item["pages"] for item in result["files"]] == [[2, 3], [1]]
+        with fitz.open(result["files"][0]["path"]) as part:
+            assert [page.get_text().strip() for page in part] == ["Page 2", "Page 3"]
+            # Only the images the part's pages show are copied
+            assert len({image[0] for page in part for image in page.get_images()}) == 2
+        with fitz.open(result["files"][1]["path"]) as part:
+            assert len(part[0].get_images()) == 1
+        assert "zip_path" not in result
+
+        with pytest.raises(FileProcessingError, match="Invalid page range"):
+            PDFConversionService.split_pdf(logo_pdf, "page_ranges", ["2-9"])
+
+
+@pytest.fixture
+def table_pdf(tmp_path):
+    """A text-only page followed by a page with a ruled 3x2 table."""
+    path = tmp_path / "table.pdf"
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "Introduction")
+    page = doc.new_page()
+    cells = [["Name", "Qty"], ["Apple", "3"], ["Pear", "5"]]
+    for row_num, row in enumerate(cells):
+        for col_num, value in enumerate(row):
+            rect = fitz.Rect(72 + col_num * 100, 100 + row_num * 30, 172 + col_num * 100, 130 + row_num * 30)
+            page.draw_rect(rect)
+            page.insert_text((rect.x0 + 5, rect.y0 + 20), value)
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+@pytest.fixture
+def pdf_app(tmp_path, monkeypatch):
+    """The PDF conversion and jobs endpoints, writing uploads, outputs and logs under ``tmp_path``."""
+    from app.api.v1.endpoints import jobs, pdf_conversion
+
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(settings.upload_dir, exist_ok=True)
+    os.makedirs(settings.output_dir, exist_ok=True)
+    app = FastAPI()
+    app.include_router(pdf_conversion.router)
+    app.include_router(jobs.router, prefix="/jobs")
+    return app
+
+
+class TestTableExtraction:
+    """Test cases for the table pipeline behind pdf-to-csv and pdf-to-excel."""
+
+    def test_only_ruled_pages_are_searched(self, table_pdf, tmp_path, monkeypatch):
+        searched = []
+        page_tables = pdf_workers.page_tables
+
+        def recording_page_tables(page):
+            searched.append(page.number)
+            return page_tables(page)
+
+        monkeypatch.setattr(pdf_workers, "page_tables", recording_page_tables)
+        output = tmp_path / "tables.csv"
+        PDFConversionService.pdf_to_csv(table_pdf, str(output))
+        assert searched == [1]
+        assert output.read_text(encoding="utf-8").splitlines() == ["Name,Qty", "Apple,3", "Pear,5"]
+
+    def test_excel_sheets(self, table_pdf, tmp_path):
+        output = tmp_path / "tables.xlsx"
+        PDFConversionService.pdf_to_excel(table_pdf, str(output))
+        workbook = openpyxl.load_workbook(str(output))
+        assert workbook.sheetnames == ["Page_1", "Page_2"]
+        assert [row for row in workbook["Page_1"].iter_rows(values_only=True)] == [("Introduction",)]
+        rows = [row for row in workbook["Page_2"].iter_rows(values_only=True)]
+        assert rows[:3] == [("Name", "Qty"), ("Apple", "3"), ("Pear", "5")]
+        assert rows[5] == ("Text Content:", None)
+
+    def test_endpoint_does_not_block_the_event_loop(self, table_pdf, pdf_app, monkeypatch):
+        """Test that pdf-to-csv runs as a job off the event loop, so other requests are served meanwhile."""
+        page_tables = pdf_workers.page_tables
+
+        def slow_page_tables(page):
+            time.sleep(0.5)
+            return page_tables(page)
+
+        monkeypatch.setattr(pdf_workers, "page_tables", slow_page_tables)
+        with open(table_pdf, "rb") as f:
+            data = f.read()
+        finished = []
+
+        async def scenario():
+            transport = httpx.ASGITransport(app=pdf_app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                async def convert():
+                    response = await client.post(
+                        "/pdf-to-csv-ai", files={"file": ("table.pdf", data, "application/pdf")},
+                        headers={"X-Job-Id": "csv-endpoint-job"}
+                    )
+                    finished.append("convert")
+                    return response
+
+                async def other_request():
+                    await asyncio.sleep(0.1)
+                    response = await client.get("/supported-formats")
+                    finished.append("other")
+                    return response
+
+                return await asyncio.gather(convert(), other_request())
+
+        converted, other = asyncio.run(scenario())
+        assert converted.status_code == 200 and other.status_code == 200
+        assert finished == ["other", "convert"]
+        assert JobService.get_job("csv-endpoint-job").status == "completed"
+
+    def test_excel_export_progress_is_streamed(self, table_pdf, pdf_app, monkeypatch):
+        """Test that /jobs/{id}/events reports the progress of a pdf-to-excel export and its end."""
+        has_table_edges = pdf_workers.has_table_edges
+
+        def slow_has_table_edges(page):
+            time.sleep(0.3)
+            return has_table_edges(page)
+
+        monkeypatch.setattr(pdf_workers, "has_table_edges", slow_has_table_edges)
+        with open(table_pdf, "rb") as f:
+            data = f.read()
+        caller = {"X-Device-Id": "excel-exporter"}
+
+        async def scenario():
+            transport = httpx.ASGITransport(app=pdf_app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                # Subscribe first, as a client showing a progress bar does
+                events = asyncio.ensure_future(client.get("/jobs/excel-export-job/events", headers=caller))
+                await asyncio.sleep(0.1)
+                converted = await client.post(
+                    "/pdf-to-excel-ai", files={"file": ("table.pdf", data, "application/pdf")},
+                    headers={"X-Job-Id": "excel-export-job", **caller}
+                )
+                return converted, await events
+
+        converted, events = asyncio.run(scenario())
+        assert converted.status_code == 200
+        messages = [
+            (block.split("\n")[0][len("event: "):], json.loads(block.split("\n")[1][len("data: "):]))
+            for block in events.text.strip().split("\n\n") if block.startswith("event:")
+        ]
+        assert any(name == "progress" and event["stage"] == "Finding tables" for name, event in messages)
+        name, event = messages[-1]
+        assert name == "done" and event["status"] == "completed" and event["progress"] == 100.0
+
+
+class TestPDFOverlay:
+    """Test cases for stamping watermarks and page numbers."""
+
+    def _pages(self, tmp_path, count, rotate_last=False):
+        path = tmp_path / "pages.pdf"
+        doc = fitz.open()
+        for page_num in range(count):
+            doc.new_page(width=300, height=400).insert_text((40, 60), f"Body {page_num + 1}")
+        if rotate_last:
+            doc[-1].set_rotation(90)
+        doc.save(str(path))
+        doc.close()
+        return str(path)
+
+    def test_watermark_is_stored_once(self, tmp_path):
+        """Test that every page shows the same XObject, so each page only adds references to it."""
+        sizes = {}
+        for count in (10, 40):
+            output = tmp_path / f"watermarked_{count}.pdf"
+            PDFConversionService.add_watermark(self._pages(tmp_path, count), str(output), "DRAFT", "center")
+            with fitz.open(str(output)) as doc:
+                forms = {xobject[0] for page in doc for xobject in page.get_xobjects() if xobject[2] == 0}
+                assert len(forms) == 1
+                assert all("DRAFT" in page.get_text() for page in doc)
+            sizes[count] = os.path.getsize(output) - os.path.getsize(tmp_path / "pages.pdf")
+        assert sizes[40] - sizes[10] < 30 * 80
+
+    def test_page_numbers(self, tmp_path):
+        output = tmp_path / "numbered.pdf"
+        PDFConversionService.add_page_numbers(
+            self._pages(tmp_path, 3, rotate_last=True), str(output), "bottom-right", start_page=2, fmt="Page {page}"
+        )
+        with fitz.open(str(output)) as doc:
+            assert doc[0].get_text().split() == ["Body", "1"]
+            for page in doc[1:]:
+                words = page.get_text("words")
+                number = [word for word in words if word[4] == "Page"]
+                assert number
+                # Bottom right of the page as displayed, whatever its rotation
+                box = fitz.Rect(number[0][:4]) * page.rotation_matrix
+                assert box.x0 > page.rect.width / 2
+                assert box.y0 > page.rect.height * 0.8
+            assert "3" in [word[4] for word in doc[2].get_text("words")]
+
+
+class TestIncrementalSave:
+    """Test cases for saving light edits as incremental updates."""
+
+    def _pages(self, tmp_path, count=30):
+        path = tmp_path / "input.pdf"
+        doc = fitz.open()
+        for page_num in range(count):
+            doc.new_page().insert_text((72, 72), f"Page {page_num + 1}")
+        doc.save(str(path))
+        doc.close()
+        return str(path)
+
+    def test_metadata_is_appended(self, tmp_path):
+        input_path = self._pages(tmp_path)
+        output = tmp_path / "out" / "meta.pdf"
+        result = PDFConversionService.set_pdf_metadata(input_path, str(output), {"title": "Report", "author": None})
+        assert result["incremental"] is True
+        assert result["metadata"]["title"] == "Report"
+        original = open(input_path, "rb").read()
+        assert output.read_bytes().startswith(original)
+        with fitz.open(str(output)) as doc:
+            assert doc.metadata["title"] == "Report"
+
+    def test_unknown_metadata_field(self, tmp_path):
+        with pytest.raises(FileProcessingError):
+            PDFConversionService.set_pdf_metadata(self._pages(tmp_path), str(tmp_path / "out.pdf"), {"colour": "red"})
+
+    def test_large_change_set_is_saved_in_full(self, tmp_path):
+        input_path = self._pages(tmp_path)
+        output = tmp_path / "out" / "rotated.pdf"
+        PDFConversionService.rotate_pdf(input_path, str(output), 90)
+        assert not output.read_bytes().startswith(open(input_path, "rb").read())
+        with fitz.open(str(output)) as doc:
+            assert [page.rotation for page in doc] == [90] * 30
+
+    def test_rotation_counts_inherited_values(self, tmp_path):
+        """Test that pages inheriting the target rotation from the page tree are left alone."""
+        with fitz.open(self._pages(tmp_path, 4)) as doc:
+            pages_root = int(doc.xref_get_key(doc.pdf_catalog(), "Pages")[1].split()[0])
+            doc.xref_set_key(pages_root, "Rotate", "90")
+            for page_num in range(4):
+                doc.xref_set_key(doc.page_xref(page_num), "Rotate", "180" if page_num == 0 else "null")
+            assert [page.rotation for page in doc] == [180, 90, 90, 90]
+            assert PDFIncrementalService.set_rotation(doc, 90) == 1
+            assert [page.rotation for page in doc] == [90] * 4
+
+    def test_unlock_unencrypted_copies_input(self, tmp_path):
+        input_path = self._pages(tmp_path)
+        output = tmp_path / "out" / "unlocked.pdf"
+        PDFConversionService.unlock_pdf(input_path, str(output), "secret")
+        assert output.read_bytes() == open(input_path, "rb").read()
+
+
+class TestPageSelection:
+    """Test cases for the ``pages`` selection of the pdf-to-X conversions."""
+
+    @pytest.fixture
+    def ten_pages(self, tmp_path):
+        path = tmp_path / "ten.pdf"
+        doc = fitz.open()
+        for page_num in range(10):
+            doc.new_page(width=200, height=200).insert_text((40, 100), f"Page {page_num + 1}")
+        doc.save(str(path))
+        doc.close()
+        return str(path)
+
+    def test_parse_pages(self):
+        assert PDFConversionService.parse_pages("1-3,7", 10) == [0, 1, 2, 6]
+        assert PDFConversionService.parse_pages("8-, 9", 10) == [7, 8, 9]
+        assert PDFConversionService.parse_pages("3-1", 10) == [0, 1, 2]
+        assert PDFConversionService.parse_pages(None, 3) == [0, 1, 2]
+        for invalid in ("0", "2-11", "two", " , "):
+            with pytest.raises(FileProcessingError):
+                PDFConversionService.parse_pages(invalid, 10)
+
+    def test_only_selected_pages_are_extracted(self, ten_pages, tmp_path, monkeypatch):
+        TextExtractionService.clear()
+        extracted = []
+        extract_page = pdf_workers.extract_page
+
+        def recording_extract_page(page):
+            extracted.append(page.number)
+            return extract_page(page)
+
+        monkeypatch.setattr(pdf_workers, "extract_page", recording_extract_page)
+        output = tmp_path / "selected.txt"
+        PDFConversionService.pdf_to_text(ten_pages, str(output), "2,9-10")
+        assert extracted == [1, 8, 9]
+        assert [line for line in output.read_text(encoding="utf-8").splitlines() if line.startswith("---")] == [
+            "--- Page 2 ---", "--- Page 9 ---", "--- Page 10 ---"
+        ]
+
+        PDFConversionService.pdf_to_json(ten_pages, str(tmp_path / "selected.json"), pages="4-5")
+        with open(tmp_path / "selected.json", encoding="utf-8") as f:
+            data = json.load(f)
+        assert data["document_info"]["total_pages"] == 10
+        assert [page["page_number"] for page in data["pages"]] == [4, 5]
+
+    def test_images_keep_page_numbers(self, ten_pages, tmp_path):
+        output_dir = tmp_path / "images"
+        output_dir.mkdir()
+        files = PDFConversionService.pdf_to_image(ten_pages, str(output_dir), "png", pages="1,10")
+        assert [os.path.basename(path) for path in files] == ["page_1.png", "page_10.png"]
+        assert sorted(os.listdir(output_dir)) == ["page_1.png", "page_10.png"]
+
+    def test_selection_can_be_cancelled(self, ten_pages, pdf_app, monkeypatch):
+        """Test that a pdf-to-svg page selection runs as a job that the jobs API can cancel."""
+        rendered = []
+        get_svg_image = fitz.Page.get_svg_image
+
+        def slow_get_svg_image(page, *args, **kwargs):
+            rendered.append(page.number)
+            time.sleep(0.1)
+            return get_svg_image(page, *args, **kwargs)
+
+        monkeypatch.setattr(fitz.Page, "get_svg_image", slow_get_svg_image)
+        with open(ten_pages, "rb") as f:
+            data = f.read()
+
+        async def scenario():
+            transport = httpx.ASGITransport(app=pdf_app, raise_app_exceptions=False)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                request = asyncio.ensure_future(client.post(
+                    "/pdf-to-svg", files={"file": ("ten.pdf", data, "application/pdf")},
+                    data={"pages": "1-10"}, headers={"X-Job-Id": "svg-selection-job"}
+                ))
+                await asyncio.sleep(0.3)
+                assert JobService.cancel_job("svg-selection-job")
+                await request
+
+        asyncio.run(scenario())
+        assert JobService.get_job("svg-selection-job").status == "cancelled"
+        assert len(rendered) < 10
+
+
+class TestStreamedExports:
+    """Test cases for the page-by-page streamed exports."""
+
+    def _pages(self, tmp_path, count=4):
+        path = tmp_path / "stream.pdf"
+        doc = fitz.open()
+        for page_num in range(count):
+            doc.new_page(width=200, height=200).insert_text((40, 100), f"Page {page_num + 1}")
+        doc.save(str(path))
+        doc.close()
+        return str(path)
+
+    def test_text_records(self, tmp_path):
+        chunks = list(StreamService.ndjson(PDFConversionService.iter_text_records(self._pages(tmp_path), "2-3")))
+        records = [json.loads(chunk) for chunk in chunks]
+        assert [(record["page_number"], record["text"].strip()) for record in records] == [(2, "Page 2"), (3, "Page 3")]
+
+    def test_json_records(self, tmp_path):
+        records = list(PDFConversionService.iter_json_records(self._pages(tmp_path)))
+        assert records[0]["document_info"]["total_pages"] == 4
+        assert [record["page_number"] for record in records[1:]] == [1, 2, 3, 4]
+
+    def test_image_zip_sends_each_page_once_rendered(self, tmp_path):
+        work_dir = tmp_path / "work"
+        work_dir.mkdir()
+        chunks = PDFConversionService.iter_image_zip(self._pages(tmp_path), str(work_dir), "doc", "png", pages="1,3-4")
+        first = next(chunks)
+        # The first page is being sent before the others are rendered
+        assert b"doc_page_1.png" in first
+        assert os.listdir(work_dir) == ["page_1.png"]
+        archive = tmp_path / "pages.zip"
+        archive.write_bytes(first + b"".join(chunks))
+        with zipfile.ZipFile(archive) as zf:
+            assert zf.namelist() == ["doc_page_1.png", "doc_page_3.png", "doc_page_4.png"]
+            assert zf.testzip() is None
+            assert Image.open(zf.open("doc_page_3.png")).size == (200, 200)
+        assert not work_dir.exists()
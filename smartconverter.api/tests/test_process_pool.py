@@ -0,0 +1,182 @@
+import os
+import zipfile
+
+import fitz
+import pytest
+from PIL import Image
+
+from app.core.config import settings
+from app.core.exceptions import FileProcessingError
+from app.services.pdf_conversion_service import PDFConversionService
+from app.services.process_pool_service import ProcessPoolService, WorkerPool
+from app.services.text_extraction_service import TextExtractionService
+
+
+def _load_state(value):
+    os.environ["WORKER_POOL_STATE"] = value
+
+
+def _worker_state(_item):
+    return os.getpid(), os.environ.get("WORKER_POOL_STATE")
+
+
+@pytest.fixture
+def sample_pdf(tmp_path):
+    path = tmp_path / "sample.pdf"
+    doc = fitz.open()
+    for page_num in range(6):
+        page = doc.new_page(width=200, height=200)
+        page.insert_text((40, 100), f"Page {page_num + 1}")
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(settings, "process_pool_workers", 2)
+    monkeypatch.setattr(settings, "pdf_parallel_min_pages", 1)
+    yield
+    ProcessPoolService.shutdown()
+
+
+class TestProcessPoolService:
+    """Test cases for sharding work across the process pool."""
+
+    def test_shard_keeps_order_and_balance(self):
+        """Test that shards are contiguous and differ in size by at most one."""
+        shards = ProcessPoolService.shard(range(10), 4)
+        assert shards == [[0, 1, 2], [3, 4, 5], [6, 7], [8, 9]]
+        assert ProcessPoolService.shard(range(2), 8) == [[0], [1]]
+        assert ProcessPoolService.shard([], 3) == []
+
+    def test_imap_keeps_order_and_bounds_pending(self, pool):
+        """Test that imap yields in input order and only pulls items as slots free up."""
+        produced = []
+
+        def items():
+            for value in range(-10, 0):
+                produced.append(value)
+                yield value
+
+        results = ProcessPoolService.imap(abs, items(), max_pending=3)
+        assert next(results) == 10
+        assert len(produced) <= 4
+        assert list(results) == list(range(9, 0, -1))
+
+    def test_worker_pool_loads_state_and_recycles_workers(self, pool):
+        """Test that a dedicated pool's workers start with its state and are replaced after max_tasks."""
+        worker_pool = WorkerPool("test", 1, _load_state, ("warm",), max_tasks=2)
+        results = list(ProcessPoolService.imap(_worker_state, range(4), max_pending=1, pool=worker_pool))
+        assert [state for _, state in results] == ["warm"] * 4
+        pids = [pid for pid, _ in results]
+        assert pids[0] == pids[1] != pids[2] == pids[3]
+        assert ProcessPoolService.get_executor(worker_pool) is not ProcessPoolService.get_executor()
+
+    def test_parallel_render_matches_sequential(self, sample_pdf, tmp_path, monkeypatch, pool):
+        """Test that pool rendering writes the same pages, in page order, as the request thread."""
+        parallel_dir = tmp_path / "parallel"
+        parallel_dir.mkdir()
+        parallel = PDFConversionService.pdf_to_image(sample_pdf, str(parallel_dir), "png", dpi=100, colorspace="gray")
+        assert [os.path.basename(path) for path in parallel] == [f"page_{n}.png" for n in range(1, 7)]
+
+        monkeypatch.setattr(settings, "pdf_parallel_min_pages", 100)
+        sequential_dir = tmp_path / "sequential"
+        sequential_dir.mkdir()
+        sequential = PDFConversionService.pdf_to_image(sample_pdf, str(sequential_dir), "png", dpi=100, colorspace="gray")
+
+        for left, right in zip(parallel, sequential):
+            with open(left, "rb") as a, open(right, "rb") as b:
+                assert a.read() == b.read()
+        with Image.open(parallel[0]) as image:
+            assert image.mode == "L"
+            assert image.size == (278, 278)
+
+    def test_tiff_cmyk_and_invalid_options(self, sample_pdf, tmp_path):
+        """Test TIFF output without a pixel copy and validation of render options."""
+        files = PDFConversionService.pdf_to_image(sample_pdf, str(tmp_path), "tiff", colorspace="cmyk")
+        with Image.open(files[0]) as image:
+            assert image.mode == "CMYK"
+
+        with pytest.raises(FileProcessingError):
+            PDFConversionService.pdf_to_image(sample_pdf, str(tmp_path), "png", colorspace="cmyk")
+        with pytest.raises(FileProcessingError):
+            PDFConversionService.pdf_to_image(sample_pdf, str(tmp_path), "jpg", dpi=5000)
+
+    def test_parallel_text_extraction_keeps_page_order(self, sample_pdf, tmp_path, monkeypatch, pool):
+        """Test that pages extracted in the pool are written in order and match the in-thread output."""
+        TextExtractionService.clear()
+        parallel_output = tmp_path / "parallel.md"
+        PDFConversionService.pdf_to_markdown(sample_pdf, str(parallel_output))
+
+        TextExtractionService.clear()
+        monkeypatch.setattr(settings, "pdf_parallel_min_pages", 100)
+        sequential_output = tmp_path / "sequential.md"
+        PDFConversionService.pdf_to_markdown(sample_pdf, str(sequential_output))
+
+        text = parallel_output.read_text(encoding="utf-8")
+        assert text == sequential_output.read_text(encoding="utf-8")
+        assert [text.index(f"## Page {n}") for n in range(1, 7)] == sorted(text.index(f"## Page {n}") for n in range(1, 7))
+
+    def test_parallel_split_writes_parts_in_order(self, sample_pdf, tmp_path, monkeypatch, pool):
+        """Test splitting in the pool: every part is written once and zipped in page order."""
+        monkeypatch.setattr(settings, "output_dir", str(tmp_path / "outputs"))
+        (tmp_path / "outputs" / "sample").mkdir(parents=True)
+        (tmp_path / "outputs" / "sample" / "sample_page_2.pdf").write_bytes(b"taken")
+
+        result = PDFConversionService.split_pdf(sample_pdf, "every_page", zip_output=True)
+        names = [item["filename"] for item in result["files"]]
+        assert names[:3] == ["sample_page_1.pdf", "sample_page_2_1.pdf", "sample_page_3.pdf"]
+        assert [item["pages"] for item in result["files"]] == [[n] for n in range(1, 7)]
+        for page_num, item in enumerate(result["files"], start=1):
+            with fitz.open(item["path"]) as part:
+                assert part.page_count == 1
+                assert part[0].get_text().strip() == f"Page {page_num}"
+        with zipfile.ZipFile(result["zip_path"]) as zf:
+            assert zf.namelist() == [f"sample/{name}" for name in names]
+
+    def test_parallel_tables_keep_page_order(self, tmp_path, pool):
+        """Test that tables found in the pool are written in page order, between pages without tables."""
+        path = tmp_path / "tables.pdf"
+        doc = fitz.open()
+        for page_num in range(6):
+            page = doc.new_page(width=300, height=300)
+            if page_num % 2:
+                for col_num, value in enumerate(["Page", str(page_num + 1)]):
+                    rect = fitz.Rect(40 + col_num * 100, 40, 140 + col_num * 100, 70)
+                    page.draw_rect(rect)
+                    page.insert_text((rect.x0 + 5, rect.y0 + 20), value)
+            else:
+                page.insert_text((40, 100), f"Text {page_num + 1}")
+        doc.save(str(path))
+        doc.close()
+
+        output = tmp_path / "tables.csv"
+        PDFConversionService.pdf_to_csv(str(path), str(output))
+        assert output.read_text(encoding="utf-8").splitlines() == ["Page,2", "Page,4", "Page,6"]
+
+    def test_parallel_render_of_selected_pages(self, sample_pdf, tmp_path, pool):
+        output_dir = tmp_path / "selected"
+        output_dir.mkdir()
+        files = PDFConversionService.pdf_to_image(sample_pdf, str(output_dir), "png", pages="2-3,6")
+        assert [os.path.basename(path) for path in files] == ["page_2.png", "page_3.png", "page_6.png"]
+        assert sorted(os.listdir(output_dir)) == ["page_2.png", "page_3.png", "page_6.png"]
+
+    def test_streamed_text_keeps_page_order(self, sample_pdf, monkeypatch, pool):
+        """Test that streamed records come in page order from small pool tasks."""
+        TextExtractionService.clear()
+        monkeypatch.setattr(settings, "pdf_stream_shard_pages", 1)
+        records = list(PDFConversionService.iter_text_records(sample_pdf))
+        assert [(record["page_number"], record["text"].strip()) for record in records] == [
+            (n, f"Page {n}") for n in range(1, 7)
+        ]
+
+    def test_streamed_images_from_pool(self, sample_pdf, tmp_path, pool):
+        work_dir = tmp_path / "work"
+        work_dir.mkdir()
+        archive = tmp_path / "pages.zip"
+        archive.write_bytes(b"".join(PDFConversionService.iter_image_zip(sample_pdf, str(work_dir), "doc", "jpg")))
+        with zipfile.ZipFile(archive) as zf:
+            assert sorted(zf.namelist()) == sorted(f"doc_page_{n}.jpg" for n in range(1, 7))
+            assert zf.testzip() is None
+        assert not work_dir.exists()
@@ -0,0 +1,68 @@
+import subprocess
+import sys
+
+import pytest
+
+from app.services.subprocess_service import FfmpegProgress, SubprocessService
+
+
+class TestSubprocessService:
+    """Test cases for SubprocessService."""
+
+    def test_run_captures_output_and_usage(self):
+        """Test that stdout, stderr and resource usage are captured."""
+        result = SubprocessService.run(
+            [sys.executable, "-c", "import sys; print('out'); print('err', file=sys.stderr)"],
+            text=True,
+        )
+        assert result.returncode == 0
+        assert result.stdout.strip() == "out"
+        assert result.stderr == "err"
+        if sys.platform != "win32":
+            assert result.cpu_time is not None
+            assert result.max_rss_kb > 0
+
+    def test_run_pipes_input(self):
+        """Test that input bytes are written to the child's stdin."""
+        result = SubprocessService.run(
+            [sys.executable, "-c", "import sys; sys.stdout.write(sys.stdin.read().upper())"],
+            input=b"hello",
+            text=True,
+        )
+        assert result.stdout == "HELLO"
+
+    def test_stderr_lines_are_streamed(self):
+        """Test that carriage-return separated stderr lines reach the callback."""
+        lines = []
+        SubprocessService.run(
+            [sys.executable, "-c", "import sys; sys.stderr.write('a\\rb\\nc')"],
+            capture_stdout=False,
+            on_stderr_line=lines.append,
+        )
+        assert lines == ["a", "b", "c"]
+
+    def test_wall_clock_timeout(self):
+        """Test that a command running past its timeout is killed."""
+        with pytest.raises(subprocess.TimeoutExpired):
+            SubprocessService.run([sys.executable, "-c", "import time; time.sleep(30)"], timeout=0.5)
+
+
+class TestFfmpegProgress:
+    """Test cases for FfmpegProgress."""
+
+    def test_stats_lines(self):
+        """Test progress from the Duration header and time= stats."""
+        progress = FfmpegProgress()
+        progress.feed("  Duration: 00:00:10.00, start: 0.000000, bitrate: 128 kb/s")
+        assert progress.feed("size=     256kB time=00:00:05.00 bitrate= 419.4kbits/s speed=10x") == 50.0
+
+    def test_progress_lines(self):
+        """Test progress from -progress key=value output."""
+        progress = FfmpegProgress(duration=4)
+        assert progress.feed("out_time_us=1000000") == 25.0
+        assert progress.feed("progress=end") == 100.0
+
+    def test_duration_from_args(self):
+        """Test that trimming arguments define the output duration."""
+        assert FfmpegProgress.duration_from_args(["-i", "in.wav", "-ss", "5", "-to", "15", "out.wav"]) == 10
+        assert FfmpegProgress.duration_from_args(["-i", "in.wav", "-t", "00:01:00", "out.wav"]) == 60
@@ -0,0 +1,167 @@
+import hashlib
+import os
+
+import pytest
+from fastapi import APIRouter, FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from app.api.v1.dependencies import UploadRoute
+from app.api.v1.endpoints import uploads
+from app.core.config import settings
+from app.services.file_service import FileService
+from app.services.upload_service import UploadService
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "resumable_upload_dir", str(tmp_path / "resumable"))
+    monkeypatch.setattr(settings, "upload_dir", str(tmp_path / "uploads"))
+    os.makedirs(settings.resumable_upload_dir)
+    os.makedirs(settings.upload_dir)
+
+    conversion_router = APIRouter(route_class=UploadRoute)
+
+    @conversion_router.post("/convert")
+    async def convert(file: UploadFile = File(...)):
+        return {"filename": file.filename, "size": len(await file.read())}
+
+    @conversion_router.post("/save")
+    async def save(file: UploadFile = File(...)):
+        return {"path": FileService.save_uploaded_file(file)}
+
+    app = FastAPI()
+    app.include_router(uploads.router, prefix="/uploads")
+    app.include_router(conversion_router)
+    return TestClient(app)
+
+
+OWNER = {"X-Device-Id": "device-a"}
+OTHER = {"X-Device-Id": "device-b"}
+
+
+def _checksum(data: bytes) -> str:
+    return "sha256 " + hashlib.sha256(data).hexdigest()
+
+
+def _upload(client, data: bytes, filename: str, headers: dict) -> str:
+    """Send ``data`` as a resumable upload in one chunk and return its finalized upload id."""
+    upload_id = client.post("/uploads", data={"filename": filename}, headers=headers).json()["upload"]["upload_id"]
+    client.patch(
+        f"/uploads/{upload_id}", content=data,
+        headers={"Upload-Offset": "0", "Upload-Checksum": _checksum(data)}
+    )
+    response = client.post(f"/uploads/{upload_id}/finalize", data={"sha256": hashlib.sha256(data).hexdigest()})
+    assert response.json()["sha256"] == hashlib.sha256(data).hexdigest()
+    return upload_id
+
+
+class TestResumableUploads:
+    """Test cases for the resumable upload endpoints."""
+
+    def test_chunked_upload_used_by_conversion_endpoint(self, client):
+        """Test uploading in chunks, then converting by upload id."""
+        data = b"x" * 1000 + b"y" * 500
+        upload_id = client.post("/uploads", data={"filename": "movie.mkv", "length": len(data)}).json()["upload"]["upload_id"]
+
+        response = client.patch(
+            f"/uploads/{upload_id}", content=data[:1000],
+            headers={"Upload-Offset": "0", "Upload-Checksum": _checksum(data[:1000])}
+        )
+        assert response.json()["offset"] == 1000
+
+        # Resume from the offset reported by the server
+        assert client.head(f"/uploads/{upload_id}").headers["Upload-Offset"] == "1000"
+        client.patch(
+            f"/uploads/{upload_id}", content=data[1000:],
+            headers={"Upload-Offset": "1000", "Upload-Checksum": _checksum(data[1000:])}
+        )
+        assert client.post(f"/uploads/{upload_id}/finalize").json()["size"] == len(data)
+
+        result = client.post("/convert", data={"upload_id": upload_id}).json()
+        assert result == {"filename": "movie.mkv", "size": len(data)}
+
+    def test_rejected_chunks_leave_offset_unchanged(self, client):
+        """Test that wrong offsets and checksums are rejected without writing data."""
+        upload_id = client.post("/uploads", data={"filename": "a.bin"}).json()["upload"]["upload_id"]
+
+        response = client.patch(
+            f"/uploads/{upload_id}", content=b"abc",
+            headers={"Upload-Offset": "0", "Upload-Checksum": _checksum(b"other")}
+        )
+        assert response.status_code == 460
+
+        response = client.patch(
+            f"/uploads/{upload_id}", content=b"abc",
+            headers={"Upload-Offset": "5", "Upload-Checksum": _checksum(b"abc")}
+        )
+        assert response.status_code == 409
+        assert client.get(f"/uploads/{upload_id}").json()["upload"]["offset"] == 0
+
+    def test_unfinalized_upload_is_not_accepted(self, client):
+        """Test that conversion endpoints only take finalized uploads."""
+        upload_id = client.post("/uploads", data={"filename": "a.bin"}).json()["upload"]["upload_id"]
+        response = client.post("/convert", data={"upload_id": upload_id})
+        assert response.status_code == 400
+
+
+class TestUploadDeduplication:
+    """Test cases for the content-addressed upload store."""
+
+    def test_check_returns_upload_id_for_own_content(self, client):
+        """Test that a caller can reuse a file it uploaded by its hash without sending it again."""
+        data = b"%PDF-1.4 same content"
+        sha256 = hashlib.sha256(data).hexdigest()
+        assert client.head("/uploads/check", params={"sha256": sha256}, headers=OWNER).status_code == 404
+        result = client.post("/uploads/check", data={"sha256": sha256}, headers=OWNER).json()
+        assert result == {"success": True, "exists": False}
+
+        first_path = client.post("/save", data={"upload_id": _upload(client, data, "a.pdf", OWNER)}).json()["path"]
+
+        assert client.head("/uploads/check", params={"sha256": sha256}, headers=OWNER).headers["Upload-Length"] == str(len(data))
+        result = client.post("/uploads/check", data={"sha256": sha256.upper(), "filename": "b.pdf"}, headers=OWNER).json()
+        assert result["exists"] and result["size"] == len(data)
+
+        second_path = client.post("/save", data={"upload_id": result["upload_id"]}).json()["path"]
+        assert second_path.endswith(".pdf")
+        # Both conversion inputs share the stored copy
+        assert os.stat(first_path).st_ino == os.stat(second_path).st_ino
+        with open(second_path, "rb") as f:
+            assert f.read() == data
+
+    def test_check_does_not_reveal_other_callers_content(self, client):
+        """Test that knowing the hash of another caller's file gives neither its existence nor an upload id."""
+        data = b"%PDF-1.4 private content"
+        sha256 = hashlib.sha256(data).hexdigest()
+        _upload(client, data, "private.pdf", OWNER)
+        # Plain form uploads are not added to the store at all
+        client.post("/save", files={"file": ("private.pdf", data)}, headers=OTHER)
+
+        assert client.head("/uploads/check", params={"sha256": sha256}, headers=OTHER).status_code == 404
+        result = client.post("/uploads/check", data={"sha256": sha256}, headers=OTHER).json()
+        assert result == {"success": True, "exists": False}
+
+    def test_identical_uploads_are_stored_once(self, client):
+        """Test that finalized uploads of the same content share one blob, removed with its last reference."""
+        data = b"z" * 300
+        sha256 = hashlib.sha256(data).hexdigest()
+        upload_ids = [_upload(client, data, "z.bin", headers) for headers in (OWNER, OTHER)]
+
+        blobs = [name for name in os.listdir(UploadService._store_dir()) if not name.startswith(".")]
+        assert len([name for name in blobs if not name.endswith(".refs")]) == 1
+
+        client.delete(f"/uploads/{upload_ids[0]}")
+        assert UploadService.find_content(sha256, "device:device-a") is None
+        assert UploadService.find_content(sha256, "device:device-b") == len(data)
+        assert client.post("/convert", data={"upload_id": upload_ids[1]}).json()["size"] == len(data)
+        client.delete(f"/uploads/{upload_ids[1]}")
+        assert not os.path.exists(UploadService._blob_path(sha256))
+
+    def test_finalize_rejects_wrong_hash(self, client):
+        """Test that a whole-file hash mismatch is reported at finalize."""
+        upload_id = client.post("/uploads", data={"filename": "a.bin"}).json()["upload"]["upload_id"]
+        client.patch(
+            f"/uploads/{upload_id}", content=b"abc",
+            headers={"Upload-Offset": "0", "Upload-Checksum": _checksum(b"abc")}
+        )
+        response = client.post(f"/uploads/{upload_id}/finalize", data={"sha256": "0" * 64})
+        assert response.status_code == 460